@@ -0,0 +1,57 @@
+"""add pregenerated_contents and plans.pregenerate_lead_minutes
+
+Revision ID: k9l0m1n2o345
+Revises: 20260216_invoice
+Create Date: 2026-02-20
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'k9l0m1n2o345'
+down_revision = '20260216_invoice'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # plans: 事前生成リードタイム
+    op.add_column('plans', sa.Column(
+        'pregenerate_lead_minutes', sa.Integer(), nullable=False, server_default='0',
+        comment='GPT事前生成のリードタイム (分, 0=無効)',
+    ))
+
+    # progress_plan.send_type に pregenerate を追加
+    op.execute("""
+        ALTER TABLE progress_plan MODIFY COLUMN send_type
+        ENUM('scheduled','manual','pregenerate') NOT NULL
+    """)
+
+    # 事前生成コンテンツ (ステージング)
+    op.create_table(
+        'pregenerated_contents',
+        sa.Column('id', sa.Integer(), autoincrement=True, nullable=False),
+        sa.Column('plan_id', sa.Integer(), nullable=False),
+        sa.Column('date', sa.Date(), nullable=False, comment='配信日 (JST)'),
+        sa.Column('prompt_hash', sa.String(64), nullable=False, comment='model+system_prompt+プロンプトのSHA-256'),
+        sa.Column('subject', sa.String(500), nullable=False),
+        sa.Column('body', sa.Text(), nullable=False),
+        sa.Column('created_at', sa.DateTime(), server_default=sa.func.now(), nullable=False),
+        sa.ForeignKeyConstraint(['plan_id'], ['plans.id'], ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('plan_id', 'date', 'prompt_hash', name='uq_pregen_plan_date_hash'),
+    )
+    op.create_index('ix_pregenerated_contents_plan_id', 'pregenerated_contents', ['plan_id'])
+
+
+def downgrade() -> None:
+    op.drop_index('ix_pregenerated_contents_plan_id', 'pregenerated_contents')
+    op.drop_table('pregenerated_contents')
+    op.execute("DELETE FROM progress_plan WHERE send_type = 'pregenerate'")
+    op.execute("""
+        ALTER TABLE progress_plan MODIFY COLUMN send_type
+        ENUM('scheduled','manual') NOT NULL
+    """)
+    op.drop_column('plans', 'pregenerate_lead_minutes')
@@ -0,0 +1,56 @@
+"""add openai_batch_jobs and plans.openai_batch_enabled
+
+Revision ID: l0m1n2o3p456
+Revises: k9l0m1n2o345
+Create Date: 2026-02-21
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'l0m1n2o3p456'
+down_revision = 'k9l0m1n2o345'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.add_column('plans', sa.Column(
+        'openai_batch_enabled', sa.Boolean(), nullable=False, server_default='0',
+        comment='OpenAI Batch APIで生成 (当日中の配信で可)',
+    ))
+
+    op.create_table(
+        'openai_batch_jobs',
+        sa.Column('id', sa.Integer(), autoincrement=True, nullable=False),
+        sa.Column('plan_id', sa.Integer(), nullable=False),
+        sa.Column('date', sa.Date(), nullable=False, comment='配信日 (JST)'),
+        sa.Column('progress_id', sa.Integer(), nullable=True),
+        sa.Column('batch_id', sa.String(255), nullable=True, comment='OpenAI Batch ID'),
+        sa.Column('input_file_id', sa.String(255), nullable=True),
+        sa.Column('output_file_id', sa.String(255), nullable=True),
+        sa.Column('status', sa.String(20), nullable=False, server_default='submitted', comment='submitted/completed/failed/expired/cancelled'),
+        sa.Column('request_count', sa.Integer(), nullable=False, server_default='0'),
+        sa.Column('completed_count', sa.Integer(), nullable=False, server_default='0'),
+        sa.Column('failed_count', sa.Integer(), nullable=False, server_default='0'),
+        sa.Column('last_error', sa.Text(), nullable=True),
+        sa.Column('submitted_at', sa.DateTime(), nullable=True),
+        sa.Column('finished_at', sa.DateTime(), nullable=True),
+        sa.Column('created_at', sa.DateTime(), server_default=sa.func.now(), nullable=False),
+        sa.Column('updated_at', sa.DateTime(), server_default=sa.func.now(), onupdate=sa.func.now(), nullable=False),
+        sa.ForeignKeyConstraint(['plan_id'], ['plans.id'], ondelete='CASCADE'),
+        sa.ForeignKeyConstraint(['progress_id'], ['progress_plan.id'], ondelete='SET NULL'),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('batch_id'),
+    )
+    op.create_index('ix_openai_batch_jobs_plan_id', 'openai_batch_jobs', ['plan_id'])
+    op.create_index('ix_openai_batch_jobs_status', 'openai_batch_jobs', ['status'])
+
+
+def downgrade() -> None:
+    op.drop_index('ix_openai_batch_jobs_status', 'openai_batch_jobs')
+    op.drop_index('ix_openai_batch_jobs_plan_id', 'openai_batch_jobs')
+    op.drop_table('openai_batch_jobs')
+    op.drop_column('plans', 'openai_batch_enabled')
@@ -0,0 +1,27 @@
+"""add plans.prompt_cache_layout
+
+Revision ID: m1n2o3p4q567
+Revises: l0m1n2o3p456
+Create Date: 2026-02-23
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'm1n2o3p4q567'
+down_revision = 'l0m1n2o3p456'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.add_column('plans', sa.Column(
+        'prompt_cache_layout', sa.Boolean(), nullable=False, server_default='0',
+        comment='プロンプトキャッシュ最適化レイアウト (外部データを共通メッセージに分離)',
+    ))
+
+
+def downgrade() -> None:
+    op.drop_column('plans', 'prompt_cache_layout')
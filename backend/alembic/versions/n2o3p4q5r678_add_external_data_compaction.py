@@ -0,0 +1,37 @@
+"""add token budget / field filters to plan_external_data_settings
+
+Revision ID: n2o3p4q5r678
+Revises: m1n2o3p4q567
+Create Date: 2026-02-24
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'n2o3p4q5r678'
+down_revision = 'm1n2o3p4q567'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.add_column('plan_external_data_settings', sa.Column(
+        'token_budget', sa.Integer(), nullable=True,
+        comment='外部データのトークン予算 (NULL/0=無制限)',
+    ))
+    op.add_column('plan_external_data_settings', sa.Column(
+        'include_fields', sa.JSON(), nullable=True,
+        comment='含めるフィールド (キー名 or ドット区切りパス)',
+    ))
+    op.add_column('plan_external_data_settings', sa.Column(
+        'exclude_fields', sa.JSON(), nullable=True,
+        comment='除外するフィールド (キー名 or ドット区切りパス)',
+    ))
+
+
+def downgrade() -> None:
+    op.drop_column('plan_external_data_settings', 'exclude_fields')
+    op.drop_column('plan_external_data_settings', 'include_fields')
+    op.drop_column('plan_external_data_settings', 'token_budget')
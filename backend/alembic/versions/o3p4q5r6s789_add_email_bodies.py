@@ -0,0 +1,70 @@
+"""add email_bodies (content-addressed, zstd) and dedupe user_email_history
+
+Revision ID: o3p4q5r6s789
+Revises: n2o3p4q5r678
+Create Date: 2026-02-25
+
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import mysql
+
+
+# revision identifiers, used by Alembic.
+revision = 'o3p4q5r6s789'
+down_revision = 'n2o3p4q5r678'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        'email_bodies',
+        sa.Column('id', sa.Integer(), autoincrement=True, nullable=False),
+        sa.Column('content_hash', sa.String(64), nullable=False, comment='本文HTMLのSHA-256'),
+        sa.Column('compression', sa.String(10), nullable=False, server_default='zstd', comment='zstd / none'),
+        sa.Column('body', mysql.MEDIUMBLOB(), nullable=False, comment='本文HTML (UTF-8, 圧縮済み)'),
+        sa.Column('original_size', sa.Integer(), nullable=False, comment='圧縮前のバイト数'),
+        sa.Column('created_at', sa.DateTime(), server_default=sa.func.now(), nullable=False),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('content_hash'),
+    )
+
+    # 既存の本文は body_html のまま読めるため移行しない
+    op.add_column('user_email_history', sa.Column(
+        'body_id', sa.Integer(), nullable=True, comment='本文 (email_bodies)',
+    ))
+    op.create_index('ix_user_email_history_body_id', 'user_email_history', ['body_id'])
+    op.create_foreign_key(
+        'fk_user_email_history_body_id', 'user_email_history', 'email_bodies',
+        ['body_id'], ['id'],
+    )
+    op.alter_column(
+        'user_email_history', 'body_html',
+        existing_type=mysql.MEDIUMTEXT(), nullable=True,
+        comment='[移行前の行のみ] 本文HTML',
+    )
+
+    # ユーザー×プランで最新1件に揃えてから一意制約を追加 (保存は upsert になる)
+    op.execute("""
+        DELETE h1 FROM user_email_history h1
+        JOIN user_email_history h2
+          ON h1.user_id = h2.user_id AND h1.plan_id = h2.plan_id
+         AND (h1.sent_at < h2.sent_at OR (h1.sent_at = h2.sent_at AND h1.id < h2.id))
+    """)
+    op.create_unique_constraint(
+        'uq_email_history_user_plan', 'user_email_history', ['user_id', 'plan_id'],
+    )
+
+
+def downgrade() -> None:
+    op.drop_constraint('uq_email_history_user_plan', 'user_email_history', type_='unique')
+    op.drop_constraint('fk_user_email_history_body_id', 'user_email_history', type_='foreignkey')
+    op.drop_index('ix_user_email_history_body_id', 'user_email_history')
+    op.drop_column('user_email_history', 'body_id')
+    op.execute("DELETE FROM user_email_history WHERE body_html IS NULL")
+    op.alter_column(
+        'user_email_history', 'body_html',
+        existing_type=mysql.MEDIUMTEXT(), nullable=False,
+    )
+    op.drop_table('email_bodies')
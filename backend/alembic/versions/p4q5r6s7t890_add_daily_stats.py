@@ -0,0 +1,38 @@
+"""add daily_stats rollup
+
+Revision ID: p4q5r6s7t890
+Revises: o3p4q5r6s789
+Create Date: 2026-02-26
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'p4q5r6s7t890'
+down_revision = 'o3p4q5r6s789'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        'daily_stats',
+        sa.Column('id', sa.Integer(), autoincrement=True, nullable=False),
+        sa.Column('date', sa.Date(), nullable=False, comment='集計日 (JST)'),
+        sa.Column('plan_id', sa.Integer(), nullable=False, server_default='0', comment='プランID (0=全体)'),
+        sa.Column('deliveries', sa.Integer(), nullable=False, server_default='0', comment='配信数'),
+        sa.Column('sent', sa.Integer(), nullable=False, server_default='0', comment='送信対象数'),
+        sa.Column('success', sa.Integer(), nullable=False, server_default='0'),
+        sa.Column('fail', sa.Integer(), nullable=False, server_default='0'),
+        sa.Column('errors', sa.Integer(), nullable=False, server_default='0', comment='ERROR/CRITICALログ数'),
+        sa.Column('warnings', sa.Integer(), nullable=False, server_default='0', comment='WARNINGログ数'),
+        sa.Column('updated_at', sa.DateTime(), server_default=sa.func.now(), onupdate=sa.func.now(), nullable=False),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('date', 'plan_id', name='uq_daily_stats_date_plan'),
+    )
+
+
+def downgrade() -> None:
+    op.drop_table('daily_stats')
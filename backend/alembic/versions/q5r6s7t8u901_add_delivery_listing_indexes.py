@@ -0,0 +1,25 @@
+"""add indexes for delivery listings
+
+Revision ID: q5r6s7t8u901
+Revises: p4q5r6s7t890
+Create Date: 2026-02-27
+
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = 'q5r6s7t8u901'
+down_revision = 'p4q5r6s7t890'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_index('ix_delivery_items_delivery_status', 'delivery_items', ['delivery_id', 'status'])
+    op.create_index('ix_deliveries_created_at', 'deliveries', ['created_at'])
+
+
+def downgrade() -> None:
+    op.drop_index('ix_deliveries_created_at', table_name='deliveries')
+    op.drop_index('ix_delivery_items_delivery_status', table_name='delivery_items')
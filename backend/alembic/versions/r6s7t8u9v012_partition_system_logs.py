@@ -0,0 +1,73 @@
+"""partition system_logs by month
+
+Revision ID: r6s7t8u9v012
+Revises: q5r6s7t8u901
+Create Date: 2026-02-28
+
+"""
+from datetime import date, timedelta
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'r6s7t8u9v012'
+down_revision = 'q5r6s7t8u901'
+branch_labels = None
+depends_on = None
+
+FUTURE_MONTHS = 2
+
+
+def _next_month(d: date) -> date:
+    return (d.replace(day=1) + timedelta(days=32)).replace(day=1)
+
+
+def upgrade() -> None:
+    bind = op.get_bind()
+
+    # パーティション表では外部キーを使えないため削除 (列のインデックスは残す)
+    fk_names = bind.execute(sa.text("""
+        SELECT CONSTRAINT_NAME FROM information_schema.TABLE_CONSTRAINTS
+        WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = 'system_logs'
+          AND CONSTRAINT_TYPE = 'FOREIGN KEY'
+    """)).scalars().all()
+    for name in fk_names:
+        op.drop_constraint(name, 'system_logs', type_='foreignkey')
+
+    # パーティションキー (created_at) を主キーに含める
+    op.execute("ALTER TABLE system_logs DROP PRIMARY KEY, ADD PRIMARY KEY (id, created_at)")
+
+    # 既存データの最古月から 今月 + FUTURE_MONTHS 先まで月パーティションを作る
+    oldest = bind.execute(sa.text("SELECT MIN(created_at) FROM system_logs")).scalar()
+    this_month = date.today().replace(day=1)
+    month = oldest.date().replace(day=1) if oldest else this_month
+    last = this_month
+    for _ in range(FUTURE_MONTHS):
+        last = _next_month(last)
+
+    partitions = []
+    while month <= last:
+        upper = _next_month(month)
+        partitions.append(
+            f"PARTITION p{month.strftime('%Y%m')} VALUES LESS THAN (TO_DAYS('{upper.isoformat()}'))"
+        )
+        month = upper
+    partitions.append("PARTITION pmax VALUES LESS THAN MAXVALUE")
+
+    op.execute(
+        "ALTER TABLE system_logs PARTITION BY RANGE (TO_DAYS(created_at)) ("
+        + ", ".join(partitions)
+        + ")"
+    )
+
+
+def downgrade() -> None:
+    op.execute("ALTER TABLE system_logs REMOVE PARTITIONING")
+    op.execute("ALTER TABLE system_logs DROP PRIMARY KEY, ADD PRIMARY KEY (id)")
+    op.execute("UPDATE system_logs SET plan_id = NULL WHERE plan_id NOT IN (SELECT id FROM plans)")
+    op.execute("UPDATE system_logs SET user_id = NULL WHERE user_id NOT IN (SELECT id FROM users)")
+    op.execute("UPDATE system_logs SET delivery_id = NULL WHERE delivery_id NOT IN (SELECT id FROM deliveries)")
+    op.create_foreign_key(None, 'system_logs', 'plans', ['plan_id'], ['id'], ondelete='SET NULL')
+    op.create_foreign_key(None, 'system_logs', 'users', ['user_id'], ['id'], ondelete='SET NULL')
+    op.create_foreign_key(None, 'system_logs', 'deliveries', ['delivery_id'], ['id'], ondelete='SET NULL')
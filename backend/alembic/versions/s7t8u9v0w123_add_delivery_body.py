@@ -0,0 +1,24 @@
+"""add body to deliveries for queued manual sends
+
+Revision ID: s7t8u9v0w123
+Revises: r6s7t8u9v012
+Create Date: 2026-03-01
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 's7t8u9v0w123'
+down_revision = 'r6s7t8u9v012'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.add_column('deliveries', sa.Column('body', sa.Text(), nullable=True, comment='手動一斉送信の本文 (Workerが送信時に使用)'))
+
+
+def downgrade() -> None:
+    op.drop_column('deliveries', 'body')
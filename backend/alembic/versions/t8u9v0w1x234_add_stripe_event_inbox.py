@@ -0,0 +1,46 @@
+"""add stripe_event_inbox for asynchronous webhook processing
+
+Revision ID: t8u9v0w1x234
+Revises: s7t8u9v0w123
+Create Date: 2026-03-02
+
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import mysql
+
+
+# revision identifiers, used by Alembic.
+revision = 't8u9v0w1x234'
+down_revision = 's7t8u9v0w123'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        'stripe_event_inbox',
+        sa.Column('id', sa.Integer(), autoincrement=True, nullable=False),
+        sa.Column('event_id', sa.String(255), nullable=False, comment='Stripe Event ID (冪等キー)'),
+        sa.Column('event_type', sa.String(100), nullable=False),
+        sa.Column('customer_key', sa.String(255), nullable=False, comment='順序保証の単位 (Stripe Customer ID、なければ Event ID)'),
+        sa.Column('stripe_created', sa.Integer(), nullable=False, server_default='0', comment='Stripe側のイベント作成時刻 (UNIX秒)'),
+        sa.Column('payload', mysql.MEDIUMTEXT(), nullable=False, comment='署名検証済みの生イベントJSON'),
+        sa.Column('status', sa.SmallInteger(), nullable=False, server_default='0', comment='0=未処理, 1=処理中, 2=処理済み, 3=エラー'),
+        sa.Column('attempts', sa.Integer(), nullable=False, server_default='0'),
+        sa.Column('next_attempt_at', sa.DateTime(), nullable=True, comment='エラー時の次回リトライ時刻 (UTC)'),
+        sa.Column('last_error', sa.Text(), nullable=True),
+        sa.Column('locked_at', sa.DateTime(), nullable=True, comment='処理開始時刻 (UTC)'),
+        sa.Column('received_at', sa.DateTime(), server_default=sa.func.now(), nullable=False),
+        sa.Column('processed_at', sa.DateTime(), nullable=True),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('event_id'),
+    )
+    op.create_index('ix_stripe_event_inbox_status_customer', 'stripe_event_inbox', ['status', 'customer_key'])
+    op.create_index('ix_stripe_event_inbox_customer_order', 'stripe_event_inbox', ['customer_key', 'stripe_created', 'id'])
+
+
+def downgrade() -> None:
+    op.drop_index('ix_stripe_event_inbox_customer_order', table_name='stripe_event_inbox')
+    op.drop_index('ix_stripe_event_inbox_status_customer', table_name='stripe_event_inbox')
+    op.drop_table('stripe_event_inbox')
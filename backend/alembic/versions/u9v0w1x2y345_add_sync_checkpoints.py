@@ -0,0 +1,32 @@
+"""add sync_checkpoints for incremental Stripe reconciliation
+
+Revision ID: u9v0w1x2y345
+Revises: t8u9v0w1x234
+Create Date: 2026-03-03
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'u9v0w1x2y345'
+down_revision = 't8u9v0w1x234'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        'sync_checkpoints',
+        sa.Column('name', sa.String(100), nullable=False),
+        sa.Column('last_event_id', sa.String(255), nullable=True, comment='最後に処理したイベントID'),
+        sa.Column('last_event_created', sa.Integer(), nullable=True, comment='ここまでのイベントを処理済み (UNIX秒)'),
+        sa.Column('last_full_sweep_at', sa.DateTime(), nullable=True, comment='最後の全件照合時刻 (JST)'),
+        sa.Column('updated_at', sa.DateTime(), server_default=sa.func.now(), nullable=False),
+        sa.PrimaryKeyConstraint('name'),
+    )
+
+
+def downgrade() -> None:
+    op.drop_table('sync_checkpoints')
@@ -0,0 +1,32 @@
+"""add Stripe discount mirror columns to subscriptions
+
+Revision ID: v0w1x2y3z456
+Revises: u9v0w1x2y345
+Create Date: 2026-03-04
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'v0w1x2y3z456'
+down_revision = 'u9v0w1x2y345'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.add_column('subscriptions', sa.Column('discount_coupon_id', sa.String(255), nullable=True, comment='適用中のStripeクーポンID (ミラー)'))
+    op.add_column('subscriptions', sa.Column('discount_name', sa.String(255), nullable=True, comment='クーポン名 (ミラー)'))
+    op.add_column('subscriptions', sa.Column('discount_percent', sa.Float(), nullable=True, comment='割引率% (ミラー)'))
+    op.add_column('subscriptions', sa.Column('discount_amount', sa.Integer(), nullable=True, comment='割引額 (ミラー)'))
+    op.add_column('subscriptions', sa.Column('stripe_synced_at', sa.DateTime(), nullable=True, comment='ミラーが表すStripeの時点 (JST)'))
+
+
+def downgrade() -> None:
+    op.drop_column('subscriptions', 'stripe_synced_at')
+    op.drop_column('subscriptions', 'discount_amount')
+    op.drop_column('subscriptions', 'discount_percent')
+    op.drop_column('subscriptions', 'discount_name')
+    op.drop_column('subscriptions', 'discount_coupon_id')
@@ -0,0 +1,42 @@
+"""add mail_outbox for transactional mail
+
+Revision ID: w1x2y3z4a567
+Revises: v0w1x2y3z456
+Create Date: 2026-03-05
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'w1x2y3z4a567'
+down_revision = 'v0w1x2y3z456'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        'mail_outbox',
+        sa.Column('id', sa.Integer(), autoincrement=True, nullable=False),
+        sa.Column('kind', sa.String(50), nullable=False, comment='メール種別 (mail_service.RENDERERS のキー)'),
+        sa.Column('to_email', sa.String(255), nullable=False),
+        sa.Column('params', sa.Text(), nullable=True, comment='本文生成パラメータJSON (送信後・断念時に消去)'),
+        sa.Column('priority', sa.SmallInteger(), nullable=False, server_default='1', comment='0=高 (認証系), 1=通常'),
+        sa.Column('status', sa.SmallInteger(), nullable=False, server_default='0', comment='0=未送信, 1=送信中, 2=送信済み, 3=エラー'),
+        sa.Column('attempts', sa.Integer(), nullable=False, server_default='0'),
+        sa.Column('next_attempt_at', sa.DateTime(), nullable=True, comment='エラー時の次回リトライ時刻 (UTC)'),
+        sa.Column('last_error', sa.Text(), nullable=True),
+        sa.Column('provider_message_id', sa.String(255), nullable=True, comment='Resend メッセージID'),
+        sa.Column('locked_at', sa.DateTime(), nullable=True, comment='送信開始時刻 (UTC)'),
+        sa.Column('created_at', sa.DateTime(), server_default=sa.func.now(), nullable=False),
+        sa.Column('sent_at', sa.DateTime(), nullable=True),
+        sa.PrimaryKeyConstraint('id'),
+    )
+    op.create_index('ix_mail_outbox_status_priority', 'mail_outbox', ['status', 'priority', 'id'])
+
+
+def downgrade() -> None:
+    op.drop_index('ix_mail_outbox_status_priority', table_name='mail_outbox')
+    op.drop_table('mail_outbox')
@@ -0,0 +1,26 @@
+"""add batch_key to mail_outbox
+
+Revision ID: x2y3z4a5b678
+Revises: w1x2y3z4a567
+Create Date: 2026-03-06
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'x2y3z4a5b678'
+down_revision = 'w1x2y3z4a567'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.add_column('mail_outbox', sa.Column('batch_key', sa.String(64), nullable=True, comment='一括送信のグループ兼 Idempotency-Key (リトライ時も同じ組で送る)'))
+    op.create_index('ix_mail_outbox_batch_key', 'mail_outbox', ['batch_key'])
+
+
+def downgrade() -> None:
+    op.drop_index('ix_mail_outbox_batch_key', table_name='mail_outbox')
+    op.drop_column('mail_outbox', 'batch_key')
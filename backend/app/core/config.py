@@ -24,9 +24,30 @@ class Settings(BaseSettings):
     RESEND_API_KEY: str = ""
     RESEND_FROM_EMAIL: str = "noreply@example.com"
     RESEND_WEBHOOK_SECRET: str = ""
+    RESEND_TIMEOUT: float = 10.0
+    RESEND_CONNECT_TIMEOUT: float = 5.0
+    RESEND_POOL_SIZE: int = 10  # keep-alive 接続数 (プロセスごと)
+
+    # メール送信トランスポート: "resend" | "smtp"。
+    # MAIL_FALLBACK_TRANSPORT を設定すると主側の一時的な失敗時にそちらで送る
+    MAIL_TRANSPORT: str = "resend"
+    MAIL_FALLBACK_TRANSPORT: str = ""
+
+    # SMTP (MAIL_TRANSPORT / MAIL_FALLBACK_TRANSPORT が smtp のとき)
+    SMTP_HOST: str = "localhost"
+    SMTP_PORT: int = 25
+    SMTP_USERNAME: str = ""
+    SMTP_PASSWORD: str = ""
+    SMTP_STARTTLS: bool = False
+    SMTP_TIMEOUT: float = 10.0
+    SMTP_POOL_SIZE: int = 4
+
+    # 配信の再送キューを処理するスレッド数 (Worker プロセスごと)
+    DELIVERY_RETRY_WORKERS: int = 4
 
     # OpenAI
     OPENAI_API_KEY: str = ""
+    OPENAI_BASE_URL: str = ""  # 互換エンドポイント (ローカルのフェイクBatch API等)。空なら公式API
 
     # サービス設定
     SITE_URL: str = "http://localhost:8000"
@@ -35,10 +56,26 @@ class Settings(BaseSettings):
 
     # セッション
     SESSION_TIMEOUT_MINUTES: int = 60
+    # セッション情報のプロセス内キャッシュ秒数 (0で無効)。
+    # 別プロセスでのログアウトはこの秒数だけ遅れて反映される
+    SESSION_CACHE_SECONDS: int = 2
+
+    # 同期ハンドラ / run_in_threadpool の同時実行スレッド数。
+    # DBプール (pool_size 10 + max_overflow 20) を超えてもDB待ちになるだけなので合わせる
+    API_THREADPOOL_SIZE: int = 30
+
+    # Stripe Webhook 受信箱を処理するスレッド数 (顧客ごとに直列、顧客間で並列)
+    STRIPE_INBOX_WORKERS: int = 4
 
     # スケジューラ
     SCHEDULER_TOKEN: str = ""
 
+    # システムログ保持日数 (超過分は月パーティション単位で削除)
+    SYSTEM_LOG_RETENTION_DAYS: int = 90
+
+    # ログ: 受信者ごとの INFO 行の出力割合 (1.0=全件, 0.1=1割)
+    LOG_SAMPLE_RATE: float = 1.0
+
     # 環境
     ENV: str = "development"
     DEBUG: bool = True
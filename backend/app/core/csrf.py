@@ -2,11 +2,11 @@ import secrets
 from fastapi import Request, HTTPException
 from starlette.middleware.base import BaseHTTPMiddleware
 from app.core.redis import get_redis
+from app.core.session import CSRF_PREFIX, load_session, forget_cached_session
 from app.core.logging import get_logger
 
 logger = get_logger(__name__)
 
-CSRF_PREFIX = "csrf:"
 CSRF_TTL = 3600 * 2  # 2時間
 
 # CSRF検証を免除するパス（前方一致でチェック）
@@ -42,6 +42,7 @@ async def generate_csrf_token(session_id: str) -> str:
     token = secrets.token_hex(32)
     r = await get_redis()
     await r.set(f"{CSRF_PREFIX}{session_id}", token, ex=CSRF_TTL)
+    forget_cached_session(session_id)
     return token
 
 
@@ -72,8 +73,11 @@ class CSRFMiddleware(BaseHTTPMiddleware):
             raise HTTPException(status_code=403, detail="CSRFトークンが無効です")
 
         # ヘッダーからCSRFトークン取得
+        # セッションとCSRFトークンを1往復で取得し、後段の認証 (deps) でも使い回す
         csrf_token = request.headers.get("X-CSRF-Token", "")
-        if not await validate_csrf_token(session_id, csrf_token):
+        session_data, stored = await load_session(await get_redis(), session_id)
+        request.state.session = session_data
+        if not csrf_token or not stored or not secrets.compare_digest(stored, csrf_token):
             logger.warning(f"CSRF検証失敗（トークン不一致）: path={request.url.path}")
             raise HTTPException(status_code=403, detail="CSRFトークンが無効です")
 
@@ -1,7 +1,25 @@
+import atexit
+import copy
 import logging
+import logging.handlers
+import queue
+import random
 import sys
 import json
-from datetime import datetime
+from datetime import datetime, timezone
+
+try:
+    import orjson
+except ImportError:  # orjson未導入時は標準jsonでエンコード
+    orjson = None
+
+# 受信者ごとのINFO行に付ける extra (LOG_SAMPLE_RATE で間引き対象になる)
+#   logger.info("...", extra=PER_RECIPIENT)
+PER_RECIPIENT = {"sampled": True}
+
+LOG_QUEUE_MAX = 10000
+
+_listener = None
 
 
 class JSONFormatter(logging.Formatter):
@@ -9,7 +27,7 @@ class JSONFormatter(logging.Formatter):
 
     def format(self, record):
         log_entry = {
-            "timestamp": datetime.utcnow().isoformat(),
+            "timestamp": datetime.fromtimestamp(record.created, timezone.utc).replace(tzinfo=None).isoformat(),
             "level": record.levelname,
             "logger": record.name,
             "message": record.getMessage(),
@@ -18,26 +36,115 @@ class JSONFormatter(logging.Formatter):
             log_entry["data"] = record.extra_data
         if record.exc_info and record.exc_info[0]:
             log_entry["exception"] = self.formatException(record.exc_info)
-        return json.dumps(log_entry, ensure_ascii=False)
+        elif record.exc_text:
+            log_entry["exception"] = record.exc_text
+        return _dumps(log_entry)
+
+
+def _dumps(log_entry: dict) -> str:
+    if orjson is not None:
+        return orjson.dumps(log_entry, default=str).decode("utf-8")
+    return json.dumps(log_entry, ensure_ascii=False, default=str)
+
+
+class SamplingFilter(logging.Filter):
+    """PER_RECIPIENT 付きの INFO 以下を sample_rate の割合だけ残す (WARNING以上は常に残す)"""
+
+    def __init__(self, sample_rate: float):
+        super().__init__()
+        self.sample_rate = sample_rate
+
+    def filter(self, record):
+        if record.levelno >= logging.WARNING or not getattr(record, "sampled", False):
+            return True
+        return random.random() < self.sample_rate
+
 
+class NonBlockingQueueHandler(logging.handlers.QueueHandler):
+    """
+    呼び出し元スレッドではメッセージ確定とキュー投入だけ行う。
+    キュー満杯 (stdout の詰まり) のときは待たずに破棄し、件数を次の出力で報告する。
+    """
 
-def setup_logging(debug: bool = False):
-    """ロギング設定を初期化"""
+    def __init__(self, log_queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def prepare(self, record):
+        # 既定の prepare は例外情報をメッセージに混ぜるため、exc_text として分けて渡す
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+            return
+        if self.dropped:
+            dropped, self.dropped = self.dropped, 0
+            notice = logging.LogRecord(
+                "app.core.logging", logging.WARNING, __file__, 0,
+                f"ログキュー満杯のため {dropped} 件を破棄しました", None, None,
+            )
+            try:
+                self.queue.put_nowait(notice)
+            except queue.Full:
+                self.dropped += dropped
+
+
+def setup_logging(debug: bool = False, sample_rate: float = None):
+    """
+    ロギング設定を初期化。
+    ログはキュー経由で別スレッド (QueueListener) が stdout に書き出すため、
+    イベントループや送信ループが JSON 化や stdout の書き込み待ちでブロックされない。
+    """
+    global _listener
+    if sample_rate is None:
+        from app.core.config import settings
+        sample_rate = settings.LOG_SAMPLE_RATE
     level = logging.DEBUG if debug else logging.INFO
 
+    # 再初期化時は前のリスナーを書き切ってから止める
+    shutdown_logging()
+
     handler = logging.StreamHandler(sys.stdout)
     handler.setFormatter(JSONFormatter())
 
+    log_queue = queue.Queue(maxsize=LOG_QUEUE_MAX)
+    queue_handler = NonBlockingQueueHandler(log_queue)
+    if sample_rate < 1.0:
+        queue_handler.addFilter(SamplingFilter(sample_rate))
+
     root = logging.getLogger()
     root.setLevel(level)
     root.handlers.clear()
-    root.addHandler(handler)
+    root.addHandler(queue_handler)
+
+    _listener = logging.handlers.QueueListener(log_queue, handler, respect_handler_level=True)
+    _listener.start()
 
     # SQLAlchemyの過剰ログを抑制
     logging.getLogger("sqlalchemy.engine").setLevel(logging.WARNING)
     logging.getLogger("uvicorn.access").setLevel(logging.INFO)
 
 
+def shutdown_logging():
+    """キューに残ったログを書き出してリスナーを停止"""
+    global _listener
+    if _listener is not None:
+        listener, _listener = _listener, None
+        listener.stop()
+
+
+atexit.register(shutdown_logging)
+
+
 def get_logger(name: str) -> logging.Logger:
     """名前付きロガーを取得"""
     return logging.getLogger(name)
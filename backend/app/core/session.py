@@ -6,6 +6,17 @@ import redis.asyncio as aioredis
 from app.core.config import settings
 
 SESSION_PREFIX = "session:"
+CSRF_PREFIX = "csrf:"
+# ユーザーごとのセッションID集合 (一括無効化用)
+USER_SESSIONS_PREFIX = "user_sessions:"
+# 既存セッションの索引作成が完了したことを示すフラグ (未完了の間は SCAN で無効化)
+USER_SESSIONS_BACKFILLED_KEY = "user_sessions:backfilled"
+# セッションハッシュに持つユーザー射影 (JSON) とキャッシュ時刻
+USER_PROJECTION_FIELD = "user"
+USER_PROJECTION_AT_FIELD = "user_cached_at"
+USER_PROJECTION_MAX_AGE = 300  # 秒 (無効化漏れがあってもこの時間で再取得)
+# ユーザーごとの射影の版数。無効化で増やし、読み込み前の版数での書き込みを拒否する
+USER_PROJECTION_VERSION_PREFIX = "user_projection_ver:"
 SESSION_TTL = settings.SESSION_TIMEOUT_MINUTES * 60  # 秒
 REMEMBER_ME_TTL = 30 * 24 * 60 * 60  # 30日（秒）
 
@@ -31,33 +42,195 @@ async def create_session(
         "last_accessed": str(int(time.time())),
         "remember_me": "1" if remember_me else "0",
     }
-    await r.hset(key, mapping=data)
-    await r.expire(key, ttl)
+    async with r.pipeline(transaction=False) as pipe:
+        pipe.hset(key, mapping=data)
+        pipe.expire(key, ttl)
+        _index_session(pipe, user_id, session_id)
+        await pipe.execute()
+    await _prune_user_sessions(r, user_id)
     return session_id, ttl
 
 
+def _user_sessions_key(user_id) -> str:
+    return f"{USER_SESSIONS_PREFIX}{user_id}"
+
+
+def _index_session(pipe, user_id, session_id: str) -> None:
+    """索引にセッションを追加 (索引は最長のセッション寿命まで保持)"""
+    pipe.sadd(_user_sessions_key(user_id), session_id)
+    pipe.expire(_user_sessions_key(user_id), REMEMBER_ME_TTL)
+
+
+async def _prune_user_sessions(r: aioredis.Redis, user_id) -> None:
+    """期限切れで消えたセッションを索引から除く"""
+    session_ids = list(await r.smembers(_user_sessions_key(user_id)))
+    if not session_ids:
+        return
+    async with r.pipeline(transaction=False) as pipe:
+        for session_id in session_ids:
+            pipe.exists(f"{SESSION_PREFIX}{session_id}")
+        exists = await pipe.execute()
+    expired = [sid for sid, alive in zip(session_ids, exists) if not alive]
+    if expired:
+        await r.srem(_user_sessions_key(user_id), *expired)
+
+
+# 1往復でセッション取得・TTL延長・last_accessed更新・CSRFトークン取得を行う
+# KEYS: [session, csrf]  ARGV: [通常TTL, remember_me TTL, 現在時刻]
+_TOUCH_SCRIPT = """
+local data = redis.call('HGETALL', KEYS[1])
+local csrf = redis.call('GET', KEYS[2]) or ''
+if #data == 0 then
+    return {data, csrf}
+end
+local ttl = ARGV[1]
+if redis.call('HGET', KEYS[1], 'remember_me') == '1' then
+    ttl = ARGV[2]
+end
+redis.call('HSET', KEYS[1], 'last_accessed', ARGV[3])
+redis.call('EXPIRE', KEYS[1], ttl)
+return {data, csrf}
+"""
+_touch_script = None
+
+# プロセス内キャッシュ: session_id -> (有効期限, セッション, CSRFトークン)
+# 連続リクエストでの Redis 往復と TTL 更新をまとめる。
+# 別プロセスでのログアウト等は最大 SESSION_CACHE_SECONDS 秒遅れて反映される。
+_local_cache: dict[str, tuple[float, Optional[dict], Optional[str]]] = {}
+_LOCAL_CACHE_MAX = 10000
+
+
+async def load_session(r: aioredis.Redis, session_id: str) -> tuple[Optional[dict], Optional[str]]:
+    """セッション情報とCSRFトークンを取得し、セッションTTLを更新する (Redis 1往復)"""
+    global _touch_script
+    if not session_id:
+        return None, None
+
+    cache_seconds = settings.SESSION_CACHE_SECONDS
+    now = time.monotonic()
+    if cache_seconds > 0:
+        cached = _local_cache.get(session_id)
+        if cached and cached[0] > now:
+            return cached[1], cached[2]
+
+    if _touch_script is None:
+        _touch_script = r.register_script(_TOUCH_SCRIPT)
+    raw_data, csrf = await _touch_script(
+        keys=[f"{SESSION_PREFIX}{session_id}", f"{CSRF_PREFIX}{session_id}"],
+        args=[SESSION_TTL, REMEMBER_ME_TTL, str(int(time.time()))],
+        client=r,
+    )
+    data = dict(zip(raw_data[::2], raw_data[1::2])) if raw_data else None
+    csrf = csrf or None
+
+    if cache_seconds > 0:
+        if len(_local_cache) >= _LOCAL_CACHE_MAX:
+            _evict_expired(now)
+        _local_cache[session_id] = (now + cache_seconds, data, csrf)
+    return data, csrf
+
+
 async def get_session(r: aioredis.Redis, session_id: str) -> Optional[dict]:
     """セッション情報を取得。アクセスごとにTTL更新"""
-    if not session_id:
+    data, _ = await load_session(r, session_id)
+    return data
+
+
+def forget_cached_session(session_id: str) -> None:
+    """プロセス内キャッシュから削除 (ログアウト・CSRFトークン再発行時)"""
+    _local_cache.pop(session_id, None)
+
+
+def _evict_expired(now: float) -> None:
+    for session_id in [k for k, v in _local_cache.items() if v[0] <= now]:
+        _local_cache.pop(session_id, None)
+    if len(_local_cache) >= _LOCAL_CACHE_MAX:
+        _local_cache.clear()
+
+
+# セッションが存在し、DB を読む前の版数から無効化されていない場合だけ射影を書き込む
+# (ログアウト直後にキーを復活させない / 無効化より前に読んだ古い射影で上書きしない)
+# KEYS: [session, 版数]  ARGV: [射影フィールド, 射影, 時刻フィールド, 時刻, 読み込み前の版数]
+_STORE_PROJECTION_SCRIPT = """
+if redis.call('EXISTS', KEYS[1]) == 0 then
+    return 0
+end
+if (redis.call('GET', KEYS[2]) or '0') ~= ARGV[5] then
+    return 0
+end
+redis.call('HSET', KEYS[1], ARGV[1], ARGV[2], ARGV[3], ARGV[4])
+return 1
+"""
+_store_projection_script = None
+
+
+def cached_user_projection(session_data: Optional[dict]) -> Optional[str]:
+    """セッションに保存済みで期限内のユーザー射影 (JSON) を返す"""
+    if not session_data:
         return None
-    key = f"{SESSION_PREFIX}{session_id}"
-    data = await r.hgetall(key)
-    if not data:
+    projection = session_data.get(USER_PROJECTION_FIELD)
+    cached_at = session_data.get(USER_PROJECTION_AT_FIELD)
+    if not projection or not cached_at:
         return None
-    # remember_meフラグに応じたTTL更新
-    remember_me = data.get("remember_me", b"0")
-    if isinstance(remember_me, bytes):
-        remember_me = remember_me.decode()
-    ttl = REMEMBER_ME_TTL if remember_me == "1" else SESSION_TTL
-    await r.expire(key, ttl)
-    await r.hset(key, "last_accessed", str(int(time.time())))
-    return data
+    if time.time() - int(cached_at) > USER_PROJECTION_MAX_AGE:
+        return None
+    return projection
+
+
+def _projection_version_key(user_id) -> str:
+    return f"{USER_PROJECTION_VERSION_PREFIX}{user_id}"
+
+
+async def get_projection_version(r: aioredis.Redis, user_id: int) -> str:
+    """射影の版数 (DB からユーザーを読む前に取得し、store_user_projection に渡す)"""
+    return await r.get(_projection_version_key(user_id)) or "0"
+
+
+async def store_user_projection(
+    r: aioredis.Redis, session_id: str, projection_json: str, user_id: int, version: str,
+) -> bool:
+    """ユーザー射影をセッションハッシュに保存 (読み込み後に無効化されていたら保存しない)"""
+    global _store_projection_script
+    if _store_projection_script is None:
+        _store_projection_script = r.register_script(_STORE_PROJECTION_SCRIPT)
+    stored = await _store_projection_script(
+        keys=[f"{SESSION_PREFIX}{session_id}", _projection_version_key(user_id)],
+        args=[USER_PROJECTION_FIELD, projection_json, USER_PROJECTION_AT_FIELD, str(int(time.time())), version],
+        client=r,
+    )
+    forget_cached_session(session_id)
+    return bool(stored)
+
+
+async def invalidate_user_projection(r: aioredis.Redis, user_id: int) -> None:
+    """プロフィール・ロール・有効フラグ変更時に、そのユーザーの全セッションの射影を破棄"""
+    # 先に版数を上げ、変更前に読まれた射影が後から書き込まれないようにする
+    async with r.pipeline(transaction=False) as pipe:
+        pipe.incr(_projection_version_key(user_id))
+        pipe.expire(_projection_version_key(user_id), REMEMBER_ME_TTL)
+        pipe.smembers(_user_sessions_key(user_id))
+        _, _, session_ids = await pipe.execute()
+    session_ids = list(session_ids)
+    if not session_ids:
+        return
+    async with r.pipeline(transaction=False) as pipe:
+        for session_id in session_ids:
+            forget_cached_session(session_id)
+            pipe.hdel(f"{SESSION_PREFIX}{session_id}", USER_PROJECTION_FIELD, USER_PROJECTION_AT_FIELD)
+        await pipe.execute()
 
 
 async def destroy_session(r: aioredis.Redis, session_id: str) -> None:
     """セッションを破棄"""
     if session_id:
-        await r.delete(f"{SESSION_PREFIX}{session_id}")
+        forget_cached_session(session_id)
+        key = f"{SESSION_PREFIX}{session_id}"
+        user_id = await r.hget(key, "user_id")
+        async with r.pipeline(transaction=False) as pipe:
+            pipe.delete(key)
+            if user_id:
+                pipe.srem(_user_sessions_key(user_id), session_id)
+            await pipe.execute()
 
 
 async def refresh_session_id(
@@ -70,9 +243,16 @@ async def refresh_session_id(
         return None
     new_session_id = secrets.token_hex(32)
     new_key = f"{SESSION_PREFIX}{new_session_id}"
-    await r.hset(new_key, mapping=data)
-    await r.expire(new_key, SESSION_TTL)
-    await r.delete(old_key)
+    user_id = data.get("user_id")
+    async with r.pipeline(transaction=False) as pipe:
+        pipe.hset(new_key, mapping=data)
+        pipe.expire(new_key, SESSION_TTL)
+        pipe.delete(old_key)
+        if user_id:
+            pipe.srem(_user_sessions_key(user_id), old_session_id)
+            _index_session(pipe, user_id, new_session_id)
+        await pipe.execute()
+    forget_cached_session(old_session_id)
     return new_session_id
 
 
@@ -92,6 +272,33 @@ async def invalidate_user_sessions(
     Returns:
         削除したセッション数
     """
+    if not await r.exists(USER_SESSIONS_BACKFILLED_KEY):
+        # 索引作成前から残っているセッションも確実に消すため、完了までは従来の SCAN で探す
+        return await _invalidate_user_sessions_by_scan(r, user_id, exclude_session_id)
+
+    index_key = _user_sessions_key(user_id)
+    session_ids = [
+        sid for sid in await r.smembers(index_key)
+        if not (exclude_session_id and sid == exclude_session_id)
+    ]
+    if not session_ids:
+        return 0
+
+    for session_id in session_ids:
+        forget_cached_session(session_id)
+    async with r.pipeline(transaction=False) as pipe:
+        pipe.delete(*[f"{SESSION_PREFIX}{sid}" for sid in session_ids])
+        pipe.srem(index_key, *session_ids)
+        deleted_count, _ = await pipe.execute()
+    return deleted_count
+
+
+async def _invalidate_user_sessions_by_scan(
+    r: aioredis.Redis,
+    user_id: int,
+    exclude_session_id: Optional[str] = None,
+) -> int:
+    """全セッションを走査して無効化 (索引作成完了前のフォールバック)"""
     deleted_count = 0
     user_id_str = str(user_id)
     cursor = 0
@@ -113,10 +320,43 @@ async def invalidate_user_sessions(
                 if isinstance(session_user_id, bytes):
                     session_user_id = session_user_id.decode()
                 if session_user_id == user_id_str:
+                    forget_cached_session(session_id)
                     await r.delete(key)
+                    await r.srem(_user_sessions_key(user_id), session_id)
                     deleted_count += 1
 
         if cursor == 0:
             break
 
     return deleted_count
+
+
+async def backfill_user_session_index(r: aioredis.Redis) -> int:
+    """
+    索引導入前から存在するセッションを user_sessions:<user_id> に登録する (起動時に1回)。
+    完了フラグを立てた後は invalidate_user_sessions が索引だけを使う。
+    何度実行しても結果は同じ。
+    """
+    if await r.exists(USER_SESSIONS_BACKFILLED_KEY):
+        return 0
+
+    indexed = 0
+    cursor = 0
+    while True:
+        cursor, keys = await r.scan(cursor, match=f"{SESSION_PREFIX}*", count=500)
+        if keys:
+            async with r.pipeline(transaction=False) as pipe:
+                for key in keys:
+                    pipe.hget(key, "user_id")
+                user_ids = await pipe.execute()
+            async with r.pipeline(transaction=False) as pipe:
+                for key, user_id in zip(keys, user_ids):
+                    if user_id:
+                        _index_session(pipe, user_id, key[len(SESSION_PREFIX):])
+                        indexed += 1
+                await pipe.execute()
+        if cursor == 0:
+            break
+
+    await r.set(USER_SESSIONS_BACKFILLED_KEY, "1")
+    return indexed
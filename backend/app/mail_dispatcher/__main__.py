@@ -0,0 +1,86 @@
+"""Mail Dispatcher エントリポイント: python -m app.mail_dispatcher で起動
+
+トランザクションメール送信箱 (mail_outbox) を priority → id 順に送信する専用プロセス。
+配信ワーカー (一斉配信) とは別プロセスなので、大量配信中も認証コード等は待たされない。
+"""
+import json
+import time
+import signal
+from app.core.database import SessionLocal
+from app.core.redis import get_sync_redis
+from app.core.logging import setup_logging, get_logger
+from app.mail_dispatcher.sender import dispatch_batch, BATCH_SIZE
+from app.services import system_log_sink
+from app.services.mail_outbox_service import outbox_lag, WAKE_KEY, METRICS_KEY
+
+setup_logging()
+logger = get_logger("mail_dispatcher")
+
+WAKE_TIMEOUT = 1  # 起床通知を待つ最大秒数 (通知が届かなくてもこの間隔で送信箱を見る)
+METRICS_INTERVAL = 10.0  # 滞留状況を Redis に書く間隔 (秒)
+LAG_WARN_SECONDS = 60
+
+running = True
+
+
+def signal_handler(sig, frame):
+    global running
+    logger.info("Mail Dispatcher停止シグナル受信")
+    running = False
+
+
+signal.signal(signal.SIGTERM, signal_handler)
+signal.signal(signal.SIGINT, signal_handler)
+
+
+def _drain():
+    """送信箱が空になるまで (1バッチ分取り出せた間は続けて) 送る"""
+    db = SessionLocal()
+    try:
+        while dispatch_batch(db) >= BATCH_SIZE and running:
+            pass
+    except Exception as e:
+        db.rollback()
+        logger.error(f"メール送信箱の処理エラー: {e}")
+    finally:
+        db.close()
+
+
+def _publish_metrics(r):
+    """未送信件数と最古の未送信メールの経過秒数を Redis に書く (/api/health で公開)"""
+    db = SessionLocal()
+    try:
+        lag = outbox_lag(db)
+    finally:
+        db.close()
+    lag["updated_at"] = int(time.time())
+    r.set(METRICS_KEY, json.dumps(lag), ex=int(METRICS_INTERVAL * 6))
+    if lag["lag_seconds"] >= LAG_WARN_SECONDS:
+        logger.warning(f"メール送信箱の滞留: pending={lag['pending']}, lag={lag['lag_seconds']}秒")
+
+
+def main():
+    logger.info("Mail Dispatcher起動")
+    r = get_sync_redis()
+    next_metrics = 0.0
+    while running:
+        try:
+            _drain()
+            if time.monotonic() >= next_metrics:
+                _publish_metrics(r)
+                next_metrics = time.monotonic() + METRICS_INTERVAL
+            # 積み込み時の通知で即座に起きる。溜まった通知はまとめて捨てる
+            if r.brpop(WAKE_KEY, timeout=WAKE_TIMEOUT):
+                r.delete(WAKE_KEY)
+        except Exception as e:
+            logger.error(f"Mail Dispatcherループエラー: {e}")
+            time.sleep(5)
+
+    _drain()
+    # キューに残った SystemLog を書き切る
+    system_log_sink.shutdown()
+    logger.info("Mail Dispatcher終了")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,111 @@
+"""送信箱のメールをメールトランスポートで送る
+
+1回の取り出し (最大 BATCH_SIZE 通) につき、送信元・サイト名の取得は1回だけ、
+送信は send_batch 1回 (Resend なら Batch API) にまとめる。一括送信が弾かれたら
+(1通の不正アドレスで全体が 4xx になる等) 1通ずつ送り直して失敗したものだけをリトライに回す。
+タイムアウト・5xx は Resend 側で送信済みの可能性があるため1通ずつは送らず、全体をリトライに回す。
+一括送信の組と Idempotency-Key は取り出し時に送信箱の batch_key に保存し、リトライでも
+同じ組・同じキーで送る (他の行が混ざるとキーが変わり、Resend で重複排除されないため)。
+1通ずつの送信は "outbox-<id>" をキーにする。
+送信先のサーキットブレーカーが OPEN の間は取り出さず、送信中に OPEN になった分は
+試行回数を消費せずに後回しにする。
+"""
+import json
+from sqlalchemy.orm import Session
+
+from app.core.api_keys import get_from_email, get_site_name
+from app.services.circuit_breaker import CircuitOpenError
+from app.services.mail_transport import MailTransportError, get_transport, sending_paused
+from app.services.mail_service import render_mail
+from app.services.mail_outbox_service import claim_batch, mark_sent, mark_failed, defer_mail
+from app.core.logging import get_logger, PER_RECIPIENT
+
+logger = get_logger(__name__)
+
+BATCH_SIZE = 50  # Resend Batch API の上限は100通
+
+
+def dispatch_batch(db: Session) -> int:
+    """送信箱から1バッチ取り出して送信し、取り出した件数を返す"""
+    if sending_paused():
+        return 0
+    entries = claim_batch(db, BATCH_SIZE)
+    if not entries:
+        return 0
+
+    transport = get_transport()
+    from_email = get_from_email()
+    site_name = get_site_name()
+
+    ready = []  # (entry, message)
+    for entry in entries:
+        try:
+            subject, html = render_mail(entry.kind, site_name, entry.to_email, json.loads(entry.params or "{}"))
+        except Exception as e:
+            entry.batch_key = None  # 送らなかった分はグループから外す
+            mark_failed(db, entry, f"本文生成失敗: {e}")
+            continue
+        ready.append((entry, {
+            "from": from_email,
+            "to": [entry.to_email],
+            "subject": subject,
+            "html": html,
+        }))
+
+    # claim_batch が付けた batch_key ごとに一括送信し、キーのない分 (と一括送信が拒否された分) は1通ずつ送る
+    groups: dict[str, list] = {}
+    singles = []
+    for entry, message in ready:
+        if entry.batch_key:
+            groups.setdefault(entry.batch_key, []).append((entry, message))
+        else:
+            singles.append((entry, message))
+
+    pending = list(groups.items())
+    while pending:
+        key, group = pending.pop(0)
+        try:
+            results = transport.send_batch([message for _, message in group], idempotency_key=key)
+            for (entry, _), sent in zip(group, results):
+                mark_sent(db, entry, sent.get("id"))
+                logger.info(f"トランザクションメール送信: kind={entry.kind}, to={entry.to_email}", extra=PER_RECIPIENT)
+        except CircuitOpenError as e:
+            _defer_all(db, group + [item for _, rest in pending for item in rest] + singles, e)
+            db.commit()
+            return len(entries)
+        except MailTransportError as e:
+            if e.retryable:
+                # 送信済みかどうか分からないので1通ずつは送らず、同じ組・同じキーでリトライする
+                logger.warning(f"一括送信失敗、同じ組でリトライします ({len(group)}通): {e}")
+                for entry, _ in group:
+                    mark_failed(db, entry, str(e))
+            else:
+                # 全体が拒否された (何も送られていない) ので、グループを解いて1通ずつ送る
+                logger.warning(f"一括送信が拒否されました、1通ずつ送信します ({len(group)}通): {e}")
+                for entry, _ in group:
+                    entry.batch_key = None
+                singles.extend(group)
+        except Exception as e:
+            logger.warning(f"一括送信失敗、同じ組でリトライします ({len(group)}通): {e}")
+            for entry, _ in group:
+                mark_failed(db, entry, str(e))
+
+    for i, (entry, message) in enumerate(singles):
+        try:
+            result = transport.send(message, idempotency_key=f"outbox-{entry.id}")
+            mark_sent(db, entry, result.get("id"))
+            logger.info(f"トランザクションメール送信: kind={entry.kind}, to={entry.to_email}", extra=PER_RECIPIENT)
+        except CircuitOpenError as e:
+            _defer_all(db, singles[i:], e)
+            break
+        except Exception as e:
+            mark_failed(db, entry, str(e))
+
+    db.commit()
+    return len(entries)
+
+
+def _defer_all(db: Session, ready: list, error: CircuitOpenError):
+    logger.warning(f"送信を後回しにします ({len(ready)}通): {error}")
+    for entry, _ in ready:
+        defer_mail(db, entry, error.retry_after, str(error))
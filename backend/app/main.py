@@ -1,3 +1,5 @@
+import asyncio
+import anyio.to_thread
 from contextlib import asynccontextmanager
 from fastapi import FastAPI, Request
 from fastapi.exceptions import RequestValidationError
@@ -10,15 +12,28 @@ from app.core.logging import setup_logging, get_logger
 from app.core.csrf import CSRFMiddleware
 from app.core.security_headers import SecurityHeadersMiddleware
 from app.core.rate_limit import limiter, rate_limit_exceeded_handler
+from app.core.redis import get_redis
+from app.core.session import backfill_user_session_index
+from app.services import system_log_sink
 from app.routers import health, auth, subscriptions, webhooks_stripe, webhooks_resend
 from app.routers import plans, pages, me
 from app.routers import admin_plans, admin_users, admin_promotions, settings as settings_router
 from app.routers import admin_progress, admin_logs, admin_manual_send, admin_deliveries, admin_subscriptions, admin_dashboard
-from app.routers import admin_firebase
+from app.routers import admin_firebase, admin_exports
 
 logger = get_logger(__name__)
 
 
+async def _backfill_session_index():
+    """既存セッションのユーザー別索引を作成 (初回のみ。起動は待たせない)"""
+    try:
+        indexed = await backfill_user_session_index(await get_redis())
+        if indexed:
+            logger.info(f"セッション索引作成完了: {indexed}件")
+    except Exception as e:
+        logger.error(f"セッション索引作成エラー: {e}")
+
+
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     """アプリケーションライフサイクル管理"""
@@ -30,8 +45,14 @@ async def lifespan(app: FastAPI):
     if len(settings.JWT_SECRET) < 32:
         raise RuntimeError("JWT_SECRET は32文字以上の強い値を設定してください。")
     
+    # 同期ハンドラ (def) と run_in_threadpool が使うスレッド数の上限
+    anyio.to_thread.current_default_thread_limiter().total_tokens = settings.API_THREADPOOL_SIZE
+
     logger.info("アプリケーション起動")
+    backfill_task = asyncio.create_task(_backfill_session_index())
     yield
+    backfill_task.cancel()
+    system_log_sink.shutdown()
     logger.info("アプリケーション終了")
 
 
@@ -141,6 +162,7 @@ app.include_router(admin_deliveries.router)
 app.include_router(admin_subscriptions.router)
 app.include_router(admin_dashboard.router)
 app.include_router(admin_firebase.router)
+app.include_router(admin_exports.router)
 app.include_router(plans.router)
 app.include_router(pages.router)
 app.include_router(me.router)
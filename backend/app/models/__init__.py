@@ -21,6 +21,13 @@ from app.models.user_answer_history import UserAnswerHistory
 from app.models.processed_stripe_event import ProcessedStripeEvent
 from app.models.subscription_plan_change import SubscriptionPlanChange
 from app.models.user_email_history import UserEmailHistory
+from app.models.pregenerated_content import PregeneratedContent
+from app.models.openai_batch_job import OpenAIBatchJob
+from app.models.email_body import EmailBody
+from app.models.daily_stat import DailyStat
+from app.models.stripe_event_inbox import StripeEventInbox
+from app.models.sync_checkpoint import SyncCheckpoint
+from app.models.mail_outbox import MailOutbox
 
 __all__ = [
     "User",
@@ -45,5 +52,12 @@ __all__ = [
     "ProcessedStripeEvent",
     "SubscriptionPlanChange",
     "UserEmailHistory",
+    "PregeneratedContent",
+    "OpenAIBatchJob",
+    "EmailBody",
+    "DailyStat",
+    "StripeEventInbox",
+    "SyncCheckpoint",
+    "MailOutbox",
 ]
 from app.models.invoice_record import InvoiceRecord
@@ -0,0 +1,26 @@
+"""日別配信統計ロールアップ
+
+Redis の日別カウンタ (stats:day:*) をスケジューラーが定期的に書き出したもの。
+plan_id=0 は全プラン合計。ダッシュボードは Redis にキーがない場合にここを読む。
+"""
+from sqlalchemy import Column, Integer, Date, DateTime, UniqueConstraint, func
+from app.core.database import Base
+
+
+class DailyStat(Base):
+    __tablename__ = "daily_stats"
+
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    date = Column(Date, nullable=False, comment="集計日 (JST)")
+    plan_id = Column(Integer, nullable=False, default=0, comment="プランID (0=全体)")
+    deliveries = Column(Integer, nullable=False, default=0, comment="配信数")
+    sent = Column(Integer, nullable=False, default=0, comment="送信対象数")
+    success = Column(Integer, nullable=False, default=0)
+    fail = Column(Integer, nullable=False, default=0)
+    errors = Column(Integer, nullable=False, default=0, comment="ERROR/CRITICALログ数")
+    warnings = Column(Integer, nullable=False, default=0, comment="WARNINGログ数")
+    updated_at = Column(DateTime, nullable=False, server_default=func.now(), onupdate=func.now())
+
+    __table_args__ = (
+        UniqueConstraint("date", "plan_id", name="uq_daily_stats_date_plan"),
+    )
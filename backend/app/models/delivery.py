@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, DateTime, Enum as SAEnum, ForeignKey, func
+from sqlalchemy import Column, Integer, String, Text, DateTime, Enum as SAEnum, ForeignKey, func
 from app.core.database import Base
 
 
@@ -18,10 +18,11 @@ class Delivery(Base):
         default="running",
     )
     subject = Column(String(500), nullable=True, comment="メール件名")
+    body = Column(Text, nullable=True, comment="手動一斉送信の本文 (Workerが送信時に使用)")
     total_count = Column(Integer, nullable=False, default=0, comment="総送信数")
     success_count = Column(Integer, nullable=False, default=0)
     fail_count = Column(Integer, nullable=False, default=0)
     started_at = Column(DateTime, nullable=True)
     completed_at = Column(DateTime, nullable=True)
-    created_at = Column(DateTime, nullable=False, server_default=func.now())
+    created_at = Column(DateTime, nullable=False, server_default=func.now(), index=True)
     updated_at = Column(DateTime, nullable=False, server_default=func.now(), onupdate=func.now())
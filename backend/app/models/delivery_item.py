@@ -1,9 +1,13 @@
-from sqlalchemy import Column, Integer, String, Text, DateTime, SmallInteger, ForeignKey, func
+from sqlalchemy import Column, Integer, String, Text, DateTime, SmallInteger, ForeignKey, Index, func
 from app.core.database import Base
 
 
 class DeliveryItem(Base):
     __tablename__ = "delivery_items"
+    __table_args__ = (
+        # 詳細画面のステータス絞り込み + id順ページング用
+        Index("ix_delivery_items_delivery_status", "delivery_id", "status"),
+    )
 
     id = Column(Integer, primary_key=True, autoincrement=True)
     delivery_id = Column(Integer, ForeignKey("deliveries.id", ondelete="CASCADE"), nullable=False, index=True)
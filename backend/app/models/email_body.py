@@ -0,0 +1,20 @@
+"""メール本文ストア (内容アドレス)
+
+user_email_history から参照される本文HTML。
+content_hash (本文のSHA-256) で重複排除し、zstd圧縮して保存する。
+共通コンテンツのプランでは全受信者の履歴が同じ1行を参照する。
+"""
+from sqlalchemy import Column, Integer, String, DateTime, func
+from sqlalchemy.dialects.mysql import MEDIUMBLOB
+from app.core.database import Base
+
+
+class EmailBody(Base):
+    __tablename__ = "email_bodies"
+
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    content_hash = Column(String(64), nullable=False, unique=True, comment="本文HTMLのSHA-256")
+    compression = Column(String(10), nullable=False, default="zstd", comment="zstd / none")
+    body = Column(MEDIUMBLOB, nullable=False, comment="本文HTML (UTF-8, 圧縮済み)")
+    original_size = Column(Integer, nullable=False, comment="圧縮前のバイト数")
+    created_at = Column(DateTime, nullable=False, server_default=func.now())
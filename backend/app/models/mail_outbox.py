@@ -0,0 +1,44 @@
+"""トランザクションメール送信箱
+
+認証コード・パスワードリセット・購読通知などは、リクエスト処理中に Resend を呼ばず
+ここへ1行積むだけにする。送信は mail_dispatcher がまとめて行う。
+
+priority:
+    0 = HIGH (認証コード・パスワードリセット等、利用者が画面で待っているもの)
+    1 = NORMAL (購読関連の通知・管理者アラート)
+
+status:
+    0 = PENDING (未送信)
+    1 = SENDING (送信中)
+    2 = SENT (送信済み)
+    3 = ERROR (失敗。next_attempt_at 以降にリトライ、attempts が上限に達したら放置)
+
+batch_key:
+    一括送信したときのグループ。Resend の Idempotency-Key にも使う。
+    結果が分からない失敗 (タイムアウト等) の後も同じ組・同じキーで送り直し、二重送信を防ぐ。
+"""
+from sqlalchemy import Column, Integer, SmallInteger, String, Text, DateTime, Index, func
+from app.core.database import Base
+
+
+class MailOutbox(Base):
+    __tablename__ = "mail_outbox"
+
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    kind = Column(String(50), nullable=False, comment="メール種別 (mail_service.RENDERERS のキー)")
+    to_email = Column(String(255), nullable=False)
+    params = Column(Text, nullable=True, comment="本文生成パラメータJSON (送信後・断念時に消去)")
+    priority = Column(SmallInteger, nullable=False, default=1, comment="0=高 (認証系), 1=通常")
+    status = Column(SmallInteger, nullable=False, default=0, comment="0=未送信, 1=送信中, 2=送信済み, 3=エラー")
+    attempts = Column(Integer, nullable=False, default=0)
+    next_attempt_at = Column(DateTime, nullable=True, comment="エラー時の次回リトライ時刻 (UTC)")
+    last_error = Column(Text, nullable=True)
+    provider_message_id = Column(String(255), nullable=True, comment="Resend メッセージID")
+    locked_at = Column(DateTime, nullable=True, comment="送信開始時刻 (UTC)")
+    batch_key = Column(String(64), nullable=True, index=True, comment="一括送信のグループ兼 Idempotency-Key (リトライ時も同じ組で送る)")
+    created_at = Column(DateTime, nullable=False, server_default=func.now())
+    sent_at = Column(DateTime, nullable=True)
+
+    __table_args__ = (
+        Index("ix_mail_outbox_status_priority", "status", "priority", "id"),
+    )
@@ -0,0 +1,28 @@
+"""OpenAI Batch API ジョブ
+
+Batch APIモードのプランで、定時送信のGPT生成をまとめて投入したジョブを管理する。
+1ジョブの上限件数を超える場合は同じ plan_id/date に複数ジョブが作られる。
+"""
+from sqlalchemy import Column, Integer, String, Text, Date, DateTime, ForeignKey, func
+from app.core.database import Base
+
+
+class OpenAIBatchJob(Base):
+    __tablename__ = "openai_batch_jobs"
+
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    plan_id = Column(Integer, ForeignKey("plans.id", ondelete="CASCADE"), nullable=False, index=True)
+    date = Column(Date, nullable=False, comment="配信日 (JST)")
+    progress_id = Column(Integer, ForeignKey("progress_plan.id", ondelete="SET NULL"), nullable=True)
+    batch_id = Column(String(255), nullable=True, unique=True, comment="OpenAI Batch ID")
+    input_file_id = Column(String(255), nullable=True)
+    output_file_id = Column(String(255), nullable=True)
+    status = Column(String(20), nullable=False, default="submitted", comment="submitted/completed/failed/expired/cancelled")
+    request_count = Column(Integer, nullable=False, default=0)
+    completed_count = Column(Integer, nullable=False, default=0)
+    failed_count = Column(Integer, nullable=False, default=0)
+    last_error = Column(Text, nullable=True)
+    submitted_at = Column(DateTime, nullable=True)
+    finished_at = Column(DateTime, nullable=True)
+    created_at = Column(DateTime, nullable=False, server_default=func.now())
+    updated_at = Column(DateTime, nullable=False, server_default=func.now(), onupdate=func.now())
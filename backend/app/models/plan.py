@@ -36,6 +36,11 @@ class Plan(Base):
     # バッチ送信
     batch_send_enabled = Column(Boolean, nullable=False, default=False, comment="まとめて送信")
 
+    # 事前生成
+    pregenerate_lead_minutes = Column(Integer, nullable=False, default=0, comment="GPT事前生成のリードタイム (分, 0=無効)")
+    openai_batch_enabled = Column(Boolean, nullable=False, default=False, comment="OpenAI Batch APIで生成 (当日中の配信で可)")
+    prompt_cache_layout = Column(Boolean, nullable=False, default=False, comment="プロンプトキャッシュ最適化レイアウト (外部データを共通メッセージに分離)")
+
     # 初月無料
     trial_enabled = Column(Boolean, nullable=False, default=True, comment="初月無料トライアルを有効にする")
 
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Text, DateTime, Boolean, ForeignKey, func
+from sqlalchemy import Column, Integer, String, Text, DateTime, Boolean, ForeignKey, JSON, func
 from app.core.database import Base
 
 
@@ -10,6 +10,10 @@ class PlanExternalDataSetting(Base):
     external_data_path = Column(String(500), nullable=False, comment="Firestoreパス (collection/doc または collection/doc/~)")
     firebase_credential_id = Column(Integer, ForeignKey("firebase_credentials.id", ondelete="SET NULL"), nullable=True, comment="Firebase認証情報ID")
     delete_after_process = Column(Boolean, nullable=False, default=False, comment="処理後にFirestoreデータを削除")
+    # プロンプト肥大化対策
+    token_budget = Column(Integer, nullable=True, comment="外部データのトークン予算 (NULL/0=無制限)")
+    include_fields = Column(JSON, nullable=True, comment="含めるフィールド (キー名 or ドット区切りパス)")
+    exclude_fields = Column(JSON, nullable=True, comment="除外するフィールド (キー名 or ドット区切りパス)")
     # 後方互換: 既存データ用
     firebase_key_json_enc = Column(Text, nullable=True, comment="[非推奨] Firebase Service Account JSON (暗号化)")
     created_at = Column(DateTime, nullable=False, server_default=func.now())
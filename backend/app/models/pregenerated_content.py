@@ -0,0 +1,24 @@
+"""GPT事前生成コンテンツ
+
+send_time前に生成したsubject/bodyを保持するステージングテーブル。
+prompt_hash は model + system_prompt + 解決済みプロンプトのSHA-256で、
+送信時に同じプロンプトが組み立てられた場合のみ再利用される。
+"""
+from sqlalchemy import Column, Integer, String, Text, Date, DateTime, ForeignKey, UniqueConstraint, func
+from app.core.database import Base
+
+
+class PregeneratedContent(Base):
+    __tablename__ = "pregenerated_contents"
+
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    plan_id = Column(Integer, ForeignKey("plans.id", ondelete="CASCADE"), nullable=False, index=True)
+    date = Column(Date, nullable=False, comment="配信日 (JST)")
+    prompt_hash = Column(String(64), nullable=False, comment="model+system_prompt+プロンプトのSHA-256")
+    subject = Column(String(500), nullable=False)
+    body = Column(Text, nullable=False)
+    created_at = Column(DateTime, nullable=False, server_default=func.now())
+
+    __table_args__ = (
+        UniqueConstraint("plan_id", "date", "prompt_hash", name="uq_pregen_plan_date_hash"),
+    )
@@ -11,14 +11,23 @@ class ProgressPlan(Base):
         1 = RUNNING (実行中)
         2 = COMPLETE (完了)
         3 = ERROR (エラー)
+        4 = WAITING_BATCH (OpenAI Batch API の完了待ち。完了後に0へ戻る)
+        5 = PARKED (OpenAI / Resend のサーキットブレーカー OPEN で一時停止。
+            OPEN でなくなったら Worker が同じ delivery_id・cursor で再開する)
+
+    send_type:
+        scheduled   = 定時送信
+        manual      = 手動送信
+        pregenerate = send_time前のGPT事前生成 (送信は行わない)
 
     heartbeat_at:
         Watchdog用。Workerが処理中に定期的に更新する。
         古いheartbeatはプロセス死亡と判断してリトライ対象。
 
     cursor:
-        途中再開用。最後に処理したdelivery_item_idを保存。
-        障害復旧時にここから再開可能。
+        途中再開用。最後に処理した位置 (delivery_service.ResumeCursor の JSON:
+        分割アイテムの位置・名前、user_id、フェーズ) を1件ごとに保存。
+        障害復旧時は同じ delivery でここから再開し、delivery_items と突き合わせて残りだけ送る。
     """
     __tablename__ = "progress_plan"
 
@@ -26,18 +35,18 @@ class ProgressPlan(Base):
     plan_id = Column(Integer, ForeignKey("plans.id", ondelete="CASCADE"), nullable=False, index=True)
     date = Column(Date, nullable=False, comment="配信日 (JST)")
     send_type = Column(
-        SAEnum("scheduled", "manual", name="progress_send_type"),
+        SAEnum("scheduled", "manual", "pregenerate", name="progress_send_type"),
         nullable=False,
     )
     delivery_id = Column(Integer, ForeignKey("deliveries.id", ondelete="SET NULL"), nullable=True)
-    status = Column(SmallInteger, nullable=False, default=0, comment="0=未実行, 1=実行中, 2=完了, 3=エラー")
+    status = Column(SmallInteger, nullable=False, default=0, comment="0=未実行, 1=実行中, 2=完了, 3=エラー, 4=バッチ待ち, 5=一時停止")
 
     # Watchdog用: 処理中に定期更新されるハートビート
     heartbeat_at = Column(DateTime, nullable=True)
     # リトライ管理
     retry_count = Column(Integer, nullable=False, default=0)
     max_retries = Column(Integer, nullable=False, default=3)
-    # 途中再開用: 最後に処理したアイテムID
+    # 途中再開用: 最後に処理した位置 (JSON)
     cursor = Column(String(255), nullable=True)
     # エラー情報
     last_error = Column(Text, nullable=True)
@@ -0,0 +1,39 @@
+"""Stripe Webhook 受信箱
+
+Webhook エンドポイントは署名検証後にイベントをここへ保存して即 200 を返し、
+処理は webhook_worker が非同期で行う。
+同じ顧客 (customer_key) のイベントは stripe_created → id 順に1件ずつ、
+別の顧客のイベントは並列に処理する。
+
+status:
+    0 = PENDING (未処理)
+    1 = PROCESSING (処理中)
+    2 = DONE (処理済み / 対象外イベント)
+    3 = ERROR (失敗。next_attempt_at 以降にリトライ、attempts が上限に達したら放置)
+"""
+from sqlalchemy import Column, Integer, SmallInteger, String, Text, DateTime, Index, func
+from sqlalchemy.dialects.mysql import MEDIUMTEXT
+from app.core.database import Base
+
+
+class StripeEventInbox(Base):
+    __tablename__ = "stripe_event_inbox"
+
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    event_id = Column(String(255), nullable=False, unique=True, comment="Stripe Event ID (冪等キー)")
+    event_type = Column(String(100), nullable=False)
+    customer_key = Column(String(255), nullable=False, comment="順序保証の単位 (Stripe Customer ID、なければ Event ID)")
+    stripe_created = Column(Integer, nullable=False, default=0, comment="Stripe側のイベント作成時刻 (UNIX秒)")
+    payload = Column(MEDIUMTEXT, nullable=False, comment="署名検証済みの生イベントJSON")
+    status = Column(SmallInteger, nullable=False, default=0, comment="0=未処理, 1=処理中, 2=処理済み, 3=エラー")
+    attempts = Column(Integer, nullable=False, default=0)
+    next_attempt_at = Column(DateTime, nullable=True, comment="エラー時の次回リトライ時刻 (UTC)")
+    last_error = Column(Text, nullable=True)
+    locked_at = Column(DateTime, nullable=True, comment="処理開始時刻 (UTC)")
+    received_at = Column(DateTime, nullable=False, server_default=func.now())
+    processed_at = Column(DateTime, nullable=True)
+
+    __table_args__ = (
+        Index("ix_stripe_event_inbox_status_customer", "status", "customer_key"),
+        Index("ix_stripe_event_inbox_customer_order", "customer_key", "stripe_created", "id"),
+    )
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Boolean, DateTime, Enum as SAEnum, ForeignKey, func
+from sqlalchemy import Column, Integer, String, Boolean, DateTime, Float, Enum as SAEnum, ForeignKey, func
 from app.core.database import Base
 
 
@@ -23,5 +23,11 @@ class Subscription(Base):
     promotion_code_id = Column(Integer, ForeignKey("promotion_codes.id", ondelete="SET NULL"), nullable=True, index=True, comment="適用プロモーションコード")
     scheduled_plan_id = Column(Integer, ForeignKey("plans.id", ondelete="SET NULL"), nullable=True, comment="ダウングレード予定プランID")
     scheduled_change_at = Column(DateTime, nullable=True, comment="プラン変更予定日時")
+    # Stripe 割引情報のミラー (services/subscription_mirror.py)
+    discount_coupon_id = Column(String(255), nullable=True, comment="適用中のStripeクーポンID (ミラー)")
+    discount_name = Column(String(255), nullable=True, comment="クーポン名 (ミラー)")
+    discount_percent = Column(Float, nullable=True, comment="割引率% (ミラー)")
+    discount_amount = Column(Integer, nullable=True, comment="割引額 (ミラー)")
+    stripe_synced_at = Column(DateTime, nullable=True, comment="ミラーが表すStripeの時点 (JST)")
     created_at = Column(DateTime, nullable=False, server_default=func.now())
     updated_at = Column(DateTime, nullable=False, server_default=func.now(), onupdate=func.now())
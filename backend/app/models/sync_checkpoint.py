@@ -0,0 +1,17 @@
+"""外部サービスとの差分同期チェックポイント
+
+name ごとに「どこまで照合したか」を保存する。
+    stripe_reconcile: Stripe Event API の取得済み上限時刻と、最後の全件照合時刻
+"""
+from sqlalchemy import Column, Integer, String, DateTime, func
+from app.core.database import Base
+
+
+class SyncCheckpoint(Base):
+    __tablename__ = "sync_checkpoints"
+
+    name = Column(String(100), primary_key=True)
+    last_event_id = Column(String(255), nullable=True, comment="最後に処理したイベントID")
+    last_event_created = Column(Integer, nullable=True, comment="ここまでのイベントを処理済み (UNIX秒)")
+    last_full_sweep_at = Column(DateTime, nullable=True, comment="最後の全件照合時刻 (JST)")
+    updated_at = Column(DateTime, nullable=False, server_default=func.now(), onupdate=func.now())
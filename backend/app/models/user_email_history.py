@@ -1,9 +1,10 @@
 """ユーザーメール履歴モデル
 
 マイページからユーザーが自分に送信されたメールを確認するためのテーブル。
-ユーザー×プランごとに最新1件のみ保持する。
+ユーザー×プランごとに最新1件のみ保持する (user_id, plan_id で一意)。
+本文は email_bodies を参照する (body_html は移行前の行のみ)。
 """
-from sqlalchemy import Column, Integer, String, DateTime, ForeignKey, func
+from sqlalchemy import Column, Integer, String, DateTime, ForeignKey, UniqueConstraint, func
 from sqlalchemy.dialects.mysql import MEDIUMTEXT
 from app.core.database import Base
 
@@ -16,6 +17,11 @@ class UserEmailHistory(Base):
     plan_id = Column(Integer, ForeignKey("plans.id", ondelete="CASCADE"), nullable=False, index=True)
     delivery_id = Column(Integer, ForeignKey("deliveries.id", ondelete="SET NULL"), nullable=True)
     subject = Column(String(500), nullable=False)
-    body_html = Column(MEDIUMTEXT, nullable=False)
+    body_id = Column(Integer, ForeignKey("email_bodies.id"), nullable=True, index=True, comment="本文 (email_bodies)")
+    body_html = Column(MEDIUMTEXT, nullable=True, comment="[移行前の行のみ] 本文HTML")
     sent_at = Column(DateTime, nullable=False)
     created_at = Column(DateTime, nullable=False, server_default=func.now())
+
+    __table_args__ = (
+        UniqueConstraint("user_id", "plan_id", name="uq_email_history_user_plan"),
+    )
@@ -28,24 +28,95 @@ def _jst_iso(dt: datetime) -> str:
         dt = dt.replace(tzinfo=JST)
     return dt.isoformat()
 from app.models.delivery import Delivery
+from app.models.delivery_item import DeliveryItem
 from app.models.plan import Plan
+from app.models.user import User
 from app.routers.deps import require_admin
 
 router = APIRouter(prefix="/api/admin/deliveries", tags=["admin-deliveries"])
 
 
+ITEMS_PAGE_DEFAULT = 500
+ITEMS_PAGE_MAX = 2000
+
+
+def fetch_delivery_items_page(
+    db: Session,
+    delivery_id: int,
+    status: Optional[int] = None,
+    after_id: Optional[int] = None,
+    limit: int = ITEMS_PAGE_DEFAULT,
+) -> tuple[list[dict], Optional[int]]:
+    """
+    配信アイテムをユーザー情報と結合して1クエリで取得 (id昇順のキーセットページング)
+    戻り値: (items, next_after_id)  次ページがなければ next_after_id は None
+    """
+    q = db.query(
+        DeliveryItem.id,
+        DeliveryItem.user_id,
+        DeliveryItem.member_no_snapshot,
+        DeliveryItem.status,
+        DeliveryItem.sent_at,
+        DeliveryItem.last_error_message,
+        User.id.label("joined_user_id"),
+        User.member_no,
+        User.name_last,
+        User.name_first,
+        User.email,
+    ).outerjoin(
+        User, DeliveryItem.user_id == User.id,
+    ).filter(
+        DeliveryItem.delivery_id == delivery_id,
+    )
+    if status is not None:
+        q = q.filter(DeliveryItem.status == status)
+    if after_id:
+        q = q.filter(DeliveryItem.id > after_id)
+
+    rows = q.order_by(DeliveryItem.id.asc()).limit(limit + 1).all()
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+
+    items = [
+        {
+            "id": r.id,
+            "user_id": r.user_id,
+            "member_no": r.member_no_snapshot or (r.member_no if r.joined_user_id else "-"),
+            "user_name": f"{r.name_last} {r.name_first}" if r.joined_user_id else "(退会済)",
+            "email": r.email if r.joined_user_id else "-",
+            "status": r.status,
+            "sent_at": _jst_iso(r.sent_at),
+            "error_message": r.last_error_message,
+        }
+        for r in rows
+    ]
+    return items, (rows[-1].id if has_more else None)
+
+
 @router.get("")
-async def list_deliveries(
+def list_deliveries(
     send_type: Optional[str] = None,
     target_date: Optional[date] = Query(None, alias="date"),
-    page: int = Query(1, ge=1),
-    per_page: int = Query(50, ge=1, le=100),
-    limit: Optional[int] = Query(None, ge=1, le=100),
+    after_id: Optional[int] = Query(None, ge=1, description="前ページ最後のID (これより古い配信を返す)"),
+    limit: int = Query(50, ge=1, le=100),
     db: Session = Depends(get_db),
     _=Depends(require_admin),
 ):
-    """配信履歴一覧"""
-    q = db.query(Delivery)
+    """配信履歴一覧 (新しい順のキーセットページング)"""
+    q = db.query(
+        Delivery.id,
+        Delivery.plan_id,
+        Delivery.send_type,
+        Delivery.status,
+        Delivery.subject,
+        Delivery.total_count,
+        Delivery.success_count,
+        Delivery.fail_count,
+        Delivery.started_at,
+        Delivery.completed_at,
+        Delivery.created_at,
+        Plan.name.label("plan_name"),
+    ).outerjoin(Plan, Delivery.plan_id == Plan.id)
     if send_type:
         q = q.filter(Delivery.send_type == send_type)
     if target_date:
@@ -54,19 +125,19 @@ async def list_deliveries(
             Delivery.created_at <= datetime.combine(target_date, datetime.max.time()),
         )
 
-    total = q.count()
-    if limit:
-        deliveries = q.order_by(Delivery.created_at.desc()).limit(limit).all()
-    else:
-        deliveries = q.order_by(Delivery.created_at.desc()).offset((page - 1) * per_page).limit(per_page).all()
+    # 件数は1ページ目のみ (2ページ目以降は不要な COUNT を避ける)
+    total = q.order_by(None).count() if after_id is None else None
+    if after_id:
+        q = q.filter(Delivery.id < after_id)
+    rows = q.order_by(Delivery.id.desc()).limit(limit + 1).all()
+    has_more = len(rows) > limit
+    rows = rows[:limit]
 
-    result = []
-    for d in deliveries:
-        plan = db.query(Plan).filter(Plan.id == d.plan_id).first()
-        result.append({
+    result = [
+        {
             "id": d.id,
             "plan_id": d.plan_id,
-            "plan_name": plan.name if plan else "(削除済)",
+            "plan_name": d.plan_name or "(削除済)",
             "send_type": d.send_type,
             "status": d.status,
             "subject": d.subject,
@@ -76,43 +147,40 @@ async def list_deliveries(
             "started_at": _jst_iso(d.started_at),
             "completed_at": _jst_iso(d.completed_at),
             "created_at": _to_jst_iso(d.created_at),
-        })
+        }
+        for d in rows
+    ]
 
-    return {"total": total, "deliveries": result}
+    return {
+        "total": total,
+        "deliveries": result,
+        "next_after_id": rows[-1].id if has_more else None,
+    }
 
 
 @router.get("/{delivery_id}/items")
-async def get_delivery_items(delivery_id: int, db: Session = Depends(get_db), _=Depends(require_admin)):
-    """配信アイテム一覧（手動送信の詳細表示用）"""
-    from app.models.delivery_item import DeliveryItem
-    from app.models.user import User
-
-    delivery = db.query(Delivery).filter(Delivery.id == delivery_id).first()
-    if not delivery:
+def get_delivery_items(
+    delivery_id: int,
+    status: Optional[int] = Query(None, ge=0, le=3, description="0=未実行, 1=実行中, 2=完了, 3=エラー"),
+    after_id: Optional[int] = Query(None, ge=1, description="前ページ最後のアイテムID"),
+    limit: int = Query(ITEMS_PAGE_DEFAULT, ge=1, le=ITEMS_PAGE_MAX),
+    db: Session = Depends(get_db),
+    _=Depends(require_admin),
+):
+    """配信アイテム一覧 (キーセットページング・ステータス絞り込み)"""
+    row = db.query(Delivery, Plan.name).outerjoin(
+        Plan, Delivery.plan_id == Plan.id,
+    ).filter(Delivery.id == delivery_id).first()
+    if not row:
         raise HTTPException(status_code=404, detail="配信履歴が見つかりません")
+    delivery, plan_name = row
 
-    items = db.query(DeliveryItem).filter(DeliveryItem.delivery_id == delivery_id).order_by(DeliveryItem.id).all()
-
-    result_items = []
-    for item in items:
-        user = db.query(User).filter(User.id == item.user_id).first()
-        result_items.append({
-            "id": item.id,
-            "user_id": item.user_id,
-            "member_no": item.member_no_snapshot or (user.member_no if user else "-"),
-            "user_name": f"{user.name_last} {user.name_first}" if user else "(退会済)",
-            "email": user.email if user else "-",
-            "status": item.status,
-            "sent_at": _jst_iso(item.sent_at),
-            "error_message": item.last_error_message,
-        })
-
-    plan = db.query(Plan).filter(Plan.id == delivery.plan_id).first() if delivery.plan_id else None
+    items, next_after_id = fetch_delivery_items_page(db, delivery_id, status, after_id, limit)
 
     return {
         "delivery": {
             "id": delivery.id,
-            "plan_name": plan.name if plan else "(手動送信)",
+            "plan_name": plan_name or "(手動送信)",
             "send_type": delivery.send_type,
             "status": delivery.status,
             "subject": delivery.subject,
@@ -122,12 +190,13 @@ async def get_delivery_items(delivery_id: int, db: Session = Depends(get_db), _=
             "started_at": _jst_iso(delivery.started_at),
             "completed_at": _jst_iso(delivery.completed_at),
         },
-        "items": result_items,
+        "items": items,
+        "next_after_id": next_after_id,
     }
 
 
 @router.delete("/{delivery_id}")
-async def delete_delivery(delivery_id: int, db: Session = Depends(get_db), _=Depends(require_admin)):
+def delete_delivery(delivery_id: int, db: Session = Depends(get_db), _=Depends(require_admin)):
     """配信履歴削除"""
     delivery = db.query(Delivery).filter(Delivery.id == delivery_id).first()
     if not delivery:
@@ -138,10 +207,9 @@ async def delete_delivery(delivery_id: int, db: Session = Depends(get_db), _=Dep
 
 
 @router.post("/{delivery_id}/retry-failed")
-async def retry_failed_items(delivery_id: int, db: Session = Depends(get_db), _=Depends(require_admin)):
+def retry_failed_items(delivery_id: int, db: Session = Depends(get_db), _=Depends(require_admin)):
     """失敗したユーザーにのみ再送"""
     from app.services.delivery_service import retry_failed_delivery
-    from app.models.delivery_item import DeliveryItem
 
     # 失敗件数を先に確認
     delivery = db.query(Delivery).filter(Delivery.id == delivery_id).first()
@@ -154,7 +222,7 @@ async def retry_failed_items(delivery_id: int, db: Session = Depends(get_db), _=
     ).count()
 
     if failed_count == 0:
-        return {"message": "再送対象の失敗ユーザーがいません", "retried": 0, "success": 0, "failed": 0}
+        return {"message": "再送対象の失敗ユーザーがいません", "retried": 0, "queued": 0}
 
     result = retry_failed_delivery(db, delivery_id)
     if "error" in result:
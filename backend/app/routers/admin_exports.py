@@ -0,0 +1,76 @@
+"""管理画面: CSV / JSONL エクスポート (ストリーミング)"""
+from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi.responses import StreamingResponse
+from sqlalchemy.orm import Session
+from typing import Optional
+
+from app.core.database import get_db
+from app.models.delivery import Delivery
+from app.routers.deps import require_admin
+from app.services.export_service import (
+    MEDIA_TYPES,
+    DELIVERY_ITEM_COLUMNS, USER_COLUMNS, ANSWER_COLUMNS,
+    delivery_item_rows, user_rows, answer_rows,
+    stream_export, export_filename,
+)
+
+router = APIRouter(prefix="/api/admin/exports", tags=["admin-exports"])
+
+FORMAT_PATTERN = "^(csv|jsonl)$"
+
+
+def _streaming_response(name: str, fmt: str, columns: tuple, rows) -> StreamingResponse:
+    return StreamingResponse(
+        stream_export(fmt, columns, rows),
+        media_type=MEDIA_TYPES[fmt],
+        headers={
+            "Content-Disposition": f'attachment; filename="{export_filename(name, fmt)}"',
+            # nginx でバッファリングせず逐次転送する
+            "X-Accel-Buffering": "no",
+            "Cache-Control": "no-store",
+        },
+    )
+
+
+@router.get("/deliveries/{delivery_id}/items")
+def export_delivery_items(
+    delivery_id: int,
+    format: str = Query("csv", pattern=FORMAT_PATTERN),
+    status: Optional[int] = Query(None, ge=0, le=3, description="0=未実行, 1=実行中, 2=完了, 3=エラー"),
+    db: Session = Depends(get_db),
+    _=Depends(require_admin),
+):
+    """配信アイテムのエクスポート"""
+    if not db.query(Delivery.id).filter(Delivery.id == delivery_id).first():
+        raise HTTPException(status_code=404, detail="配信履歴が見つかりません")
+    return _streaming_response(
+        f"delivery_{delivery_id}_items", format, DELIVERY_ITEM_COLUMNS,
+        delivery_item_rows(delivery_id, status),
+    )
+
+
+@router.get("/users")
+def export_users(
+    format: str = Query("csv", pattern=FORMAT_PATTERN),
+    plan_id: Optional[int] = None,
+    subscription_status: Optional[str] = None,
+    _=Depends(require_admin),
+):
+    """ユーザー × 購読のエクスポート"""
+    return _streaming_response(
+        "users", format, USER_COLUMNS,
+        user_rows(plan_id, subscription_status),
+    )
+
+
+@router.get("/answers")
+def export_answers(
+    format: str = Query("csv", pattern=FORMAT_PATTERN),
+    plan_id: Optional[int] = None,
+    _=Depends(require_admin),
+):
+    """ユーザー回答のエクスポート"""
+    return _streaming_response(
+        "answers", format, ANSWER_COLUMNS,
+        answer_rows(plan_id),
+    )
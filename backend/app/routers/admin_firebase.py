@@ -26,7 +26,7 @@ class CredentialUpdate(BaseModel):
 
 
 @router.get("")
-async def list_credentials(db: Session = Depends(get_db), _=Depends(require_admin)):
+def list_credentials(db: Session = Depends(get_db), _=Depends(require_admin)):
     """Firebase認証情報一覧"""
     credentials = db.query(FirebaseCredential).order_by(FirebaseCredential.name).all()
     return [
@@ -40,7 +40,7 @@ async def list_credentials(db: Session = Depends(get_db), _=Depends(require_admi
 
 
 @router.post("")
-async def create_credential(
+def create_credential(
     data: CredentialCreate,
     db: Session = Depends(get_db),
     _=Depends(require_admin),
@@ -72,7 +72,7 @@ async def create_credential(
 
 
 @router.put("/{credential_id}")
-async def update_credential(
+def update_credential(
     credential_id: int,
     data: CredentialUpdate,
     db: Session = Depends(get_db),
@@ -107,7 +107,7 @@ async def update_credential(
 
 
 @router.delete("/{credential_id}")
-async def delete_credential(
+def delete_credential(
     credential_id: int,
     db: Session = Depends(get_db),
     _=Depends(require_admin),
@@ -131,7 +131,7 @@ async def delete_credential(
 
 
 @router.post("/{credential_id}/test")
-async def test_credential(
+def test_credential(
     credential_id: int,
     db: Session = Depends(get_db),
     _=Depends(require_admin),
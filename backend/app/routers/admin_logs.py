@@ -1,30 +1,48 @@
 """管理画面: システムログ"""
-from fastapi import APIRouter, Depends, Query
+from fastapi import APIRouter, Depends, HTTPException, Query
+from sqlalchemy import and_, or_, func as sa_func
 from sqlalchemy.orm import Session
 from typing import Optional
-from datetime import date, datetime
+from datetime import date, datetime, timedelta
 from zoneinfo import ZoneInfo
 
 from app.core.database import get_db
 from app.models.system_log import SystemLog
 from app.routers.deps import require_admin
+from app.services.system_log_maintenance import estimated_row_count, purge_logs_before
 
 router = APIRouter(prefix="/api/admin/logs", tags=["admin-logs"])
 
 
+COUNT_CAP = 10000  # 絞り込み時の件数はこれを上限に数える
+
+
+def _encode_cursor(log: SystemLog) -> str:
+    return f"{log.created_at.isoformat()}_{log.id}"
+
+
+def _decode_cursor(cursor: str) -> tuple[datetime, int]:
+    try:
+        created_at, log_id = cursor.rsplit("_", 1)
+        return datetime.fromisoformat(created_at), int(log_id)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="cursor が不正です")
+
+
 @router.get("")
-async def list_logs(
+def list_logs(
     level: Optional[str] = None,
     event_type: Optional[str] = None,
     start_date: Optional[date] = None,
     end_date: Optional[date] = None,
-    page: int = Query(1, ge=1),
+    cursor: Optional[str] = Query(None, description="前ページの next_cursor"),
     per_page: int = Query(50, ge=1, le=200),
     db: Session = Depends(get_db),
     _=Depends(require_admin),
 ):
-    """ログ一覧"""
+    """ログ一覧 (新しい順のキーセットページング。件数は概算)"""
     q = db.query(SystemLog)
+    filtered = bool(level or event_type or start_date or end_date)
     if level:
         q = q.filter(SystemLog.level == level)
     if event_type:
@@ -34,13 +52,35 @@ async def list_logs(
     if end_date:
         q = q.filter(SystemLog.created_at <= datetime.combine(end_date, datetime.max.time()))
 
-    total = q.count()
-    logs = q.order_by(SystemLog.created_at.desc()).offset((page - 1) * per_page).limit(per_page).all()
+    # 件数は1ページ目のみ。絞り込みなしは統計情報の概算、ありは COUNT_CAP 件で打ち切り
+    total = None
+    total_approximate = False
+    if cursor is None:
+        if filtered:
+            total = db.query(sa_func.count()).select_from(
+                q.with_entities(SystemLog.id).limit(COUNT_CAP + 1).subquery()
+            ).scalar()
+            total_approximate = total > COUNT_CAP
+            total = min(total, COUNT_CAP)
+        else:
+            total = estimated_row_count(db)
+            total_approximate = True
+
+    if cursor:
+        before_at, before_id = _decode_cursor(cursor)
+        q = q.filter(or_(
+            SystemLog.created_at < before_at,
+            and_(SystemLog.created_at == before_at, SystemLog.id < before_id),
+        ))
+    logs = q.order_by(SystemLog.created_at.desc(), SystemLog.id.desc()).limit(per_page + 1).all()
+    has_more = len(logs) > per_page
+    logs = logs[:per_page]
 
     return {
         "total": total,
-        "page": page,
+        "total_approximate": total_approximate,
         "per_page": per_page,
+        "next_cursor": _encode_cursor(logs[-1]) if has_more else None,
         "logs": [
             {
                 "id": l.id,
@@ -60,13 +100,19 @@ async def list_logs(
 
 
 @router.delete("/bulk-delete")
-async def bulk_delete_logs(
+def bulk_delete_logs(
     before_date: date,
     db: Session = Depends(get_db),
     _=Depends(require_admin),
 ):
-    """指定日付以前のログを一括削除"""
-    threshold = datetime.combine(before_date, datetime.max.time())
-    count = db.query(SystemLog).filter(SystemLog.created_at <= threshold).delete()
-    db.commit()
+    """
+    指定日付以前のログを一括削除。
+    月パーティション単位で消せる分は DROP、残りは小分け DELETE
+    (時間がかかりうるため同期関数としてスレッドプールで実行する)
+    """
+    before = datetime.combine(before_date + timedelta(days=1), datetime.min.time())
+    result = purge_logs_before(db, before)
+    count = result["deleted_rows"]
+    if result["dropped_partitions"]:
+        return {"message": f"{len(result['dropped_partitions'])}ヶ月分のパーティションと{count}件のログを削除しました"}
     return {"message": f"{count}件のログを削除しました"}
@@ -1,21 +1,21 @@
 """管理画面: 手動送信 (入力内容をそのまま送信)"""
-import time as _time
-import threading
-from fastapi import APIRouter, Depends, HTTPException, BackgroundTasks
+from fastapi import APIRouter, Depends, HTTPException
 from sqlalchemy.orm import Session
 from pydantic import BaseModel
 from typing import Optional
 from datetime import datetime
 from zoneinfo import ZoneInfo
 
-from app.core.database import get_db, SessionLocal
+from app.core.database import get_db
 from app.core.config import settings
 from app.models.plan import Plan
 from app.models.user import User
 from app.models.subscription import Subscription
 from app.models.delivery import Delivery
 from app.models.delivery_item import DeliveryItem
+from app.models.progress_plan import ProgressPlan
 from app.services.resend_service import send_email
+from app.services.stats_service import sync_delivery_stats
 from app.routers.deps import require_admin
 from app.core.logging import get_logger
 
@@ -23,8 +23,6 @@ router = APIRouter(prefix="/api/admin/manual-send", tags=["admin-manual-send"])
 logger = get_logger(__name__)
 JST = ZoneInfo("Asia/Tokyo")
 
-THROTTLE_SECONDS = 5
-
 
 class ManualSendUserRequest(BaseModel):
     user_id: Optional[int] = None
@@ -40,7 +38,7 @@ class ManualSendPlanRequest(BaseModel):
 
 
 @router.post("/user")
-async def manual_send_user(
+def manual_send_user(
     req: ManualSendUserRequest,
     db: Session = Depends(get_db),
     _=Depends(require_admin),
@@ -113,6 +111,7 @@ async def manual_send_user(
 
     delivery.completed_at = datetime.now(JST)
     db.commit()
+    sync_delivery_stats(delivery)
 
     return {
         "message": "送信完了" if delivery.status == "success" else "送信失敗",
@@ -121,92 +120,13 @@ async def manual_send_user(
     }
 
 
-def _background_send_plan(delivery_id: int, user_ids: list[int], subject: str, body: str):
-    """バックグラウンドで一斉送信を実行"""
-    db = SessionLocal()
-    try:
-        delivery = db.query(Delivery).filter(Delivery.id == delivery_id).first()
-        if not delivery:
-            logger.error(f"Delivery not found: {delivery_id}")
-            return
-
-        success_count = 0
-        fail_count = 0
-
-        for user_id in user_ids:
-            user = db.query(User).filter(User.id == user_id).first()
-            if not user:
-                continue
-
-            unsubscribe_url = None
-            if user.unsubscribe_token:
-                unsubscribe_url = f"{settings.SITE_URL}/api/me/unsubscribe?token={user.unsubscribe_token}"
-
-            try:
-                result = send_email(
-                    to_email=user.email,
-                    subject=subject,
-                    body=body,
-                    unsubscribe_url=unsubscribe_url,
-                )
-                item = DeliveryItem(
-                    delivery_id=delivery.id,
-                    user_id=user.id,
-                    member_no_snapshot=user.member_no,
-                    status=2,
-                    resend_message_id=result.get("id"),
-                    sent_at=datetime.now(JST),
-                )
-                db.add(item)
-                success_count += 1
-                delivery.success_count = success_count  # 1件ごとに更新
-                logger.info(f"手動送信成功: user_id={user.id}, email={user.email}")
-            except Exception as e:
-                item = DeliveryItem(
-                    delivery_id=delivery.id,
-                    user_id=user.id,
-                    member_no_snapshot=user.member_no,
-                    status=3,
-                    last_error_message=str(e),
-                )
-                db.add(item)
-                fail_count += 1
-                delivery.fail_count = fail_count  # 1件ごとに更新
-                logger.error(f"手動送信失敗: user_id={user.id} - {e}")
-
-            db.commit()
-            _time.sleep(THROTTLE_SECONDS)
-
-        # 完了更新
-        delivery.success_count = success_count
-        delivery.fail_count = fail_count
-        delivery.completed_at = datetime.now(JST)
-        if fail_count == 0:
-            delivery.status = "success"
-        elif success_count == 0:
-            delivery.status = "failed"
-        else:
-            delivery.status = "partial_failed"
-        db.commit()
-        logger.info(f"一斉送信完了: delivery_id={delivery_id}, success={success_count}, fail={fail_count}")
-    except Exception as e:
-        logger.error(f"一斉送信エラー: delivery_id={delivery_id} - {e}")
-        delivery = db.query(Delivery).filter(Delivery.id == delivery_id).first()
-        if delivery:
-            delivery.status = "failed"
-            delivery.completed_at = datetime.now(JST)
-            db.commit()
-    finally:
-        db.close()
-
-
 @router.post("/plan")
-async def manual_send_plan(
+def manual_send_plan(
     req: ManualSendPlanRequest,
     db: Session = Depends(get_db),
     _=Depends(require_admin),
 ):
-    """全員手動送信 (プラン加入者全員) - バックグラウンド実行"""
+    """全員手動送信 (プラン加入者全員) - Worker で実行"""
     plan = db.query(Plan).filter(Plan.id == req.plan_id).first()
     if not plan:
         raise HTTPException(status_code=404, detail="プランが見つかりません")
@@ -214,8 +134,8 @@ async def manual_send_plan(
     if not req.subject.strip() or not req.body.strip():
         raise HTTPException(status_code=400, detail="件名と本文は必須です")
 
-    # 対象ユーザー取得
-    users = db.query(User).join(
+    # 対象件数 (送信対象は Worker 実行時に改めて一括取得する)
+    total_count = db.query(User.id).join(
         Subscription, Subscription.user_id == User.id
     ).filter(
         Subscription.plan_id == plan.id,
@@ -223,37 +143,36 @@ async def manual_send_plan(
         User.is_active == True,
         User.deliverable == True,
         User.email_verified == True,
-    ).all()
+    ).count()
 
-    if not users:
+    if not total_count:
         raise HTTPException(status_code=400, detail="配信対象ユーザーがいません")
 
-    user_ids = [u.id for u in users]
-
-    # Delivery レコード
+    # Delivery レコード (件名・本文を保存し、送信は Worker が行う)
     delivery = Delivery(
         plan_id=plan.id,
         send_type="manual",
         status="running",
         subject=req.subject,
-        total_count=len(users),
-        started_at=datetime.now(JST),
+        body=req.body,
+        total_count=total_count,
     )
     db.add(delivery)
-    db.commit()
-    db.refresh(delivery)
+    db.flush()
 
-    # バックグラウンドで送信開始
-    thread = threading.Thread(
-        target=_background_send_plan,
-        args=(delivery.id, user_ids, req.subject, req.body),
-        daemon=True,
-    )
-    thread.start()
+    # Worker のタスクキューに登録 (定時配信と同じ排他取得・heartbeat・途中再開の対象)
+    db.add(ProgressPlan(
+        plan_id=plan.id,
+        date=datetime.now(JST).date(),
+        send_type="manual",
+        delivery_id=delivery.id,
+        status=0,
+    ))
+    db.commit()
 
     return {
-        "message": f"送信を開始しました（{len(users)}件）",
+        "message": f"送信キューに登録しました（{total_count}件）",
         "delivery_id": delivery.id,
         "status": "running",
-        "total_count": len(users),
+        "total_count": total_count,
     }
@@ -51,6 +51,9 @@ class PlanCreate(BaseModel):
     system_prompt: Optional[str] = None
     prompt: str
     batch_send_enabled: bool = False
+    pregenerate_lead_minutes: int = Field(default=0, ge=0, le=720)
+    openai_batch_enabled: bool = False
+    prompt_cache_layout: bool = False
     trial_enabled: bool = True
     bg_color: Optional[str] = "#ffffff"
     text_color: Optional[str] = "#000000"
@@ -85,6 +88,9 @@ class ExternalDataSettingData(BaseModel):
     firebase_credential_id: Optional[int] = None  # 認証情報ID
     delete_after_process: bool = False  # 処理後に削除
     firebase_key_json: Optional[str] = None  # [後方互換] 平文JSON (保存時に暗号化)
+    token_budget: Optional[int] = Field(default=None, ge=0, le=200000)  # 外部データのトークン予算
+    include_fields: Optional[list[str]] = None  # 含めるフィールド
+    exclude_fields: Optional[list[str]] = None  # 除外するフィールド
 
 
 class TestExternalDataRequest(BaseModel):
@@ -92,6 +98,13 @@ class TestExternalDataRequest(BaseModel):
     firebase_credential_id: Optional[int] = None  # 認証情報ID
     firebase_key_json: Optional[str] = None  # 平文JSON (未保存時)
     plan_id: Optional[int] = None            # 保存済み設定使用時
+    # プロンプトサイズ表示用 (編集中の値)
+    token_budget: Optional[int] = Field(default=None, ge=0, le=200000)
+    include_fields: Optional[list[str]] = None
+    exclude_fields: Optional[list[str]] = None
+    model: Optional[str] = None
+    system_prompt: Optional[str] = None
+    prompt: Optional[str] = None
 
 
 class TestSheetsRequest(BaseModel):
@@ -100,7 +113,7 @@ class TestSheetsRequest(BaseModel):
 
 # --- ルート ---
 @router.get("")
-async def list_plans(db: Session = Depends(get_db), _=Depends(require_admin)):
+def list_plans(db: Session = Depends(get_db), _=Depends(require_admin)):
     """プラン一覧"""
     plans = db.query(Plan).order_by(Plan.sort_order.asc(), Plan.created_at.desc()).all()
     result = []
@@ -122,6 +135,9 @@ async def list_plans(db: Session = Depends(get_db), _=Depends(require_admin)):
             "send_time": p.send_time.strftime("%H:%M") if p.send_time else None,
             "model": p.model,
             "batch_send_enabled": p.batch_send_enabled,
+            "pregenerate_lead_minutes": p.pregenerate_lead_minutes,
+            "openai_batch_enabled": p.openai_batch_enabled,
+            "prompt_cache_layout": p.prompt_cache_layout,
             "trial_enabled": p.trial_enabled,
             "subscriber_count": sub_count,
             "sort_order": p.sort_order,
@@ -137,7 +153,7 @@ class ReorderPlansRequest(BaseModel):
 
 
 @router.post("/reorder")
-async def reorder_plans(req: ReorderPlansRequest, db: Session = Depends(get_db), _=Depends(require_admin)):
+def reorder_plans(req: ReorderPlansRequest, db: Session = Depends(get_db), _=Depends(require_admin)):
     """プランの並び順を更新"""
     for i, plan_id in enumerate(req.plan_ids):
         plan = db.query(Plan).filter(Plan.id == plan_id).first()
@@ -148,7 +164,7 @@ async def reorder_plans(req: ReorderPlansRequest, db: Session = Depends(get_db),
 
 
 @router.get("/{plan_id}")
-async def get_plan(plan_id: int, db: Session = Depends(get_db), _=Depends(require_admin)):
+def get_plan(plan_id: int, db: Session = Depends(get_db), _=Depends(require_admin)):
     """プラン詳細"""
     plan = db.query(Plan).filter(Plan.id == plan_id).first()
     if not plan:
@@ -182,6 +198,9 @@ async def get_plan(plan_id: int, db: Session = Depends(get_db), _=Depends(requir
         "system_prompt": plan.system_prompt,
         "prompt": plan.prompt,
         "batch_send_enabled": plan.batch_send_enabled,
+        "pregenerate_lead_minutes": plan.pregenerate_lead_minutes,
+        "openai_batch_enabled": plan.openai_batch_enabled,
+        "prompt_cache_layout": plan.prompt_cache_layout,
         "trial_enabled": plan.trial_enabled,
         "bg_color": plan.bg_color,
         "text_color": plan.text_color,
@@ -211,12 +230,15 @@ async def get_plan(plan_id: int, db: Session = Depends(get_db), _=Depends(requir
             "firebase_credential_id": external.firebase_credential_id,
             "delete_after_process": external.delete_after_process,
             "has_firebase_key": bool(external.firebase_key_json_enc),  # 後方互換
+            "token_budget": external.token_budget,
+            "include_fields": external.include_fields or [],
+            "exclude_fields": external.exclude_fields or [],
         } if external else None,
     }
 
 
 @router.post("")
-async def create_plan(data: PlanCreate, db: Session = Depends(get_db), _=Depends(require_admin)):
+def create_plan(data: PlanCreate, db: Session = Depends(get_db), _=Depends(require_admin)):
     """プラン作成"""
     from datetime import time
     try:
@@ -237,6 +259,9 @@ async def create_plan(data: PlanCreate, db: Session = Depends(get_db), _=Depends
         system_prompt=data.system_prompt,
         prompt=data.prompt,
         batch_send_enabled=data.batch_send_enabled,
+        pregenerate_lead_minutes=data.pregenerate_lead_minutes,
+        openai_batch_enabled=data.openai_batch_enabled,
+        prompt_cache_layout=data.prompt_cache_layout,
         trial_enabled=data.trial_enabled,
         bg_color=data.bg_color,
         text_color=data.text_color,
@@ -265,7 +290,7 @@ async def create_plan(data: PlanCreate, db: Session = Depends(get_db), _=Depends
 
 
 @router.put("/{plan_id}")
-async def update_plan(plan_id: int, data: PlanUpdate, db: Session = Depends(get_db), _=Depends(require_admin)):
+def update_plan(plan_id: int, data: PlanUpdate, db: Session = Depends(get_db), _=Depends(require_admin)):
     """プラン更新"""
     from datetime import time
     plan = db.query(Plan).filter(Plan.id == plan_id).first()
@@ -293,6 +318,9 @@ async def update_plan(plan_id: int, data: PlanUpdate, db: Session = Depends(get_
     plan.system_prompt = data.system_prompt
     plan.prompt = data.prompt
     plan.batch_send_enabled = data.batch_send_enabled
+    plan.pregenerate_lead_minutes = data.pregenerate_lead_minutes
+    plan.openai_batch_enabled = data.openai_batch_enabled
+    plan.prompt_cache_layout = data.prompt_cache_layout
     plan.trial_enabled = data.trial_enabled
     plan.bg_color = data.bg_color
     plan.text_color = data.text_color
@@ -338,7 +366,7 @@ async def update_plan(plan_id: int, data: PlanUpdate, db: Session = Depends(get_
 
 
 @router.delete("/{plan_id}")
-async def delete_plan(
+def delete_plan(
     plan_id: int,
     at_period_end: bool = False,
     db: Session = Depends(get_db),
@@ -396,7 +424,7 @@ async def delete_plan(
 
 # --- 質問項目 ---
 @router.put("/{plan_id}/questions")
-async def update_questions(
+def update_questions(
     plan_id: int,
     questions: list[QuestionItem],
     db: Session = Depends(get_db),
@@ -456,7 +484,7 @@ async def update_questions(
 
 # --- あらすじ設定 ---
 @router.put("/{plan_id}/summary-setting")
-async def update_summary_setting(
+def update_summary_setting(
     plan_id: int,
     data: SummarySettingData,
     db: Session = Depends(get_db),
@@ -487,7 +515,7 @@ async def update_summary_setting(
 
 
 @router.delete("/{plan_id}/summary-setting")
-async def delete_summary_setting(
+def delete_summary_setting(
     plan_id: int,
     db: Session = Depends(get_db),
     _=Depends(require_admin),
@@ -500,13 +528,14 @@ async def delete_summary_setting(
 
 # --- 動作チェック ---
 @router.post("/test-external-data")
-async def test_external_data(
+def test_external_data(
     data: TestExternalDataRequest,
     db: Session = Depends(get_db),
     _=Depends(require_admin),
 ):
     """Firebase外部データ動作チェック"""
     from app.services.firestore_external_service import load_external_data
+    from app.services.external_data_compactor import compact_external_data, count_tokens
     from app.models.firebase_credential import FirebaseCredential
 
     firebase_key_enc = None
@@ -543,18 +572,43 @@ async def test_external_data(
         data_str, split_items = load_external_data(data.external_data_path, firebase_key_enc)
         is_split = data.external_data_path.rstrip("/").endswith("~")
 
+        # 配信時と同じ圧縮を適用してプロンプトサイズを算出 (分割時は最大のアイテム)
+        def _compact(text: str) -> str:
+            return compact_external_data(
+                text,
+                token_budget=data.token_budget,
+                include_fields=data.include_fields,
+                exclude_fields=data.exclude_fields,
+                model=data.model,
+            )
+
+        samples = [item for _, item in split_items] if is_split and split_items else [data_str]
+        raw_tokens = max((count_tokens(t, data.model) for t in samples), default=0)
+        compacted = [_compact(t) for t in samples]
+        compacted_tokens = max((count_tokens(t, data.model) for t in compacted), default=0)
+        fixed_tokens = count_tokens(data.system_prompt or "", data.model) + count_tokens(
+            (data.prompt or "").replace("{external_data}", ""), data.model,
+        )
+        tokens = {
+            "external_data_raw": raw_tokens,
+            "external_data": compacted_tokens,
+            "prompt_total": fixed_tokens + compacted_tokens,
+        }
+
         if is_split and split_items:
             return {
                 "ok": True,
                 "split": True,
                 "keys": [name for name, _ in split_items],
+                "tokens": tokens,
             }
         else:
-            preview = data_str[:500] if data_str else ""
+            preview = compacted[0][:500] if compacted[0] else ""
             return {
                 "ok": True,
                 "split": False,
                 "preview": preview,
+                "tokens": tokens,
             }
     except Exception as e:
         logger.error(f"外部データテストエラー: {e}")
@@ -562,7 +616,7 @@ async def test_external_data(
 
 
 @router.post("/test-sheets")
-async def test_sheets(
+def test_sheets(
     data: TestSheetsRequest,
     _=Depends(require_admin),
 ):
@@ -573,7 +627,7 @@ async def test_sheets(
 
 # --- 外部データ設定 ---
 @router.put("/{plan_id}/external-data-setting")
-async def update_external_data_setting(
+def update_external_data_setting(
     plan_id: int,
     data: ExternalDataSettingData,
     db: Session = Depends(get_db),
@@ -592,6 +646,9 @@ async def update_external_data_setting(
     if setting:
         setting.external_data_path = data.external_data_path
         setting.delete_after_process = data.delete_after_process
+        setting.token_budget = data.token_budget or None
+        setting.include_fields = data.include_fields or None
+        setting.exclude_fields = data.exclude_fields or None
         if data.firebase_credential_id is not None:
             setting.firebase_credential_id = data.firebase_credential_id
         if firebase_enc:
@@ -603,6 +660,9 @@ async def update_external_data_setting(
             firebase_credential_id=data.firebase_credential_id,
             delete_after_process=data.delete_after_process,
             firebase_key_json_enc=firebase_enc,
+            token_budget=data.token_budget or None,
+            include_fields=data.include_fields or None,
+            exclude_fields=data.exclude_fields or None,
         )
         db.add(setting)
 
@@ -611,7 +671,7 @@ async def update_external_data_setting(
 
 
 @router.delete("/{plan_id}/external-data-setting")
-async def delete_external_data_setting(
+def delete_external_data_setting(
     plan_id: int,
     db: Session = Depends(get_db),
     _=Depends(require_admin),
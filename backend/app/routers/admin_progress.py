@@ -1,22 +1,26 @@
 """管理画面: 進捗モニタリング・リセット・緊急停止"""
 from fastapi import APIRouter, Depends, HTTPException, Query
 from sqlalchemy.orm import Session
+from typing import Optional
 from datetime import date, datetime
 from zoneinfo import ZoneInfo
 
 from app.core.database import get_db
-from app.core.redis import get_redis
+from app.core.redis import get_sync_redis
 from app.models.progress_plan import ProgressPlan
 from app.models.plan import Plan
 from app.models.delivery import Delivery
 from app.models.delivery_item import DeliveryItem
 from app.models.user import User
 from app.worker.throttle_manager import set_emergency_stop, check_emergency_stop
+from app.services.pregeneration_service import stats_key as pregen_stats_key, format_stats as format_pregen_stats
+from app.services.openai_service import usage_stats_key, format_usage_stats
+from app.services.stats_service import get_day_stats
 from app.routers.deps import require_admin
 
 router = APIRouter(prefix="/api/admin/progress", tags=["admin-progress"])
 
-STATUS_LABELS = {0: "未実行", 1: "実行中", 2: "完了", 3: "エラー"}
+STATUS_LABELS = {0: "未実行", 1: "実行中", 2: "完了", 3: "エラー", 4: "バッチ待ち", 5: "一時停止"}
 JST = ZoneInfo("Asia/Tokyo")
 UTC = ZoneInfo("UTC")
 
@@ -46,7 +50,7 @@ def _today_jst():
 
 
 @router.get("/scheduler-status")
-async def get_scheduler_status(db: Session = Depends(get_db), _=Depends(require_admin)):
+def get_scheduler_status(db: Session = Depends(get_db), _=Depends(require_admin)):
     """スケジューラー状態チェック"""
     now = datetime.now(ZoneInfo("Asia/Tokyo"))
     today = now.date()
@@ -55,8 +59,7 @@ async def get_scheduler_status(db: Session = Depends(get_db), _=Depends(require_
     schedule_type_label = {"daily": "毎日", "weekday": "曜日指定", "sheets": "シート連動"}
 
     # ハートビート確認
-    redis = await get_redis()
-    heartbeat = await redis.get("scheduler:heartbeat")
+    heartbeat = get_sync_redis().get("scheduler:heartbeat")
     scheduler_alive = False
     last_heartbeat = None
     if heartbeat:
@@ -101,7 +104,7 @@ async def get_scheduler_status(db: Session = Depends(get_db), _=Depends(require_
             target_reason = "スケジュール未設定"
 
         # 今日の進捗
-        today_pp = next((tp for tp in today_items if tp.plan_id == pl.id), None)
+        today_pp = next((tp for tp in today_items if tp.plan_id == pl.id and tp.send_type != "pregenerate"), None)
         today_status = None
         today_status_label = "未実行"
         if today_pp:
@@ -153,7 +156,7 @@ def _safe_int(v):
 
 
 @router.get("/dashboard")
-async def get_dashboard(db: Session = Depends(get_db), _=Depends(require_admin)):
+def get_dashboard(db: Session = Depends(get_db), _=Depends(require_admin)):
     """ダッシュボード統計"""
     today = _today_jst()
 
@@ -166,17 +169,8 @@ async def get_dashboard(db: Session = Depends(get_db), _=Depends(require_admin))
     completed = sum(1 for p in today_items if p.status == 2)
     errors = sum(1 for p in today_items if p.status == 3)
 
-    # 今日の配信統計
-    today_start = datetime.combine(today, datetime.min.time())
-    today_end = datetime.combine(today, datetime.max.time())
-    today_dels = db.query(Delivery).filter(
-        Delivery.created_at >= today_start,
-        Delivery.created_at <= today_end,
-    ).all()
-    today_deliveries = len(today_dels)
-    today_success = sum(d.success_count or 0 for d in today_dels)
-    today_fail = sum(d.fail_count or 0 for d in today_dels)
-    today_total_sent = sum(d.total_count or 0 for d in today_dels)
+    # 今日の配信統計 (日別カウンタ)
+    today_stats = get_day_stats(get_sync_redis(), db, today)
 
     # スケジューラー (有効プランの配信予定)
     schedule_type_label = {"daily": "毎日", "weekday": "曜日指定", "sheets": "シート連動"}
@@ -191,7 +185,7 @@ async def get_dashboard(db: Session = Depends(get_db), _=Depends(require_admin))
             except (ValueError, TypeError, IndexError):
                 wd_str = ""
         # 今日の進捗状態
-        today_pp = next((tp for tp in today_items if tp.plan_id == pl.id), None)
+        today_pp = next((tp for tp in today_items if tp.plan_id == pl.id and tp.send_type != "pregenerate"), None)
         schedules.append({
             "plan_name": pl.name,
             "schedule_type": schedule_type_label.get(pl.schedule_type, pl.schedule_type or "-"),
@@ -228,10 +222,10 @@ async def get_dashboard(db: Session = Depends(get_db), _=Depends(require_admin))
         "running": running,
         "completed": completed,
         "errors": errors,
-        "today_deliveries": today_deliveries,
-        "today_success": today_success,
-        "today_fail": today_fail,
-        "today_total_sent": today_total_sent,
+        "today_deliveries": today_stats["deliveries"],
+        "today_success": today_stats["success"],
+        "today_fail": today_stats["fail"],
+        "today_total_sent": today_stats["sent"],
         "emergency_stop": check_emergency_stop(),
         "schedules": schedules,
         "recent_errors": recent_errors,
@@ -239,7 +233,7 @@ async def get_dashboard(db: Session = Depends(get_db), _=Depends(require_admin))
 
 
 @router.get("")
-async def list_progress(
+def list_progress(
     target_date: date = Query(None),
     db: Session = Depends(get_db),
     _=Depends(require_admin),
@@ -248,16 +242,46 @@ async def list_progress(
     if not target_date:
         target_date = _today_jst()
 
-    items = db.query(ProgressPlan).filter(
+    # プラン・配信は結合して1クエリで取得 (行ごとの追加クエリをしない)
+    items = db.query(ProgressPlan, Plan, Delivery).outerjoin(
+        Plan, ProgressPlan.plan_id == Plan.id,
+    ).outerjoin(
+        Delivery, ProgressPlan.delivery_id == Delivery.id,
+    ).filter(
         ProgressPlan.date == target_date,
     ).order_by(ProgressPlan.created_at.desc()).all()
 
-    # ProgressPlan が存在するplan_idセット
-    existing_plan_ids = {p.plan_id for p in items}
+    # ProgressPlan が存在するplan_idセット (事前生成タスクは送信とは別扱い)
+    existing_plan_ids = {p.plan_id for p, _plan, _delivery in items if p.send_type != "pregenerate"}
+
+    # 事前生成のステージング統計
+    redis = get_sync_redis()
+    pregen_cache = {}
+
+    def _pregen_info(pl):
+        if not pl or not pl.pregenerate_lead_minutes:
+            return None
+        if pl.id not in pregen_cache:
+            raw = redis.hgetall(pregen_stats_key(pl.id, target_date))
+            pregen_cache[pl.id] = {
+                "lead_minutes": pl.pregenerate_lead_minutes,
+                "stats": format_pregen_stats(raw),
+            }
+        return pregen_cache[pl.id]
+
+    # GPT usage (プロンプトキャッシュ率・平均レイテンシ)
+    usage_cache = {}
+
+    def _usage_info(pl):
+        if not pl:
+            return None
+        if pl.id not in usage_cache:
+            raw = redis.hgetall(usage_stats_key(pl.id, target_date))
+            usage_cache[pl.id] = format_usage_stats(raw)
+        return usage_cache[pl.id]
 
     result = []
-    for p in items:
-        plan = db.query(Plan).filter(Plan.id == p.plan_id).first()
+    for p, plan, delivery in items:
 
         # 配信の集計情報
         total_items = 0
@@ -269,18 +293,16 @@ async def list_progress(
         delivery_status = None
         duration_seconds = None
 
-        if p.delivery_id:
-            delivery = db.query(Delivery).filter(Delivery.id == p.delivery_id).first()
-            if delivery:
-                total_items = delivery.total_count
-                success_count = delivery.success_count
-                fail_count = delivery.fail_count
-                delivery_subject = delivery.subject
-                delivery_status = delivery.status
-                delivery_started_at = _jst_iso(delivery.started_at)
-                delivery_completed_at = _jst_iso(delivery.completed_at)
-                if delivery.started_at and delivery.completed_at:
-                    duration_seconds = int((delivery.completed_at - delivery.started_at).total_seconds())
+        if delivery:
+            total_items = delivery.total_count
+            success_count = delivery.success_count
+            fail_count = delivery.fail_count
+            delivery_subject = delivery.subject
+            delivery_status = delivery.status
+            delivery_started_at = _jst_iso(delivery.started_at)
+            delivery_completed_at = _jst_iso(delivery.completed_at)
+            if delivery.started_at and delivery.completed_at:
+                duration_seconds = int((delivery.completed_at - delivery.started_at).total_seconds())
 
         # スケジュール情報
         schedule_time = plan.send_time.strftime("%H:%M") if plan and plan.send_time else None
@@ -305,6 +327,8 @@ async def list_progress(
             "duration_seconds": duration_seconds,
             "schedule_type": schedule_type_label.get(plan.schedule_type, plan.schedule_type or "-") if plan else "-",
             "schedule_time": schedule_time,
+            "pregenerate": _pregen_info(plan),
+            "gpt_usage": _usage_info(plan),
             "updated_at": _to_jst_iso(p.updated_at),
         })
 
@@ -333,6 +357,8 @@ async def list_progress(
             "duration_seconds": None,
             "schedule_type": schedule_type_label.get(pl.schedule_type, pl.schedule_type or "-"),
             "schedule_time": pl.send_time.strftime("%H:%M") if pl.send_time else None,
+            "pregenerate": _pregen_info(pl),
+            "gpt_usage": _usage_info(pl),
             "updated_at": None,
         })
 
@@ -344,62 +370,87 @@ async def list_progress(
 
 
 @router.get("/{progress_id}/detail")
-async def get_progress_detail(
+def get_progress_detail(
     progress_id: int,
+    status: Optional[int] = Query(None, ge=0, le=3, description="0=未実行, 1=実行中, 2=完了, 3=エラー"),
+    after_id: Optional[int] = Query(None, ge=1, description="前ページ最後のアイテムID"),
+    limit: int = Query(500, ge=1, le=2000),
     db: Session = Depends(get_db),
     _=Depends(require_admin),
 ):
-    """進捗詳細 (ユーザー別配信結果)"""
-    pp = db.query(ProgressPlan).filter(ProgressPlan.id == progress_id).first()
-    if not pp:
+    """進捗詳細 (ユーザー別配信結果・id昇順のキーセットページング)"""
+    row = db.query(ProgressPlan, Plan.name, Delivery).outerjoin(
+        Plan, ProgressPlan.plan_id == Plan.id,
+    ).outerjoin(
+        Delivery, ProgressPlan.delivery_id == Delivery.id,
+    ).filter(ProgressPlan.id == progress_id).first()
+    if not row:
         raise HTTPException(status_code=404, detail="進捗データが見つかりません")
-
-    plan = db.query(Plan).filter(Plan.id == pp.plan_id).first()
+    pp, plan_name, delivery = row
 
     delivery_data = None
     items_data = []
-
-    if pp.delivery_id:
-        delivery = db.query(Delivery).filter(Delivery.id == pp.delivery_id).first()
-        if delivery:
-            delivery_data = {
-                "id": delivery.id,
-                "subject": delivery.subject,
-                "total_count": delivery.total_count,
-                "success_count": delivery.success_count,
-                "fail_count": delivery.fail_count,
-                "started_at": _jst_iso(delivery.started_at),
-                "completed_at": _jst_iso(delivery.completed_at),
-                "status": delivery.status,
-            }
-
-            # DeliveryItem一覧
-            di_rows = db.query(DeliveryItem, User).join(
-                User, DeliveryItem.user_id == User.id, isouter=True
-            ).filter(
-                DeliveryItem.delivery_id == delivery.id,
-            ).order_by(DeliveryItem.id).all()
-
-            for di, user in di_rows:
-                items_data.append({
-                    "user_name": f"{user.name_last} {user.name_first}" if user else "(削除済み)",
-                    "member_no": di.member_no_snapshot,
-                    "email": user.email if user else "-",
-                    "status": di.status,
-                    "sent_at": _jst_iso(di.sent_at),
-                    "error_message": di.last_error_message,
-                })
+    next_after_id = None
+
+    if delivery:
+        delivery_data = {
+            "id": delivery.id,
+            "subject": delivery.subject,
+            "total_count": delivery.total_count,
+            "success_count": delivery.success_count,
+            "fail_count": delivery.fail_count,
+            "started_at": _jst_iso(delivery.started_at),
+            "completed_at": _jst_iso(delivery.completed_at),
+            "status": delivery.status,
+        }
+
+        # DeliveryItem一覧 (必要な列だけ取得)
+        q = db.query(
+            DeliveryItem.id,
+            DeliveryItem.member_no_snapshot,
+            DeliveryItem.status,
+            DeliveryItem.sent_at,
+            DeliveryItem.last_error_message,
+            User.id.label("joined_user_id"),
+            User.name_last,
+            User.name_first,
+            User.email,
+        ).join(
+            User, DeliveryItem.user_id == User.id, isouter=True
+        ).filter(
+            DeliveryItem.delivery_id == delivery.id,
+        )
+        if status is not None:
+            q = q.filter(DeliveryItem.status == status)
+        if after_id:
+            q = q.filter(DeliveryItem.id > after_id)
+        di_rows = q.order_by(DeliveryItem.id).limit(limit + 1).all()
+        if len(di_rows) > limit:
+            di_rows = di_rows[:limit]
+            next_after_id = di_rows[-1].id
+
+        for di in di_rows:
+            items_data.append({
+                "id": di.id,
+                "user_name": f"{di.name_last} {di.name_first}" if di.joined_user_id else "(削除済み)",
+                "member_no": di.member_no_snapshot,
+                "email": di.email if di.joined_user_id else "-",
+                "status": di.status,
+                "sent_at": _jst_iso(di.sent_at),
+                "error_message": di.last_error_message,
+            })
 
     return {
-        "plan_name": plan.name if plan else "(削除済)",
+        "plan_name": plan_name or "(削除済)",
         "status": pp.status,
         "delivery": delivery_data,
         "items": items_data,
+        "next_after_id": next_after_id,
     }
 
 
 @router.post("/{progress_id}/reset")
-async def reset_progress(progress_id: int, db: Session = Depends(get_db), _=Depends(require_admin)):
+def reset_progress(progress_id: int, db: Session = Depends(get_db), _=Depends(require_admin)):
     """進捗リセット (status→0, delivery紐付け解除, 実行中delivery停止)"""
     p = db.query(ProgressPlan).filter(ProgressPlan.id == progress_id).first()
     if p:
@@ -416,14 +467,14 @@ async def reset_progress(progress_id: int, db: Session = Depends(get_db), _=Depe
 
 
 @router.post("/emergency-stop")
-async def toggle_emergency_stop(active: bool, _=Depends(require_admin)):
+def toggle_emergency_stop(active: bool, _=Depends(require_admin)):
     """緊急停止フラグ切替"""
     set_emergency_stop(active)
     return {"message": f"緊急停止を{'有効' if active else '解除'}にしました", "active": active}
 
 
 @router.post("/{progress_id}/retry-failed")
-async def retry_failed_progress(progress_id: int, db: Session = Depends(get_db), _=Depends(require_admin)):
+def retry_failed_progress(progress_id: int, db: Session = Depends(get_db), _=Depends(require_admin)):
     """失敗したユーザーにのみ再送（進捗管理画面用）"""
     from app.services.delivery_service import retry_failed_delivery
 
@@ -441,7 +492,7 @@ async def retry_failed_progress(progress_id: int, db: Session = Depends(get_db),
     ).count()
 
     if failed_count == 0:
-        return {"message": "再送対象の失敗ユーザーがいません", "retried": 0, "success": 0, "failed": 0}
+        return {"message": "再送対象の失敗ユーザーがいません", "retried": 0, "queued": 0}
 
     result = retry_failed_delivery(db, pp.delivery_id)
     if "error" in result:
@@ -66,7 +66,7 @@ class PromotionCodeCreate(BaseModel):
 
 
 @router.get("")
-async def list_promotions(db: Session = Depends(get_db), _=Depends(require_admin)):
+def list_promotions(db: Session = Depends(get_db), _=Depends(require_admin)):
     """プロモーションコード一覧"""
     promos = db.query(PromotionCode).order_by(PromotionCode.created_at.desc()).all()
     return [
@@ -87,7 +87,7 @@ async def list_promotions(db: Session = Depends(get_db), _=Depends(require_admin
 
 
 @router.post("")
-async def create_promotion(
+def create_promotion(
     data: PromotionCodeCreate,
     db: Session = Depends(get_db),
     _=Depends(require_admin),
@@ -176,7 +176,7 @@ class PromotionCodeUpdate(BaseModel):
 
 
 @router.put("/{promo_id}")
-async def update_promotion(
+def update_promotion(
     promo_id: int,
     data: PromotionCodeUpdate,
     db: Session = Depends(get_db),
@@ -285,7 +285,7 @@ async def update_promotion(
 
 
 @router.put("/{promo_id}/deactivate")
-async def deactivate_promotion(
+def deactivate_promotion(
     promo_id: int,
     db: Session = Depends(get_db),
     _=Depends(require_admin),
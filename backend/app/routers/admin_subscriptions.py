@@ -18,7 +18,7 @@ ACTIVE_STATUSES = ("trialing", "active", "past_due", "admin_added")
 
 
 @router.get("")
-async def list_subscriptions(db: Session = Depends(get_db), _=Depends(require_admin)):
+def list_subscriptions(db: Session = Depends(get_db), _=Depends(require_admin)):
     """購読一覧 (プラン別グループ)"""
     plans = db.query(Plan).order_by(Plan.sort_order.asc()).all()
 
@@ -88,7 +88,7 @@ async def list_subscriptions(db: Session = Depends(get_db), _=Depends(require_ad
 
 
 @router.get("/{subscription_id}/detail")
-async def get_subscription_detail(
+def get_subscription_detail(
     subscription_id: int,
     db: Session = Depends(get_db),
     _=Depends(require_admin),
@@ -184,7 +184,7 @@ class AdminSaveAnswers(BaseModel):
 
 
 @router.put("/{subscription_id}/answers")
-async def save_subscription_answers(
+def save_subscription_answers(
     subscription_id: int,
     data: AdminSaveAnswers,
     db: Session = Depends(get_db),
@@ -1,16 +1,21 @@
 """管理画面: ユーザー管理"""
 from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi.concurrency import run_in_threadpool
 from sqlalchemy.orm import Session
 from typing import Optional
 from pydantic import BaseModel, EmailStr
 
 from app.core.database import get_db
 from app.core.logging import get_logger
+from app.core.redis import get_redis
+from app.core.session import invalidate_user_projection, invalidate_user_sessions
 from app.models.user import User
 from app.models.subscription import Subscription
 from app.models.plan import Plan
 from app.services import auth_service, stripe_service
 from app.services.mail_service import send_verify_code_email
+from app.services.stats_service import invalidate_subscription_snapshot
+from app.services.suppression_service import unsuppress
 from app.routers.deps import require_admin
 
 router = APIRouter(prefix="/api/admin/users", tags=["admin-users"])
@@ -34,7 +39,7 @@ class InviteAdminRequest(BaseModel):
 
 
 @router.get("")
-async def list_users(
+def list_users(
     page: int = Query(1, ge=1),
     per_page: int = Query(50, ge=1, le=100),
     search: Optional[str] = None,
@@ -106,7 +111,7 @@ async def list_users(
 
 
 @router.get("/{user_id}")
-async def get_user(user_id: int, db: Session = Depends(get_db), _=Depends(require_admin)):
+def get_user(user_id: int, db: Session = Depends(get_db), _=Depends(require_admin)):
     """ユーザー詳細"""
     user = db.query(User).filter(User.id == user_id).first()
     if not user:
@@ -151,18 +156,29 @@ async def update_role(
     if data.role not in ("user", "admin"):
         raise HTTPException(status_code=400, detail="無効なロールです")
 
+    await run_in_threadpool(_set_role, db, user_id, data.role)
+    await invalidate_user_projection(await get_redis(), user_id)
+    return {"message": f"ロールを{data.role}に変更しました"}
+
+
+def _set_role(db: Session, user_id: int, role: str):
     user = db.query(User).filter(User.id == user_id).first()
     if not user:
         raise HTTPException(status_code=404, detail="ユーザーが見つかりません")
-
-    user.role = data.role
+    user.role = role
     db.commit()
-    return {"message": f"ロールを{data.role}に変更しました"}
 
 
 @router.put("/{user_id}/toggle-active")
 async def toggle_active(user_id: int, db: Session = Depends(get_db), _=Depends(require_admin)):
     """有効/無効切替"""
+    is_active = await run_in_threadpool(_toggle_active, db, user_id)
+    await invalidate_user_projection(await get_redis(), user_id)
+    return {"message": f"ユーザーを{'有効' if is_active else '無効'}にしました", "is_active": is_active}
+
+
+def _toggle_active(db: Session, user_id: int) -> bool:
+    """有効フラグを反転し、Stripe購読のキャンセル予約/解除を行う (スレッドプールで実行)"""
     user = db.query(User).filter(User.id == user_id).first()
     if not user:
         raise HTTPException(status_code=404, detail="ユーザーが見つかりません")
@@ -203,11 +219,26 @@ async def toggle_active(user_id: int, db: Session = Depends(get_db), _=Depends(r
 
     user.is_active = not user.is_active
     db.commit()
-    return {"message": f"ユーザーを{'有効' if user.is_active else '無効'}にしました", "is_active": user.is_active}
+    invalidate_subscription_snapshot()
+    return user.is_active
+
+
+@router.put("/{user_id}/restore-deliverable")
+def restore_deliverable(user_id: int, db: Session = Depends(get_db), _=Depends(require_admin)):
+    """配信再開 (bounce/complaint・配信停止で止まったアドレスを配信対象に戻し、抑止リストからも外す)"""
+    user = db.query(User).filter(User.id == user_id).first()
+    if not user:
+        raise HTTPException(status_code=404, detail="ユーザーが見つかりません")
+
+    user.deliverable = True
+    db.commit()
+    unsuppress([user.email])
+    logger.info(f"配信再開: user_id={user_id}")
+    return {"message": "配信を再開しました", "deliverable": True}
 
 
 @router.put("/{user_id}/subscriptions")
-async def update_user_subscriptions(
+def update_user_subscriptions(
     user_id: int,
     data: UpdateUserSubscriptions,
     db: Session = Depends(get_db),
@@ -250,6 +281,7 @@ async def update_user_subscriptions(
         db.add(sub)
 
     db.commit()
+    invalidate_subscription_snapshot()
     return {"message": "購読を更新しました"}
 
 
@@ -259,6 +291,14 @@ async def delete_user(user_id: int, db: Session = Depends(get_db), admin=Depends
     if admin.id == user_id:
         raise HTTPException(status_code=400, detail="自分自身は削除できません")
 
+    await run_in_threadpool(_delete_user, db, user_id)
+    # キャッシュ済みの射影で認証が通らないようセッションごと破棄
+    await invalidate_user_sessions(await get_redis(), user_id)
+    return {"message": "ユーザーを削除しました"}
+
+
+def _delete_user(db: Session, user_id: int):
+    """購読解約・関連テーブルの user_id NULL化・物理削除 (スレッドプールで実行)"""
     user = db.query(User).filter(User.id == user_id).first()
     if not user:
         raise HTTPException(status_code=404, detail="ユーザーが見つかりません")
@@ -289,9 +329,11 @@ async def delete_user(user_id: int, db: Session = Depends(get_db), admin=Depends
     db.query(ProgressTask).filter(ProgressTask.user_id == user_id).update({"user_id": None})
 
     # 物理削除
+    email = user.email
     db.delete(user)
     db.commit()
-    return {"message": "ユーザーを削除しました"}
+    unsuppress([email])
+    invalidate_subscription_snapshot()
 
 
 @router.post("/invite-admin")
@@ -303,19 +345,20 @@ async def invite_admin(
     """管理者招待 (仮パスワードで作成 → メールで通知)"""
     from app.services.mail_service import send_admin_invite_email
     
-    existing = auth_service.get_user_by_email(db, data.email)
+    existing = await run_in_threadpool(auth_service.get_user_by_email, db, data.email)
     if existing:
         if existing.role == "admin":
             raise HTTPException(status_code=400, detail="既に管理者として登録されています")
         # 一般会員を管理者に昇格
-        existing.role = "admin"
-        db.commit()
+        await run_in_threadpool(_set_role, db, existing.id, "admin")
+        await invalidate_user_projection(await get_redis(), existing.id)
         return {"message": f"{data.email} を管理者に昇格しました"}
 
     # 仮パスワードで新規作成（メール送信で所有確認済みとして認証完了状態で作成）
     import secrets
     temp_password = secrets.token_urlsafe(16)
-    user = auth_service.create_user(
+    user = await run_in_threadpool(
+        auth_service.create_user,
         db=db,
         email=data.email,
         password=temp_password,
@@ -327,10 +370,14 @@ async def invite_admin(
     
     # 仮パスワードをメールで送信（APIレスポンスには含めない）
     name = f"{data.name_last} {data.name_first}"
-    if not send_admin_invite_email(data.email, name, temp_password):
+    if not await run_in_threadpool(send_admin_invite_email, data.email, name, temp_password):
         # メール送信失敗時はユーザーを削除してエラー
-        db.delete(user)
-        db.commit()
+        await run_in_threadpool(_discard_user, db, user)
         raise HTTPException(status_code=500, detail="招待メールの送信に失敗しました")
 
     return {"message": f"管理者を招待しました。仮パスワードをメールで送信しました: {data.email}"}
+
+
+def _discard_user(db: Session, user: User):
+    db.delete(user)
+    db.commit()
@@ -1,5 +1,6 @@
 """認証ルーター: 登録、メール認証、ログイン、ログアウト、パスワードリセット"""
 from fastapi import APIRouter, Depends, HTTPException, Response, Request
+from fastapi.concurrency import run_in_threadpool
 from fastapi.responses import JSONResponse
 from sqlalchemy.orm import Session
 
@@ -27,7 +28,7 @@ from app.schemas.auth import (
 from app.services import auth_service
 from app.services.mail_service import send_verify_code_email, send_password_reset_email, send_welcome_email
 from app.services.email_utils import normalize_email, validate_email_for_registration
-from app.routers.deps import get_current_user, require_login
+from app.routers.deps import require_identity
 
 router = APIRouter(prefix="/api/auth", tags=["auth"])
 
@@ -45,12 +46,13 @@ async def register(request: Request, req: RegisterRequest, db: Session = Depends
     normalized_email = normalize_email(req.email)
     
     # 既存ユーザーチェック（正規化後のメールで）
-    existing = auth_service.get_user_by_email(db, normalized_email)
+    existing = await run_in_threadpool(auth_service.get_user_by_email, db, normalized_email)
     if existing:
         raise HTTPException(status_code=400, detail="このメールアドレスは既に登録されています")
 
-    # ユーザー作成（正規化されたメールで保存、表示用は元のメール）
-    user = auth_service.create_user(
+    # ユーザー作成（正規化されたメールで保存、表示用は元のメール。bcryptはスレッドで実行）
+    user = await run_in_threadpool(
+        auth_service.create_user,
         db=db,
         email=normalized_email,
         password=req.password,
@@ -61,7 +63,8 @@ async def register(request: Request, req: RegisterRequest, db: Session = Depends
     # 認証コード生成・送信
     code = await auth_service.generate_verify_code(r, user.id)
     if code:
-        send_verify_code_email(
+        await run_in_threadpool(
+            send_verify_code_email,
             to_email=user.email,
             name=f"{user.name_last} {user.name_first}",
             code=code,
@@ -85,14 +88,15 @@ async def verify_email(
         raise HTTPException(status_code=400, detail=msg)
 
     # メール認証済みに更新
-    user = auth_service.get_user_by_id(db, req.user_id)
+    user = await run_in_threadpool(auth_service.get_user_by_id, db, req.user_id)
     if not user:
         raise HTTPException(status_code=404, detail="ユーザーが見つかりません")
     user.email_verified = True
-    db.commit()
+    await run_in_threadpool(db.commit)
 
     # ウェルカムメール送信
-    send_welcome_email(
+    await run_in_threadpool(
+        send_welcome_email,
         to_email=user.email,
         name=f"{user.name_last} {user.name_first}",
     )
@@ -123,7 +127,7 @@ async def resend_verify_code(
     r=Depends(get_redis),
 ):
     """認証コード再送"""
-    user = auth_service.get_user_by_id(db, user_id)
+    user = await run_in_threadpool(auth_service.get_user_by_id, db, user_id)
     if not user:
         raise HTTPException(status_code=404, detail="ユーザーが見つかりません")
 
@@ -131,7 +135,8 @@ async def resend_verify_code(
     if code is None:
         raise HTTPException(status_code=429, detail="認証がロックされています。しばらくお待ちください。")
 
-    send_verify_code_email(
+    await run_in_threadpool(
+        send_verify_code_email,
         to_email=user.email,
         name=f"{user.name_last} {user.name_first}",
         code=code,
@@ -149,8 +154,8 @@ async def login(
     r=Depends(get_redis),
 ):
     """ログイン"""
-    user = auth_service.get_user_by_email(db, req.email)
-    if not user or not auth_service.verify_password(req.password, user.password_hash):
+    user = await run_in_threadpool(auth_service.get_user_by_email, db, req.email)
+    if not user or not await run_in_threadpool(auth_service.verify_password, req.password, user.password_hash):
         raise HTTPException(status_code=401, detail="メールアドレスまたはパスワードが正しくありません")
 
     if not user.is_active:
@@ -160,7 +165,8 @@ async def login(
         # 認証コード再送
         code = await auth_service.generate_verify_code(r, user.id)
         if code:
-            send_verify_code_email(
+            await run_in_threadpool(
+                send_verify_code_email,
                 to_email=user.email,
                 name=f"{user.name_last} {user.name_first}",
                 code=code,
@@ -213,12 +219,13 @@ async def request_password_reset(
     r=Depends(get_redis),
 ):
     """パスワードリセット要求"""
-    user = auth_service.get_user_by_email(db, req.email)
+    user = await run_in_threadpool(auth_service.get_user_by_email, db, req.email)
     # ユーザーの存在有無に関わらず同じレスポンス (情報漏洩防止)
     if user and user.is_active:
         token = await auth_service.create_reset_token(r, user.id)
         reset_url = f"{settings.SITE_URL}/form/password-reset.html?token={token}"
-        send_password_reset_email(
+        await run_in_threadpool(
+            send_password_reset_email,
             to_email=user.email,
             name=f"{user.name_last} {user.name_first}",
             reset_url=reset_url,
@@ -239,17 +246,17 @@ async def confirm_password_reset(
     if user_id is None:
         raise HTTPException(status_code=400, detail="リセットトークンが無効または期限切れです")
 
-    user = auth_service.get_user_by_id(db, user_id)
+    user = await run_in_threadpool(auth_service.get_user_by_id, db, user_id)
     if not user:
         raise HTTPException(status_code=404, detail="ユーザーが見つかりません")
 
-    user.password_hash = auth_service.hash_password(req.new_password)
-    db.commit()
+    user.password_hash = await run_in_threadpool(auth_service.hash_password, req.new_password)
+    await run_in_threadpool(db.commit)
 
     return AuthResponse(message="パスワードをリセットしました")
 
 
 @router.get("/me", response_model=UserInfo)
-async def get_me(user=Depends(require_login)):
+def get_me(user=Depends(require_identity)):
     """現在のログインユーザー情報"""
     return UserInfo.model_validate(user)
@@ -1,25 +1,39 @@
 """共通依存関数: 認証・ロール制御"""
 from typing import Optional
 from fastapi import Request, HTTPException, Depends
+from fastapi.concurrency import run_in_threadpool
 from sqlalchemy.orm import Session
 
 from app.core.database import get_db
 from app.core.redis import get_redis
-from app.core.session import get_session
+from app.core.session import (
+    get_session,
+    cached_user_projection,
+    get_projection_version,
+    store_user_projection,
+)
 from app.models.user import User
+from app.schemas.auth import CurrentUser
 
 
-async def get_current_user(
+async def get_current_identity(
     request: Request,
     db: Session = Depends(get_db),
     r=Depends(get_redis),
-) -> Optional[User]:
-    """Cookie → Redis → DB でユーザー取得。未ログインならNone"""
+) -> Optional[CurrentUser]:
+    """
+    Cookie → Redis でログインユーザーの射影を取得。未ログイン・無効ユーザーならNone。
+    射影はセッションにキャッシュするため、通常はDBを参照しない。
+    """
     session_id = request.cookies.get("session_id")
     if not session_id:
         return None
 
-    session_data = await get_session(r, session_id)
+    # CSRFミドルウェアで取得済みならそれを使う (Redis往復を増やさない)
+    if hasattr(request.state, "session"):
+        session_data = request.state.session
+    else:
+        session_data = await get_session(r, session_id)
     if not session_data:
         return None
 
@@ -27,8 +41,48 @@ async def get_current_user(
     if not user_id:
         return None
 
-    user = db.query(User).filter(User.id == user_id, User.is_active == True).first()
-    return user
+    projection = cached_user_projection(session_data)
+    if projection:
+        identity = CurrentUser.model_validate_json(projection)
+    else:
+        # 読み込み中に無効化された場合に古い射影を保存しないよう、DBより先に版数を取る
+        version = await get_projection_version(r, user_id)
+        identity = await run_in_threadpool(_load_identity, db, user_id)
+        if identity is None:
+            return None
+        await store_user_projection(r, session_id, identity.model_dump_json(), user_id, version)
+
+    if identity.id != user_id or not identity.is_active:
+        return None
+    return identity
+
+
+def _load_identity(db: Session, user_id: int) -> Optional[CurrentUser]:
+    """射影のキャッシュがないときにDBから作る (スレッドプールで実行)"""
+    user = db.query(User).filter(User.id == user_id).first()
+    return CurrentUser.model_validate(user) if user is not None else None
+
+
+def get_current_user(
+    identity: Optional[CurrentUser] = Depends(get_current_identity),
+    db: Session = Depends(get_db),
+) -> Optional[User]:
+    """
+    ログインユーザーのORMオブジェクト (更新やリレーション参照が必要なルート用)。未ログインならNone
+    DBを読むため同期関数にし、FastAPI のスレッドプールで実行させる
+    """
+    if identity is None:
+        return None
+    return db.query(User).filter(User.id == identity.id, User.is_active == True).first()
+
+
+async def require_identity(
+    identity: Optional[CurrentUser] = Depends(get_current_identity),
+) -> CurrentUser:
+    """ログイン必須 (射影のみ・DB参照なし)。未ログインなら401"""
+    if identity is None:
+        raise HTTPException(status_code=401, detail="ログインが必要です")
+    return identity
 
 
 async def require_login(
@@ -41,9 +95,9 @@ async def require_login(
 
 
 async def require_admin(
-    user: User = Depends(require_login),
-) -> User:
-    """管理者権限必須。adminでなければ403"""
-    if user.role != "admin":
+    identity: CurrentUser = Depends(require_identity),
+) -> CurrentUser:
+    """管理者権限必須。adminでなければ403 (射影で判定しDBは参照しない)"""
+    if identity.role != "admin":
         raise HTTPException(status_code=403, detail="管理者権限が必要です")
-    return user
+    return identity
@@ -1,6 +1,10 @@
+import json
 from fastapi import APIRouter
+from fastapi.concurrency import run_in_threadpool
 from app.core.database import check_db_connection
-from app.core.redis import check_redis_connection
+from app.core.redis import check_redis_connection, get_redis
+from app.services.mail_outbox_service import METRICS_KEY as MAIL_OUTBOX_METRICS_KEY
+from app.services.circuit_breaker import breaker_states
 
 router = APIRouter()
 
@@ -9,7 +13,7 @@ router = APIRouter()
 @router.get("/api/health")
 async def health_check():
     """ヘルスチェックエンドポイント"""
-    db_ok = check_db_connection()
+    db_ok = await run_in_threadpool(check_db_connection)
     redis_ok = await check_redis_connection()
 
     status = "ok" if (db_ok and redis_ok) else "degraded"
@@ -18,4 +22,16 @@ async def health_check():
         "status": status,
         "db": "connected" if db_ok else "disconnected",
         "redis": "connected" if redis_ok else "disconnected",
+        "mail_outbox": await _mail_outbox_metrics() if redis_ok else None,
+        "circuits": await run_in_threadpool(breaker_states) if redis_ok else None,
     }
+
+
+async def _mail_outbox_metrics():
+    """mail_dispatcher が書いた滞留状況 (pending, lag_seconds, updated_at)。未計測なら None"""
+    try:
+        r = await get_redis()
+        raw = await r.get(MAIL_OUTBOX_METRICS_KEY)
+        return json.loads(raw) if raw else None
+    except Exception:
+        return None
@@ -1,5 +1,6 @@
 """マイページAPI"""
 from fastapi import APIRouter, Depends, HTTPException, Query, Request
+from fastapi.concurrency import run_in_threadpool
 from sqlalchemy.orm import Session
 from pydantic import BaseModel, EmailStr
 from typing import Optional
@@ -8,7 +9,7 @@ from zoneinfo import ZoneInfo
 from app.core.database import get_db
 from app.core.redis import get_redis
 from app.core.rate_limit import limiter, VERIFY_CODE_RATE_LIMIT
-from app.core.session import invalidate_user_sessions
+from app.core.session import invalidate_user_sessions, invalidate_user_projection
 from app.models.user import User
 from app.models.subscription import Subscription
 from app.models.plan import Plan
@@ -19,12 +20,14 @@ from app.models.user_answer_history import UserAnswerHistory
 from app.models.plan_question import PlanQuestion
 from app.services import auth_service, stripe_service
 from app.services.mail_service import send_password_change_code_email
+from app.services.suppression_service import unsuppress
 from app.schemas.auth import (
     PasswordChangeRequestSchema,
     PasswordChangeConfirmSchema,
     PasswordChangeResponse,
+    CurrentUser,
 )
-from app.routers.deps import require_login
+from app.routers.deps import require_login, require_identity
 
 router = APIRouter(prefix="/api/me", tags=["me"])
 
@@ -42,14 +45,18 @@ class ChangePasswordRequest(BaseModel):
 
 
 @router.get("/profile")
-async def get_profile(user: User = Depends(require_login)):
-    """プロフィール取得"""
+def get_profile(
+    user: CurrentUser = Depends(require_identity),
+    db: Session = Depends(get_db),
+):
+    """プロフィール取得 (配信可否だけは射影にないため列を1つ読む)"""
+    deliverable = db.query(User.deliverable).filter(User.id == user.id).scalar()
     return {
         "member_no": user.member_no,
         "email": user.email,
         "name_last": user.name_last,
         "name_first": user.name_first,
-        "deliverable": user.deliverable,
+        "deliverable": bool(deliverable),
     }
 
 
@@ -75,13 +82,14 @@ async def update_profile(
                 status_code=400,
                 detail="メールアドレスの変更には現在のパスワードが必要です",
             )
-        if not auth_service.verify_password(data.current_password, user.password_hash):
+        if not await run_in_threadpool(auth_service.verify_password, data.current_password, user.password_hash):
             raise HTTPException(status_code=400, detail="パスワードが正しくありません")
-        existing = auth_service.get_user_by_email(db, data.email)
+        existing = await run_in_threadpool(auth_service.get_user_by_email, db, data.email)
         if existing:
             raise HTTPException(status_code=400, detail="このメールアドレスは既に使用されています")
         user.email = data.email
-    db.commit()
+    await run_in_threadpool(db.commit)
+    await invalidate_user_projection(await get_redis(), user.id)
     return {"message": "プロフィールを更新しました"}
 
 
@@ -95,7 +103,7 @@ async def request_password_change(
 ):
     """パスワード変更リクエスト（2FA: 認証コード送信）"""
     # 現在のパスワードを検証
-    if not auth_service.verify_password(data.current_password, user.password_hash):
+    if not await run_in_threadpool(auth_service.verify_password, data.current_password, user.password_hash):
         raise HTTPException(status_code=400, detail="現在のパスワードが正しくありません")
 
     # 認証コード生成
@@ -104,7 +112,8 @@ async def request_password_change(
         raise HTTPException(status_code=429, detail="認証がロックされています。しばらくお待ちください。")
 
     # 認証コードをメール送信
-    success = send_password_change_code_email(
+    success = await run_in_threadpool(
+        send_password_change_code_email,
         to_email=user.email,
         name=f"{user.name_last} {user.name_first}",
         code=code,
@@ -149,8 +158,8 @@ async def confirm_password_change(
     await auth_service.consume_password_change_token(r, data.token)
 
     # パスワード更新
-    user.password_hash = auth_service.hash_password(data.new_password)
-    db.commit()
+    user.password_hash = await run_in_threadpool(auth_service.hash_password, data.new_password)
+    await run_in_threadpool(db.commit)
 
     # セキュリティ: 他のセッションを無効化（現在のセッションは維持）
     current_session_id = request.cookies.get("session_id")
@@ -160,10 +169,10 @@ async def confirm_password_change(
 
 
 @router.get("/delivery-history")
-async def delivery_history(
+def delivery_history(
     page: int = Query(1, ge=1),
     per_page: int = Query(20, ge=1, le=50),
-    user: User = Depends(require_login),
+    user: CurrentUser = Depends(require_identity),
     db: Session = Depends(get_db),
 ):
     """配信履歴 (件名のみ)"""
@@ -192,13 +201,14 @@ async def delivery_history(
 
 
 @router.get("/email-content/{delivery_id}")
-async def get_email_content(
+def get_email_content(
     delivery_id: int,
-    user: User = Depends(require_login),
+    user: CurrentUser = Depends(require_identity),
     db: Session = Depends(get_db),
 ):
     """配信メールの本文を取得"""
     from app.models.user_email_history import UserEmailHistory
+    from app.services.email_history_service import load_body_html
     
     history = db.query(UserEmailHistory).filter(
         UserEmailHistory.delivery_id == delivery_id,
@@ -210,15 +220,15 @@ async def get_email_content(
     
     return {
         "subject": history.subject,
-        "body_html": history.body_html,
+        "body_html": load_body_html(db, history),
         "sent_at": history.sent_at.isoformat() if history.sent_at else None,
     }
 
 
 @router.get("/answers/{plan_id}")
-async def get_answers(
+def get_answers(
     plan_id: int,
-    user: User = Depends(require_login),
+    user: CurrentUser = Depends(require_identity),
     db: Session = Depends(get_db),
 ):
     """質問回答取得 (他プランからの var_name 一致引き継ぎ付き)"""
@@ -268,7 +278,7 @@ async def get_answers(
 
 
 @router.post("/answers/{plan_id}")
-async def save_answers(
+def save_answers(
     plan_id: int,
     answers: list[dict],
     user: User = Depends(require_login),
@@ -339,9 +349,9 @@ async def save_answers(
 
 
 @router.get("/answer-history")
-async def get_answer_history(
+def get_answer_history(
     plan_id: int = Query(...),
-    user: User = Depends(require_login),
+    user: CurrentUser = Depends(require_identity),
     db: Session = Depends(get_db),
 ):
     """回答変更履歴一覧 (古い順、上限200)"""
@@ -383,7 +393,7 @@ async def get_answer_history(
 
 
 @router.delete("/account")
-async def delete_account(
+def delete_account(
     user: User = Depends(require_login),
     db: Session = Depends(get_db),
 ):
@@ -415,13 +425,15 @@ async def delete_account(
     db.query(SystemLog).filter(SystemLog.user_id == user.id).update({"user_id": None})
     db.query(ProgressTask).filter(ProgressTask.user_id == user.id).update({"user_id": None})
 
+    email = user.email
     db.delete(user)
     db.commit()
+    unsuppress([email])
     return {"message": "退会処理が完了しました"}
 
 
 @router.post("/unsubscribe")
-async def unsubscribe_delivery(
+def unsubscribe_delivery(
     token: str,
     db: Session = Depends(get_db),
 ):
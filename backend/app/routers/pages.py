@@ -8,7 +8,7 @@ from app.models.service_setting import ServiceSetting
 router = APIRouter(prefix="/api/pages", tags=["pages"])
 
 @router.get("")
-async def get_site_info(db: Session = Depends(get_db)):
+def get_site_info(db: Session = Depends(get_db)):
     """サイト基本情報 (認証不要)"""
     setting = db.query(ServiceSetting).first()
     return {
@@ -34,7 +34,7 @@ PAGE_TITLES = {
 
 
 @router.get("/{page_type}")
-async def get_page(page_type: str, db: Session = Depends(get_db)):
+def get_page(page_type: str, db: Session = Depends(get_db)):
     """静的ページ内容取得"""
     field = PAGE_FIELDS.get(page_type)
     if not field:
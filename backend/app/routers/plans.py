@@ -10,7 +10,7 @@ router = APIRouter(prefix="/api/plans", tags=["plans"])
 
 
 @router.get("")
-async def list_public_plans(db: Session = Depends(get_db)):
+def list_public_plans(db: Session = Depends(get_db)):
     """公開プラン一覧 (アクティブのみ)"""
     plans = db.query(Plan).filter(Plan.is_active == True).order_by(Plan.sort_order.asc(), Plan.created_at.desc()).all()
     return [
@@ -27,7 +27,7 @@ async def list_public_plans(db: Session = Depends(get_db)):
 
 
 @router.get("/{plan_id}")
-async def get_plan_detail(plan_id: int, db: Session = Depends(get_db)):
+def get_plan_detail(plan_id: int, db: Session = Depends(get_db)):
     """プラン詳細 (質問項目含む)"""
     plan = db.query(Plan).filter(Plan.id == plan_id, Plan.is_active == True).first()
     if not plan:
@@ -40,7 +40,7 @@ def _mask(value: str) -> str:
 
 
 @router.get("")
-async def get_settings(db: Session = Depends(get_db), _=Depends(require_admin)):
+def get_settings(db: Session = Depends(get_db), _=Depends(require_admin)):
     """設定取得"""
     setting = db.query(ServiceSetting).first()
     if not setting:
@@ -109,7 +109,7 @@ async def get_settings(db: Session = Depends(get_db), _=Depends(require_admin)):
 
 
 @router.put("")
-async def update_settings(data: SettingsUpdate, db: Session = Depends(get_db), _=Depends(require_admin)):
+def update_settings(data: SettingsUpdate, db: Session = Depends(get_db), _=Depends(require_admin)):
     """設定更新"""
     setting = db.query(ServiceSetting).first()
     if not setting:
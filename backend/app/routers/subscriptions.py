@@ -1,7 +1,7 @@
 """購読ルーター: Subscribe, Billing Portal, Checkout Complete"""
 import urllib.parse
 from datetime import datetime, timezone
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Query
 from pydantic import BaseModel
 from sqlalchemy.orm import Session
 from sqlalchemy.exc import IntegrityError
@@ -16,8 +16,9 @@ from app.schemas.subscription import (
     SubscribeRequest, BillingPortalRequest, SubscriptionInfo, CheckoutCompleteRequest,
     SchedulePlanChangeRequest, ChangePlanRequest, ChangePlanResponse,
 )
-from app.services import stripe_service, subscription_service
-from app.routers.deps import require_login
+from app.services import stripe_service, subscription_service, subscription_mirror
+from app.schemas.auth import CurrentUser
+from app.routers.deps import require_login, require_identity
 from app.core.logging import get_logger
 
 router = APIRouter(prefix="/api", tags=["subscriptions"])
@@ -36,7 +37,7 @@ def _validate_redirect_url(url: str) -> str:
 
 
 @router.post("/subscribe")
-async def subscribe(
+def subscribe(
     req: SubscribeRequest,
     user: User = Depends(require_login),
     db: Session = Depends(get_db),
@@ -130,7 +131,7 @@ async def subscribe(
 
 
 @router.post("/checkout-complete")
-async def checkout_complete(
+def checkout_complete(
     req: CheckoutCompleteRequest,
     user: User = Depends(require_login),
     db: Session = Depends(get_db),
@@ -231,7 +232,7 @@ async def checkout_complete(
 
 
 @router.post("/billing-portal")
-async def billing_portal(
+def billing_portal(
     req: BillingPortalRequest,
     user: User = Depends(require_login),
     db: Session = Depends(get_db),
@@ -267,11 +268,12 @@ async def billing_portal(
 
 
 @router.get("/my-subscriptions", response_model=list[SubscriptionInfo])
-async def my_subscriptions(
-    user: User = Depends(require_login),
+def my_subscriptions(
+    refresh: bool = Query(False, description="割引情報等をStripeから再取得する"),
+    user: CurrentUser = Depends(require_identity),
     db: Session = Depends(get_db),
 ):
-    """自分の購読一覧"""
+    """自分の購読一覧 (割引情報は subscriptions のミラーから。Stripe は refresh 時と未同期の購読のみ)"""
     subs = subscription_service.get_active_subscriptions(db, user.id)
     result = []
     for sub in subs:
@@ -284,27 +286,14 @@ async def my_subscriptions(
             scheduled_plan = db.query(Plan).filter(Plan.id == sub.scheduled_plan_id).first()
             scheduled_plan_name = scheduled_plan.name if scheduled_plan else None
 
-        # Stripeから割引情報を取得
-        discount_name = None
-        discount_percent = None
-        discount_amount = None
-        actual_price = plan_price
-
-        if sub.stripe_subscription_id:
+        # 明示的な更新、または一度も同期されていない購読だけ Stripe から取得
+        if sub.stripe_subscription_id and (refresh or sub.stripe_synced_at is None) \
+                and subscription_mirror.needs_refresh(sub):
             try:
-                discount_info = stripe_service.get_subscription_discount_info(sub.stripe_subscription_id)
-                discount_name = discount_info.get("discount_name")
-                discount_percent = discount_info.get("discount_percent")
-                discount_amount = discount_info.get("discount_amount")
-
-                # 実際の請求額を計算
-                if discount_percent:
-                    actual_price = int(plan_price * (100 - discount_percent) / 100)
-                elif discount_amount:
-                    actual_price = max(0, plan_price - discount_amount)
+                subscription_service.refresh_subscription_from_stripe(db, sub)
             except Exception as e:
-                logger.warning(f"Stripe割引情報取得失敗 (subscription_id={sub.stripe_subscription_id}): {e}")
-                pass  # Stripe取得失敗時は定価を使用
+                db.rollback()
+                logger.warning(f"Stripe購読情報の再取得失敗 (subscription_id={sub.stripe_subscription_id}): {e}")
 
         info = SubscriptionInfo(
             id=sub.id,
@@ -317,10 +306,12 @@ async def my_subscriptions(
             trial_end=sub.trial_end,
             scheduled_plan_name=scheduled_plan_name,
             scheduled_change_at=sub.scheduled_change_at,
-            discount_name=discount_name,
-            discount_percent=discount_percent,
-            discount_amount=discount_amount,
-            actual_price=actual_price,
+            discount_name=sub.discount_name,
+            discount_percent=sub.discount_percent,
+            discount_amount=sub.discount_amount,
+            actual_price=subscription_mirror.actual_price(plan_price, sub),
+            discount_synced_at=sub.stripe_synced_at,
+            discount_stale=subscription_mirror.is_stale(sub),
             has_payment_issue=sub.status in ("past_due", "unpaid"),
         )
         result.append(info)
@@ -328,7 +319,7 @@ async def my_subscriptions(
 
 
 @router.post("/cancel-subscription/{subscription_id}")
-async def cancel_subscription(
+def cancel_subscription(
     subscription_id: int,
     user: User = Depends(require_login),
     db: Session = Depends(get_db),
@@ -369,7 +360,7 @@ async def cancel_subscription(
 
 
 @router.post("/schedule-plan-change")
-async def schedule_plan_change(
+def schedule_plan_change(
     req: SchedulePlanChangeRequest,
     user: User = Depends(require_login),
     db: Session = Depends(get_db),
@@ -410,7 +401,7 @@ async def schedule_plan_change(
 
 
 @router.delete("/cancel-scheduled-plan-change/{subscription_id}")
-async def cancel_scheduled_plan_change(
+def cancel_scheduled_plan_change(
     subscription_id: int,
     user: User = Depends(require_login),
     db: Session = Depends(get_db),
@@ -436,7 +427,7 @@ async def cancel_scheduled_plan_change(
 
 
 @router.post("/change-plan", response_model=ChangePlanResponse)
-async def change_plan(
+def change_plan(
     req: ChangePlanRequest,
     user: User = Depends(require_login),
     db: Session = Depends(get_db),
@@ -492,7 +483,7 @@ class ValidatePromotionCodeRequest(BaseModel):
 
 
 @router.post("/validate-promotion-code")
-async def validate_promotion_code_endpoint(
+def validate_promotion_code_endpoint(
     req: ValidatePromotionCodeRequest,
     user: User = Depends(require_login),
     db: Session = Depends(get_db),
@@ -1,79 +1,111 @@
-"""Resend Webhook ルーター (bounce/complaint → deliverable=false)"""
-from fastapi import APIRouter, Request, HTTPException
+"""Resend Webhook ルーター (bounce/complaint → 抑止リスト + deliverable=false)"""
+import json
+import time
+from fastapi import APIRouter, Depends, Request, HTTPException
+from fastapi.concurrency import run_in_threadpool
 from svix.webhooks import Webhook, WebhookVerificationError
 
 from app.core.database import SessionLocal
-from app.core.api_keys import get_resend_webhook_secret
-from app.models.user import User
+from app.core.config import settings
+from app.core.redis import get_redis
+from app.core.security import decrypt
 from app.models.service_setting import ServiceSetting
+from app.services.suppression_service import enqueue_bounces
 from app.core.logging import get_logger
 
 logger = get_logger(__name__)
 
 router = APIRouter(tags=["webhooks"])
 
+# ON/OFF と署名シークレットのプロセス内キャッシュ秒数 (設定変更はこの秒数だけ遅れて反映)
+CONFIG_CACHE_SECONDS = 30
 
-@router.post("/api/webhooks/resend")
-async def resend_webhook(request: Request):
-    """Resend Webhook エンドポイント (CSRF免除、Svix署名検証)"""
-    payload = await request.body()
+_config_cache: tuple[float, bool, str] | None = None
 
-    # Resend Webhook ON/OFFチェック
+
+def _load_webhook_config() -> tuple[bool, str]:
+    """service_settings から ON/OFF と Webhook Secret を1回のクエリで取得"""
     db = SessionLocal()
     try:
         setting = db.query(ServiceSetting).first()
         if not setting or not setting.resend_webhook_enabled:
-            return {"received": True, "processed": False, "reason": "webhook_disabled"}
-
-        # 署名検証 (fail-closed: シークレット未設定時は拒否)
-        webhook_secret = get_resend_webhook_secret()
-        if not webhook_secret:
-            logger.error("Resend webhook署名検証: RESEND_WEBHOOK_SECRET が未設定のためリクエストを拒否")
-            raise HTTPException(status_code=401, detail="Webhook secret not configured")
-        headers = {
-            "svix-id": request.headers.get("svix-id", ""),
-            "svix-timestamp": request.headers.get("svix-timestamp", ""),
-            "svix-signature": request.headers.get("svix-signature", ""),
-        }
-        try:
-            wh = Webhook(webhook_secret)
-            wh.verify(payload, headers)
-        except WebhookVerificationError:
-            logger.error("Resend webhook署名検証失敗")
-            raise HTTPException(status_code=401, detail="Invalid signature")
-
-        # イベント処理
-        import json
-        data = json.loads(payload)
-        event_type = data.get("type", "")
+            return False, ""
+        secret = None
+        if setting.resend_webhook_secret_enc:
+            try:
+                secret = decrypt(setting.resend_webhook_secret_enc)
+            except Exception as e:
+                logger.debug(f"Resend Webhook Secret 復号スキップ: {e}")
+        return True, secret or settings.RESEND_WEBHOOK_SECRET
+    finally:
+        db.close()
+
 
-        if event_type in ("email.bounced", "email.complained"):
-            _handle_bounce_or_complaint(db, data)
-        else:
-            logger.info(f"未処理のResendイベント: {event_type}")
+async def _webhook_config() -> tuple[bool, str]:
+    global _config_cache
+    now = time.monotonic()
+    if _config_cache and _config_cache[0] > now:
+        return _config_cache[1], _config_cache[2]
+    enabled, secret = await run_in_threadpool(_load_webhook_config)
+    _config_cache = (now + CONFIG_CACHE_SECONDS, enabled, secret)
+    return enabled, secret
 
-    except HTTPException:
-        raise
+
+@router.post("/api/webhooks/resend")
+async def resend_webhook(request: Request, r=Depends(get_redis)):
+    """
+    Resend Webhook エンドポイント (CSRF免除、Svix署名検証)。
+    bounce/complaint は抑止リストと反映キューに積んで即応答し、
+    users への反映は webhook_worker がまとめて行う。
+    """
+    payload = await request.body()
+
+    # Resend Webhook ON/OFFチェック
+    enabled, webhook_secret = await _webhook_config()
+    if not enabled:
+        return {"received": True, "processed": False, "reason": "webhook_disabled"}
+
+    # 署名検証 (fail-closed: シークレット未設定時は拒否)
+    if not webhook_secret:
+        logger.error("Resend webhook署名検証: RESEND_WEBHOOK_SECRET が未設定のためリクエストを拒否")
+        raise HTTPException(status_code=401, detail="Webhook secret not configured")
+    headers = {
+        "svix-id": request.headers.get("svix-id", ""),
+        "svix-timestamp": request.headers.get("svix-timestamp", ""),
+        "svix-signature": request.headers.get("svix-signature", ""),
+    }
+    try:
+        Webhook(webhook_secret).verify(payload, headers)
+    except WebhookVerificationError:
+        logger.error("Resend webhook署名検証失敗")
+        raise HTTPException(status_code=401, detail="Invalid signature")
+
+    # イベント処理 (不正なペイロードは再送されても直らないため受領扱い)
+    try:
+        data = json.loads(payload)
+        event_type = data.get("type", "")
     except Exception as e:
-        logger.error(f"Resend webhook処理エラー: {e}")
-    finally:
-        db.close()
+        logger.error(f"Resend webhookペイロード解析エラー: {e}")
+        return {"received": True, "processed": False, "reason": "invalid_payload"}
+
+    if event_type in ("email.bounced", "email.complained"):
+        try:
+            await _handle_bounce_or_complaint(r, data)
+        except Exception as e:
+            # 5xx を返して Svix に再送させる (抑止リストへの登録漏れを防ぐ)
+            logger.error(f"Resend webhook処理エラー: {e}")
+            raise HTTPException(status_code=503, detail="Failed to enqueue event")
+    else:
+        logger.info(f"未処理のResendイベント: {event_type}")
 
     return {"received": True}
 
 
-def _handle_bounce_or_complaint(db, data: dict):
-    """bounce/complaint → deliverable=false"""
-    event_data = data.get("data", {})
-    to_emails = event_data.get("to", [])
+async def _handle_bounce_or_complaint(r, data: dict):
+    """bounce/complaint → 抑止リストへ追加 + deliverable=false 反映キューへ"""
+    to_emails = data.get("data", {}).get("to", [])
 
     if isinstance(to_emails, str):
         to_emails = [to_emails]
 
-    for email in to_emails:
-        user = db.query(User).filter(User.email == email).first()
-        if user:
-            user.deliverable = False
-            logger.warning(f"配信停止: email={email}, event={data.get('type')}")
-
-    db.commit()
+    await enqueue_bounces(r, to_emails, data.get("type"))
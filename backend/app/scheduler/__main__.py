@@ -7,6 +7,7 @@ from apscheduler.triggers.cron import CronTrigger
 from app.core.logging import setup_logging, get_logger
 from app.scheduler.plan_checker import check_plans
 from app.scheduler.daily_reset import daily_reset
+from app.services import system_log_sink
 
 setup_logging()
 logger = get_logger("scheduler")
@@ -17,6 +18,7 @@ scheduler = BlockingScheduler(timezone="Asia/Tokyo")
 def signal_handler(sig, frame):
     logger.info("Scheduler停止シグナル受信")
     scheduler.shutdown(wait=False)
+    system_log_sink.shutdown()
     sys.exit(0)
 
 
@@ -155,6 +157,32 @@ def main():
         max_instances=1,
     )
 
+    # 5分ごと: OpenAI Batchジョブのポーリング
+    from app.scheduler.openai_batch_poller import poll_openai_batches
+    scheduler.add_job(
+        poll_openai_batches,
+        CronTrigger(minute="*/5", timezone="Asia/Tokyo"),
+        id="openai_batch_poller",
+        max_instances=1,
+    )
+
+    # 5分ごと: ダッシュボード統計の更新
+    from app.scheduler.stats_refresher import refresh_dashboard_stats, refresh_dirty_snapshot
+    scheduler.add_job(
+        refresh_dashboard_stats,
+        CronTrigger(minute="*/5", timezone="Asia/Tokyo"),
+        id="stats_refresher",
+        max_instances=1,
+    )
+
+    # 毎分: 購読スナップショットの再計算待ちを反映
+    scheduler.add_job(
+        refresh_dirty_snapshot,
+        CronTrigger(minute="*", timezone="Asia/Tokyo"),
+        id="snapshot_refresher",
+        max_instances=1,
+    )
+
     # 23:55 JST: 日次レポート
     from app.scheduler.daily_report import daily_report_job
     scheduler.add_job(
@@ -182,21 +210,21 @@ def main():
         max_instances=1,
     )
 
-    # 毎日2:00 JST: Stripe Invoice同期（取りこぼし対策）
-    from app.scheduler.invoice_sync import sync_invoices_from_stripe
+    # 毎時20分: Stripe⇔DB差分照合 + Invoice同期（週次で全件照合）
+    from app.scheduler.stripe_sync_checker import reconcile_stripe
     scheduler.add_job(
-        sync_invoices_from_stripe,
-        CronTrigger(hour=2, minute=0, timezone="Asia/Tokyo"),
-        id="invoice_sync",
+        reconcile_stripe,
+        CronTrigger(minute=20, timezone="Asia/Tokyo"),
+        id="stripe_reconciler",
         max_instances=1,
     )
 
-    # 毎日3:00 JST: Stripe⇔DB整合性チェック
-    from app.scheduler.stripe_sync_checker import check_stripe_db_consistency
+    # 毎日3:30 JST: システムログのパーティション作成・保持期間パージ
+    from app.scheduler.log_retention import rotate_system_logs
     scheduler.add_job(
-        check_stripe_db_consistency,
-        CronTrigger(hour=3, minute=0, timezone="Asia/Tokyo"),
-        id="stripe_sync_checker",
+        rotate_system_logs,
+        CronTrigger(hour=3, minute=30, timezone="Asia/Tokyo"),
+        id="log_retention",
         max_instances=1,
     )
 
@@ -5,6 +5,10 @@ from app.core.database import SessionLocal
 from app.models.progress_plan import ProgressPlan
 from app.models.progress_task import ProgressTask
 from app.models.delivery import Delivery
+from app.services.pregeneration_service import cleanup_old_contents
+from app.services.email_history_service import cleanup_orphan_bodies
+from app.services.stripe_inbox_service import purge_processed_events
+from app.services.mail_outbox_service import purge_sent_mails
 from app.core.logging import get_logger
 
 logger = get_logger(__name__)
@@ -15,16 +19,20 @@ def daily_reset():
     """
     日次クリーンアップ:
     - 完了済み (status=2) はリセット不要 (スケジューラーが毎日新しいレコードを作る)
-    - 実行中のまま残った (status=1) をエラーに変更
+    - 実行中 (status=1) / バッチ待ち (status=4) / 一時停止 (status=5) のまま残ったものをエラーに変更
     - running のまま残った delivery を stopped に変更
+    - 前日以前の事前生成コンテンツを削除
+    - 履歴から参照されなくなったメール本文を削除
+    - 保持期間を過ぎた処理済みの Stripe 受信箱イベントを削除
+    - 保持期間を過ぎた送信済みのメール送信箱を削除
     """
     db = SessionLocal()
     now = datetime.now(JST)
     try:
-        # status=1 (実行中) のまま日をまたいだタスクをエラーに
+        # status=1 (実行中) / 4 (バッチ待ち) / 5 (一時停止) のまま日をまたいだタスクをエラーに
         hung_plans = db.query(ProgressPlan).filter(
-            ProgressPlan.status == 1,
-        ).update({"status": 3})
+            ProgressPlan.status.in_([1, 4, 5]),
+        ).update({"status": 3}, synchronize_session=False)
 
         hung_tasks = db.query(ProgressTask).filter(
             ProgressTask.status == 1,
@@ -39,9 +47,24 @@ def daily_reset():
             d.completed_at = now
 
         db.commit()
+
+        # 配信日を過ぎた事前生成コンテンツを削除
+        pregen_deleted = cleanup_old_contents(db, now.date())
+
+        # 上書きされて参照が無くなったメール本文を削除
+        bodies_deleted = cleanup_orphan_bodies(db, now.date())
+
+        # 処理済みの Stripe 受信箱イベントを削除
+        inbox_deleted = purge_processed_events(db)
+
+        # 送信済みのメール送信箱を削除
+        outbox_deleted = purge_sent_mails(db)
+
         logger.info(
             f"日次クリーンアップ完了: hung_plans={hung_plans}, "
-            f"hung_tasks={hung_tasks}, stale_deliveries={len(stale_deliveries)}"
+            f"hung_tasks={hung_tasks}, stale_deliveries={len(stale_deliveries)}, "
+            f"pregenerated={pregen_deleted}, email_bodies={bodies_deleted}, "
+            f"stripe_inbox={inbox_deleted}, mail_outbox={outbox_deleted}"
         )
     except Exception as e:
         logger.error(f"日次クリーンアップエラー: {e}")
@@ -0,0 +1,32 @@
+"""03:30 JST: システムログの保持期間管理"""
+from datetime import datetime, timedelta
+from zoneinfo import ZoneInfo
+from app.core.config import settings
+from app.core.database import SessionLocal
+from app.services.system_log_maintenance import ensure_future_partitions, purge_logs_before
+from app.core.logging import get_logger
+
+logger = get_logger(__name__)
+UTC = ZoneInfo("UTC")
+
+
+def rotate_system_logs():
+    """
+    - 先の月のパーティションを作成
+    - 保持期間 (SYSTEM_LOG_RETENTION_DAYS) を過ぎたログを削除
+      (月パーティションごとDROP、境界にかからない残りは小分けDELETE)
+    """
+    db = SessionLocal()
+    try:
+        created = ensure_future_partitions(db)
+        before = datetime.now(UTC).replace(tzinfo=None) - timedelta(days=settings.SYSTEM_LOG_RETENTION_DAYS)
+        result = purge_logs_before(db, before)
+        logger.info(
+            f"システムログ保持期間管理完了: created={created}, "
+            f"dropped={result['dropped_partitions']}, deleted_rows={result['deleted_rows']}"
+        )
+    except Exception as e:
+        logger.error(f"システムログ保持期間管理エラー: {e}")
+        db.rollback()
+    finally:
+        db.close()
@@ -0,0 +1,41 @@
+"""5分ごと: OpenAI Batchジョブのポーリング"""
+from app.core.database import SessionLocal
+from app.models.openai_batch_job import OpenAIBatchJob
+from app.services.openai_service import get_openai_client
+from app.services.openai_batch_service import poll_batch_job, release_waiting_progress
+from app.core.logging import get_logger
+
+logger = get_logger(__name__)
+
+
+def poll_openai_batches():
+    """
+    投入済みのBatchジョブを確認し、完了した結果をステージングに取り込む。
+    プラン×日付の全ジョブが終了したら、バッチ待ちの進捗を未実行に戻してWorkerに送信させる。
+    """
+    db = SessionLocal()
+    try:
+        jobs = db.query(OpenAIBatchJob).filter(
+            OpenAIBatchJob.status == "submitted",
+        ).order_by(OpenAIBatchJob.id.asc()).all()
+        if not jobs:
+            return
+
+        client = get_openai_client()
+        finished_keys = set()
+        for job in jobs:
+            try:
+                if poll_batch_job(db, job, client):
+                    finished_keys.add((job.plan_id, job.date))
+            except Exception as e:
+                db.rollback()
+                logger.error(f"Batchポーリングエラー: batch_id={job.batch_id} - {e}")
+
+        for plan_id, target_date in finished_keys:
+            if release_waiting_progress(db, plan_id, target_date):
+                logger.info(f"Batch完了→送信開始: plan_id={plan_id}, date={target_date}")
+
+    except Exception as e:
+        logger.error(f"Batchポーリング処理エラー: {e}")
+    finally:
+        db.close()
@@ -1,5 +1,5 @@
 """毎分: 送信対象プランチェック"""
-from datetime import datetime, date
+from datetime import datetime, date, timedelta
 from zoneinfo import ZoneInfo
 from sqlalchemy.orm import Session
 
@@ -38,6 +38,10 @@ def check_plans():
             if not plan.send_time:
                 continue
 
+            # 事前生成: send_time の pregenerate_lead_minutes 分前
+            if plan.pregenerate_lead_minutes:
+                _check_pregenerate(db, plan, now, today, weekday)
+
             plan_time_str = plan.send_time.strftime("%H:%M")
             if plan_time_str != current_time_str:
                 continue
@@ -73,6 +77,37 @@ def check_plans():
         db.close()
 
 
+def _check_pregenerate(db: Session, plan: Plan, now: datetime, today: date, weekday: int):
+    """事前生成時刻に一致すれば pregenerate タスクを作成 (日付をまたぐ場合は00:00に前倒し)"""
+    send_dt = datetime.combine(today, plan.send_time)
+    pregen_dt = max(
+        send_dt - timedelta(minutes=plan.pregenerate_lead_minutes),
+        datetime.combine(today, datetime.min.time()),
+    )
+    if pregen_dt.strftime("%H:%M") != now.strftime("%H:%M"):
+        return
+
+    if not _should_send_today(plan, today, weekday):
+        return
+
+    existing = db.query(ProgressPlan).filter(
+        ProgressPlan.plan_id == plan.id,
+        ProgressPlan.date == today,
+        ProgressPlan.send_type == "pregenerate",
+    ).first()
+    if existing:
+        return
+
+    db.add(ProgressPlan(
+        plan_id=plan.id,
+        date=today,
+        send_type="pregenerate",
+        status=0,
+    ))
+    db.commit()
+    logger.info(f"事前生成タスク作成: plan_id={plan.id}, date={today}, lead={plan.pregenerate_lead_minutes}min")
+
+
 def _should_send_today(plan: Plan, today: date, weekday: int) -> bool:
     """今日送信すべきか判定"""
     if plan.schedule_type == "daily":
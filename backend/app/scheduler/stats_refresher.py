@@ -0,0 +1,44 @@
+"""5分ごと: ダッシュボード統計の更新 / 毎分: 購読スナップショットの再計算待ちを反映"""
+from datetime import datetime, timedelta
+from zoneinfo import ZoneInfo
+from app.core.database import SessionLocal
+from app.services.stats_service import (
+    refresh_day_stats,
+    refresh_subscription_snapshot,
+    refresh_subscription_snapshot_if_dirty,
+)
+from app.core.logging import get_logger
+
+logger = get_logger(__name__)
+JST = ZoneInfo("Asia/Tokyo")
+
+
+def refresh_dashboard_stats():
+    """
+    当日の配信カウンタの補正・ログ件数集計・ロールアップ書き出しと、購読スナップショットの再計算。
+    日付が変わった直後は前日分も確定させる。
+    """
+    db = SessionLocal()
+    try:
+        now = datetime.now(JST)
+        refresh_day_stats(db, now.date())
+        if now.hour == 0 and now.minute < 10:
+            refresh_day_stats(db, now.date() - timedelta(days=1))
+        refresh_subscription_snapshot(db)
+    except Exception as e:
+        logger.error(f"ダッシュボード統計の更新エラー: {e}")
+        db.rollback()
+    finally:
+        db.close()
+
+
+def refresh_dirty_snapshot():
+    """購読・ユーザーの変更で invalidate されたスナップショットを再計算する"""
+    db = SessionLocal()
+    try:
+        refresh_subscription_snapshot_if_dirty(db)
+    except Exception as e:
+        logger.error(f"購読スナップショットの再計算エラー: {e}")
+        db.rollback()
+    finally:
+        db.close()
@@ -1,168 +1,187 @@
-"""日次: Stripe⇔DB整合性チェック"""
+"""Stripe⇔DB整合性チェック
+
+- 毎時: 前回チェックポイント以降の Stripe イベント (Event API) だけを照合する差分チェック
+- 週次 (またはチェックポイントが Event API の保持期間より古い場合): 全件照合
+不一致は検出・通知のみで自動修正は行わない。
+照合で取得した購読の割引情報はマイページ表示用のミラー (subscription_mirror) に反映する。
+"""
+import time
 import stripe
-from datetime import datetime
+from datetime import datetime, timedelta
 from zoneinfo import ZoneInfo
 from sqlalchemy.orm import Session
 
 from app.core.database import SessionLocal
 from app.core.api_keys import get_stripe_secret_key
-from app.models.subscription import Subscription
-from app.models.user import User
+from app.models.sync_checkpoint import SyncCheckpoint
+from app.services.subscription_mirror import jst_naive, mirror_discounts
+from app.services.stripe_reconcile_service import (
+    ReconcileMaps, ACTIVE_STATUSES, subscription_inconsistencies, sync_invoices, latest_by_id,
+)
 from app.core.logging import get_logger
 
 logger = get_logger(__name__)
 JST = ZoneInfo("Asia/Tokyo")
 
+CHECKPOINT_NAME = "stripe_reconcile"
+FULL_SWEEP_INTERVAL = timedelta(days=7)
+EVENT_RETENTION = timedelta(days=29)  # Event API で取得できるのは直近30日
+EVENT_SETTLE_SECONDS = 600  # Webhook処理が追いつく前の直近イベントは次回に回す
+MIRROR_BATCH = 500
+RECONCILE_EVENT_TYPES = [
+    "customer.subscription.created",
+    "customer.subscription.updated",
+    "customer.subscription.deleted",
+    "invoice.paid",
+]
+
+
+def reconcile_stripe():
+    """
+    毎時: 差分チェック (チェックポイント以降のイベント)。
+    週次またはチェックポイントが古すぎる場合は全件照合に切り替える。
+    """
+    stripe.api_key = get_stripe_secret_key()
+    db = SessionLocal()
+    try:
+        checkpoint = db.query(SyncCheckpoint).filter(SyncCheckpoint.name == CHECKPOINT_NAME).first()
+        if not checkpoint:
+            checkpoint = SyncCheckpoint(name=CHECKPOINT_NAME)
+            db.add(checkpoint)
+
+        now = datetime.now(JST)
+        until = int(time.time()) - EVENT_SETTLE_SECONDS
+        full_sweep_due = (
+            checkpoint.last_event_created is None
+            or checkpoint.last_full_sweep_at is None
+            or checkpoint.last_full_sweep_at.replace(tzinfo=JST) <= now - FULL_SWEEP_INTERVAL
+            or checkpoint.last_event_created < (now - EVENT_RETENTION).timestamp()
+        )
+
+        if full_sweep_due:
+            # どちらかが失敗したら例外で抜け、チェックポイントを進めずに次回やり直す
+            from app.scheduler.invoice_sync import sync_invoices_from_stripe
+            check_stripe_db_consistency()
+            sync_invoices_from_stripe()
+            checkpoint.last_full_sweep_at = now.replace(tzinfo=None)
+        else:
+            last_event_id = _check_events_since(db, checkpoint.last_event_created, until)
+            if last_event_id:
+                checkpoint.last_event_id = last_event_id
+
+        # 全件照合後もここまでのイベントは照合済みとして進める
+        checkpoint.last_event_created = until
+        db.commit()
+    except Exception as e:
+        logger.error(f"Stripe照合エラー: {e}")
+        db.rollback()
+    finally:
+        db.close()
+
+
+def _check_events_since(db: Session, since: int, until: int):
+    """since < created <= until のイベントで変化した購読・支払いだけを照合。最後のイベントIDを返す"""
+    events = list(stripe.Event.list(
+        types=RECONCILE_EVENT_TYPES,
+        created={"gt": since, "lte": until},
+        limit=100,
+    ).auto_paging_iter())
+    if not events:
+        logger.info("Stripe差分チェック: 新しいイベントなし")
+        return None
+    events.sort(key=lambda e: (e["created"], e["id"]))
+
+    maps = ReconcileMaps(db)
+    subscriptions = latest_by_id([
+        e["data"]["object"] for e in events if e["type"].startswith("customer.subscription.")
+    ])
+    invoices = list(latest_by_id([
+        e["data"]["object"] for e in events if e["type"] == "invoice.paid"
+    ]).values())
+
+    inconsistencies = []
+    mirrored = []  # (subscriptions.id, スナップショット)
+    for stripe_id, snapshot in subscriptions.items():
+        db_sub = maps.subscriptions.get(stripe_id)
+        found = subscription_inconsistencies(snapshot, db_sub)
+        if found:
+            # イベント時点の内容なので、不一致のものだけ現在の状態で確かめる
+            try:
+                current = stripe.Subscription.retrieve(stripe_id)
+                found = subscription_inconsistencies(current, db_sub)
+            except stripe.error.InvalidRequestError:
+                pass
+        inconsistencies.extend(found)
+        if db_sub:
+            mirrored.append((db_sub.id, snapshot))
+
+    # until までのイベントを見ているので、最新スナップショットは until 時点の内容
+    mirror_discounts(db, mirrored, jst_naive(until))
+    db.commit()
+
+    synced, skipped = sync_invoices(db, invoices, maps)
+
+    logger.info(
+        f"Stripe差分チェック完了: events={len(events)}, subscriptions={len(subscriptions)}, "
+        f"invoices synced={synced} skipped={skipped}, inconsistencies={len(inconsistencies)}"
+    )
+    _report(db, inconsistencies)
+    return events[-1]["id"]
+
 
 def check_stripe_db_consistency():
-    """Stripeとデータベースの整合性をチェック
-    
-    日次で実行し、不一致があればログに記録する。
-    自動修正は行わず、検出のみ。
+    """Stripeとデータベースの全件照合 (週次)
+
+    Stripe の購読一覧と DB の購読を事前ロードした対応表で突き合わせる。
+    不一致があればログとメールで通知する。自動修正は行わず、検出のみ。
     """
     logger.info("Stripe⇔DB整合性チェック開始")
-    
+
     stripe.api_key = get_stripe_secret_key()
-    
+
     db = SessionLocal()
     inconsistencies = []
-    
+
     try:
-        # 1. DBのアクティブな購読を取得
-        db_subscriptions = db.query(Subscription).filter(
-            Subscription.stripe_subscription_id != None,
-            Subscription.status.in_(["trialing", "active", "past_due"]),
-        ).all()
-        
-        db_sub_map = {sub.stripe_subscription_id: sub for sub in db_subscriptions}
-        logger.info(f"DB上のアクティブ購読数: {len(db_subscriptions)}")
-        
-        # 2. Stripeのアクティブな購読を取得
-        stripe_subscriptions = []
-        has_more = True
-        starting_after = None
-        
-        while has_more:
-            params = {
-                "status": "all",  # trialing, active, past_due, canceled等全て
-                "limit": 100,
-            }
-            if starting_after:
-                params["starting_after"] = starting_after
-            
-            result = stripe.Subscription.list(**params)
-            stripe_subscriptions.extend(result.data)
-            has_more = result.has_more
-            if result.data:
-                starting_after = result.data[-1].id
-        
-        logger.info(f"Stripe上の購読数: {len(stripe_subscriptions)}")
-        
-        # 3. 比較
+        maps = ReconcileMaps(db)
+        active_in_db = {
+            stripe_id: row for stripe_id, row in maps.subscriptions.items()
+            if row.status in ACTIVE_STATUSES
+        }
+        logger.info(f"DB上のアクティブ購読数: {len(active_in_db)}")
+
+        # Stripe の購読 (キャンセル済み含む全件) を照合し、割引情報をミラーへ反映
         checked_stripe_ids = set()
-        
-        for stripe_sub in stripe_subscriptions:
-            stripe_id = stripe_sub.id
-            stripe_status = stripe_sub.status
-            checked_stripe_ids.add(stripe_id)
-            
-            # Stripeでアクティブな購読がDBにない
-            if stripe_status in ["trialing", "active", "past_due"]:
-                if stripe_id not in db_sub_map:
-                    # DBにレコードがあるか確認（キャンセル済み等）
-                    existing = db.query(Subscription).filter(
-                        Subscription.stripe_subscription_id == stripe_id
-                    ).first()
-                    if not existing:
-                        inconsistencies.append({
-                            "type": "MISSING_IN_DB",
-                            "stripe_subscription_id": stripe_id,
-                            "stripe_status": stripe_status,
-                            "customer_id": stripe_sub.customer,
-                            "message": f"Stripeにアクティブな購読があるがDBに存在しない",
-                        })
-                    elif existing.status != stripe_status:
-                        inconsistencies.append({
-                            "type": "STATUS_MISMATCH",
-                            "stripe_subscription_id": stripe_id,
-                            "stripe_status": stripe_status,
-                            "db_status": existing.status,
-                            "message": f"ステータス不一致: Stripe={stripe_status}, DB={existing.status}",
-                        })
-                else:
-                    db_sub = db_sub_map[stripe_id]
-                    # ステータス比較
-                    if db_sub.status != stripe_status:
-                        inconsistencies.append({
-                            "type": "STATUS_MISMATCH",
-                            "stripe_subscription_id": stripe_id,
-                            "stripe_status": stripe_status,
-                            "db_status": db_sub.status,
-                            "subscription_id": db_sub.id,
-                            "message": f"ステータス不一致: Stripe={stripe_status}, DB={db_sub.status}",
-                        })
-                    
-                    # cancel_at_period_end比較
-                    if db_sub.cancel_at_period_end != stripe_sub.cancel_at_period_end:
-                        inconsistencies.append({
-                            "type": "CANCEL_FLAG_MISMATCH",
-                            "stripe_subscription_id": stripe_id,
-                            "stripe_cancel_at_period_end": stripe_sub.cancel_at_period_end,
-                            "db_cancel_at_period_end": db_sub.cancel_at_period_end,
-                            "subscription_id": db_sub.id,
-                            "message": f"キャンセル予約フラグ不一致: Stripe={stripe_sub.cancel_at_period_end}, DB={db_sub.cancel_at_period_end}",
-                        })
-            
-            # Stripeでキャンセル済みなのにDBでアクティブ
-            elif stripe_status == "canceled":
-                if stripe_id in db_sub_map:
-                    db_sub = db_sub_map[stripe_id]
-                    inconsistencies.append({
-                        "type": "CANCELED_BUT_ACTIVE_IN_DB",
-                        "stripe_subscription_id": stripe_id,
-                        "stripe_status": stripe_status,
-                        "db_status": db_sub.status,
-                        "subscription_id": db_sub.id,
-                        "message": f"Stripeでキャンセル済みだがDBでアクティブ",
-                    })
-        
-        # 4. DBにあるがStripeにない購読（削除された等）
-        for stripe_id, db_sub in db_sub_map.items():
+        as_of = jst_naive()
+        mirrored = []
+        for stripe_sub in stripe.Subscription.list(status="all", limit=100).auto_paging_iter():
+            checked_stripe_ids.add(stripe_sub.id)
+            db_sub = maps.subscriptions.get(stripe_sub.id)
+            inconsistencies.extend(subscription_inconsistencies(stripe_sub, db_sub))
+            if db_sub:
+                mirrored.append((db_sub.id, stripe_sub))
+            if len(mirrored) >= MIRROR_BATCH:
+                mirror_discounts(db, mirrored, as_of)
+                db.commit()
+                mirrored = []
+        mirror_discounts(db, mirrored, as_of)
+        db.commit()
+        logger.info(f"Stripe上の購読数: {len(checked_stripe_ids)}")
+
+        # DBでアクティブだが Stripe の一覧 (status=all) に存在しない購読
+        for stripe_id, db_sub in active_in_db.items():
             if stripe_id not in checked_stripe_ids:
-                # Stripeから取得できなかった購読
-                try:
-                    stripe_sub = stripe.Subscription.retrieve(stripe_id)
-                    if stripe_sub.status == "canceled" and db_sub.status != "canceled":
-                        inconsistencies.append({
-                            "type": "CANCELED_BUT_ACTIVE_IN_DB",
-                            "stripe_subscription_id": stripe_id,
-                            "stripe_status": stripe_sub.status,
-                            "db_status": db_sub.status,
-                            "subscription_id": db_sub.id,
-                            "message": f"Stripeでキャンセル済みだがDBでアクティブ",
-                        })
-                except stripe.error.InvalidRequestError:
-                    inconsistencies.append({
-                        "type": "NOT_FOUND_IN_STRIPE",
-                        "stripe_subscription_id": stripe_id,
-                        "db_status": db_sub.status,
-                        "subscription_id": db_sub.id,
-                        "message": f"Stripeに購読が存在しない",
-                    })
-        
-        # 5. 結果をログ出力
-        if inconsistencies:
-            logger.warning(f"整合性チェック完了: {len(inconsistencies)}件の不一致を検出")
-            for item in inconsistencies:
-                logger.warning(f"不一致: {item}")
-            
-            # 管理者にメール通知
-            _send_inconsistency_alert(db, inconsistencies)
-        else:
-            logger.info("整合性チェック完了: 不一致なし")
-        
+                inconsistencies.append({
+                    "type": "NOT_FOUND_IN_STRIPE",
+                    "stripe_subscription_id": stripe_id,
+                    "db_status": db_sub.status,
+                    "subscription_id": db_sub.id,
+                    "message": "Stripeに購読が存在しない",
+                })
+
+        _report(db, inconsistencies)
         return inconsistencies
-        
+
     except Exception as e:
         logger.error(f"整合性チェックエラー: {e}")
         raise
@@ -170,6 +189,19 @@ def check_stripe_db_consistency():
         db.close()
 
 
+def _report(db: Session, inconsistencies: list):
+    """結果をログ出力し、不一致があれば管理者に通知"""
+    if inconsistencies:
+        logger.warning(f"整合性チェック完了: {len(inconsistencies)}件の不一致を検出")
+        for item in inconsistencies:
+            logger.warning(f"不一致: {item}")
+
+        # 管理者にメール通知
+        _send_inconsistency_alert(db, inconsistencies)
+    else:
+        logger.info("整合性チェック完了: 不一致なし")
+
+
 def _send_inconsistency_alert(db: Session, inconsistencies: list):
     """不一致が検出された場合に管理者に通知"""
     from app.services.mail_service import send_admin_alert_email
@@ -116,3 +116,8 @@ class UserInfo(BaseModel):
     email_verified: bool
 
     model_config = {"from_attributes": True}
+
+
+class CurrentUser(UserInfo):
+    """認証済みユーザーの射影 (セッションにキャッシュし、認証時のDB参照を省く)"""
+    is_active: bool
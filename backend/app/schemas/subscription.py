@@ -53,6 +53,8 @@ class SubscriptionInfo(BaseModel):
     discount_percent: Optional[float] = None  # 割引率（%）
     discount_amount: Optional[int] = None  # 割引額（円）
     actual_price: Optional[int] = None  # 実際の請求額（割引後）
+    discount_synced_at: Optional[datetime] = None  # 割引情報がいつ時点のStripeの内容か
+    discount_stale: bool = False  # 割引情報が古い可能性がある (再取得を促す)
     # 決済問題フラグ
     has_payment_issue: bool = False  # past_due等の決済問題がある場合true
 
@@ -84,6 +84,9 @@ def create_user(
     db.add(user)
     db.commit()
     db.refresh(user)
+    # 以前の所有者のバウンスで新しい登録者への配信を止めない
+    from app.services.suppression_service import unsuppress
+    unsuppress([email])
     logger.info(f"ユーザー作成: member_no={member_no}, email={email}")
     return user
 
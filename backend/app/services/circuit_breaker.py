@@ -0,0 +1,190 @@
+"""外部プロバイダ (OpenAI / Resend) のサーキットブレーカー
+
+状態は Redis に置き、Worker・dispatcher・API の全プロセスで共有する。
+- CLOSED: 通常どおり呼ぶ。直近の呼び出し (window_seconds × 2 の範囲) で失敗率か遅延率が
+  閾値を超えたら OPEN にする
+- OPEN: open_seconds の間は呼ばずに CircuitOpenError
+- HALF_OPEN: OPEN の期限切れ後。同時に probe_calls 件だけ試し、全部成功したら CLOSED、
+  1件でも失敗・遅延したら再び OPEN
+Redis に繋がらないときは呼び出しを止めない (ブレーカーなしと同じ動作)。
+"""
+import time
+from contextlib import contextmanager
+from typing import Callable
+
+from app.core.redis import get_sync_redis
+from app.services.system_log_sink import log_event
+from app.core.logging import get_logger
+
+logger = get_logger(__name__)
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+PROBE_TTL = 300  # 試行中のまま終わらなかった probe (プロセス停止) を数えなくなるまでの秒数
+
+
+class CircuitOpenError(Exception):
+    """ブレーカーが OPEN のため呼び出さなかった。retry_after 秒後に HALF_OPEN になる"""
+
+    def __init__(self, provider: str, retry_after: float):
+        super().__init__(f"{provider} のサーキットブレーカーが OPEN (約{int(retry_after)}秒後に再試行)")
+        self.provider = provider
+        self.retry_after = retry_after
+
+
+class CircuitBreaker:
+    def __init__(
+        self,
+        name: str,
+        failure_rate: float = 0.5,
+        slow_rate: float = 0.5,
+        slow_seconds: float = 10.0,
+        min_calls: int = 10,
+        window_seconds: int = 60,
+        open_seconds: int = 60,
+        probe_calls: int = 3,
+    ):
+        self.name = name
+        self.failure_rate = failure_rate
+        self.slow_rate = slow_rate
+        self.slow_seconds = slow_seconds
+        self.min_calls = min_calls
+        self.window_seconds = window_seconds
+        self.open_seconds = open_seconds
+        self.probe_calls = probe_calls
+        self._key = f"circuit:{name}"
+
+    def _window_keys(self, now: float) -> tuple[str, str]:
+        bucket = int(now // self.window_seconds)
+        return f"{self._key}:w:{bucket}", f"{self._key}:w:{bucket - 1}"
+
+    def _open_until(self, r) -> float | None:
+        value = r.get(f"{self._key}:open_until")
+        return float(value) if value else None
+
+    def state(self) -> str:
+        try:
+            open_until = self._open_until(get_sync_redis())
+        except Exception:
+            return CLOSED
+        if open_until is None:
+            return CLOSED
+        return OPEN if time.time() < open_until else HALF_OPEN
+
+    def is_open(self) -> bool:
+        """OPEN (HALF_OPEN は含まない) か。一時停止した配信を再開してよいかの判定に使う"""
+        return self.state() == OPEN
+
+    def allow(self) -> bool:
+        """
+        呼び出してよいか確認する。OPEN なら CircuitOpenError。
+        戻り値: HALF_OPEN の probe として許可したら True (結果は record に probe=True で渡す)
+        """
+        try:
+            r = get_sync_redis()
+            open_until = self._open_until(r)
+            if open_until is None:
+                return False
+            now = time.time()
+            if now < open_until:
+                raise CircuitOpenError(self.name, open_until - now)
+            probe_key = f"{self._key}:probes"
+            if r.incr(probe_key) > self.probe_calls:
+                r.decr(probe_key)
+                raise CircuitOpenError(self.name, 1)
+            r.expire(probe_key, PROBE_TTL)
+            return True
+        except CircuitOpenError:
+            raise
+        except Exception as e:
+            logger.debug(f"サーキットブレーカー確認スキップ ({self.name}): {e}")
+            return False
+
+    def record(self, ok: bool, elapsed: float, probe: bool = False):
+        """呼び出し結果を記録し、閾値を超えたら OPEN、probe が揃えば CLOSED にする"""
+        slow = elapsed >= self.slow_seconds
+        try:
+            r = get_sync_redis()
+            if probe:
+                self._record_probe(r, ok and not slow)
+                return
+
+            current, previous = self._window_keys(time.time())
+            pipe = r.pipeline()
+            pipe.hincrby(current, "calls", 1)
+            if not ok:
+                pipe.hincrby(current, "failures", 1)
+            if slow:
+                pipe.hincrby(current, "slow", 1)
+            pipe.expire(current, self.window_seconds * 2)
+            pipe.hgetall(current)
+            pipe.hgetall(previous)
+            *_, now_counts, prev_counts = pipe.execute()
+
+            if ok and not slow:
+                return
+            calls = int(now_counts.get("calls", 0)) + int(prev_counts.get("calls", 0))
+            if calls < self.min_calls:
+                return
+            failures = int(now_counts.get("failures", 0)) + int(prev_counts.get("failures", 0))
+            slows = int(now_counts.get("slow", 0)) + int(prev_counts.get("slow", 0))
+            if failures / calls >= self.failure_rate:
+                self._trip(r, f"失敗率 {failures}/{calls}")
+            elif slows / calls >= self.slow_rate:
+                self._trip(r, f"遅延率 {slows}/{calls} ({self.slow_seconds}秒以上)")
+        except Exception as e:
+            logger.debug(f"サーキットブレーカー記録スキップ ({self.name}): {e}")
+
+    def _record_probe(self, r, ok: bool):
+        r.decr(f"{self._key}:probes")
+        if not ok:
+            self._trip(r, "HALF_OPEN の試行が失敗", reopen=True)
+            return
+        if r.incr(f"{self._key}:probe_ok") >= self.probe_calls:
+            self._close(r)
+
+    def _trip(self, r, reason: str, reopen: bool = False):
+        open_until = time.time() + self.open_seconds
+        # 複数プロセスが同時に閾値を超えても OPEN にするのは1回だけ (期限も延ばさない)
+        if not r.set(f"{self._key}:open_until", str(open_until), nx=not reopen):
+            return
+        now = time.time()
+        r.delete(f"{self._key}:probe_ok", *self._window_keys(now))
+        logger.warning(f"サーキットブレーカー OPEN: {self.name} ({reason})、{self.open_seconds}秒停止")
+        log_event(
+            "WARNING", "circuit_open",
+            f"{self.name}: {reason}",
+            details={"provider": self.name, "open_seconds": self.open_seconds},
+        )
+
+    def _close(self, r):
+        r.delete(f"{self._key}:open_until", f"{self._key}:probes", f"{self._key}:probe_ok")
+        logger.info(f"サーキットブレーカー CLOSED: {self.name}")
+        log_event("INFO", "circuit_closed", self.name, details={"provider": self.name})
+
+    @contextmanager
+    def guard(self, is_failure: Callable[[Exception], bool] = lambda e: True):
+        """
+        with ブロック内の呼び出しを記録する。OPEN なら入らずに CircuitOpenError。
+        is_failure が False を返す例外 (入力不正等、プロバイダは正常) は成功として数える。
+        """
+        probe = self.allow()
+        started = time.monotonic()
+        try:
+            yield
+        except Exception as e:
+            self.record(not is_failure(e), time.monotonic() - started, probe)
+            raise
+        self.record(True, time.monotonic() - started, probe)
+
+
+# GPT は1件数十秒かかることがあるため、遅延の閾値は長めにとる
+openai_breaker = CircuitBreaker("openai", slow_seconds=90, min_calls=5, open_seconds=120)
+resend_breaker = CircuitBreaker("resend", slow_seconds=10, min_calls=20, open_seconds=60)
+
+
+def breaker_states() -> dict:
+    """ヘルスチェック用: {プロバイダ: 状態}"""
+    return {b.name: b.state() for b in (openai_breaker, resend_breaker)}
@@ -1,7 +1,14 @@
-"""送信オーケストレーションサービス"""
+"""送信オーケストレーションサービス
+
+OpenAI / Resend のサーキットブレーカーが OPEN の間は、失敗として記録せずに
+CircuitOpenError を呼び出し元 (Worker) まで伝える。Worker は進捗を一時停止にし、
+ブレーカーが HALF_OPEN になったら同じ Delivery で続きから再開する。
+"""
+import json
 import time
-from datetime import datetime
+from datetime import date, datetime
 from typing import Optional
+from sqlalchemy import func
 from sqlalchemy.orm import Session
 from zoneinfo import ZoneInfo
 
@@ -14,20 +21,30 @@ from app.models.user import User
 from app.models.user_answer import UserAnswer
 from app.models.delivery import Delivery
 from app.models.delivery_item import DeliveryItem
-from app.models.system_log import SystemLog
 from app.models.progress_plan import ProgressPlan
-from app.services.openai_service import generate_email_content
+from app.services.openai_service import (
+    generate_email_content,
+    new_usage_stats,
+    record_usage_stats,
+    SHARED_CONTEXT_REFERENCE,
+)
 from app.services.variable_resolver import resolve_variables, build_answers_dict
 from app.services.resend_service import send_email, wrap_body_html
+from app.services.circuit_breaker import CircuitOpenError
+from app.services import retry_queue
 from app.services.email_history_service import save_email_history
-import json
+from app.services.pregeneration_service import load_staged_contents, record_stats, stage_content
 from app.services.firestore_external_service import load_external_data
+from app.services.external_data_compactor import compact_external_data, count_tokens
+from app.services.stats_service import sync_delivery_stats
+from app.services.system_log_sink import log_event
+from app.services.suppression_service import is_suppressed, filter_suppressed
 from app.services.summary_service import (
     get_summary_setting, get_recent_summaries,
     inject_summaries_into_prompt, generate_and_save_summary,
 )
 from app.core.config import settings
-from app.core.logging import get_logger
+from app.core.logging import get_logger, PER_RECIPIENT
 from app.worker.throttle_manager import check_emergency_stop
 
 logger = get_logger(__name__)
@@ -57,6 +74,80 @@ def _update_progress_heartbeat(db: Session, progress_id: int, cursor: str = None
         logger.warning(f"Heartbeat更新失敗: {e}")
 
 
+class ResumeCursor:
+    """
+    途中再開位置 (ProgressPlan.cursor に JSON で保存)。この位置までの処理は済んでいる
+    (送信済み・失敗記録済み・再送キューに積み済みのいずれか)。
+
+    item:  分割送信モードの分割アイテムの位置 (それ以外のモードは None)
+    key:   そのアイテム名 (再開時に外部データの分割が変わっていないかの確認用)
+    user:  そのアイテム内で最後に処理した user_id (まだなければ None)
+    phase: "generate" = アイテムの共通コンテンツ生成中 / "send" = 送信中
+    旧形式 (user_id のみの文字列) も読める。
+    """
+    GENERATE = "generate"
+    SEND = "send"
+    KEY_MAX = 100  # cursor 列 (255文字) に収める
+
+    def __init__(self, item: int = None, key: str = None, user: int = None, phase: str = SEND):
+        self.item = item
+        self.key = key[:self.KEY_MAX] if key else key
+        self.user = user
+        self.phase = phase
+
+    @classmethod
+    def parse(cls, raw: Optional[str]) -> Optional["ResumeCursor"]:
+        if not raw:
+            return None
+        try:
+            if raw.isdigit():
+                return cls(user=int(raw))
+            data = json.loads(raw)
+            return cls(data.get("item"), data.get("key"), data.get("user"), data.get("phase", cls.SEND))
+        except (ValueError, TypeError, AttributeError):
+            logger.warning(f"無効なcursor値: {raw}、最初から処理")
+            return None
+
+    def dump(self) -> str:
+        data = {"user": self.user}
+        if self.item is not None:
+            data.update(item=self.item, key=self.key, phase=self.phase)
+        return json.dumps(data, ensure_ascii=False)
+
+    def locate(self, split_items: list) -> bool:
+        """分割アイテムの位置を合わせる (並びが変わっていればアイテム名で探す)。見つからなければ False"""
+        if self.item is None:
+            return False
+        names = [name[:self.KEY_MAX] for name, _ in split_items]
+        if self.item < len(names) and names[self.item] == self.key:
+            return True
+        if self.key in names:
+            self.item = names.index(self.key)
+            return True
+        return False
+
+    def covers(self, item: int, user_id: int) -> bool:
+        """(分割アイテム, ユーザー) が再開位置までに処理済みか"""
+        if self.item is not None and item != self.item:
+            return item < self.item
+        return self.user is not None and user_id <= self.user
+
+    def describe(self) -> str:
+        if self.item is None:
+            return f"user_id>{self.user}"
+        return f"分割{self.item}({self.key}) {self.phase} user_id>{self.user}"
+
+
+def _save_cursor(db: Session, progress_id: Optional[int], cursor: ResumeCursor):
+    """再開位置を記録する (コミットは配信ループの1件ごとのコミットに相乗りする)"""
+    if not progress_id:
+        return
+    db.query(ProgressPlan).filter(
+        ProgressPlan.id == progress_id,
+        ProgressPlan.status == 1,
+    ).update({"cursor": cursor.dump()}, synchronize_session=False)
+
+
 def _has_user_variables(prompt: str, questions: list) -> bool:
     """プロンプトにユーザー固有の変数が含まれているか判定
     
@@ -87,12 +178,19 @@ def execute_plan_delivery(
     target_user_id: int = None,
     api_key: str = None,
     progress_id: int = None,
-    cursor: str = None,  # 途中再開用: 最後に処理したdelivery_item_id
+    cursor: str = None,  # 途中再開用: ResumeCursor.dump() の文字列
+    resume_delivery_id: int = None,
+    target_date: date = None,
 ) -> Delivery:
     """
     プランの配信を実行する。
 
     target_user_id: 指定時は単体送信
+    target_date: 配信日 (ProgressPlan.date)。ステージング済みコンテンツの参照に使い、
+        日付をまたいで実行・再開されても配信日の分を読む。省略時は当日 (JST)
+    cursor / resume_delivery_id: 途中再開 (一時停止・プロセス停止) 時に指定。実行中のままの Delivery に
+        続きを送る。cursor より前は処理済み、cursor より後も delivery_items にある分は送らず、
+        共通コンテンツはステージングに保存済みの生成結果を使うので GPT を呼び直さない
     
     配信パターン:
     ============
@@ -109,44 +207,46 @@ def execute_plan_delivery(
     - 質問なし + 外部データ分割あり → 5件, GPT 3回 (分割を1メールにまとめる)
     - 質問あり + 外部データ分割あり → 5件, GPT 15回 (分割を1メールにまとめる)
     """
+    target_date = target_date or datetime.now(JST).date()
+
     # 対象ユーザー取得
     users = _get_target_users(db, plan.id, target_user_id)
     if not users:
         logger.info(f"配信対象ユーザーなし: plan_id={plan.id}")
         return None
 
-    # cursor再開: 指定されたuser_id以降から処理を再開
-    original_count = len(users)
-    if cursor:
-        try:
-            cursor_id = int(cursor)
-            users = [u for u in users if u.id > cursor_id]
-            logger.info(f"Cursor再開: user_id>{cursor_id}、{len(users)}/{original_count}件を処理")
-        except ValueError:
-            logger.warning(f"無効なcursor値: {cursor}、最初から処理")
-
     # 質問定義取得
     questions = db.query(PlanQuestion).filter(PlanQuestion.plan_id == plan.id).order_by(PlanQuestion.sort_order).all()
 
     # 外部データ取得
-    external_setting = db.query(PlanExternalDataSetting).filter(
-        PlanExternalDataSetting.plan_id == plan.id
-    ).first()
+    external_data_str, split_items = _load_plan_external_data(db, plan)
+    split_mode = bool(split_items) and not plan.batch_send_enabled  # 分割×ユーザー件のメール
 
-    external_data_str = ""
-    split_items = []
-    if external_setting:
-        firebase_key_enc = _get_firebase_credential(db, external_setting)
-        if firebase_key_enc:
-            external_data_str, split_items = load_external_data(
-                external_setting.external_data_path,
-                firebase_key_enc,
-            )
+    # cursor再開: 最後に処理した位置より後から再開する
+    original_count = len(users)
+    resume = ResumeCursor.parse(cursor)
+    if resume and split_mode and not resume.locate(split_items):
+        # 旧形式 (user_id のみ) か外部データの分割が変わった: delivery_items との突き合わせだけで再開
+        logger.warning(f"分割の位置が特定できないcursor: {cursor}、delivery_itemsとの突き合わせで再開")
+        resume = None
+    elif resume and not split_mode and resume.user:
+        users = [u for u in users if u.id > resume.user]
+    if resume:
+        logger.info(f"Cursor再開: {resume.describe()}、{len(users)}/{original_count}人が対象")
+
+    delivery = None
+    if resume_delivery_id:
+        delivery = db.query(Delivery).filter(
+            Delivery.id == resume_delivery_id,
+            Delivery.status == "running",
+        ).first()
 
-    # 同じプランの実行中deliveryがあれば停止する
+    # 同じプランの実行中deliveryがあれば停止する (手動一斉送信は別タスクのため対象外)
     stale = db.query(Delivery).filter(
         Delivery.plan_id == plan.id,
         Delivery.status == "running",
+        Delivery.send_type != "manual",
+        Delivery.id != (delivery.id if delivery else 0),
     ).all()
     for s in stale:
         s.status = "stopped"
@@ -154,24 +254,50 @@ def execute_plan_delivery(
     if stale:
         db.commit()
 
+    success_count = 0
+    fail_count = 0
+    done_pairs = set()  # 分割モード: (document_key, user_id)
+    if delivery:
+        success_count, fail_count, done_ids = _restore_item_counts(db, delivery.id)
+        if split_mode:
+            done_pairs = _done_pairs(db, delivery.id)
+        elif done_ids:
+            # 1人1通のモード: cursor 保存後に記録された分を重複させない
+            users = [u for u in users if u.id not in done_ids]
+        logger.info(f"途中から再開: delivery_id={delivery.id}, 処理済み={success_count + fail_count}")
+
     # 配信件数を計算（total_count）
-    if split_items and not plan.batch_send_enabled:
-        # 分割あり + まとめてOFF → 分割×ユーザー
-        total_count = len(split_items) * len(users)
+    if split_mode:
+        # 分割あり + まとめてOFF → 分割×ユーザー (再開時は分割ごとに残りのユーザーだけ)
+        item_users = [
+            [
+                u for u in users
+                if (item_name, u.id) not in done_pairs and not (resume and resume.covers(index, u.id))
+            ]
+            for index, (item_name, _) in enumerate(split_items)
+        ]
+        total_count = sum(len(remaining) for remaining in item_users)
     else:
         total_count = len(users)
 
-    # Delivery レコード作成
-    delivery = Delivery(
-        plan_id=plan.id,
-        send_type=send_type,
-        status="running",
-        total_count=total_count,
-        started_at=datetime.now(JST),
-    )
-    db.add(delivery)
-    db.commit()
-    db.refresh(delivery)
+    if delivery:
+        delivery.total_count = success_count + fail_count + total_count
+        delivery.success_count = success_count
+        delivery.fail_count = fail_count
+        db.commit()
+    else:
+        # Delivery レコード作成
+        delivery = Delivery(
+            plan_id=plan.id,
+            send_type=send_type,
+            status="running",
+            total_count=total_count,
+            started_at=datetime.now(JST),
+        )
+        db.add(delivery)
+        db.commit()
+        db.refresh(delivery)
+    sync_delivery_stats(delivery)
 
     # ProgressPlanにdelivery_idとstatusを即座に設定（進捗表示のため）
     if progress_id:
@@ -195,8 +321,15 @@ def execute_plan_delivery(
     has_user_vars = _has_user_variables(prompt, questions)
     has_split_data = bool(split_items)
 
-    success_count = 0
-    fail_count = 0
+    # 事前生成 / Batch API 済みコンテンツ (定時送信かつプロンプト上書きなしの場合のみ)
+    staged = None
+    uses_staging = plan.pregenerate_lead_minutes or plan.openai_batch_enabled
+    if (uses_staging and send_type == "scheduled" and not prompt_override) or resume or resume_delivery_id:
+        # 再開時は中断前に生成して保存した共通コンテンツも使う
+        staged = load_staged_contents(db, plan.id, target_date)
+
+    # GPT usage (プロンプトキャッシュのヒット率・レイテンシ) の集計
+    usage_stats = new_usage_stats()
 
     if plan.batch_send_enabled and has_split_data:
         # =================================================
@@ -216,39 +349,23 @@ def execute_plan_delivery(
                 db.commit()
                 return delivery
 
-            user_answers = db.query(UserAnswer).filter(UserAnswer.user_id == user.id).all()
-            answers_dict = _build_answers_with_fallback(db, user.id, plan.id, questions, user_answers)
-
             all_contents = []
-            
+
             for item_name, item_data in split_items:
                 if has_user_vars:
                     # 質問あり: ユーザーごとにGPT生成
-                    user_prompt = prompt
-                    if summary_setting:
-                        summaries = get_recent_summaries(
-                            db, plan.id, user.id, summary_setting.summary_inject_count
-                        )
-                        user_prompt = inject_summaries_into_prompt(user_prompt, summaries)
-
-                    resolved_prompt = resolve_variables(
-                        text=user_prompt,
-                        external_data=item_data,
-                        item_name=item_name,
-                        answers=answers_dict,
-                        user_name=f"{user.name_last} {user.name_first}",
-                        name_last=user.name_last,
-                        name_first=user.name_first,
+                    resolved_prompt, context = _build_user_prompt(
+                        db, plan, prompt, user, questions, summary_setting,
+                        external_data=item_data, item_name=item_name,
                     )
 
                     try:
-                        gpt_result = generate_email_content(
-                            prompt=resolved_prompt,
-                            model=plan.model,
-                            system_prompt=plan.system_prompt,
-                            api_key=api_key,
+                        gpt_result = _generate_content(
+                            plan, resolved_prompt, api_key, staged, context, usage_stats,
                         )
                         all_contents.append((item_name, gpt_result))
+                    except CircuitOpenError:
+                        raise
                     except Exception as e:
                         logger.error(f"GPT生成失敗 (batch user={user.id}, item={item_name}): {e}")
                 else:
@@ -260,13 +377,10 @@ def execute_plan_delivery(
                             item_name=item_name,
                         )
                         try:
-                            gpt_result = generate_email_content(
-                                prompt=resolved_prompt,
-                                model=plan.model,
-                                system_prompt=plan.system_prompt,
-                                api_key=api_key,
-                            )
+                            gpt_result = _generate_shared_content(db, plan, target_date, resolved_prompt, api_key, staged, usage_stats)
                             split_gpt_cache[item_name] = gpt_result
+                        except CircuitOpenError:
+                            raise
                         except Exception as e:
                             logger.error(f"GPT生成失敗 (batch item={item_name}): {e}")
                             split_gpt_cache[item_name] = None  # 失敗をマーク
@@ -286,6 +400,7 @@ def execute_plan_delivery(
                     status=3,
                     error_msg="全分割アイテムでGPT生成失敗",
                 )
+                _save_cursor(db, progress_id, ResumeCursor(user=user.id))
                 db.commit()
                 continue
 
@@ -305,14 +420,16 @@ def execute_plan_delivery(
             if ok:
                 success_count += 1
                 delivery.success_count = success_count
-            else:
+            elif ok is False:  # None は再送キューに回した
                 fail_count += 1
                 delivery.fail_count = fail_count
+            _save_cursor(db, progress_id, ResumeCursor(user=user.id))
             db.commit()
 
             # Heartbeat更新（Watchdog対策）
             if (success_count + fail_count) % HEARTBEAT_INTERVAL == 0:
-                _update_progress_heartbeat(db, progress_id, cursor=str(user.id))
+                _update_progress_heartbeat(db, progress_id)
+                sync_delivery_stats(delivery)
 
             time.sleep(throttle_seconds)
 
@@ -322,7 +439,11 @@ def execute_plan_delivery(
         # =================================================
         logger.info(f"分割送信モード: plan_id={plan.id}, users={len(users)}, splits={len(split_items)}")
         
-        for item_name, item_data in split_items:
+        for index, (item_name, item_data) in enumerate(split_items):
+            users = item_users[index]
+            if not users:
+                continue  # 再開時: この分割は処理済み (共通コンテンツも生成しない)
+
             if has_user_vars:
                 # 質問あり: ユーザーごとにGPT生成
                 for user in users:
@@ -334,24 +455,9 @@ def execute_plan_delivery(
                         db.commit()
                         return delivery
 
-                    user_answers = db.query(UserAnswer).filter(UserAnswer.user_id == user.id).all()
-                    answers_dict = _build_answers_with_fallback(db, user.id, plan.id, questions, user_answers)
-
-                    user_prompt = prompt
-                    if summary_setting:
-                        summaries = get_recent_summaries(
-                            db, plan.id, user.id, summary_setting.summary_inject_count
-                        )
-                        user_prompt = inject_summaries_into_prompt(user_prompt, summaries)
-
-                    resolved_prompt = resolve_variables(
-                        text=user_prompt,
-                        external_data=item_data,
-                        item_name=item_name,
-                        answers=answers_dict,
-                        user_name=f"{user.name_last} {user.name_first}",
-                        name_last=user.name_last,
-                        name_first=user.name_first,
+                    resolved_prompt, context = _build_user_prompt(
+                        db, plan, prompt, user, questions, summary_setting,
+                        external_data=item_data, item_name=item_name,
                     )
 
                     ok = _send_with_retry(
@@ -363,17 +469,22 @@ def execute_plan_delivery(
                         document_key=item_name,
                         summary_setting=summary_setting,
                         api_key=api_key,
+                        staged=staged,
+                        context=context,
+                        usage_stats=usage_stats,
                     )
                     if ok:
                         success_count += 1
                         delivery.success_count = success_count
-                    else:
+                    elif ok is False:  # None は再送キューに回した
                         fail_count += 1
                         delivery.fail_count = fail_count
+                    _save_cursor(db, progress_id, ResumeCursor(index, item_name, user.id))
                     db.commit()
 
                     if (success_count + fail_count) % HEARTBEAT_INTERVAL == 0:
-                        _update_progress_heartbeat(db, progress_id, cursor=str(user.id))
+                        _update_progress_heartbeat(db, progress_id)
+                        sync_delivery_stats(delivery)
 
                     time.sleep(throttle_seconds)
             else:
@@ -384,13 +495,12 @@ def execute_plan_delivery(
                     item_name=item_name,
                 )
 
+                _save_cursor(db, progress_id, ResumeCursor(index, item_name, phase=ResumeCursor.GENERATE))
+                db.commit()
                 try:
-                    gpt_result = generate_email_content(
-                        prompt=resolved_prompt,
-                        model=plan.model,
-                        system_prompt=plan.system_prompt,
-                        api_key=api_key,
-                    )
+                    gpt_result = _generate_shared_content(db, plan, target_date, resolved_prompt, api_key, staged, usage_stats)
+                except CircuitOpenError:
+                    raise
                 except Exception as e:
                     logger.error(f"GPT生成失敗 (split item={item_name}): {e}")
                     # この分割アイテムの全ユーザーを失敗扱い
@@ -403,6 +513,7 @@ def execute_plan_delivery(
                             status=3,
                             error_msg=f"GPT生成失敗: {e}",
                         )
+                    _save_cursor(db, progress_id, ResumeCursor(index, item_name, users[-1].id))
                     db.commit()
                     continue
 
@@ -428,13 +539,15 @@ def execute_plan_delivery(
                     if ok:
                         success_count += 1
                         delivery.success_count = success_count
-                    else:
+                    elif ok is False:  # None は再送キューに回した
                         fail_count += 1
                         delivery.fail_count = fail_count
+                    _save_cursor(db, progress_id, ResumeCursor(index, item_name, user.id))
                     db.commit()
 
                     if (success_count + fail_count) % HEARTBEAT_INTERVAL == 0:
-                        _update_progress_heartbeat(db, progress_id, cursor=str(user.id))
+                        _update_progress_heartbeat(db, progress_id)
+                        sync_delivery_stats(delivery)
 
                     time.sleep(throttle_seconds)
 
@@ -453,23 +566,9 @@ def execute_plan_delivery(
                 db.commit()
                 return delivery
 
-            user_answers = db.query(UserAnswer).filter(UserAnswer.user_id == user.id).all()
-            answers_dict = _build_answers_with_fallback(db, user.id, plan.id, questions, user_answers)
-
-            user_prompt = prompt
-            if summary_setting:
-                summaries = get_recent_summaries(
-                    db, plan.id, user.id, summary_setting.summary_inject_count
-                )
-                user_prompt = inject_summaries_into_prompt(user_prompt, summaries)
-
-            resolved_prompt = resolve_variables(
-                text=user_prompt,
+            resolved_prompt, context = _build_user_prompt(
+                db, plan, prompt, user, questions, summary_setting,
                 external_data=external_data_str or None,
-                answers=answers_dict,
-                user_name=f"{user.name_last} {user.name_first}",
-                name_last=user.name_last,
-                name_first=user.name_first,
             )
 
             ok = _send_with_retry(
@@ -481,17 +580,22 @@ def execute_plan_delivery(
                 document_key=None,
                 summary_setting=summary_setting,
                 api_key=api_key,
+                staged=staged,
+                context=context,
+                usage_stats=usage_stats,
             )
             if ok:
                 success_count += 1
                 delivery.success_count = success_count
-            else:
+            elif ok is False:  # None は再送キューに回した
                 fail_count += 1
                 delivery.fail_count = fail_count
+            _save_cursor(db, progress_id, ResumeCursor(user=user.id))
             db.commit()
 
             if (success_count + fail_count) % HEARTBEAT_INTERVAL == 0:
-                _update_progress_heartbeat(db, progress_id, cursor=str(user.id))
+                _update_progress_heartbeat(db, progress_id)
+                sync_delivery_stats(delivery)
 
             time.sleep(throttle_seconds)
 
@@ -507,12 +611,9 @@ def execute_plan_delivery(
         )
 
         try:
-            gpt_result = generate_email_content(
-                prompt=resolved_prompt,
-                model=plan.model,
-                system_prompt=plan.system_prompt,
-                api_key=api_key,
-            )
+            gpt_result = _generate_shared_content(db, plan, target_date, resolved_prompt, api_key, staged, usage_stats)
+        except CircuitOpenError:
+            raise
         except Exception as e:
             logger.error(f"GPT生成失敗: {e}")
             # 全ユーザーのDeliveryItemを失敗で作成
@@ -523,10 +624,12 @@ def execute_plan_delivery(
                     status=3,
                     error_msg=f"GPT生成失敗: {e}",
                 )
-            delivery.status = "failed"
-            delivery.fail_count = len(users)
-            delivery.completed_at = datetime.now(JST)
-            db.commit()
+            # 再開時は復元済みの件数に加算し、結果は delivery_items から確定する
+            fail_count += len(users)
+            delivery.success_count = success_count
+            delivery.fail_count = fail_count
+            _close_delivery(db, delivery)
+            _record_generation_stats(plan, target_date, staged, usage_stats)
             return delivery
 
         for user in users:
@@ -551,32 +654,337 @@ def execute_plan_delivery(
             if ok:
                 success_count += 1
                 delivery.success_count = success_count
-            else:
+            elif ok is False:  # None は再送キューに回した
                 fail_count += 1
                 delivery.fail_count = fail_count
+            _save_cursor(db, progress_id, ResumeCursor(user=user.id))
             db.commit()
 
             if (success_count + fail_count) % HEARTBEAT_INTERVAL == 0:
-                _update_progress_heartbeat(db, progress_id, cursor=str(user.id))
+                _update_progress_heartbeat(db, progress_id)
+                sync_delivery_stats(delivery)
 
             time.sleep(throttle_seconds)
 
-    # Delivery完了更新
+    # Delivery完了更新 (再送キューに残りがあれば最後の1件を処理した再送スレッドが締める)
     delivery.success_count = success_count
     delivery.fail_count = fail_count
-    delivery.completed_at = datetime.now(JST)
-    if fail_count == 0:
-        delivery.status = "success"
-    elif success_count == 0:
-        delivery.status = "failed"
+    _close_delivery(db, delivery)
+    _record_generation_stats(plan, target_date, staged, usage_stats)
+    return delivery
+
+
+def execute_manual_delivery(
+    db: Session,
+    delivery_id: int,
+    throttle_seconds: int = 5,
+    progress_id: int = None,
+    cursor: str = None,  # 途中再開用: ResumeCursor.dump() の文字列
+) -> Delivery:
+    """
+    手動一斉送信を実行する (管理画面で入力した件名・本文をプラン加入者全員へ)。
+
+    件名・本文は登録時に Delivery (subject/body) に保存済み。
+    対象ユーザーは定時配信と同じく実行時に一括取得し、id昇順で送信する。
+    再開時は cursor より後のユーザーのうち、この配信でまだ delivery_item がない人だけ送る。
+    """
+    delivery = db.query(Delivery).filter(Delivery.id == delivery_id).first()
+    if not delivery:
+        raise ValueError(f"Delivery not found: {delivery_id}")
+    if not delivery.body:
+        raise ValueError(f"手動送信の本文がありません: delivery_id={delivery_id}")
+
+    users = _get_target_users(db, delivery.plan_id)
+    original_count = len(users)
+    resume = ResumeCursor.parse(cursor)
+    if resume and resume.user:
+        users = [u for u in users if u.id > resume.user]
+
+    # 処理済みユーザーと件数は delivery_items から復元 (heartbeat間隔内の送信済み分を重複させない)
+    success_count, fail_count, done_ids = _restore_item_counts(db, delivery.id)
+    if done_ids:
+        users = [u for u in users if u.id not in done_ids]
+        logger.info(f"手動送信再開: delivery_id={delivery.id}, 残り{len(users)}/{original_count}件")
+        delivery.total_count = success_count + fail_count + len(users)
     else:
-        delivery.status = "partial_failed"
+        delivery.total_count = len(users)
 
+    delivery.status = "running"
+    delivery.started_at = delivery.started_at or datetime.now(JST)
+    delivery.success_count = success_count
+    delivery.fail_count = fail_count
     db.commit()
-    logger.info(f"配信完了: delivery_id={delivery.id}, success={success_count}, fail={fail_count}")
+    sync_delivery_stats(delivery)
+
+    unsubscribe_base = f"{settings.SITE_URL}/api/me/unsubscribe?token="
+    logger.info(f"手動一斉送信開始: delivery_id={delivery.id}, users={len(users)}")
+
+    for user in users:
+        # 緊急停止チェック
+        if check_emergency_stop():
+            logger.warning(f"緊急停止により配信中断: delivery_id={delivery.id}")
+            delivery.status = "stopped"
+            delivery.completed_at = datetime.now(JST)
+            db.commit()
+            return delivery
+
+        unsubscribe_url = unsubscribe_base + user.unsubscribe_token if user.unsubscribe_token else None
+        ok = _send_manual_email_with_retry(db, delivery, user, unsubscribe_url)
+        if ok:
+            success_count += 1
+            delivery.success_count = success_count
+        elif ok is False:  # None は再送キューに回した
+            fail_count += 1
+            delivery.fail_count = fail_count
+        _save_cursor(db, progress_id, ResumeCursor(user=user.id))
+        db.commit()
+
+        if (success_count + fail_count) % HEARTBEAT_INTERVAL == 0:
+            _update_progress_heartbeat(db, progress_id)
+            sync_delivery_stats(delivery)
+
+        time.sleep(throttle_seconds)
+
+    delivery.success_count = success_count
+    delivery.fail_count = fail_count
+    _close_delivery(db, delivery)
     return delivery
 
 
+def _close_delivery(db: Session, delivery: Delivery):
+    """配信ループの終了。再送キューに未解決の分が残っていれば実行中のまま返す"""
+    try:
+        ready = retry_queue.close_delivery(delivery.id)
+    except Exception as e:
+        logger.warning(f"再送キュー確認失敗、そのまま締めます: delivery_id={delivery.id} - {e}")
+        ready = True
+    if ready:
+        _finish_delivery(db, delivery)
+        return
+    db.commit()
+    sync_delivery_stats(delivery)
+    logger.info(f"配信ループ完了、再送待ち: delivery_id={delivery.id}")
+
+
+def _finish_delivery(db: Session, delivery: Delivery):
+    """件数を delivery_items から数え直して結果を確定する (緊急停止済みなら件数だけ)"""
+    success_count, fail_count = _item_counts(db, delivery.id)
+    delivery.success_count = success_count
+    delivery.fail_count = fail_count
+    if delivery.status != "stopped":
+        delivery.completed_at = datetime.now(JST)
+        if fail_count == 0:
+            delivery.status = "success"
+        elif success_count == 0:
+            delivery.status = "failed"
+        else:
+            delivery.status = "partial_failed"
+    db.commit()
+    sync_delivery_stats(delivery)
+    logger.info(f"配信完了: delivery_id={delivery.id}, success={success_count}, fail={fail_count}")
+
+
+def _item_counts(db: Session, delivery_id: int) -> tuple[int, int]:
+    """delivery_items の (成功件数, 失敗件数)"""
+    counts = dict(
+        db.query(DeliveryItem.status, func.count(DeliveryItem.id)).filter(
+            DeliveryItem.delivery_id == delivery_id,
+        ).group_by(DeliveryItem.status).all()
+    )
+    return counts.get(2, 0), counts.get(3, 0)
+
+
+def _done_pairs(db: Session, delivery_id: int) -> set[tuple[str, int]]:
+    """分割送信モードの処理済み (document_key, user_id)"""
+    return {
+        (row.document_key, row.user_id) for row in db.query(
+            DeliveryItem.document_key, DeliveryItem.user_id,
+        ).filter(DeliveryItem.delivery_id == delivery_id)
+    }
+
+
+def _restore_item_counts(db: Session, delivery_id: int) -> tuple[int, int, set]:
+    """delivery_items から (成功件数, 失敗件数, 処理済みuser_id) を復元"""
+    success_count, fail_count = _item_counts(db, delivery_id)
+    done_ids = set()
+    if success_count or fail_count:
+        done_ids = {
+            row.user_id for row in db.query(DeliveryItem.user_id).filter(
+                DeliveryItem.delivery_id == delivery_id,
+            )
+        }
+    return success_count, fail_count, done_ids
+
+
+def _send_manual_email_with_retry(
+    db: Session,
+    delivery: Delivery,
+    user: User,
+    unsubscribe_url: Optional[str],
+) -> Optional[bool]:
+    """手動送信の本文をそのまま送信。失敗したら再送キューに回して None"""
+    if _skip_suppressed(db, delivery, user):
+        return False
+
+    try:
+        result = send_email(
+            to_email=user.email,
+            subject=delivery.subject,
+            body=delivery.body,
+            unsubscribe_url=unsubscribe_url,
+        )
+    except CircuitOpenError:
+        raise
+    except Exception as e:
+        return _defer_retry(
+            db, delivery, None, user, None, str(e),
+            manual=True, unsubscribe_url=unsubscribe_url,
+        )
+
+    _create_delivery_item(
+        db, delivery.id, user,
+        status=2,
+        resend_message_id=result.get("id"),
+    )
+    logger.info(f"手動送信成功: user_id={user.id}", extra=PER_RECIPIENT)
+    return True
+
+
+def _generate_content(
+    plan: Plan,
+    resolved_prompt: str,
+    api_key: str,
+    staged=None,
+    context: Optional[str] = None,
+    usage_stats: Optional[dict] = None,
+) -> dict:
+    """GPT生成 (事前生成済みのステージング結果があれば再利用)"""
+    if staged is not None:
+        cached = staged.get(plan.model, plan.system_prompt, resolved_prompt, context)
+        if cached is not None:
+            return cached
+    return generate_email_content(
+        prompt=resolved_prompt,
+        model=plan.model,
+        system_prompt=plan.system_prompt,
+        api_key=api_key,
+        shared_context=context,
+        usage_stats=usage_stats,
+    )
+
+
+def _generate_shared_content(
+    db: Session,
+    plan: Plan,
+    target_date: date,
+    resolved_prompt: str,
+    api_key: str,
+    staged,
+    usage_stats: dict,
+) -> dict:
+    """全員共通のGPT生成。結果はステージングに保存し、途中再開時に生成し直さない"""
+    gpt_result = _generate_content(plan, resolved_prompt, api_key, staged, usage_stats=usage_stats)
+    stage_content(db, plan, target_date, resolved_prompt, None, gpt_result)
+    if staged is not None:
+        staged.add(plan.model, plan.system_prompt, resolved_prompt, None, gpt_result)
+    return gpt_result
+
+
+def _record_generation_stats(plan: Plan, target_date: date, staged, usage_stats: dict):
+    """事前生成ステージングのヒット/ミスとGPT usageを記録"""
+    record_usage_stats(plan.id, target_date, usage_stats)
+    if staged is None:
+        return
+    record_stats(
+        plan.id, target_date,
+        hits=len(staged.hit_hashes), misses=len(staged.miss_hashes),
+    )
+
+
+def _build_user_prompt(
+    db: Session,
+    plan: Plan,
+    prompt: str,
+    user: User,
+    questions: list,
+    summary_setting,
+    external_data: Optional[str] = None,
+    item_name: Optional[str] = None,
+) -> tuple[str, Optional[str]]:
+    """
+    ユーザー個別のプロンプトを組み立てる (回答 + あらすじ注入 + 変数置換)
+
+    plan.prompt_cache_layout が有効な場合、外部データはプロンプトに埋め込まず
+    共通コンテキストとして別メッセージで渡し、あらすじはプロンプト末尾に置く
+    (受信者間で共通のプレフィックスを長くし、プロバイダのプロンプトキャッシュを効かせるため)。
+    戻り値: (解決済みプロンプト, 共通コンテキスト or None)
+    """
+    user_answers = db.query(UserAnswer).filter(UserAnswer.user_id == user.id).all()
+    answers_dict = _build_answers_with_fallback(db, user.id, plan.id, questions, user_answers)
+
+    context = None
+    if plan.prompt_cache_layout and external_data and "{external_data}" in prompt:
+        context = external_data
+        external_data = SHARED_CONTEXT_REFERENCE
+
+    user_prompt = prompt
+    if summary_setting:
+        summaries = get_recent_summaries(
+            db, plan.id, user.id, summary_setting.summary_inject_count
+        )
+        user_prompt = inject_summaries_into_prompt(
+            user_prompt, summaries, append=bool(plan.prompt_cache_layout),
+        )
+
+    resolved = resolve_variables(
+        text=user_prompt,
+        external_data=external_data,
+        item_name=item_name,
+        answers=answers_dict,
+        user_name=f"{user.name_last} {user.name_first}",
+        name_last=user.name_last,
+        name_first=user.name_first,
+    )
+    return resolved, context
+
+
+def iter_generation_prompts(
+    db: Session,
+    plan: Plan,
+    prompt: str,
+    users: list[User],
+    questions: list,
+    split_items: list,
+    external_data_str: str,
+    summary_setting,
+):
+    """
+    配信時にGPTへ渡す (解決済みプロンプト, 共通コンテキスト) を
+    execute_plan_delivery と同じ組み立て方で列挙する。
+    事前生成用。共通コンテンツ (質問なし) のプロンプトは1回だけ返す。
+    """
+    has_user_vars = _has_user_variables(prompt, questions)
+
+    if split_items:
+        for item_name, item_data in split_items:
+            if has_user_vars:
+                for user in users:
+                    yield _build_user_prompt(
+                        db, plan, prompt, user, questions, summary_setting,
+                        external_data=item_data, item_name=item_name,
+                    )
+            else:
+                yield resolve_variables(text=prompt, external_data=item_data, item_name=item_name), None
+    elif has_user_vars:
+        for user in users:
+            yield _build_user_prompt(
+                db, plan, prompt, user, questions, summary_setting,
+                external_data=external_data_str or None,
+            )
+    else:
+        yield resolve_variables(text=prompt, external_data=external_data_str or None), None
+
+
 def _combine_gpt_results(contents: list) -> dict:
     """複数のGPT結果を1つに結合する
     
@@ -615,7 +1023,26 @@ def _get_target_users(db: Session, plan_id: int, target_user_id: int = None) ->
     )
     if target_user_id:
         q = q.filter(User.id == target_user_id)
-    return q.order_by(User.id.asc()).all()  # cursor再開のためid昇順必須
+    users = q.order_by(User.id.asc()).all()  # cursor再開のためid昇順必須
+    # deliverable 未反映の bounce/complaint も除外
+    return filter_suppressed(users)
+
+
+def _skip_suppressed(db: Session, delivery: Delivery, user: User, document_key: str = None) -> bool:
+    """
+    配信中に bounce/complaint を受けたアドレスなら送信せず失敗として記録する。
+    (対象ユーザー取得後に Webhook を受けた分。リトライ・アラートはしない)
+    """
+    if not is_suppressed(user.email):
+        return False
+    logger.info(f"抑止リストのため送信スキップ: user_id={user.id}", extra=PER_RECIPIENT)
+    _create_delivery_item(
+        db, delivery.id, user,
+        document_key=document_key,
+        status=3,
+        error_msg="配信停止アドレス (bounce/complaint)",
+    )
+    return True
 
 
 def _create_delivery_item(
@@ -645,7 +1072,6 @@ def _create_delivery_item(
 
 
 def _log_event(
-    db: Session,
     level: str,
     event_type: str,
     plan_id: int = None,
@@ -654,18 +1080,11 @@ def _log_event(
     delivery_id: int = None,
     message: str = "",
 ):
-    """システムログ記録"""
-    log = SystemLog(
-        level=level,
-        event_type=event_type,
-        plan_id=plan_id,
-        user_id=user_id,
-        member_no_snapshot=member_no,
-        delivery_id=delivery_id,
-        message=message,
+    """システムログ記録 (バッチ書き込みのキューに積むだけで配信は待たせない)"""
+    log_event(
+        level, event_type, message,
+        plan_id=plan_id, user_id=user_id, member_no=member_no, delivery_id=delivery_id,
     )
-    db.add(log)
-    db.commit()
 
 
 def _build_answers_with_fallback(
@@ -704,6 +1123,57 @@ def _build_answers_with_fallback(
     return result
 
 
+def _load_plan_external_data(db: Session, plan: Plan) -> tuple[str, list]:
+    """プランの外部データ設定からFirestoreデータを読み込む。戻り値: (data_str, split_items)"""
+    external_setting = db.query(PlanExternalDataSetting).filter(
+        PlanExternalDataSetting.plan_id == plan.id
+    ).first()
+    if not external_setting:
+        return "", []
+
+    firebase_key_enc = _get_firebase_credential(db, external_setting)
+    if not firebase_key_enc:
+        return "", []
+
+    data_str, split_items = load_external_data(
+        external_setting.external_data_path,
+        firebase_key_enc,
+    )
+    return _compact_plan_external_data(plan, external_setting, data_str, split_items)
+
+
+def _compact_plan_external_data(
+    plan: Plan, external_setting: PlanExternalDataSetting, data_str: str, split_items: list,
+) -> tuple[str, list]:
+    """外部データ設定のフィールド指定・トークン予算で圧縮 (配信ごとに1回)"""
+    if not (
+        external_setting.token_budget
+        or external_setting.include_fields
+        or external_setting.exclude_fields
+    ):
+        return data_str, split_items
+
+    def _compact(text: str) -> str:
+        compacted = compact_external_data(
+            text,
+            token_budget=external_setting.token_budget,
+            include_fields=external_setting.include_fields,
+            exclude_fields=external_setting.exclude_fields,
+            model=plan.model,
+        )
+        if len(compacted) < len(text):
+            logger.info(
+                f"外部データ圧縮: plan_id={plan.id}, chars {len(text)} -> {len(compacted)}, "
+                f"tokens={count_tokens(compacted, plan.model)}"
+            )
+        return compacted
+
+    if split_items:
+        # 分割時の data_str はプレビュー用のため圧縮しない
+        return data_str, [(name, _compact(item_data)) for name, item_data in split_items]
+    return _compact(data_str), split_items
+
+
 def _get_firebase_credential(db: Session, external_setting: PlanExternalDataSetting) -> Optional[str]:
     """外部データ設定からFirebase認証情報(暗号化済み)を取得"""
     # 1. firebase_credential_id がある場合
@@ -732,73 +1202,46 @@ def _send_with_retry(
     document_key: str,
     summary_setting,
     api_key: str,
-) -> bool:
-    """GPT生成 + メール送信をリトライ付きで実行（通常モード・ハイブリッドモード用）"""
-    from app.services.report_service import send_error_alert
-
-    last_error = None
-
-    for attempt in range(MAX_RETRY + 1):
-        try:
-            gpt_result = generate_email_content(
-                prompt=resolved_prompt,
-                model=plan.model,
-                system_prompt=plan.system_prompt,
-                api_key=api_key,
-            )
-
-            # メール送信
-            ok, error_msg = _try_send_email(
-                db, delivery, plan, user,
-                gpt_result, document_key, summary_setting, api_key,
-            )
-            if ok:
-                # 成功: delivery_item作成
-                _create_delivery_item(
-                    db, delivery.id, user,
-                    document_key=document_key,
-                    status=2,
-                    retry_count=attempt,
-                )
-                return True
-
-            last_error = error_msg
-
-        except Exception as e:
-            last_error = str(e)
-
-        # リトライ
-        if attempt < MAX_RETRY:
-            logger.warning(f"送信リトライ {attempt + 1}/{MAX_RETRY}: user_id={user.id} - {last_error}")
-            time.sleep(2 ** attempt)  # 1, 2, 4秒
-
-    # 全リトライ失敗
-    logger.error(f"送信失敗 (リトライ上限): user_id={user.id} - {last_error}")
-    _create_delivery_item(
-        db, delivery.id, user,
-        document_key=document_key,
-        status=3,
-        retry_count=MAX_RETRY,
-        error_msg=last_error,
-    )
-    _log_event(db, "ERROR", "send_failed_after_retry", plan.id, user.id, user.member_no, delivery.id, last_error)
+    staged=None,
+    context: Optional[str] = None,
+    usage_stats: Optional[dict] = None,
+) -> Optional[bool]:
+    """
+    GPT生成 + メール送信（通常モード・ハイブリッドモード用）。
+    失敗したら再送キューに回して None を返す (配信ループは待たずに次の受信者へ進む)
+    """
+    if _skip_suppressed(db, delivery, user, document_key):
+        return False
 
-    # エラー通知
+    gpt_result = None
     try:
-        send_error_alert(
-            plan_id=plan.id,
-            plan_name=plan.name,
-            error_message=f"リトライ上限到達 ({MAX_RETRY}回): {last_error}",
-            details={
-                "user_id": user.id,
-                "member_no": user.member_no,
-                "email": user.email,
-            }
+        gpt_result = _generate_content(
+            plan, resolved_prompt, api_key, staged, context, usage_stats,
         )
-    except Exception as alert_err:
-        logger.error(f"エラー通知送信失敗: {alert_err}")
+        ok, error_msg = _try_send_email(
+            db, delivery, plan, user,
+            gpt_result, document_key, summary_setting, api_key,
+        )
+    except CircuitOpenError:
+        raise
+    except Exception as e:
+        ok, error_msg = False, str(e)
 
-    return False
+    if ok:
+        _create_delivery_item(
+            db, delivery.id, user,
+            document_key=document_key,
+            status=2,
+        )
+        return True
+
+    # 生成済みなら再送では送信だけやり直す
+    if gpt_result is not None:
+        return _defer_retry(db, delivery, plan, user, document_key, error_msg, gpt=gpt_result)
+    return _defer_retry(
+        db, delivery, plan, user, document_key, error_msg,
+        prompt=resolved_prompt, context=context,
+    )
 
 
 def _send_email_with_retry(
@@ -810,48 +1253,95 @@ def _send_email_with_retry(
     document_key: str,
     summary_setting,
     api_key: str,
-) -> bool:
-    """メール送信のみリトライ付きで実行（バッチモード用、GPT結果は事前生成済み）"""
-    from app.services.report_service import send_error_alert
-
-    last_error = None
+) -> Optional[bool]:
+    """メール送信のみ（バッチモード用、GPT結果は事前生成済み）。失敗したら再送キューに回して None"""
+    if _skip_suppressed(db, delivery, user, document_key):
+        return False
 
-    for attempt in range(MAX_RETRY + 1):
-        ok, error_msg = _try_send_email(
-            db, delivery, plan, user,
-            gpt_result, document_key, summary_setting, api_key,
+    ok, error_msg = _try_send_email(
+        db, delivery, plan, user,
+        gpt_result, document_key, summary_setting, api_key,
+    )
+    if ok:
+        _create_delivery_item(
+            db, delivery.id, user,
+            document_key=document_key,
+            status=2,
         )
-        if ok:
-            _create_delivery_item(
-                db, delivery.id, user,
-                document_key=document_key,
-                status=2,
-                retry_count=attempt,
-            )
-            return True
+        return True
 
-        last_error = error_msg
+    return _defer_retry(db, delivery, plan, user, document_key, error_msg, gpt=gpt_result)
 
-        if attempt < MAX_RETRY:
-            logger.warning(f"メール送信リトライ {attempt + 1}/{MAX_RETRY}: user_id={user.id} - {last_error}")
-            time.sleep(2 ** attempt)
 
-    # 全リトライ失敗
-    logger.error(f"メール送信失敗 (リトライ上限): user_id={user.id} - {last_error}")
-    _create_delivery_item(
-        db, delivery.id, user,
-        document_key=document_key,
-        status=3,
-        retry_count=MAX_RETRY,
-        error_msg=last_error,
-    )
-    _log_event(db, "ERROR", "send_failed_after_retry", plan.id, user.id, user.member_no, delivery.id, last_error)
+def _defer_retry(
+    db: Session,
+    delivery: Delivery,
+    plan: Optional[Plan],
+    user: User,
+    document_key: Optional[str],
+    error_msg: str,
+    item_id: int = None,
+    **payload,
+) -> Optional[bool]:
+    """
+    失敗した1通を再送キューに積む (payload: gpt / prompt+context / manual+unsubscribe_url)。
+    item_id は失敗分再送で置き換える既存の失敗 delivery_item。
+    Redis に積めなければその場で失敗として記録して False
+    """
+    unit = {
+        "delivery_id": delivery.id,
+        "user_id": user.id,
+        "document_key": document_key,
+        "attempt": 1,
+        "item_id": item_id,
+        **payload,
+    }
+    try:
+        delay = retry_queue.push(unit)
+    except Exception as e:
+        logger.error(f"再送キュー追加失敗: user_id={user.id} - {e}")
+        _give_up(db, delivery, plan, user, document_key, error_msg, 0, item_id)
+        return False
+    logger.warning(f"送信失敗、{delay:.0f}秒後に再送: user_id={user.id} - {error_msg}")
+    return None
+
+
+def _give_up(
+    db: Session,
+    delivery: Delivery,
+    plan: Optional[Plan],
+    user: User,
+    document_key: Optional[str],
+    error_msg: str,
+    retry_count: int,
+    item_id: int = None,
+):
+    """リトライ上限: 失敗の delivery_item を記録してアラート (手動送信は plan=None でアラートなし)"""
+    from app.services.report_service import send_error_alert
 
+    logger.error(f"送信失敗 (リトライ上限): user_id={user.id} - {error_msg}")
+    item = db.query(DeliveryItem).filter(DeliveryItem.id == item_id).first() if item_id else None
+    if item:
+        item.retry_count = retry_count
+        item.last_error_message = error_msg
+        db.commit()
+    else:
+        _create_delivery_item(
+            db, delivery.id, user,
+            document_key=document_key,
+            status=3,
+            retry_count=retry_count,
+            error_msg=error_msg,
+        )
+    _log_event("ERROR", "send_failed_after_retry", delivery.plan_id, user.id, user.member_no, delivery.id, error_msg)
+
+    if plan is None:
+        return
     try:
         send_error_alert(
             plan_id=plan.id,
             plan_name=plan.name,
-            error_message=f"リトライ上限到達 ({MAX_RETRY}回): {last_error}",
+            error_message=f"リトライ上限到達 ({retry_count}回): {error_msg}",
             details={
                 "user_id": user.id,
                 "member_no": user.member_no,
@@ -861,8 +1351,6 @@ def _send_email_with_retry(
     except Exception as alert_err:
         logger.error(f"エラー通知送信失敗: {alert_err}")
 
-    return False
-
 
 def _try_send_email(
     db: Session,
@@ -904,7 +1392,6 @@ def _try_send_email(
             subject=subject,
             body=body_html,
             is_html=True,
-            api_key=api_key,
         )
 
         # 件名をDeliveryに保存 (初回のみ)
@@ -934,6 +1421,8 @@ def _try_send_email(
 
         return True, ""
 
+    except CircuitOpenError:
+        raise
     except Exception as e:
         return False, str(e)
 
@@ -943,7 +1432,10 @@ def _try_send_email(
 # =========================================================
 
 def retry_failed_delivery(db: Session, delivery_id: int, api_key: str = None) -> dict:
-    """失敗したdelivery_itemのユーザーにのみ再送"""
+    """
+    失敗したdelivery_itemのユーザーにのみ再送する。
+    その場では送らず再送キューに積み、Worker の再送スレッドが並列に送る (結果は配信の件数に反映)
+    """
     delivery = db.query(Delivery).filter(Delivery.id == delivery_id).first()
     if not delivery:
         return {"error": "Delivery not found"}
@@ -959,31 +1451,24 @@ def retry_failed_delivery(db: Session, delivery_id: int, api_key: str = None) ->
     ).all()
 
     if not failed_items:
-        return {"message": "No failed items to retry", "retried": 0, "success": 0, "failed": 0}
+        return {"message": "No failed items to retry", "retried": 0, "queued": 0}
 
     # 質問定義・外部データ・サマリー設定を取得
     questions = db.query(PlanQuestion).filter(PlanQuestion.plan_id == plan.id).order_by(PlanQuestion.sort_order).all()
 
-    external_setting = db.query(PlanExternalDataSetting).filter(
-        PlanExternalDataSetting.plan_id == plan.id
-    ).first()
-
-    external_data_str = ""
-    if external_setting:
-        firebase_key_enc = _get_firebase_credential(db, external_setting)
-        if firebase_key_enc:
-            external_data_str, _ = load_external_data(
-                external_setting.external_data_path,
-                firebase_key_enc,
-            )
+    external_data_str, _ = _load_plan_external_data(db, plan)
 
     summary_setting = get_summary_setting(db, plan.id)
 
-    success_count = 0
-    fail_count = 0
+    users = {
+        u.id: u for u in db.query(User).filter(
+            User.id.in_({item.user_id for item in failed_items}),
+        )
+    }
 
+    queued = 0
     for item in failed_items:
-        user = db.query(User).filter(User.id == item.user_id).first()
+        user = users.get(item.user_id)
         if not user:
             continue
 
@@ -991,60 +1476,129 @@ def retry_failed_delivery(db: Session, delivery_id: int, api_key: str = None) ->
         if not user.is_active or not user.deliverable or not user.email_verified:
             continue
 
-        # プロンプト生成
-        user_answers = db.query(UserAnswer).filter(UserAnswer.user_id == user.id).all()
-        answers_dict = _build_answers_with_fallback(db, user.id, plan.id, questions, user_answers)
-
-        user_prompt = plan.prompt
-        if summary_setting:
-            summaries = get_recent_summaries(
-                db, plan.id, user.id, summary_setting.summary_inject_count
+        if delivery.send_type == "manual":
+            unsubscribe_url = (
+                f"{settings.SITE_URL}/api/me/unsubscribe?token={user.unsubscribe_token}"
+                if user.unsubscribe_token else None
+            )
+            payload = {"manual": True, "unsubscribe_url": unsubscribe_url}
+        else:
+            resolved_prompt, context = _build_user_prompt(
+                db, plan, plan.prompt, user, questions, summary_setting,
+                external_data=external_data_str or None,
             )
-            user_prompt = inject_summaries_into_prompt(user_prompt, summaries)
+            payload = {"prompt": resolved_prompt, "context": context}
 
-        resolved_prompt = resolve_variables(
-            text=user_prompt,
-            external_data=external_data_str or None,
-            answers=answers_dict,
-            user_name=f"{user.name_last} {user.name_first}",
-            name_last=user.name_last,
-            name_first=user.name_first,
+        deferred = _defer_retry(
+            db, delivery, plan, user, item.document_key, item.last_error_message or "",
+            item_id=item.id, **payload,
         )
+        if deferred is None:
+            queued += 1
 
-        # リトライ送信
-        ok = _send_with_retry(
-            db=db,
-            delivery=delivery,
-            plan=plan,
-            user=user,
-            resolved_prompt=resolved_prompt,
-            document_key=item.document_key,
-            summary_setting=summary_setting,
-            api_key=api_key,
-        )
+    # 積み終わったら、最後の1件を処理した再送スレッドが件数・ステータスを更新する
+    if queued:
+        try:
+            if retry_queue.close_delivery(delivery.id):
+                _finish_delivery(db, delivery)
+        except Exception as e:
+            logger.warning(f"再送キュー確認失敗: delivery_id={delivery.id} - {e}")
 
-        if ok:
-            # 元のfailed itemを削除（新しいitemが作成されている）
-            db.delete(item)
-            db.commit()
-            success_count += 1
+    return {
+        "message": "Retry queued",
+        "retried": len(failed_items),
+        "queued": queued,
+    }
+
+
+def process_retry_unit(db: Session, member: str, unit: dict):
+    """
+    再送キューから取り出した1通を送る (app.worker.retry_worker から並列に呼ばれる)。
+    失敗したら attempt を進めて積み直し、MAX_RETRY 回目の失敗で諦める。
+    """
+    delivery_id = unit["delivery_id"]
+    attempt = unit["attempt"]
+    delivery = db.query(Delivery).filter(Delivery.id == delivery_id).first()
+    user = db.query(User).filter(User.id == unit["user_id"]).first()
+    if not delivery or not user or delivery.status == "stopped":
+        _resolve_retry(db, member, delivery_id)
+        return
+
+    # 配信ループ側 (途中再開等) で送信済みになっていれば送らない
+    already_sent = db.query(DeliveryItem.id).filter(
+        DeliveryItem.delivery_id == delivery_id,
+        DeliveryItem.user_id == user.id,
+        DeliveryItem.document_key == unit["document_key"],
+        DeliveryItem.status == 2,
+    ).first()
+    if already_sent:
+        _resolve_retry(db, member, delivery_id)
+        return
+
+    # 待っている間に bounce/complaint を受けたアドレス
+    if is_suppressed(user.email):
+        if not unit.get("item_id"):
+            _skip_suppressed(db, delivery, user, unit["document_key"])
+        _resolve_retry(db, member, delivery_id)
+        return
+
+    plan = None
+    message_id = None
+    try:
+        if unit.get("manual"):
+            result = send_email(
+                to_email=user.email,
+                subject=delivery.subject,
+                body=delivery.body,
+                unsubscribe_url=unit.get("unsubscribe_url"),
+            )
+            ok, error_msg, message_id = True, "", result.get("id")
         else:
-            fail_count += 1
+            plan = db.query(Plan).filter(Plan.id == delivery.plan_id).first()
+            if not plan:
+                _resolve_retry(db, member, delivery_id)
+                return
+            if not unit.get("gpt"):
+                unit["gpt"] = _generate_content(plan, unit["prompt"], None, context=unit.get("context"))
+                # 次の再送では生成をやり直さない
+                unit.pop("prompt", None)
+                unit.pop("context", None)
+            ok, error_msg = _try_send_email(
+                db, delivery, plan, user,
+                unit["gpt"], unit["document_key"], get_summary_setting(db, plan.id), None,
+            )
+    except CircuitOpenError as e:
+        # プロバイダ障害中は試行回数に数えずに待つ
+        retry_queue.reschedule(member, unit, delay=e.retry_after)
+        return
+    except Exception as e:
+        ok, error_msg = False, str(e)
+
+    if ok:
+        if unit.get("item_id"):
+            db.query(DeliveryItem).filter(DeliveryItem.id == unit["item_id"]).delete(synchronize_session=False)
+        _create_delivery_item(
+            db, delivery_id, user,
+            document_key=unit["document_key"],
+            status=2,
+            retry_count=attempt,
+            resend_message_id=message_id,
+        )
+        logger.info(f"再送成功: delivery_id={delivery_id}, user_id={user.id}, attempt={attempt}", extra=PER_RECIPIENT)
+    elif attempt < MAX_RETRY:
+        unit["attempt"] = attempt + 1
+        delay = retry_queue.reschedule(member, unit)
+        logger.warning(f"再送失敗 {attempt}/{MAX_RETRY}、{delay:.0f}秒後に再送: user_id={user.id} - {error_msg}")
+        return
+    else:
+        _give_up(db, delivery, plan, user, unit["document_key"], error_msg, attempt, unit.get("item_id"))
 
-        time.sleep(5)  # スロットリング
+    _resolve_retry(db, member, delivery_id)
 
-    # delivery統計を更新
-    delivery.success_count = (delivery.success_count or 0) + success_count
-    delivery.fail_count = max(0, (delivery.fail_count or 0) - success_count)
-    if delivery.fail_count == 0:
-        delivery.status = "success"
-    elif delivery.success_count > 0:
-        delivery.status = "partial_failed"
-    db.commit()
 
-    return {
-        "message": "Retry completed",
-        "retried": len(failed_items),
-        "success": success_count,
-        "failed": fail_count,
-    }
+def _resolve_retry(db: Session, member: str, delivery_id: int):
+    """再送キューの1件を片付け、それが配信の最後の1件なら配信を締める"""
+    if retry_queue.resolve(member, delivery_id):
+        delivery = db.query(Delivery).filter(Delivery.id == delivery_id).first()
+        if delivery:
+            _finish_delivery(db, delivery)
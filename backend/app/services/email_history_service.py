@@ -2,19 +2,32 @@
 
 ユーザーへの送信メールを履歴として保存し、
 ユーザー×プランごとに最新1件のみ保持する。
+
+本文HTMLは email_bodies に内容アドレス (SHA-256) で重複排除して zstd 圧縮保存し、
+履歴行はその ID を参照する。共通コンテンツのプランでは本文の書き込みは1回だけになる。
 """
-from datetime import datetime
+import hashlib
+from datetime import date, datetime
+from typing import Optional
 from zoneinfo import ZoneInfo
+from sqlalchemy import select, exists
+from sqlalchemy.dialects.mysql import insert as mysql_insert
 from sqlalchemy.orm import Session
 
+from app.models.email_body import EmailBody
 from app.models.user_email_history import UserEmailHistory
 from app.core.logging import get_logger
 
 logger = get_logger(__name__)
 JST = ZoneInfo("Asia/Tokyo")
 
-# 保持する履歴の最大件数（プランごと）
-MAX_HISTORY_PER_USER_PLAN = 1
+try:
+    import zstandard
+except ImportError:  # zstandard未導入時は無圧縮で保存
+    zstandard = None
+
+ZSTD_LEVEL = 3
+CLEANUP_BATCH = 500  # 孤立本文の削除で1トランザクションにロックする件数
 
 
 def save_email_history(
@@ -26,8 +39,8 @@ def save_email_history(
     body_html: str,
 ) -> None:
     """
-    メール履歴を保存し、1件を超えた古い履歴を削除する。
-    
+    メール履歴を保存する (ユーザー×プランの既存行を上書き)。
+
     Args:
         db: DBセッション
         user_id: ユーザーID
@@ -37,33 +50,109 @@ def save_email_history(
         body_html: メール本文（HTML）
     """
     now = datetime.now(JST)
-    
-    # 履歴を挿入
-    history = UserEmailHistory(
+    body_id = _get_or_create_body(db, body_html)
+
+    stmt = mysql_insert(UserEmailHistory).values(
         user_id=user_id,
         plan_id=plan_id,
         delivery_id=delivery_id,
         subject=subject,
-        body_html=body_html,
+        body_id=body_id,
+        body_html=None,
         sent_at=now,
     )
-    db.add(history)
+    db.execute(stmt.on_duplicate_key_update(
+        delivery_id=stmt.inserted.delivery_id,
+        subject=stmt.inserted.subject,
+        body_id=stmt.inserted.body_id,
+        body_html=None,
+        sent_at=stmt.inserted.sent_at,
+    ))
     db.flush()
-    
-    # 1件を超えた古い履歴を削除
-    _cleanup_old_history(db, user_id, plan_id)
-
-
-def _cleanup_old_history(db: Session, user_id: int, plan_id: int) -> None:
-    """1件を超えた古い履歴を削除"""
-    old_ids = db.query(UserEmailHistory.id).filter(
-        UserEmailHistory.user_id == user_id,
-        UserEmailHistory.plan_id == plan_id,
-    ).order_by(UserEmailHistory.sent_at.desc()).offset(MAX_HISTORY_PER_USER_PLAN).all()
-    
-    if old_ids:
-        ids_to_delete = [x[0] for x in old_ids]
-        db.query(UserEmailHistory).filter(
-            UserEmailHistory.id.in_(ids_to_delete)
-        ).delete(synchronize_session=False)
-        logger.debug(f"古いメール履歴を削除: user_id={user_id}, plan_id={plan_id}, count={len(ids_to_delete)}")
+
+
+def load_body_html(db: Session, history: UserEmailHistory) -> str:
+    """履歴の本文HTMLを取得 (移行前の行は body_html をそのまま返す)"""
+    if history.body_id is None:
+        return history.body_html or ""
+    body = db.get(EmailBody, history.body_id)
+    if body is None:
+        return history.body_html or ""
+    return _decompress(body.body, body.compression)
+
+
+def cleanup_orphan_bodies(db: Session, before: date) -> int:
+    """
+    どの履歴からも参照されなくなった本文を削除 (当日作成分は送信中の可能性があるため対象外)
+
+    古い本文も同じ内容の送信で再利用されるため、候補の行を FOR UPDATE でロックしてから
+    同じトランザクション内で参照を読み直し、参照されていないものだけを削除する。
+    送信側は再利用する本文を共有ロックで読むので、履歴の書き込みが終わるまで削除されない。
+    """
+    referenced = exists().where(UserEmailHistory.body_id == EmailBody.id)
+    candidates = [
+        body_id for (body_id,) in db.query(EmailBody.id).filter(
+            EmailBody.created_at < before,
+            ~referenced,
+        ).all()
+    ]
+    db.commit()  # 候補を読んだスナップショットを閉じ、以降はロック付きで最新を読む
+
+    deleted = 0
+    for start in range(0, len(candidates), CLEANUP_BATCH):
+        chunk = candidates[start:start + CLEANUP_BATCH]
+        locked = db.execute(
+            select(EmailBody.id).where(EmailBody.id.in_(chunk)).with_for_update()
+        ).scalars().all()
+        in_use = set(db.execute(
+            select(UserEmailHistory.body_id).where(UserEmailHistory.body_id.in_(locked)).with_for_update(read=True)
+        ).scalars().all())
+        orphans = [body_id for body_id in locked if body_id not in in_use]
+        if orphans:
+            deleted += db.query(EmailBody).filter(
+                EmailBody.id.in_(orphans),
+            ).delete(synchronize_session=False)
+        db.commit()
+    return deleted
+
+
+def _get_or_create_body(db: Session, body_html: str) -> int:
+    """本文を内容アドレスで取得 or 作成し、ID を返す"""
+    raw = body_html.encode("utf-8")
+    content_hash = hashlib.sha256(raw).hexdigest()
+
+    # 既存の本文を再利用する場合は、履歴を書き込むまで削除されないよう共有ロックで読む
+    body_id = _find_body_id(db, content_hash)
+    if body_id is not None:
+        return body_id
+
+    data, compression = _compress(raw)
+    # 同一本文の同時挿入は一意制約で1行に収束させる
+    stmt = mysql_insert(EmailBody).values(
+        content_hash=content_hash,
+        compression=compression,
+        body=data,
+        original_size=len(raw),
+    )
+    db.execute(stmt.on_duplicate_key_update(content_hash=stmt.inserted.content_hash))
+    return _find_body_id(db, content_hash)
+
+
+def _find_body_id(db: Session, content_hash: str) -> Optional[int]:
+    return db.execute(
+        select(EmailBody.id).where(EmailBody.content_hash == content_hash).with_for_update(read=True)
+    ).scalar_one_or_none()
+
+
+def _compress(raw: bytes) -> tuple[bytes, str]:
+    if zstandard is None:
+        return raw, "none"
+    return zstandard.ZstdCompressor(level=ZSTD_LEVEL).compress(raw), "zstd"
+
+
+def _decompress(data: bytes, compression: str) -> str:
+    if compression == "zstd":
+        if zstandard is None:
+            raise RuntimeError("zstd圧縮された本文の展開には zstandard パッケージが必要です")
+        data = zstandard.ZstdDecompressor().decompress(data)
+    return data.decode("utf-8")
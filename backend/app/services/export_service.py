@@ -0,0 +1,263 @@
+"""管理画面のデータエクスポート (CSV / JSONL ストリーミング)
+
+件数に関わらず一定メモリで出力できるよう、
+- サーバーサイドカーソル (yield_per) で行を少しずつ読み
+- 一定行数ごとにエンコードしてチャンクとして返す。
+
+StreamingResponse の本文はリクエストの依存関係 (get_db) の終了後に読まれるため、
+各ジェネレーターは自前でセッションを開いて最後に閉じる。
+同期ジェネレーターなので Starlette がスレッドプールで回し、イベントループは塞がない。
+"""
+import csv
+import io
+import json
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Callable, Iterable, Iterator, Optional
+from zoneinfo import ZoneInfo
+
+from app.core.database import SessionLocal
+from app.core.logging import get_logger
+from app.models.delivery_item import DeliveryItem
+from app.models.plan import Plan
+from app.models.plan_question import PlanQuestion
+from app.models.subscription import Subscription
+from app.models.user import User
+from app.models.user_answer import UserAnswer
+
+logger = get_logger(__name__)
+JST = ZoneInfo("Asia/Tokyo")
+UTC = ZoneInfo("UTC")
+
+FORMATS = ("csv", "jsonl")
+MEDIA_TYPES = {
+    "csv": "text/csv; charset=utf-8",
+    "jsonl": "application/x-ndjson; charset=utf-8",
+}
+FETCH_SIZE = 1000  # サーバーサイドカーソルの取得単位
+CHUNK_ROWS = 500  # この行数ごとに出力チャンクを返す
+
+DELIVERY_ITEM_COLUMNS = (
+    "id", "delivery_id", "user_id", "member_no", "user_name", "email",
+    "status", "retry_count", "sent_at", "error_code", "error_message",
+)
+USER_COLUMNS = (
+    "user_id", "member_no", "email", "name_last", "name_first", "role",
+    "is_active", "email_verified", "deliverable", "user_created_at",
+    "subscription_id", "plan_id", "plan_name", "subscription_status",
+    "cancel_at_period_end", "current_period_end", "trial_end",
+)
+ANSWER_COLUMNS = (
+    "answer_id", "user_id", "member_no", "email", "plan_id",
+    "question_id", "var_name", "label", "answer_value", "updated_at",
+)
+
+
+def delivery_item_rows(delivery_id: int, status: Optional[int] = None) -> Callable[[], Iterator[tuple]]:
+    """配信アイテム (ユーザー情報付き) の行ジェネレーター"""
+    def rows():
+        with _export_session() as db:
+            q = db.query(
+                DeliveryItem.id,
+                DeliveryItem.delivery_id,
+                DeliveryItem.user_id,
+                DeliveryItem.member_no_snapshot,
+                DeliveryItem.status,
+                DeliveryItem.retry_count,
+                DeliveryItem.sent_at,
+                DeliveryItem.last_error_code,
+                DeliveryItem.last_error_message,
+                User.id.label("joined_user_id"),
+                User.name_last,
+                User.name_first,
+                User.email,
+            ).outerjoin(
+                User, DeliveryItem.user_id == User.id,
+            ).filter(DeliveryItem.delivery_id == delivery_id)
+            if status is not None:
+                q = q.filter(DeliveryItem.status == status)
+
+            for r in q.order_by(DeliveryItem.id).yield_per(FETCH_SIZE):
+                yield (
+                    r.id,
+                    r.delivery_id,
+                    r.user_id,
+                    r.member_no_snapshot,
+                    f"{r.name_last} {r.name_first}" if r.joined_user_id else None,
+                    r.email,
+                    r.status,
+                    r.retry_count,
+                    _jst_iso(r.sent_at),
+                    r.last_error_code,
+                    r.last_error_message,
+                )
+    return rows
+
+
+def user_rows(plan_id: Optional[int] = None, subscription_status: Optional[str] = None) -> Callable[[], Iterator[tuple]]:
+    """ユーザー × 購読の行ジェネレーター (購読のないユーザーは購読列が空の1行)"""
+    def rows():
+        with _export_session() as db:
+            q = db.query(
+                User.id,
+                User.member_no,
+                User.email,
+                User.name_last,
+                User.name_first,
+                User.role,
+                User.is_active,
+                User.email_verified,
+                User.deliverable,
+                User.created_at,
+                Subscription.id.label("subscription_id"),
+                Subscription.plan_id,
+                Plan.name.label("plan_name"),
+                Subscription.status,
+                Subscription.cancel_at_period_end,
+                Subscription.current_period_end,
+                Subscription.trial_end,
+            ).outerjoin(
+                Subscription, Subscription.user_id == User.id,
+            ).outerjoin(
+                Plan, Subscription.plan_id == Plan.id,
+            )
+            if plan_id:
+                q = q.filter(Subscription.plan_id == plan_id)
+            if subscription_status:
+                q = q.filter(Subscription.status == subscription_status)
+
+            for r in q.order_by(User.id, Subscription.id).yield_per(FETCH_SIZE):
+                yield (
+                    r.id,
+                    r.member_no,
+                    r.email,
+                    r.name_last,
+                    r.name_first,
+                    r.role,
+                    r.is_active,
+                    r.email_verified,
+                    r.deliverable,
+                    _to_jst_iso(r.created_at),
+                    r.subscription_id,
+                    r.plan_id,
+                    r.plan_name,
+                    r.status,
+                    r.cancel_at_period_end,
+                    _to_jst_iso(r.current_period_end),
+                    _to_jst_iso(r.trial_end),
+                )
+    return rows
+
+
+def answer_rows(plan_id: Optional[int] = None) -> Callable[[], Iterator[tuple]]:
+    """ユーザー回答 (質問定義付き) の行ジェネレーター"""
+    def rows():
+        with _export_session() as db:
+            q = db.query(
+                UserAnswer.id,
+                UserAnswer.user_id,
+                User.member_no,
+                User.email,
+                PlanQuestion.plan_id,
+                UserAnswer.question_id,
+                PlanQuestion.var_name,
+                PlanQuestion.label,
+                UserAnswer.answer_value,
+                UserAnswer.updated_at,
+            ).join(
+                PlanQuestion, UserAnswer.question_id == PlanQuestion.id,
+            ).join(
+                User, UserAnswer.user_id == User.id,
+            )
+            if plan_id:
+                q = q.filter(PlanQuestion.plan_id == plan_id)
+
+            for r in q.order_by(UserAnswer.id).yield_per(FETCH_SIZE):
+                yield (
+                    r.id,
+                    r.user_id,
+                    r.member_no,
+                    r.email,
+                    r.plan_id,
+                    r.question_id,
+                    r.var_name,
+                    r.label,
+                    r.answer_value,
+                    _to_jst_iso(r.updated_at),
+                )
+    return rows
+
+
+def stream_export(fmt: str, columns: tuple, rows: Callable[[], Iterable[tuple]]) -> Iterator[bytes]:
+    """行を CSV (BOM付きUTF-8, Excel対応) または JSONL にエンコードしてチャンクで返す"""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer, lineterminator="\n") if fmt == "csv" else None
+    if writer:
+        buffer.write("\ufeff")
+        writer.writerow(columns)
+        # ヘッダーは即座に返す (最初の行の取得が遅くてもプロキシのタイムアウトにしない)
+        yield _drain(buffer)
+
+    count = 0
+    try:
+        for row in rows():
+            if writer:
+                writer.writerow(_csv_value(v) for v in row)
+            else:
+                buffer.write(json.dumps(dict(zip(columns, row)), ensure_ascii=False))
+                buffer.write("\n")
+            count += 1
+            if count % CHUNK_ROWS == 0:
+                yield _drain(buffer)
+    except Exception as e:
+        # ヘッダー送信後はステータスを変えられないため、ログに残して打ち切る
+        logger.error(f"エクスポート中断: {count}行出力後 - {e}")
+        raise
+    if buffer.tell():
+        yield _drain(buffer)
+    logger.info(f"エクスポート完了: {fmt} {count}行")
+
+
+def _drain(buffer: io.StringIO) -> bytes:
+    data = buffer.getvalue().encode("utf-8")
+    buffer.seek(0)
+    buffer.truncate()
+    return data
+
+
+def export_filename(name: str, fmt: str) -> str:
+    return f"{name}_{datetime.now(JST).strftime('%Y%m%d_%H%M%S')}.{fmt}"
+
+
+@contextmanager
+def _export_session():
+    """エクスポート用のセッション (ジェネレーター終了・中断時に必ず閉じる)"""
+    db = SessionLocal()
+    try:
+        yield db
+    finally:
+        db.close()
+
+
+def _csv_value(value):
+    if isinstance(value, bool):
+        return int(value)
+    return "" if value is None else value
+
+
+def _to_jst_iso(dt: datetime) -> Optional[str]:
+    """UTC保存のカラムをJSTのISO形式に"""
+    if dt is None:
+        return None
+    if dt.tzinfo is None:
+        dt = dt.replace(tzinfo=UTC)
+    return dt.astimezone(JST).isoformat()
+
+
+def _jst_iso(dt: datetime) -> Optional[str]:
+    """JST保存のカラムをISO形式に"""
+    if dt is None:
+        return None
+    if dt.tzinfo is None:
+        dt = dt.replace(tzinfo=JST)
+    return dt.isoformat()
@@ -0,0 +1,174 @@
+"""外部データ (external_data) のトークン予算内への圧縮
+
+Firestoreのドキュメント + サブコレクションをそのまま {external_data} に埋め込むと
+プロンプトが肥大化し、遅い・高い・コンテキスト上限超過でリトライ失敗、となるため
+プランごとのトークン予算に収まるよう決定的に圧縮する。
+
+処理順:
+1. フィールドの許可/除外リストを適用
+2. インデントなしJSONに変換
+3. 長い文字列値の切り詰めと、配列・サブコレクションの要素数削減 (省略件数を残す) を
+   予算に収まるまで段階的に強める
+4. それでも超える場合はテキストを予算位置で切断
+
+同じ入力・同じ設定なら常に同じ出力になる (キーはソート済み)。
+"""
+import json
+from functools import lru_cache
+from typing import Optional
+
+from app.core.logging import get_logger
+
+logger = get_logger(__name__)
+
+try:
+    import tiktoken
+except ImportError:  # tiktoken未導入時は文字数ベースの推定
+    tiktoken = None
+
+# 圧縮の段階: (文字列の最大文字数, 配列・辞書の最大要素数 / None=制限なし)
+COMPACTION_STEPS = (
+    (2000, None), (1000, None), (500, None),
+    (500, 50), (200, 50), (200, 20), (100, 20), (100, 10),
+    (50, 10), (50, 5), (50, 3), (50, 1),
+)
+
+OMITTED_KEY = "_omitted"
+TRUNCATED_MARK = "…"
+CUT_MARK = "\n…(以下省略)"
+
+
+@lru_cache(maxsize=8)
+def _get_encoding(model: Optional[str]):
+    """
+    モデルのエンコーディング。取得できなければ None (文字数ベースの推定に切り替え)。
+    BPEファイルはイメージのビルド時に TIKTOKEN_CACHE_DIR へ取得済みの想定だが、
+    キャッシュがなくダウンロードにも失敗した場合に配信全体を失敗させない。結果はキャッシュする。
+    """
+    if tiktoken is None:
+        return None
+    try:
+        try:
+            return tiktoken.encoding_for_model(model or "gpt-4o-mini")
+        except KeyError:
+            return tiktoken.get_encoding("o200k_base")
+    except Exception as e:
+        logger.warning(f"tiktokenのエンコーディング取得失敗、文字数ベースで推定します: model={model} - {e}")
+        return None
+
+
+def count_tokens(text: str, model: Optional[str] = None) -> int:
+    """ローカルでトークン数を数える (tiktoken未導入時は推定値)"""
+    if not text:
+        return 0
+    encoding = _get_encoding(model)
+    if encoding is not None:
+        return len(encoding.encode(text, disallowed_special=()))
+    # 推定: ASCIIは約4文字/トークン、日本語等は約1文字/トークン
+    ascii_chars = sum(1 for c in text if ord(c) < 128)
+    return ascii_chars // 4 + (len(text) - ascii_chars) + 1
+
+
+def compact_external_data(
+    data_str: str,
+    token_budget: Optional[int] = None,
+    include_fields: Optional[list] = None,
+    exclude_fields: Optional[list] = None,
+    model: Optional[str] = None,
+) -> str:
+    """
+    外部データJSON文字列をフィールド指定とトークン予算に従って圧縮する。
+
+    フィールド指定は "price" のようなキー名 (任意の階層に一致) か
+    "doc.price" のようなルートからのドット区切りパス。
+    token_budget が 0 / None なら予算による圧縮は行わない。
+    """
+    if not data_str or not (token_budget or include_fields or exclude_fields):
+        return data_str
+
+    try:
+        data = json.loads(data_str)
+    except (json.JSONDecodeError, TypeError):
+        return _cut_text(data_str, token_budget, model) if token_budget else data_str
+
+    if include_fields or exclude_fields:
+        data = _filter_fields(data, set(include_fields or []), set(exclude_fields or []), ())
+        if not token_budget:
+            return json.dumps(data, ensure_ascii=False, indent=2, sort_keys=True)
+
+    text = _dumps(data)
+    if count_tokens(text, model) <= token_budget:
+        return text
+
+    for string_limit, item_limit in COMPACTION_STEPS:
+        compacted = _truncate_strings(data, string_limit)
+        if item_limit is not None:
+            compacted = _limit_items(compacted, item_limit)
+        text = _dumps(compacted)
+        if count_tokens(text, model) <= token_budget:
+            return text
+
+    return _cut_text(text, token_budget, model)
+
+
+def _dumps(data) -> str:
+    return json.dumps(data, ensure_ascii=False, separators=(",", ":"), sort_keys=True)
+
+
+def _filter_fields(value, include: set, exclude: set, path: tuple, included: bool = False):
+    """許可/除外リストを適用 (許可リストは一致したキー配下を丸ごと残す)"""
+    if not isinstance(value, dict):
+        return value
+
+    result = {}
+    for key, child in value.items():
+        child_path = path + (str(key),)
+        dotted = ".".join(child_path)
+        if key in exclude or dotted in exclude:
+            continue
+        child_included = included or not include or key in include or dotted in include
+        if isinstance(child, dict):
+            filtered = _filter_fields(child, include, exclude, child_path, child_included)
+            if filtered or child_included:
+                result[key] = filtered
+        elif child_included:
+            result[key] = child
+    return result
+
+
+def _truncate_strings(value, limit: int):
+    if isinstance(value, str):
+        return value if len(value) <= limit else value[:limit] + TRUNCATED_MARK
+    if isinstance(value, dict):
+        return {k: _truncate_strings(v, limit) for k, v in value.items()}
+    if isinstance(value, list):
+        return [_truncate_strings(v, limit) for v in value]
+    return value
+
+
+def _limit_items(value, limit: int):
+    """配列・辞書の要素数を先頭 limit 件に制限 (辞書はキー順)"""
+    if isinstance(value, list):
+        kept = [_limit_items(v, limit) for v in value[:limit]]
+        if len(value) > limit:
+            kept.append({OMITTED_KEY: len(value) - limit})
+        return kept
+    if isinstance(value, dict):
+        keys = sorted(value.keys(), key=str)
+        kept = {k: _limit_items(value[k], limit) for k in keys[:limit]}
+        if len(keys) > limit:
+            kept[OMITTED_KEY] = len(keys) - limit
+        return kept
+    return value
+
+
+def _cut_text(text: str, token_budget: int, model: Optional[str]) -> str:
+    """予算に収まる最長の先頭部分で切断 (二分探索)"""
+    low, high = 0, len(text)
+    while low < high:
+        mid = (low + high + 1) // 2
+        if count_tokens(text[:mid] + CUT_MARK, model) <= token_budget:
+            low = mid
+        else:
+            high = mid - 1
+    return text[:low] + CUT_MARK
@@ -0,0 +1,175 @@
+"""トランザクションメール送信箱の積み込みと取り出し
+
+- 積み込み (enqueue_mail): API・Webhook・スケジューラーから。1行 INSERT して dispatcher を起こすだけ
+- 取り出し (claim_batch): mail_dispatcher から。priority → id 順に SKIP LOCKED で確保する。
+  一括送信の組 (batch_key) はここで決めて保存し、リトライ時は組の全行をまとめて取り出す
+- 失敗は指数バックオフでリトライし、attempts が上限に達したら諦めて SystemLog に残す
+本文の生成と Resend への送信は mail_dispatcher が行う。
+"""
+import json
+import uuid
+from datetime import datetime, timedelta
+from zoneinfo import ZoneInfo
+from sqlalchemy import and_, func, or_
+from sqlalchemy.orm import Session
+
+from app.core.database import SessionLocal
+from app.core.redis import get_sync_redis
+from app.models.mail_outbox import MailOutbox
+from app.services.system_log_sink import log_event
+from app.core.logging import get_logger
+
+logger = get_logger(__name__)
+UTC = ZoneInfo("UTC")
+
+PRIORITY_HIGH = 0
+PRIORITY_NORMAL = 1
+
+PENDING = 0
+SENDING = 1
+SENT = 2
+ERROR = 3
+
+MAX_ATTEMPTS = 8
+RETRY_BASE_SECONDS = 15  # 15秒, 30秒, 1分, ... 最大 RETRY_MAX_SECONDS
+RETRY_MAX_SECONDS = 1800
+STALE_LOCK_SECONDS = 300  # 送信中のまま残った行 (プロセス停止) を再送するまでの秒数
+SENT_RETENTION_DAYS = 7
+
+WAKE_KEY = "mail_outbox:wake"  # 積み込み時に dispatcher を待機から起こす
+METRICS_KEY = "metrics:mail_outbox"  # dispatcher が書く滞留状況 (health で公開)
+
+
+def _utcnow() -> datetime:
+    return datetime.now(UTC).replace(tzinfo=None)
+
+
+def enqueue_mail(kind: str, to_email: str, params: dict, priority: int = PRIORITY_NORMAL) -> bool:
+    """送信箱に1通積む (成功したら True)"""
+    db = SessionLocal()
+    try:
+        db.add(MailOutbox(
+            kind=kind,
+            to_email=to_email,
+            params=json.dumps(params, ensure_ascii=False),
+            priority=priority,
+            status=PENDING,
+        ))
+        db.commit()
+    except Exception as e:
+        db.rollback()
+        logger.error(f"メール送信箱への追加失敗: kind={kind}, to={to_email} - {e}")
+        return False
+    finally:
+        db.close()
+
+    try:
+        get_sync_redis().lpush(WAKE_KEY, 1)
+    except Exception as e:
+        logger.debug(f"mail_dispatcher 起床通知スキップ: {e}")
+    return True
+
+
+def claim_batch(db: Session, limit: int) -> list[MailOutbox]:
+    """送信対象を priority → id 順に確保して SENDING にする"""
+    now = _utcnow()
+    entries = db.query(MailOutbox).filter(
+        or_(
+            MailOutbox.status == PENDING,
+            and_(
+                MailOutbox.status == ERROR,
+                MailOutbox.attempts < MAX_ATTEMPTS,
+                MailOutbox.next_attempt_at <= now,
+            ),
+            and_(
+                MailOutbox.status == SENDING,
+                MailOutbox.locked_at < now - timedelta(seconds=STALE_LOCK_SECONDS),
+            ),
+        )
+    ).order_by(
+        MailOutbox.priority, MailOutbox.id,
+    ).limit(limit).with_for_update(skip_locked=True).all()
+
+    # 前回一括送信した組は、残りの行も取り出して同じ組で送り直す
+    keys = {entry.batch_key for entry in entries if entry.batch_key}
+    if keys:
+        claimed = {entry.id for entry in entries}
+        entries += db.query(MailOutbox).filter(
+            MailOutbox.batch_key.in_(keys),
+            MailOutbox.id.notin_(claimed),
+            MailOutbox.status.in_([ERROR, SENDING]),
+            MailOutbox.attempts < MAX_ATTEMPTS,
+        ).with_for_update(skip_locked=True).all()
+
+    # 組のない行が2通以上なら新しい組にする (送信前にコミットし、プロセス停止後も同じ組で送る)
+    fresh = [entry for entry in entries if not entry.batch_key]
+    if len(fresh) > 1:
+        batch_key = f"outbox-batch-{uuid.uuid4().hex}"
+        for entry in fresh:
+            entry.batch_key = batch_key
+
+    for entry in entries:
+        entry.status = SENDING
+        entry.locked_at = now
+        entry.attempts += 1
+    db.commit()
+    return entries
+
+
+def mark_sent(db: Session, entry: MailOutbox, message_id: str | None):
+    entry.status = SENT
+    entry.sent_at = _utcnow()
+    entry.provider_message_id = message_id
+    entry.params = None  # 認証コード・仮パスワードを残さない
+    entry.last_error = None
+
+
+def mark_failed(db: Session, entry: MailOutbox, error: str):
+    delay = min(RETRY_BASE_SECONDS * 2 ** (entry.attempts - 1), RETRY_MAX_SECONDS)
+    entry.status = ERROR
+    entry.last_error = error[:1000]
+    entry.next_attempt_at = _utcnow() + timedelta(seconds=delay)
+
+    if entry.attempts >= MAX_ATTEMPTS:
+        entry.params = None
+        logger.error(f"メール送信失敗 (リトライ上限): outbox_id={entry.id}, kind={entry.kind}, to={entry.to_email} - {error}")
+        log_event(
+            "ERROR", "mail_outbox_failed",
+            f"{entry.kind} → {entry.to_email}: {error}",
+            details={"outbox_id": entry.id, "attempts": entry.attempts},
+        )
+    else:
+        logger.warning(
+            f"メール送信失敗: outbox_id={entry.id}, kind={entry.kind}, "
+            f"attempt={entry.attempts}/{MAX_ATTEMPTS}, {delay}秒後にリトライ - {error}"
+        )
+
+
+def defer_mail(db: Session, entry: MailOutbox, seconds: float, reason: str):
+    """送信せずに後回しにする (送信先プロバイダのブレーカー OPEN 中。試行回数には数えない)"""
+    entry.status = ERROR
+    entry.attempts = max(0, entry.attempts - 1)
+    entry.last_error = reason[:1000]
+    entry.next_attempt_at = _utcnow() + timedelta(seconds=max(1, int(seconds)))
+
+
+def outbox_lag(db: Session) -> dict:
+    """未送信件数と、最も古い未送信メールの経過秒数 (送信待ち・リトライ待ちを含む)"""
+    count, oldest = db.query(func.count(MailOutbox.id), func.min(MailOutbox.created_at)).filter(
+        or_(
+            MailOutbox.status.in_([PENDING, SENDING]),
+            and_(MailOutbox.status == ERROR, MailOutbox.attempts < MAX_ATTEMPTS),
+        )
+    ).one()
+    lag = (_utcnow() - oldest).total_seconds() if oldest else 0
+    return {"pending": count, "lag_seconds": max(0, int(lag))}
+
+
+def purge_sent_mails(db: Session, days: int = SENT_RETENTION_DAYS) -> int:
+    """送信済みメールを保持期間経過後に削除"""
+    deleted = db.query(MailOutbox).filter(
+        MailOutbox.status == SENT,
+        MailOutbox.sent_at < _utcnow() - timedelta(days=days),
+    ).delete(synchronize_session=False)
+    db.commit()
+    return deleted
@@ -0,0 +1,336 @@
+"""メール送信トランスポート
+
+Resend SDK のモジュールグローバル (resend.api_key) を使わず、トランスポートごとに
+APIキー・タイムアウト・コネクションプールを持つ。スレッド間で共有してよい。
+
+- ResendTransport: Resend HTTP API (keep-alive の httpx.Client を使い回す)
+- SmtpTransport: SMTP (接続をプールして使い回す)。ローカルの SMTP スタンドイン
+  (負荷試験用) や Resend 障害時のフォールバック先に使う
+- FallbackTransport: 主トランスポートが確実に送っていない一時的な失敗 (接続失敗・429・5xx・
+  ブレーカー OPEN) を返したら副トランスポートで送る。読み取りタイムアウト等、相手が受け付けた
+  可能性がある失敗では送らない (二重送信になるため)
+Resend への呼び出しはサーキットブレーカー (circuit_breaker.resend_breaker) を通し、
+OPEN 中は送らずに CircuitOpenError を投げる (フォールバックがあればそちらで送る)。
+
+メッセージは Resend の送信形式の dict:
+    {"from": str, "to": [str], "subject": str, "html": str, "headers": {...} (任意)}
+
+idempotency_key を渡すと Resend には Idempotency-Key ヘッダーで送り、タイムアウト後の
+再送で同じリクエストが二重に送られないようにする (Resend 側で24時間有効。SMTP では無視)。
+"""
+import queue
+import smtplib
+import threading
+import time
+from contextlib import contextmanager
+from email.message import EmailMessage
+from email.utils import make_msgid
+
+import httpx
+
+from app.core.config import settings
+from app.core.api_keys import get_resend_api_key
+from app.services.circuit_breaker import CircuitOpenError, resend_breaker
+from app.core.logging import get_logger
+
+logger = get_logger(__name__)
+
+RESEND_API_URL = "https://api.resend.com"
+KEY_CACHE_SECONDS = 60  # 管理画面で変更された Resend APIキーはこの秒数以内に反映
+SMTP_IDLE_SECONDS = 60  # これより長く使っていないプール内の接続は NOOP で生存確認する
+
+
+class MailTransportError(Exception):
+    """
+    送信失敗。retryable=False はリトライしても成功しない (宛先不正・認証エラー等)。
+    may_have_sent=True は送信先が受け付けたかどうか分からない失敗 (応答待ちのタイムアウト等)。
+    """
+
+    def __init__(self, message: str, status_code: int = None, retryable: bool = True, may_have_sent: bool = False):
+        super().__init__(message)
+        self.status_code = status_code
+        self.retryable = retryable
+        self.may_have_sent = may_have_sent
+
+
+class MailTransport:
+    name = "base"
+
+    def send(self, message: dict, idempotency_key: str = None) -> dict:
+        """1通送信して {"id": メッセージID} を返す。失敗時は MailTransportError"""
+        raise NotImplementedError
+
+    def send_batch(self, messages: list[dict], idempotency_key: str = None) -> list[dict]:
+        """複数送信 (既定は1通ずつ)。戻り値は messages と同じ順の [{"id": ...}]"""
+        return [self.send(message) for message in messages]
+
+    def close(self):
+        pass
+
+
+class ResendTransport(MailTransport):
+    name = "resend"
+
+    def __init__(
+        self,
+        api_key: str,
+        timeout: float = 10.0,
+        connect_timeout: float = 5.0,
+        pool_size: int = 10,
+        base_url: str = RESEND_API_URL,
+    ):
+        self._client = httpx.Client(
+            base_url=base_url,
+            headers={"Authorization": f"Bearer {api_key}"},
+            timeout=httpx.Timeout(timeout, connect=connect_timeout),
+            limits=httpx.Limits(max_connections=pool_size, max_keepalive_connections=pool_size),
+        )
+
+    def _post(self, path: str, payload, idempotency_key: str = None):
+        headers = {"Idempotency-Key": idempotency_key} if idempotency_key else None
+        # 宛先不正等 (retryable=False) は Resend 自体は正常なのでブレーカーに数えない
+        with resend_breaker.guard(is_failure=lambda e: getattr(e, "retryable", True)):
+            try:
+                response = self._client.post(path, json=payload, headers=headers)
+            except (httpx.ConnectError, httpx.ConnectTimeout, httpx.PoolTimeout) as e:
+                # リクエストを送る前の失敗
+                raise MailTransportError(f"Resend接続エラー: {e!r}") from e
+            except httpx.TransportError as e:
+                # 送信後の読み取りタイムアウト等: Resend が受け付けた可能性がある
+                raise MailTransportError(f"Resend通信エラー: {e!r}", may_have_sent=True) from e
+            if response.status_code >= 400:
+                # 429 (レート制限) と 5xx は時間をおけば通る
+                retryable = response.status_code == 429 or response.status_code >= 500
+                raise MailTransportError(
+                    f"Resend {response.status_code}: {response.text[:500]}",
+                    status_code=response.status_code,
+                    retryable=retryable,
+                )
+        return response.json()
+
+    def send(self, message: dict, idempotency_key: str = None) -> dict:
+        return self._post("/emails", message, idempotency_key)
+
+    def send_batch(self, messages: list[dict], idempotency_key: str = None) -> list[dict]:
+        """Batch API で1リクエスト送信 (最大100通、1通でも不正なら全体が失敗する)"""
+        return self._post("/emails/batch", messages, idempotency_key)["data"]
+
+    def close(self):
+        self._client.close()
+
+
+class SmtpTransport(MailTransport):
+    name = "smtp"
+
+    def __init__(
+        self,
+        host: str,
+        port: int = 25,
+        username: str = "",
+        password: str = "",
+        starttls: bool = False,
+        timeout: float = 10.0,
+        pool_size: int = 4,
+    ):
+        self._host = host
+        self._port = port
+        self._username = username
+        self._password = password
+        self._starttls = starttls
+        self._timeout = timeout
+        self._slots = threading.BoundedSemaphore(pool_size)
+        self._idle = queue.LifoQueue()  # (SMTP, 最終使用時刻)
+
+    def _connect(self) -> smtplib.SMTP:
+        conn = smtplib.SMTP(self._host, self._port, timeout=self._timeout)
+        if self._starttls:
+            conn.starttls()
+        if self._username:
+            conn.login(self._username, self._password)
+        return conn
+
+    def _checkout(self) -> smtplib.SMTP:
+        while True:
+            try:
+                conn, last_used = self._idle.get_nowait()
+            except queue.Empty:
+                return self._connect()
+            if time.monotonic() - last_used < SMTP_IDLE_SECONDS:
+                return conn
+            try:
+                if conn.noop()[0] == 250:
+                    return conn
+            except smtplib.SMTPException:
+                pass
+            _quit(conn)
+
+    @contextmanager
+    def _connection(self):
+        self._slots.acquire()
+        conn = None
+        try:
+            conn = self._checkout()
+            yield conn
+            self._idle.put((conn, time.monotonic()))
+            conn = None
+        finally:
+            if conn is not None:
+                _quit(conn)  # 失敗した接続はプールに戻さない
+            self._slots.release()
+
+    def send(self, message: dict, idempotency_key: str = None) -> dict:
+        mime = _to_mime(message)
+        try:
+            with self._connection() as conn:
+                conn.send_message(mime)
+        except smtplib.SMTPResponseException as e:
+            # 4xx は一時的、5xx は恒久的なエラー
+            raise MailTransportError(
+                f"SMTP {e.smtp_code}: {e.smtp_error!r}",
+                status_code=e.smtp_code,
+                retryable=e.smtp_code < 500,
+            ) from e
+        except smtplib.SMTPRecipientsRefused as e:
+            raise MailTransportError(f"SMTP 宛先拒否: {e.recipients!r}", retryable=False) from e
+        except (smtplib.SMTPServerDisconnected, TimeoutError) as e:
+            # 送信途中の切断・タイムアウト: サーバーが受け付けた可能性がある
+            raise MailTransportError(f"SMTP通信エラー: {e!r}", may_have_sent=True) from e
+        except (smtplib.SMTPException, OSError) as e:
+            raise MailTransportError(f"SMTP接続エラー: {e!r}") from e
+        return {"id": mime["Message-ID"]}
+
+    def close(self):
+        while True:
+            try:
+                conn, _ = self._idle.get_nowait()
+            except queue.Empty:
+                return
+            _quit(conn)
+
+
+class FallbackTransport(MailTransport):
+    """主トランスポートが確実に送っていない一時的な失敗か、ブレーカー OPEN のときだけ副トランスポートで送る"""
+
+    def __init__(self, primary: MailTransport, fallback: MailTransport):
+        self.primary = primary
+        self.fallback = fallback
+        self.name = f"{primary.name}+{fallback.name}"
+
+    def send(self, message: dict, idempotency_key: str = None) -> dict:
+        try:
+            return self.primary.send(message, idempotency_key)
+        except (MailTransportError, CircuitOpenError) as e:
+            if not _can_fall_back(e):
+                raise
+            logger.warning(f"{self.primary.name} 送信失敗、{self.fallback.name} で再送: {e}")
+            return self.fallback.send(message, idempotency_key)
+
+    def send_batch(self, messages: list[dict], idempotency_key: str = None) -> list[dict]:
+        try:
+            return self.primary.send_batch(messages, idempotency_key)
+        except (MailTransportError, CircuitOpenError) as e:
+            if not _can_fall_back(e):
+                raise
+            logger.warning(f"{self.primary.name} 一括送信失敗、{self.fallback.name} で再送 ({len(messages)}通): {e}")
+            return self.fallback.send_batch(messages, idempotency_key)
+
+    def close(self):
+        self.primary.close()
+        self.fallback.close()
+
+
+def _can_fall_back(error: Exception) -> bool:
+    """副トランスポートで送ってよいか (主トランスポートで送られていないことが確実な一時的失敗のみ)"""
+    if isinstance(error, CircuitOpenError):
+        return True
+    return error.retryable and not error.may_have_sent
+
+
+def _quit(conn: smtplib.SMTP):
+    try:
+        conn.quit()
+    except Exception:
+        conn.close()
+
+
+def _to_mime(message: dict) -> EmailMessage:
+    mime = EmailMessage()
+    mime["From"] = message["from"]
+    mime["To"] = ", ".join(message["to"])
+    mime["Subject"] = message["subject"]
+    mime["Message-ID"] = make_msgid()
+    for key, value in (message.get("headers") or {}).items():
+        mime[key] = value
+    mime.set_content(message["html"], subtype="html")
+    return mime
+
+
+# =========================================================
+# プロセス内で共有するトランスポート
+# =========================================================
+
+_lock = threading.Lock()
+_transport: MailTransport | None = None
+_transport_key: tuple | None = None
+_resend_key_cache: tuple[float, str] | None = None
+
+
+def _resend_api_key() -> str:
+    """Resend APIキー (DB優先 → 環境変数) を KEY_CACHE_SECONDS だけキャッシュ"""
+    global _resend_key_cache
+    now = time.monotonic()
+    if _resend_key_cache and _resend_key_cache[0] > now:
+        return _resend_key_cache[1]
+    api_key = get_resend_api_key()
+    _resend_key_cache = (now + KEY_CACHE_SECONDS, api_key)
+    return api_key
+
+
+def _build(name: str, resend_key: str) -> MailTransport:
+    if name == "resend":
+        return ResendTransport(
+            resend_key,
+            timeout=settings.RESEND_TIMEOUT,
+            connect_timeout=settings.RESEND_CONNECT_TIMEOUT,
+            pool_size=settings.RESEND_POOL_SIZE,
+        )
+    if name == "smtp":
+        return SmtpTransport(
+            settings.SMTP_HOST,
+            settings.SMTP_PORT,
+            username=settings.SMTP_USERNAME,
+            password=settings.SMTP_PASSWORD,
+            starttls=settings.SMTP_STARTTLS,
+            timeout=settings.SMTP_TIMEOUT,
+            pool_size=settings.SMTP_POOL_SIZE,
+        )
+    raise ValueError(f"未対応のメールトランスポート: {name}")
+
+
+def sending_paused() -> bool:
+    """主トランスポートの Resend がブレーカー OPEN で、フォールバック先もないか"""
+    return (
+        settings.MAIL_TRANSPORT == "resend"
+        and not settings.MAIL_FALLBACK_TRANSPORT
+        and resend_breaker.is_open()
+    )
+
+
+def get_transport() -> MailTransport:
+    """設定 (MAIL_TRANSPORT / MAIL_FALLBACK_TRANSPORT) に従うトランスポート。APIキー変更時は作り直す"""
+    global _transport, _transport_key
+    names = (settings.MAIL_TRANSPORT, settings.MAIL_FALLBACK_TRANSPORT)
+    resend_key = _resend_api_key() if "resend" in names else ""
+    key = (*names, resend_key)
+    if _transport is not None and _transport_key == key:
+        return _transport
+
+    with _lock:
+        if _transport is None or _transport_key != key:
+            transport = _build(names[0], resend_key)
+            if names[1]:
+                transport = FallbackTransport(transport, _build(names[1], resend_key))
+            # 旧トランスポートは送信中のスレッドがあり得るので閉じずに手放す
+            _transport, _transport_key = transport, key
+            logger.info(f"メールトランスポート: {transport.name}")
+    return _transport
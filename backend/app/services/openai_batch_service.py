@@ -0,0 +1,264 @@
+"""OpenAI Batch API サービス
+
+Batch APIモード (plans.openai_batch_enabled) のプランは、定時送信時にGPTを1件ずつ呼ばず、
+全受信者分の解決済みプロンプトをJSONLにまとめてBatchジョブとして投入する。
+スケジューラーがジョブをポーリングし、完了した結果を pregenerated_contents に取り込んでから
+進捗を未実行に戻すため、送信ステージはステージング済みの内容をそのまま送る。
+
+custom_id には事前生成と同じプロンプトハッシュを使うので、取り込み後の参照は
+pregeneration_service と共通になる。
+"""
+import json
+from datetime import date, datetime, time
+from zoneinfo import ZoneInfo
+from sqlalchemy.orm import Session
+
+from app.models.plan import Plan
+from app.models.plan_question import PlanQuestion
+from app.models.progress_plan import ProgressPlan
+from app.models.pregenerated_content import PregeneratedContent
+from app.models.openai_batch_job import OpenAIBatchJob
+from app.services.openai_service import (
+    get_openai_client,
+    build_chat_request,
+    parse_email_content,
+    new_usage_stats,
+    accumulate_usage,
+    record_usage_stats,
+)
+from app.services.pregeneration_service import compute_prompt_hash, record_stats
+from app.core.logging import get_logger
+
+logger = get_logger(__name__)
+JST = ZoneInfo("Asia/Tokyo")
+
+BATCH_ENDPOINT = "/v1/chat/completions"
+BATCH_COMPLETION_WINDOW = "24h"
+BATCH_MAX_REQUESTS = 50000  # 1ジョブあたりの上限件数
+# この時刻までに完了しないジョブはキャンセルし、通常のGPT生成で当日中に送信する
+BATCH_FALLBACK_TIME = time(22, 0)
+
+TERMINAL_STATUSES = {"completed", "failed", "expired", "cancelled"}
+
+
+def has_batch_jobs(db: Session, plan_id: int, target_date: date) -> bool:
+    """指定日のBatchジョブが投入済みか"""
+    return db.query(OpenAIBatchJob.id).filter(
+        OpenAIBatchJob.plan_id == plan_id,
+        OpenAIBatchJob.date == target_date,
+    ).first() is not None
+
+
+def submit_plan_batch(db: Session, plan: Plan, progress: ProgressPlan, api_key: str = None) -> int:
+    """
+    配信対象の全プロンプトをBatchジョブとして投入する。
+    ステージング済みのプロンプトは除外する。
+
+    Returns: 投入したリクエスト数 (0なら投入不要)
+    """
+    from app.services.delivery_service import (
+        _get_target_users, _load_plan_external_data, iter_generation_prompts,
+    )
+    from app.services.summary_service import get_summary_setting
+
+    target_date = progress.date
+    users = _get_target_users(db, plan.id)
+    if not users:
+        return 0
+
+    questions = db.query(PlanQuestion).filter(PlanQuestion.plan_id == plan.id).order_by(PlanQuestion.sort_order).all()
+    external_data_str, split_items = _load_plan_external_data(db, plan)
+    summary_setting = get_summary_setting(db, plan.id)
+
+    seen = {
+        h for (h,) in db.query(PregeneratedContent.prompt_hash).filter(
+            PregeneratedContent.plan_id == plan.id,
+            PregeneratedContent.date == target_date,
+        ).all()
+    }
+
+    requests = []
+    for resolved_prompt, context in iter_generation_prompts(
+        db, plan, plan.prompt, users, questions, split_items, external_data_str, summary_setting,
+    ):
+        prompt_hash = compute_prompt_hash(plan.model, plan.system_prompt, resolved_prompt, context)
+        if prompt_hash in seen:
+            continue
+        seen.add(prompt_hash)
+        requests.append({
+            "custom_id": prompt_hash,
+            "method": "POST",
+            "url": BATCH_ENDPOINT,
+            "body": build_chat_request(resolved_prompt, plan.model, plan.system_prompt, context),
+        })
+
+    if not requests:
+        return 0
+
+    # 全チャンクを投入し終えてからまとめて記録する。途中のチャンクで失敗した場合は
+    # 投入済みのジョブをキャンセルして例外を送出し、呼び出し元の通常生成と二重にならないようにする
+    client = get_openai_client(api_key)
+    submitted = []
+    try:
+        for start in range(0, len(requests), BATCH_MAX_REQUESTS):
+            chunk = requests[start:start + BATCH_MAX_REQUESTS]
+            payload = "\n".join(json.dumps(r, ensure_ascii=False) for r in chunk).encode("utf-8")
+
+            input_file = client.files.create(
+                file=(f"plan{plan.id}_{target_date.isoformat()}_{start}.jsonl", payload),
+                purpose="batch",
+            )
+            batch = client.batches.create(
+                input_file_id=input_file.id,
+                endpoint=BATCH_ENDPOINT,
+                completion_window=BATCH_COMPLETION_WINDOW,
+                metadata={"plan_id": str(plan.id), "date": target_date.isoformat()},
+            )
+            submitted.append((batch.id, input_file.id, len(chunk)))
+
+        now = datetime.now(JST)
+        for batch_id, input_file_id, count in submitted:
+            db.add(OpenAIBatchJob(
+                plan_id=plan.id,
+                date=target_date,
+                progress_id=progress.id,
+                batch_id=batch_id,
+                input_file_id=input_file_id,
+                status="submitted",
+                request_count=count,
+                submitted_at=now,
+            ))
+        db.commit()
+    except Exception:
+        db.rollback()
+        _cancel_submitted(client, [batch_id for batch_id, _, _ in submitted])
+        raise
+
+    for batch_id, _, count in submitted:
+        logger.info(f"Batchジョブ投入: plan_id={plan.id}, batch_id={batch_id}, requests={count}")
+    return len(requests)
+
+
+def _cancel_submitted(client, batch_ids: list[str]):
+    """投入を取りやめたジョブをキャンセルする (失敗しても結果は取り込まれないため警告のみ)"""
+    for batch_id in batch_ids:
+        try:
+            client.batches.cancel(batch_id)
+            logger.info(f"投入中止のためBatchキャンセル: batch_id={batch_id}")
+        except Exception as e:
+            logger.warning(f"Batchキャンセル失敗: batch_id={batch_id} - {e}")
+
+
+def poll_batch_job(db: Session, job: OpenAIBatchJob, client) -> bool:
+    """
+    Batchジョブの状態を確認し、完了していれば結果を取り込む。
+    締切時刻を過ぎても未完了ならキャンセルする。
+
+    Returns: ジョブが終了状態になったか
+    """
+    batch = client.batches.retrieve(job.batch_id)
+    now = datetime.now(JST)
+
+    if batch.status == "completed":
+        if batch.output_file_id:
+            job.output_file_id = batch.output_file_id
+            ok, failed = _import_results(db, job, client.files.content(batch.output_file_id).text)
+            job.completed_count = ok
+            job.failed_count = failed
+        job.status = "completed"
+    elif batch.status in ("failed", "expired", "cancelled"):
+        job.status = batch.status
+        errors = getattr(batch, "errors", None)
+        if errors and getattr(errors, "data", None):
+            job.last_error = "; ".join(str(e.message) for e in errors.data)[:1000]
+    elif now.date() > job.date or now.time() >= BATCH_FALLBACK_TIME:
+        # 当日中の配信に間に合わないため通常生成にフォールバック
+        try:
+            client.batches.cancel(job.batch_id)
+        except Exception as e:
+            logger.warning(f"Batchキャンセル失敗: batch_id={job.batch_id} - {e}")
+        job.status = "cancelled"
+        job.last_error = f"締切 {BATCH_FALLBACK_TIME.strftime('%H:%M')} までに完了しなかったためキャンセル (status={batch.status})"
+    else:
+        return False
+
+    job.finished_at = now
+    db.commit()
+    logger.info(
+        f"Batchジョブ終了: batch_id={job.batch_id}, status={job.status}, "
+        f"completed={job.completed_count}, failed={job.failed_count}"
+    )
+    return True
+
+
+def _import_results(db: Session, job: OpenAIBatchJob, output_text: str) -> tuple[int, int]:
+    """Batch出力JSONLを pregenerated_contents に取り込む。戻り値: (成功件数, 失敗件数)"""
+    existing = {
+        h for (h,) in db.query(PregeneratedContent.prompt_hash).filter(
+            PregeneratedContent.plan_id == job.plan_id,
+            PregeneratedContent.date == job.date,
+        ).all()
+    }
+
+    ok = 0
+    failed = 0
+    usage_stats = new_usage_stats()
+    for line in output_text.splitlines():
+        if not line.strip():
+            continue
+        try:
+            record = json.loads(line)
+            prompt_hash = record["custom_id"]
+            response = record.get("response") or {}
+            if record.get("error") or response.get("status_code") != 200:
+                raise ValueError(record.get("error") or f"status_code={response.get('status_code')}")
+            content = response["body"]["choices"][0]["message"]["content"]
+            result = parse_email_content(content)
+            accumulate_usage(usage_stats, response["body"].get("usage"))
+        except Exception as e:
+            # 失敗分は送信時に通常生成される
+            failed += 1
+            logger.warning(f"Batch結果の取り込み失敗: batch_id={job.batch_id} - {e}")
+            continue
+
+        if prompt_hash in existing:
+            continue
+        existing.add(prompt_hash)
+        db.add(PregeneratedContent(
+            plan_id=job.plan_id,
+            date=job.date,
+            prompt_hash=prompt_hash,
+            subject=str(result["subject"])[:500],
+            body=result["body"],
+        ))
+        ok += 1
+        if ok % 500 == 0:
+            db.commit()
+
+    db.commit()
+    record_stats(job.plan_id, job.date, staged=ok)
+    record_usage_stats(job.plan_id, job.date, usage_stats)
+    return ok, failed
+
+
+def release_waiting_progress(db: Session, plan_id: int, target_date: date) -> bool:
+    """全ジョブが終了していれば、バッチ待ちの進捗を未実行に戻して送信させる"""
+    pending = db.query(OpenAIBatchJob.id).filter(
+        OpenAIBatchJob.plan_id == plan_id,
+        OpenAIBatchJob.date == target_date,
+        OpenAIBatchJob.status.notin_(TERMINAL_STATUSES),
+    ).first()
+    if pending:
+        return False
+
+    progresses = db.query(ProgressPlan).filter(
+        ProgressPlan.plan_id == plan_id,
+        ProgressPlan.date == target_date,
+        ProgressPlan.status == 4,
+    ).all()
+    now = datetime.now(JST)
+    for p in progresses:
+        p.status = 0
+        p.updated_at = now
+    db.commit()
+    return bool(progresses)
@@ -1,73 +1,199 @@
 """OpenAI API サービス (subject + body JSON生成)"""
 import json
-from openai import OpenAI
+import time
+from datetime import date
+from typing import Optional
+from openai import (
+    OpenAI, APIConnectionError, APIStatusError, APITimeoutError, RateLimitError,
+)
 from app.core.api_keys import get_openai_api_key
-from app.core.logging import get_logger
+from app.core.config import settings
+from app.core.redis import get_sync_redis
+from app.services.circuit_breaker import CircuitOpenError, openai_breaker
+from app.core.logging import get_logger, PER_RECIPIENT
 
 logger = get_logger(__name__)
 
+# キャッシュ最適化レイアウト: 共通の外部データを独立したメッセージとしてユーザー個別部分より前に置く
+SHARED_CONTEXT_HEADER = "【外部データ】"
+SHARED_CONTEXT_REFERENCE = "（前のメッセージの【外部データ】を参照）"
+
+# usage集計 (Redis Hash)
+USAGE_STATS_PREFIX = "openai:usage:"
+USAGE_STATS_TTL = 7 * 24 * 60 * 60  # 7日
+USAGE_FIELDS = ("requests", "prompt_tokens", "cached_tokens", "completion_tokens", "latency_ms")
+
 DEFAULT_SYSTEM_PROMPT = """あなたはメールコンテンツ生成AIです。
 以下の形式でJSON応答してください:
 {"subject": "メール件名", "body": "メール本文"}
 bodyはHTMLタグなしのプレーンテキストで記述してください。"""
 
 
-def generate_email_content(
+def get_openai_client(api_key: str = None, timeout: int = 240) -> OpenAI:
+    """OpenAIクライアント生成 (OPENAI_BASE_URL 指定時は互換エンドポイントを使用)"""
+    return OpenAI(
+        api_key=api_key or get_openai_api_key(),
+        timeout=timeout,
+        base_url=settings.OPENAI_BASE_URL or None,
+    )
+
+
+def build_chat_request(
     prompt: str,
     model: str = "gpt-4o-mini",
     system_prompt: str = None,
-    api_key: str = None,
-    timeout_read: int = 240,
-    max_retries: int = 3,
+    shared_context: str = None,
 ) -> dict:
     """
-    GPTでメールコンテンツを生成。
-    Returns: {"subject": "...", "body": "..."}
-    """
-    client = OpenAI(
-        api_key=api_key or get_openai_api_key(),
-        timeout=timeout_read,
-    )
+    chat.completions のリクエストボディを構築 (通常呼び出し / Batch API 共通)
 
+    shared_context 指定時 (キャッシュ最適化レイアウト) は
+    [システムプロンプト] → [全員共通の外部データ] → [ユーザー個別のプロンプト] の順に並べ、
+    受信者間でプレフィックスが一致するようにする。
+    """
     system_msg = system_prompt or DEFAULT_SYSTEM_PROMPT
 
     # response_format=json_object 使用時、messagesに"json"が必須
     if "json" not in system_msg.lower() and "json" not in prompt.lower():
         system_msg += '\n\n回答は必ず {"subject": "件名", "body": "本文"} のJSON形式で出力してください。'
 
+    messages = [{"role": "system", "content": system_msg}]
+    if shared_context:
+        messages.append({"role": "user", "content": f"{SHARED_CONTEXT_HEADER}\n{shared_context}"})
+    messages.append({"role": "user", "content": prompt})
+
+    body = {
+        "model": model,
+        "messages": messages,
+        "response_format": {"type": "json_object"},
+    }
+
     # temperatureをサポートしないモデル（o1系, o3系, gpt-5等）を判定
-    extra_params = {}
     model_lower = (model or "").lower()
     if not any(model_lower.startswith(p) for p in ("o1", "o3", "gpt-5")):
-        extra_params["temperature"] = 0.7
+        body["temperature"] = 0.7
+    return body
+
+
+def parse_email_content(content: str) -> dict:
+    """GPT応答のJSONを検証して {"subject", "body"} を返す"""
+    result = json.loads(content)
+    if "subject" not in result or "body" not in result:
+        raise ValueError(f"GPT応答に必須フィールドがありません: {list(result.keys())}")
+    return result
+
+
+def new_usage_stats() -> dict:
+    """GPT呼び出しのusage集計用の辞書"""
+    return {key: 0 for key in USAGE_FIELDS}
+
+
+def accumulate_usage(usage_stats: dict, usage, elapsed_ms: int = 0):
+    """レスポンスの usage (SDKオブジェクト or dict) を集計に加算"""
+    if usage is None:
+        return
+    if not isinstance(usage, dict):
+        usage = usage.model_dump()
+    details = usage.get("prompt_tokens_details") or {}
+    usage_stats["requests"] += 1
+    usage_stats["prompt_tokens"] += usage.get("prompt_tokens") or 0
+    usage_stats["cached_tokens"] += details.get("cached_tokens") or 0
+    usage_stats["completion_tokens"] += usage.get("completion_tokens") or 0
+    usage_stats["latency_ms"] += elapsed_ms
+
+
+def record_usage_stats(plan_id: int, target_date: date, usage_stats: dict):
+    """プラン×日付のusage集計をRedisに加算 (管理画面でキャッシュ率を確認するため)"""
+    if not usage_stats or not usage_stats.get("requests"):
+        return
+    try:
+        redis = get_sync_redis()
+        key = usage_stats_key(plan_id, target_date)
+        pipe = redis.pipeline()
+        for field in USAGE_FIELDS:
+            if usage_stats.get(field):
+                pipe.hincrby(key, field, usage_stats[field])
+        pipe.expire(key, USAGE_STATS_TTL)
+        pipe.execute()
+    except Exception as e:
+        logger.warning(f"GPT usage統計の記録失敗: plan_id={plan_id} - {e}")
+
+
+def usage_stats_key(plan_id: int, target_date: date) -> str:
+    return f"{USAGE_STATS_PREFIX}{plan_id}:{target_date.isoformat()}"
+
+
+def format_usage_stats(raw: Optional[dict]) -> Optional[dict]:
+    """Redis Hashのusage集計を表示用に整形"""
+    if not raw:
+        return None
+    stats = {field: int(raw.get(field, 0)) for field in USAGE_FIELDS}
+    stats["cached_ratio"] = (
+        round(stats["cached_tokens"] / stats["prompt_tokens"] * 100, 1)
+        if stats["prompt_tokens"] else None
+    )
+    stats["avg_latency_ms"] = (
+        stats["latency_ms"] // stats["requests"] if stats["requests"] else None
+    )
+    return stats
+
+
+def is_provider_failure(e: Exception) -> bool:
+    """OpenAI 側の障害か (接続・タイムアウト・レート制限・5xx)。400 等の入力起因はブレーカーに数えない"""
+    if isinstance(e, (APIConnectionError, APITimeoutError, RateLimitError)):
+        return True
+    return isinstance(e, APIStatusError) and e.status_code >= 500
+
+
+def generate_email_content(
+    prompt: str,
+    model: str = "gpt-4o-mini",
+    system_prompt: str = None,
+    api_key: str = None,
+    timeout_read: int = 240,
+    max_retries: int = 3,
+    shared_context: str = None,
+    usage_stats: dict = None,
+) -> dict:
+    """
+    GPTでメールコンテンツを生成。
+    usage_stats を渡すと成功したリクエストのトークン数・キャッシュヒット数・レイテンシを加算する。
+    Returns: {"subject": "...", "body": "..."}
+    """
+    client = get_openai_client(api_key, timeout_read)
+    request = build_chat_request(prompt, model, system_prompt, shared_context)
 
     last_error = None
     for attempt in range(max_retries):
         try:
-            response = client.chat.completions.create(
-                model=model,
-                messages=[
-                    {"role": "system", "content": system_msg},
-                    {"role": "user", "content": prompt},
-                ],
-                response_format={"type": "json_object"},
-                **extra_params,
-            )
+            started = time.monotonic()
+            with openai_breaker.guard(is_failure=is_provider_failure):
+                response = client.chat.completions.create(**request)
+            elapsed_ms = int((time.monotonic() - started) * 1000)
 
             content = response.choices[0].message.content
-            result = json.loads(content)
-
-            if "subject" not in result or "body" not in result:
-                raise ValueError(f"GPT応答に必須フィールドがありません: {list(result.keys())}")
+            result = parse_email_content(content)
 
-            logger.info(f"GPTコンテンツ生成成功: model={model}, subject={result['subject'][:30]}")
+            if usage_stats is not None:
+                accumulate_usage(usage_stats, response.usage, elapsed_ms)
+            cached_tokens = 0
+            if response.usage and response.usage.prompt_tokens_details:
+                cached_tokens = response.usage.prompt_tokens_details.cached_tokens or 0
+            logger.info(
+                f"GPTコンテンツ生成成功: model={model}, subject={result['subject'][:30]}, "
+                f"prompt_tokens={response.usage.prompt_tokens if response.usage else '-'}, "
+                f"cached_tokens={cached_tokens}, {elapsed_ms}ms",
+                extra=PER_RECIPIENT,
+            )
             return result
 
+        except CircuitOpenError:
+            raise  # OPEN 中はリトライせず呼び出し側で一時停止させる
         except Exception as e:
             # temperatureエラーの場合、パラメータを除外してリトライ
-            if "temperature" in str(e) and "temperature" in extra_params:
+            if "temperature" in str(e) and "temperature" in request:
                 logger.warning(f"temperature非対応モデル検出 ({model}), パラメータ除外してリトライ")
-                extra_params.pop("temperature", None)
+                request.pop("temperature", None)
                 continue
             last_error = e
             logger.warning(f"GPT生成リトライ {attempt + 1}/{max_retries}: {e}")
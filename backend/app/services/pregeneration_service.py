@@ -0,0 +1,337 @@
+"""GPT事前生成サービス
+
+send_time の pregenerate_lead_minutes 分前にスケジューラーが pregenerate タスクを作成し、
+Workerが全受信者分のプロンプトを解決してGPT生成結果を pregenerated_contents に保存する。
+送信時はプロンプトのハッシュが一致した場合のみ保存済みの結果を再利用するため、
+事前生成後に回答やあらすじが変わったユーザーは通常通りその場で生成される。
+配信中に生成した全員共通のコンテンツも同じテーブルに保存し、途中再開時に再利用する (stage_content)。
+
+事前生成は定時・手動配信より優先度が低い。生成中に他の配信タスクが待っていれば中断して
+キューに戻り (PregenerationPreempted)、send_time を過ぎたら残りは送信時の生成に任せて終了する。
+"""
+import hashlib
+from datetime import date, datetime
+from zoneinfo import ZoneInfo
+from typing import Optional
+from sqlalchemy.orm import Session
+
+from app.models.plan import Plan
+from app.models.pregenerated_content import PregeneratedContent
+from app.core.redis import get_sync_redis
+from app.core.logging import get_logger
+
+logger = get_logger(__name__)
+JST = ZoneInfo("Asia/Tokyo")
+
+# ステージング統計 (Redis Hash: staged / hit / miss)
+STATS_PREFIX = "pregen:stats:"
+STATS_TTL = 3 * 24 * 60 * 60  # 3日
+
+# Heartbeat更新間隔（生成件数）
+HEARTBEAT_INTERVAL = 5
+
+
+class PregenerationPreempted(Exception):
+    """他の配信タスクが待っているため事前生成を中断した (キューに戻して後で続きから再開する)"""
+
+
+def compute_prompt_hash(
+    model: str,
+    system_prompt: Optional[str],
+    prompt: str,
+    shared_context: Optional[str] = None,
+) -> str:
+    """model + system_prompt + 解決済みプロンプト (+ 共通コンテキスト) からステージングキーを計算"""
+    raw = f"{model or ''}\x00{system_prompt or ''}\x00{prompt}"
+    if shared_context is not None:
+        raw += f"\x00{shared_context}"
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+def stats_key(plan_id: int, target_date: date) -> str:
+    return f"{STATS_PREFIX}{plan_id}:{target_date.isoformat()}"
+
+
+class StagedContentCache:
+    """送信時のステージング参照 (ヒット/ミスはプロンプト単位で集計)"""
+
+    def __init__(self, contents: dict[str, dict]):
+        self.contents = contents
+        self.hit_hashes: set[str] = set()
+        self.miss_hashes: set[str] = set()
+
+    def get(
+        self,
+        model: str,
+        system_prompt: Optional[str],
+        prompt: str,
+        shared_context: Optional[str] = None,
+    ) -> Optional[dict]:
+        prompt_hash = compute_prompt_hash(model, system_prompt, prompt, shared_context)
+        cached = self.contents.get(prompt_hash)
+        if cached is None:
+            self.miss_hashes.add(prompt_hash)
+            return None
+        self.hit_hashes.add(prompt_hash)
+        return dict(cached)
+
+    def add(
+        self,
+        model: str,
+        system_prompt: Optional[str],
+        prompt: str,
+        shared_context: Optional[str],
+        content: dict,
+    ):
+        prompt_hash = compute_prompt_hash(model, system_prompt, prompt, shared_context)
+        self.contents.setdefault(prompt_hash, {"subject": content["subject"], "body": content["body"]})
+
+
+def load_staged_contents(db: Session, plan_id: int, target_date: date) -> StagedContentCache:
+    """指定日のステージング済みコンテンツを読み込む"""
+    rows = db.query(
+        PregeneratedContent.prompt_hash,
+        PregeneratedContent.subject,
+        PregeneratedContent.body,
+    ).filter(
+        PregeneratedContent.plan_id == plan_id,
+        PregeneratedContent.date == target_date,
+    ).all()
+    contents = {h: {"subject": s, "body": b} for h, s, b in rows}
+    logger.info(f"事前生成コンテンツ読み込み: plan_id={plan_id}, date={target_date}, count={len(contents)}")
+    return StagedContentCache(contents)
+
+
+def stage_content(
+    db: Session,
+    plan: Plan,
+    target_date: date,
+    prompt: str,
+    shared_context: Optional[str],
+    content: dict,
+):
+    """配信中に生成したコンテンツを保存する (保存済みなら何もしない)"""
+    prompt_hash = compute_prompt_hash(plan.model, plan.system_prompt, prompt, shared_context)
+    try:
+        exists = db.query(PregeneratedContent.id).filter(
+            PregeneratedContent.plan_id == plan.id,
+            PregeneratedContent.date == target_date,
+            PregeneratedContent.prompt_hash == prompt_hash,
+        ).first()
+        if exists:
+            return
+        db.add(PregeneratedContent(
+            plan_id=plan.id,
+            date=target_date,
+            prompt_hash=prompt_hash,
+            subject=str(content["subject"])[:500],
+            body=content["body"],
+        ))
+        db.commit()
+    except Exception as e:
+        db.rollback()
+        logger.warning(f"生成コンテンツの保存失敗: plan_id={plan.id} - {e}")
+
+
+def record_stats(plan_id: int, target_date: date, staged: int = 0, hits: int = 0, misses: int = 0):
+    """ステージング統計をRedisに加算"""
+    try:
+        redis = get_sync_redis()
+        key = stats_key(plan_id, target_date)
+        pipe = redis.pipeline()
+        if staged:
+            pipe.hincrby(key, "staged", staged)
+        if hits:
+            pipe.hincrby(key, "hit", hits)
+        if misses:
+            pipe.hincrby(key, "miss", misses)
+        pipe.expire(key, STATS_TTL)
+        pipe.execute()
+    except Exception as e:
+        logger.warning(f"事前生成統計の記録失敗: plan_id={plan_id} - {e}")
+
+
+def format_stats(raw: Optional[dict]) -> Optional[dict]:
+    """Redis Hashの統計を表示用に整形"""
+    if not raw:
+        return None
+    staged = int(raw.get("staged", 0))
+    hits = int(raw.get("hit", 0))
+    misses = int(raw.get("miss", 0))
+    lookups = hits + misses
+    return {
+        "staged": staged,
+        "hit": hits,
+        "miss": misses,
+        "hit_rate": round(hits / lookups * 100, 1) if lookups else None,
+    }
+
+
+def pregenerate_plan_content(
+    db: Session,
+    plan: Plan,
+    target_date: date,
+    api_key: str = None,
+    progress_id: int = None,
+) -> int:
+    """
+    配信対象の全プロンプトを解決してGPT生成し、ステージングに保存する。
+    既に保存済みのプロンプトはスキップするため、途中で落ちても再実行で続きから生成される。
+
+    他の配信タスクが待っていれば PregenerationPreempted を送出し、
+    send_time を過ぎていれば残りを生成せずに終了する。
+
+    Returns: 新規にステージングした件数
+    """
+    from app.services.delivery_service import (
+        _get_target_users, _load_plan_external_data, _update_progress_heartbeat,
+        iter_generation_prompts,
+    )
+    from app.services.openai_service import (
+        generate_email_content, new_usage_stats, record_usage_stats,
+    )
+    from app.services.circuit_breaker import CircuitOpenError
+    from app.services.summary_service import get_summary_setting
+    from app.models.plan_question import PlanQuestion
+    from app.models.progress_plan import ProgressPlan
+    from app.worker.throttle_manager import check_emergency_stop
+
+    # 定時送信が既に作成されていれば事前生成しても使われないのでスキップ
+    scheduled = db.query(ProgressPlan.id).filter(
+        ProgressPlan.plan_id == plan.id,
+        ProgressPlan.date == target_date,
+        ProgressPlan.send_type == "scheduled",
+    ).first()
+    if scheduled:
+        logger.info(f"定時送信開始済みのため事前生成スキップ: plan_id={plan.id}, date={target_date}")
+        return 0
+
+    users = _get_target_users(db, plan.id)
+    if not users:
+        logger.info(f"事前生成対象ユーザーなし: plan_id={plan.id}")
+        return 0
+
+    questions = db.query(PlanQuestion).filter(PlanQuestion.plan_id == plan.id).order_by(PlanQuestion.sort_order).all()
+    external_data_str, split_items = _load_plan_external_data(db, plan)
+    summary_setting = get_summary_setting(db, plan.id)
+
+    existing = {
+        h for (h,) in db.query(PregeneratedContent.prompt_hash).filter(
+            PregeneratedContent.plan_id == plan.id,
+            PregeneratedContent.date == target_date,
+        ).all()
+    }
+
+    staged = 0
+    failed = 0
+    preempted = False
+    usage_stats = new_usage_stats()
+    for resolved_prompt, context in iter_generation_prompts(
+        db, plan, plan.prompt, users, questions, split_items, external_data_str, summary_setting,
+    ):
+        if check_emergency_stop():
+            logger.warning(f"緊急停止により事前生成中断: plan_id={plan.id}")
+            break
+
+        prompt_hash = compute_prompt_hash(plan.model, plan.system_prompt, resolved_prompt, context)
+        if prompt_hash in existing:
+            continue
+        # GPT を呼ぶ前に、配信の邪魔にならないか確かめる
+        if _send_time_reached(db, plan, target_date):
+            logger.info(f"配信時刻到達のため事前生成終了: plan_id={plan.id}, date={target_date}")
+            break
+        if _has_waiting_delivery(db, target_date):
+            preempted = True
+            break
+        existing.add(prompt_hash)
+
+        try:
+            gpt_result = generate_email_content(
+                prompt=resolved_prompt,
+                model=plan.model,
+                system_prompt=plan.system_prompt,
+                api_key=api_key,
+                shared_context=context,
+                usage_stats=usage_stats,
+            )
+        except CircuitOpenError as e:
+            # OpenAI 障害中: 残りは送信時に生成する
+            logger.warning(f"事前生成中断: plan_id={plan.id} - {e}")
+            break
+        except Exception as e:
+            # 送信時に改めて生成されるため、ここでは失敗を記録するだけ
+            failed += 1
+            logger.warning(f"事前生成失敗: plan_id={plan.id} - {e}")
+            continue
+
+        # 生成中に配信側 (stage_content) が同じプロンプトを保存している場合がある
+        try:
+            exists = db.query(PregeneratedContent.id).filter(
+                PregeneratedContent.plan_id == plan.id,
+                PregeneratedContent.date == target_date,
+                PregeneratedContent.prompt_hash == prompt_hash,
+            ).first()
+            if exists:
+                continue
+            db.add(PregeneratedContent(
+                plan_id=plan.id,
+                date=target_date,
+                prompt_hash=prompt_hash,
+                subject=str(gpt_result["subject"])[:500],
+                body=gpt_result["body"],
+            ))
+            db.commit()
+        except Exception as e:
+            db.rollback()
+            logger.warning(f"事前生成結果の保存失敗: plan_id={plan.id} - {e}")
+            continue
+        staged += 1
+
+        if staged % HEARTBEAT_INTERVAL == 0:
+            _update_progress_heartbeat(db, progress_id)
+
+    record_stats(plan.id, target_date, staged=staged)
+    record_usage_stats(plan.id, target_date, usage_stats)
+    if preempted:
+        logger.info(f"配信タスク待ちのため事前生成を中断: plan_id={plan.id}, date={target_date}, staged={staged}")
+        raise PregenerationPreempted(f"plan_id={plan.id}, staged={staged}")
+    logger.info(f"事前生成完了: plan_id={plan.id}, date={target_date}, staged={staged}, failed={failed}")
+    return staged
+
+
+def _send_time_reached(db: Session, plan: Plan, target_date: date) -> bool:
+    """配信時刻を過ぎたか、定時送信タスクが作成済みか"""
+    from app.models.progress_plan import ProgressPlan
+
+    now = datetime.now(JST).replace(tzinfo=None)
+    if now >= datetime.combine(target_date, plan.send_time):
+        return True
+    return db.query(ProgressPlan.id).filter(
+        ProgressPlan.plan_id == plan.id,
+        ProgressPlan.date == target_date,
+        ProgressPlan.send_type == "scheduled",
+    ).first() is not None
+
+
+def _has_waiting_delivery(db: Session, target_date: date) -> bool:
+    """事前生成以外の実行待ちタスク (未実行・リトライ待ち) があるか"""
+    from sqlalchemy import and_, or_
+    from app.models.progress_plan import ProgressPlan
+
+    return db.query(ProgressPlan.id).filter(
+        ProgressPlan.send_type != "pregenerate",
+        or_(ProgressPlan.date == target_date, ProgressPlan.send_type == "manual"),
+        or_(
+            ProgressPlan.status == 0,
+            and_(ProgressPlan.status == 3, ProgressPlan.retry_count < ProgressPlan.max_retries),
+        ),
+    ).first() is not None
+
+
+def cleanup_old_contents(db: Session, before: date) -> int:
+    """配信日を過ぎたステージングを削除"""
+    deleted = db.query(PregeneratedContent).filter(
+        PregeneratedContent.date < before,
+    ).delete(synchronize_session=False)
+    db.commit()
+    return deleted
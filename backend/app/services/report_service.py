@@ -17,11 +17,11 @@ from sqlalchemy.orm import Session
 from sqlalchemy import func as sa_func
 from jinja2 import Environment, FileSystemLoader, select_autoescape
 from pathlib import Path
-import resend
 
 from app.core.database import SessionLocal
 from app.core.config import settings
-from app.core.api_keys import get_resend_api_key, get_from_email, get_site_name
+from app.core.api_keys import get_from_email, get_site_name
+from app.services.mail_transport import get_transport
 from app.models.delivery import Delivery
 from app.models.delivery_item import DeliveryItem
 from app.models.plan import Plan
@@ -201,7 +201,7 @@ def send_daily_report(force: bool = False):
         success_count = 0
         fail_count = 0
 
-        resend.api_key = get_resend_api_key()
+        transport = get_transport()
 
         for i, admin in enumerate(admins):
             # Resendレート制限対策: 2通目以降は5秒待機
@@ -217,7 +217,7 @@ def send_daily_report(force: bool = False):
             db.commit()
 
             try:
-                resend.Emails.send({
+                transport.send({
                     "from": get_from_email(),
                     "to": [admin.email],
                     "subject": subject,
@@ -305,7 +305,7 @@ def send_error_alert(
             occurred_at=now,
         )
 
-        resend.api_key = get_resend_api_key()
+        transport = get_transport()
 
         for i, admin in enumerate(admins):
             # Resendレート制限対策: 2通目以降は5秒待機
@@ -313,7 +313,7 @@ def send_error_alert(
                 time_mod.sleep(5)
             
             try:
-                resend.Emails.send({
+                transport.send({
                     "from": get_from_email(),
                     "to": [admin.email],
                     "subject": subject,
@@ -1,10 +1,10 @@
-"""Resend API メール送信サービス"""
-import resend
+"""配信メール送信サービス (送信はメールトランスポート経由)"""
 from jinja2 import Environment, FileSystemLoader, select_autoescape
 from pathlib import Path
 from app.core.config import settings
-from app.core.api_keys import get_resend_api_key, get_from_email, get_site_name
-from app.core.logging import get_logger
+from app.core.api_keys import get_from_email, get_site_name
+from app.services.mail_transport import get_transport
+from app.core.logging import get_logger, PER_RECIPIENT
 
 logger = get_logger(__name__)
 
@@ -40,16 +40,13 @@ def send_email(
     body: str,
     from_email: str = None,
     unsubscribe_url: str = None,
-    api_key: str = None,
     is_html: bool = False,
 ) -> dict:
     """
-    HTMLメールをResend APIで送信。
+    HTMLメールを送信 (MAIL_TRANSPORT のトランスポート経由)。
     is_html=True の場合、bodyをそのままHTMLとして送信。
-    Returns: {"id": "resend_message_id"} or raises
+    Returns: {"id": "message_id"} or raises MailTransportError
     """
-    resend.api_key = api_key or get_resend_api_key()
-
     if is_html:
         # 既にHTML形式の場合はそのまま送信
         html = body
@@ -62,12 +59,12 @@ def send_email(
             site_name=get_site_name(),
         )
 
-    result = resend.Emails.send({
+    result = get_transport().send({
         "from": from_email or get_from_email(),
         "to": [to_email],
         "subject": subject,
         "html": html,
     })
 
-    logger.info(f"メール送信成功: to={to_email}, subject={subject[:30]}")
+    logger.info(f"メール送信成功: to={to_email}, subject={subject[:30]}", extra=PER_RECIPIENT)
     return result
@@ -0,0 +1,112 @@
+"""配信の遅延リトライキュー (Redis の sorted set、score = 再試行する時刻)
+
+送信に失敗した1通 (作業単位) は配信ループで待たずにここへ積み、配信ループは次の受信者へ進む。
+Worker 内の再送スレッド (app.worker.retry_worker) が期限の来たものを並列に取り出して処理する。
+- 取り出したものは処理中セット (score = リース期限) に移す。リースが切れたもの (プロセス停止) はキューに戻す
+- 配信ごとに未解決の件数を数え、配信ループが終わった後に最後の1件が片付いた側が配信を締める
+作業単位は JSON の dict: {"delivery_id", "user_id", "document_key", "attempt", ...}
+"""
+import json
+import random
+import time
+import uuid
+
+from app.core.redis import get_sync_redis
+
+QUEUE_KEY = "delivery:retry"
+INFLIGHT_KEY = "delivery:retry:inflight"
+PENDING_KEY = "delivery:retry:pending"  # Hash: delivery_id → 未解決件数
+CLOSED_KEY = "delivery:retry:closed"  # Set: 配信ループが終わった delivery_id
+
+RETRY_BASE_SECONDS = 10  # 10秒, 20秒, 40秒, ... 最大 RETRY_MAX_SECONDS (それぞれ半分〜満額のジッター)
+RETRY_MAX_SECONDS = 300
+LEASE_SECONDS = 900  # GPT 生成のリトライ込みで1件がこれより長くかかることはない
+
+# リース切れを戻してから、期限の来たものを処理中セットへ移す (複数 Worker で取り合わない)
+_CLAIM_SCRIPT = """
+local expired = redis.call('ZRANGEBYSCORE', KEYS[2], '-inf', ARGV[1])
+for _, member in ipairs(expired) do
+    redis.call('ZREM', KEYS[2], member)
+    redis.call('ZADD', KEYS[1], ARGV[1], member)
+end
+local due = redis.call('ZRANGEBYSCORE', KEYS[1], '-inf', ARGV[1], 'LIMIT', 0, tonumber(ARGV[2]))
+for _, member in ipairs(due) do
+    redis.call('ZREM', KEYS[1], member)
+    redis.call('ZADD', KEYS[2], ARGV[3], member)
+end
+return due
+"""
+
+
+def backoff(attempt: int) -> float:
+    """attempt 回目の再試行までの秒数 (指数バックオフ + ジッター)"""
+    delay = min(RETRY_BASE_SECONDS * 2 ** (attempt - 1), RETRY_MAX_SECONDS)
+    return random.uniform(delay / 2, delay)
+
+
+def _member(unit: dict) -> str:
+    return json.dumps({**unit, "id": uuid.uuid4().hex}, ensure_ascii=False)
+
+
+def push(unit: dict) -> float:
+    """新しい作業単位を積み (配信の未解決件数 +1)、再試行までの秒数を返す"""
+    delay = backoff(unit["attempt"])
+    r = get_sync_redis()
+    pipe = r.pipeline()
+    pipe.hincrby(PENDING_KEY, unit["delivery_id"], 1)
+    pipe.zadd(QUEUE_KEY, {_member(unit): time.time() + delay})
+    pipe.execute()
+    return delay
+
+
+def reschedule(member: str, unit: dict, delay: float = None) -> float:
+    """取り出した作業単位を積み直す (未解決件数はそのまま)"""
+    if delay is None:
+        delay = backoff(unit["attempt"])
+    r = get_sync_redis()
+    pipe = r.pipeline()
+    pipe.zrem(INFLIGHT_KEY, member)
+    pipe.zadd(QUEUE_KEY, {_member(unit): time.time() + delay})
+    pipe.execute()
+    return delay
+
+
+def claim_due(limit: int) -> list[tuple[str, dict]]:
+    """期限の来た作業単位を最大 limit 件取り出す。戻り値: [(member, unit)]"""
+    now = time.time()
+    r = get_sync_redis()
+    members = r.eval(_CLAIM_SCRIPT, 2, QUEUE_KEY, INFLIGHT_KEY, now, limit, now + LEASE_SECONDS)
+    return [(member, json.loads(member)) for member in members]
+
+
+def resolve(member: str, delivery_id: int) -> bool:
+    """
+    作業単位を片付ける (成功・諦め・不要)。
+    戻り値: 配信ループが終わっていて、これが最後の1件なら True (呼び出し側が配信を締める)
+    """
+    r = get_sync_redis()
+    pipe = r.pipeline()
+    pipe.zrem(INFLIGHT_KEY, member)
+    pipe.hincrby(PENDING_KEY, delivery_id, -1)
+    _, remaining = pipe.execute()
+    if remaining > 0:
+        return False
+    r.hdel(PENDING_KEY, delivery_id)
+    return bool(r.srem(CLOSED_KEY, delivery_id))
+
+
+def close_delivery(delivery_id: int) -> bool:
+    """
+    配信ループの終了を記録する。
+    戻り値: 未解決の作業単位がなければ True (呼び出し側がそのまま配信を締める)
+    """
+    r = get_sync_redis()
+    r.sadd(CLOSED_KEY, delivery_id)
+    if int(r.hget(PENDING_KEY, delivery_id) or 0) > 0:
+        return False
+    # resolve と同時に 0 になった場合も、締めるのはどちらか一方だけ
+    return bool(r.srem(CLOSED_KEY, delivery_id))
+
+
+def pending_count(delivery_id: int) -> int:
+    return int(get_sync_redis().hget(PENDING_KEY, delivery_id) or 0)
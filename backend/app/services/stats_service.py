@@ -0,0 +1,319 @@
+"""ダッシュボード統計レイヤー
+
+管理画面のダッシュボードは履歴の量に関わらず一定時間で表示できるよう、
+ここで管理する集計だけを読む。
+
+- 日別 / プラン別の配信カウンタ: Redis Hash (stats:day:{date}[:plan:{plan_id}])
+  配信の進捗に応じて sync_delivery_stats() で差分を加算する。
+  Delivery ごとに反映済みの値を stats:delivery:{id} に日別カウンタと同じ期限で持つため、
+  何度呼んでも二重計上しない (再送で fail が減る場合は負の差分になる)。
+- daily_stats テーブル: Redis のカウンタを定期的に書き出したロールアップ (Redis 消失時のフォールバック)
+- 購読スナップショット (ユーザー数・購読数・売上・プラン別加入者数): SQL集計結果を Redis に保存。
+  集計はスケジューラーだけが行い、管理画面は保存済みの値を返すだけにする。
+  購読が変わる処理では invalidate で再計算待ちの印を付け、毎分のジョブが再計算する。
+"""
+import json
+from datetime import date, datetime, time, timedelta
+from typing import Optional
+from zoneinfo import ZoneInfo
+from sqlalchemy import case, func as sa_func
+from sqlalchemy.dialects.mysql import insert as mysql_insert
+from sqlalchemy.orm import Session
+
+from app.models.daily_stat import DailyStat
+from app.models.delivery import Delivery
+from app.models.plan import Plan
+from app.models.promotion_code import PromotionCode
+from app.models.subscription import Subscription
+from app.models.system_log import SystemLog
+from app.models.user import User
+from app.core.redis import get_sync_redis
+from app.core.logging import get_logger
+
+logger = get_logger(__name__)
+JST = ZoneInfo("Asia/Tokyo")
+UTC = ZoneInfo("UTC")
+
+DAY_PREFIX = "stats:day:"
+DELIVERY_PREFIX = "stats:delivery:"
+SNAPSHOT_KEY = "stats:subscription_snapshot"
+SNAPSHOT_DIRTY_KEY = "stats:subscription_snapshot:dirty"
+DAY_TTL = 40 * 24 * 60 * 60  # 40日
+# 反映済みの値が先に消えると次の同期で全件を再加算してしまうため、日別カウンタと同じだけ保持する
+DELIVERY_TTL = DAY_TTL
+
+# 配信の進捗に応じて差分加算するフィールド
+DELIVERY_FIELDS = ("deliveries", "sent", "success", "fail")
+# 定期集計で上書きするフィールド
+LOG_FIELDS = ("errors", "warnings")
+COUNTER_FIELDS = DELIVERY_FIELDS + LOG_FIELDS
+
+ACTIVE_STATUSES = ("trialing", "active", "past_due", "admin_added")
+
+# KEYS: [delivery反映済み, 日別合計, 日別プラン別]
+# ARGV: [ttl_delivery, ttl_day, field1, value1, field2, value2, ...]
+_SYNC_DELIVERY_SCRIPT = """
+for i = 3, #ARGV, 2 do
+    local field = ARGV[i]
+    local value = tonumber(ARGV[i + 1])
+    local old = tonumber(redis.call('HGET', KEYS[1], field) or '0')
+    local delta = value - old
+    if delta ~= 0 then
+        redis.call('HSET', KEYS[1], field, value)
+        redis.call('HINCRBY', KEYS[2], field, delta)
+        redis.call('HINCRBY', KEYS[3], field, delta)
+    end
+end
+redis.call('EXPIRE', KEYS[1], ARGV[1])
+redis.call('EXPIRE', KEYS[2], ARGV[2])
+redis.call('EXPIRE', KEYS[3], ARGV[2])
+return 1
+"""
+_sync_delivery_script = None
+
+
+def day_key(target_date: date, plan_id: Optional[int] = None) -> str:
+    key = f"{DAY_PREFIX}{target_date.isoformat()}"
+    if plan_id is not None:
+        key += f":plan:{plan_id}"
+    return key
+
+
+def delivery_day(delivery: Delivery) -> date:
+    """配信の集計日 (created_at は UTC 保存)"""
+    if delivery.created_at is None:
+        return datetime.now(JST).date()
+    created = delivery.created_at
+    if created.tzinfo is None:
+        created = created.replace(tzinfo=UTC)
+    return created.astimezone(JST).date()
+
+
+def sync_delivery_stats(delivery: Delivery, redis=None):
+    """Deliveryの現在の件数をカウンタに反映 (前回反映分との差分だけ加算)"""
+    global _sync_delivery_script
+    if delivery is None or delivery.id is None:
+        return
+    try:
+        redis = redis or get_sync_redis()
+        if _sync_delivery_script is None:
+            _sync_delivery_script = redis.register_script(_SYNC_DELIVERY_SCRIPT)
+        target_date = delivery_day(delivery)
+        values = {
+            "deliveries": 1,
+            "sent": delivery.total_count or 0,
+            "success": delivery.success_count or 0,
+            "fail": delivery.fail_count or 0,
+        }
+        args = [DELIVERY_TTL, DAY_TTL]
+        for field, value in values.items():
+            args += [field, value]
+        _sync_delivery_script(
+            keys=[
+                f"{DELIVERY_PREFIX}{delivery.id}",
+                day_key(target_date),
+                day_key(target_date, delivery.plan_id or 0),
+            ],
+            args=args,
+            client=redis,
+        )
+    except Exception as e:
+        logger.warning(f"配信統計の反映失敗: delivery_id={delivery.id} - {e}")
+
+
+def refresh_day_stats(db: Session, target_date: date):
+    """
+    指定日の統計を更新する (スケジューラーから定期実行)。
+    - 当日のDeliveryを再同期 (途中終了などで反映漏れがあっても差分だけ補正される)
+    - システムログ件数を集計
+    - Redis のカウンタを daily_stats に書き出す
+    """
+    redis = get_sync_redis()
+    start_utc, end_utc = _utc_range(target_date)
+
+    deliveries = db.query(Delivery).filter(
+        Delivery.created_at >= start_utc,
+        Delivery.created_at < end_utc,
+    ).yield_per(500)
+    for delivery in deliveries:
+        sync_delivery_stats(delivery, redis)
+
+    level_group = case(
+        (SystemLog.level.in_(["ERROR", "CRITICAL"]), "errors"),
+        else_="warnings",
+    ).label("level_group")
+    log_counts = dict(
+        db.query(level_group, sa_func.count(SystemLog.id)).filter(
+            SystemLog.created_at >= start_utc,
+            SystemLog.created_at < end_utc,
+            SystemLog.level.in_(["ERROR", "CRITICAL", "WARNING"]),
+        ).group_by(level_group).all()
+    )
+    redis.hset(day_key(target_date), mapping={f: log_counts.get(f, 0) for f in LOG_FIELDS})
+    redis.expire(day_key(target_date), DAY_TTL)
+
+    _flush_to_rollup(db, redis, target_date)
+
+
+def _flush_to_rollup(db: Session, redis, target_date: date):
+    """Redis の日別カウンタを daily_stats に upsert (plan_id=0 は全体合計)"""
+    rows = []
+    total = redis.hgetall(day_key(target_date))
+    if total:
+        rows.append((0, total))
+    for key in redis.scan_iter(match=f"{day_key(target_date)}:plan:*", count=500):
+        plan_id = int(key.rsplit(":", 1)[1])
+        if plan_id:
+            rows.append((plan_id, redis.hgetall(key)))
+
+    for plan_id, values in rows:
+        counts = {f: int(values.get(f, 0)) for f in COUNTER_FIELDS}
+        stmt = mysql_insert(DailyStat).values(date=target_date, plan_id=plan_id, **counts)
+        db.execute(stmt.on_duplicate_key_update(**{f: stmt.inserted[f] for f in COUNTER_FIELDS}))
+    db.commit()
+
+
+def get_day_stats(redis, db: Session, target_date: date, plan_id: Optional[int] = None) -> dict:
+    """日別 (プラン別) の統計。Redis になければロールアップから読む"""
+    raw = redis.hgetall(day_key(target_date, plan_id))
+    if raw:
+        return {f: int(raw.get(f, 0)) for f in COUNTER_FIELDS}
+
+    row = db.query(DailyStat).filter(
+        DailyStat.date == target_date,
+        DailyStat.plan_id == (plan_id or 0),
+    ).first()
+    return {f: (getattr(row, f) if row else 0) for f in COUNTER_FIELDS}
+
+
+def compute_subscription_snapshot(db: Session) -> dict:
+    """ユーザー数・購読数・売上・プラン別加入者数をSQL集計で計算"""
+    total_users = db.query(sa_func.count(User.id)).filter(User.role == "user").scalar()
+    active_users = db.query(sa_func.count(User.id)).filter(
+        User.role == "user", User.is_active == True, User.email_verified == True,
+    ).scalar()
+
+    sub_counts = dict(
+        db.query(Subscription.status, sa_func.count(Subscription.id))
+        .filter(Subscription.status.in_(ACTIVE_STATUSES))
+        .group_by(Subscription.status)
+        .all()
+    )
+
+    # 売上 (定価とプロモ適用後)
+    discounted_price = case(
+        (
+            (PromotionCode.discount_type == "percent_off") & (PromotionCode.discount_value > 0),
+            Plan.price * (100 - PromotionCode.discount_value) / 100,
+        ),
+        (
+            (PromotionCode.discount_type == "amount_off") & (PromotionCode.discount_value > 0),
+            sa_func.greatest(0, Plan.price - PromotionCode.discount_value),
+        ),
+        else_=Plan.price,
+    )
+    list_price_total, discounted_total = (
+        db.query(sa_func.sum(Plan.price), sa_func.sum(discounted_price))
+        .select_from(Subscription)
+        .join(Plan, Subscription.plan_id == Plan.id)
+        .join(User, Subscription.user_id == User.id)
+        .outerjoin(PromotionCode, Subscription.promotion_code_id == PromotionCode.id)
+        .filter(
+            Subscription.status.in_(ACTIVE_STATUSES),
+            User.is_active == True,
+        )
+        .one()
+    )
+
+    # プラン別加入者数 (0人のプランも含め sort_order 順)
+    plan_breakdown = (
+        db.query(
+            Plan.name,
+            Plan.price,
+            sa_func.count(Subscription.id).label("cnt"),
+        )
+        .outerjoin(
+            Subscription,
+            (Subscription.plan_id == Plan.id) & (Subscription.status.in_(ACTIVE_STATUSES)),
+        )
+        .filter(Plan.is_active == True)
+        .group_by(Plan.id)
+        .order_by(Plan.sort_order, Plan.id)
+        .all()
+    )
+
+    return {
+        "users": {
+            "total": total_users,
+            "active": active_users,
+        },
+        "subscriptions": {
+            "total_active": sum(sub_counts.values()),
+            "trialing": sub_counts.get("trialing", 0),
+        },
+        "revenue": {
+            "list_price": int(list_price_total or 0),
+            "discounted": int(discounted_total or 0),
+        },
+        "plans_summary": [
+            {"name": name, "price": price, "count": cnt}
+            for name, price, cnt in plan_breakdown
+        ],
+        "computed_at": datetime.now(JST).isoformat(),
+    }
+
+
+def empty_subscription_snapshot() -> dict:
+    """初回集計前に返す空のスナップショット"""
+    return {
+        "users": {"total": 0, "active": 0},
+        "subscriptions": {"total_active": 0, "trialing": 0},
+        "revenue": {"list_price": 0, "discounted": 0},
+        "plans_summary": [],
+        "computed_at": None,
+    }
+
+
+def refresh_subscription_snapshot(db: Session, redis=None) -> dict:
+    """スナップショットを再計算して保存 (スケジューラーから呼ぶ)"""
+    redis = redis or get_sync_redis()
+    # 集計中の invalidate を取りこぼさないよう、印は集計前に消す
+    redis.delete(SNAPSHOT_DIRTY_KEY)
+    snapshot = compute_subscription_snapshot(db)
+    redis.set(SNAPSHOT_KEY, json.dumps(snapshot, ensure_ascii=False))
+    return snapshot
+
+
+def refresh_subscription_snapshot_if_dirty(db: Session) -> bool:
+    """再計算待ちの印があるときだけ再計算する"""
+    redis = get_sync_redis()
+    if not redis.exists(SNAPSHOT_DIRTY_KEY) and redis.exists(SNAPSHOT_KEY):
+        return False
+    refresh_subscription_snapshot(db, redis)
+    return True
+
+
+def get_subscription_snapshot(redis) -> dict:
+    """
+    保存済みの購読スナップショット (リクエスト中には集計しない)
+    未保存なら再計算待ちの印を付けて空の値を返す。
+    """
+    cached = redis.get(SNAPSHOT_KEY)
+    if cached:
+        return json.loads(cached)
+    redis.set(SNAPSHOT_DIRTY_KEY, "1")
+    return empty_subscription_snapshot()
+
+
+def invalidate_subscription_snapshot():
+    """購読・ユーザーの変更時に呼ぶ (毎分のジョブで再計算)"""
+    try:
+        get_sync_redis().set(SNAPSHOT_DIRTY_KEY, "1")
+    except Exception as e:
+        logger.warning(f"購読スナップショットの無効化失敗: {e}")
+
+
+def _utc_range(target_date: date) -> tuple[datetime, datetime]:
+    """JSTの1日をUTC (naive) の範囲に変換"""
+    start = datetime.combine(target_date, time.min).replace(tzinfo=JST).astimezone(UTC).replace(tzinfo=None)
+    return start, start + timedelta(days=1)
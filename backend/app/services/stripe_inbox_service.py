@@ -0,0 +1,167 @@
+"""Stripe Webhook 受信箱の保存と処理
+
+- 受信: 署名検証済みイベントを event_id の一意制約で1行だけ保存する (再送は無視)
+- 処理: 顧客キーごとに stripe_created → id 順で1件ずつハンドラを実行する。
+  失敗したイベントは指数バックオフでリトライし、その間同じ顧客の後続イベントは待たせる
+  (attempts が上限に達したイベントは諦めて後続を進める)。
+顧客単位の排他は呼び出し側 (webhook_worker) が取る。
+"""
+import json
+from datetime import datetime, timedelta
+from zoneinfo import ZoneInfo
+from sqlalchemy import and_, func, or_
+from sqlalchemy.dialects.mysql import insert as mysql_insert
+from sqlalchemy.orm import Session, aliased
+
+from app.models.stripe_event_inbox import StripeEventInbox
+from app.services.stripe_webhook_service import handle_stripe_event
+from app.services.system_log_sink import log_event
+from app.core.logging import get_logger
+
+logger = get_logger(__name__)
+UTC = ZoneInfo("UTC")
+
+PENDING = 0
+PROCESSING = 1
+DONE = 2
+ERROR = 3
+
+MAX_ATTEMPTS = 8
+RETRY_BASE_SECONDS = 30  # 30秒, 1分, 2分, ... 最大 RETRY_MAX_SECONDS
+RETRY_MAX_SECONDS = 3600
+STALE_LOCK_SECONDS = 600  # 処理中のまま残った行 (プロセス停止) を再処理するまでの秒数
+CUSTOMER_BATCH = 50  # 1回の排他で処理する1顧客あたりの最大件数
+DONE_RETENTION_DAYS = 30
+
+
+def _utcnow() -> datetime:
+    return datetime.now(UTC).replace(tzinfo=None)
+
+
+def customer_key_for(event) -> str:
+    """順序保証の単位。Stripe Customer ID、取れないイベントは単独 (Event ID)"""
+    obj = event["data"]["object"]
+    customer = obj.get("customer")
+    if isinstance(customer, dict):
+        customer = customer.get("id")
+    if not customer and obj.get("object") == "customer":
+        customer = obj.get("id")
+    return customer or event["id"]
+
+
+def store_event(db: Session, event, payload: bytes):
+    """署名検証済みのイベントを受信箱に保存 (同じ event_id の再送は何もしない)"""
+    stmt = mysql_insert(StripeEventInbox).values(
+        event_id=event["id"],
+        event_type=event["type"],
+        customer_key=customer_key_for(event),
+        stripe_created=int(event.get("created") or 0),
+        payload=payload.decode("utf-8"),
+        status=PENDING,
+    )
+    db.execute(stmt.on_duplicate_key_update(event_id=stmt.inserted.event_id))
+    db.commit()
+
+
+def due_customer_keys(db: Session, limit: int) -> list[str]:
+    """
+    処理待ちイベントがある顧客キー (最も古いイベントの順)
+
+    リトライ待ちのイベントを抱える顧客は process_customer_events で先へ進めないため除外する。
+    除外しないと、待ち中の顧客が古い順に limit を占有し、他の顧客が処理されなくなる。
+    """
+    now = _utcnow()
+    first_id = func.min(StripeEventInbox.id).label("first_id")
+    waiting = aliased(StripeEventInbox)
+    in_backoff = db.query(waiting.id).filter(
+        waiting.customer_key == StripeEventInbox.customer_key,
+        waiting.status == ERROR,
+        waiting.attempts < MAX_ATTEMPTS,
+        waiting.next_attempt_at > now,
+    ).exists()
+    rows = db.query(StripeEventInbox.customer_key, first_id).filter(
+        or_(
+            StripeEventInbox.status == PENDING,
+            and_(
+                StripeEventInbox.status == ERROR,
+                StripeEventInbox.attempts < MAX_ATTEMPTS,
+                StripeEventInbox.next_attempt_at <= now,
+            ),
+            and_(
+                StripeEventInbox.status == PROCESSING,
+                StripeEventInbox.locked_at < now - timedelta(seconds=STALE_LOCK_SECONDS),
+            ),
+        ),
+        ~in_backoff,
+    ).group_by(StripeEventInbox.customer_key).order_by(first_id).limit(limit).all()
+    return [row.customer_key for row in rows]
+
+
+def process_customer_events(db: Session, customer_key: str) -> int:
+    """
+    1顧客分の未処理イベントを順番に処理し、処理件数を返す。
+    失敗したらそこで止め、後続イベントはリトライが済むまで処理しない。
+    """
+    entries = db.query(StripeEventInbox).filter(
+        StripeEventInbox.customer_key == customer_key,
+        StripeEventInbox.status != DONE,
+        StripeEventInbox.attempts < MAX_ATTEMPTS,
+    ).order_by(
+        StripeEventInbox.stripe_created, StripeEventInbox.id,
+    ).limit(CUSTOMER_BATCH).all()
+
+    processed = 0
+    for entry in entries:
+        now = _utcnow()
+        if entry.status == ERROR and entry.next_attempt_at and entry.next_attempt_at > now:
+            break  # リトライ待ち: 順序を守るため後続も待つ
+
+        entry.status = PROCESSING
+        entry.locked_at = now
+        entry.attempts += 1
+        db.commit()
+
+        try:
+            handle_stripe_event(db, json.loads(entry.payload))
+        except Exception as e:
+            db.rollback()
+            _mark_failed(db, entry, str(e))
+            break
+
+        entry.status = DONE
+        entry.processed_at = _utcnow()
+        entry.last_error = None
+        db.commit()
+        processed += 1
+    return processed
+
+
+def _mark_failed(db: Session, entry: StripeEventInbox, error: str):
+    delay = min(RETRY_BASE_SECONDS * 2 ** (entry.attempts - 1), RETRY_MAX_SECONDS)
+    entry.status = ERROR
+    entry.last_error = error[:1000]
+    entry.next_attempt_at = _utcnow() + timedelta(seconds=delay)
+    db.commit()
+
+    if entry.attempts >= MAX_ATTEMPTS:
+        logger.error(f"Stripeイベント処理失敗 (リトライ上限): {entry.event_id} ({entry.event_type}) - {error}")
+        log_event(
+            "ERROR", "stripe_event_failed",
+            f"{entry.event_type} {entry.event_id}: {error}",
+            details={"customer_key": entry.customer_key, "attempts": entry.attempts},
+        )
+    else:
+        logger.warning(
+            f"Stripeイベント処理失敗: {entry.event_id} ({entry.event_type}) "
+            f"attempt={entry.attempts}/{MAX_ATTEMPTS}, {delay}秒後にリトライ - {error}"
+        )
+
+
+def purge_processed_events(db: Session, days: int = DONE_RETENTION_DAYS) -> int:
+    """処理済みイベントを保持期間経過後に削除"""
+    deleted = db.query(StripeEventInbox).filter(
+        StripeEventInbox.status == DONE,
+        StripeEventInbox.processed_at < _utcnow() - timedelta(days=days),
+    ).delete(synchronize_session=False)
+    db.commit()
+    return deleted
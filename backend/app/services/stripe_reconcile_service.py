@@ -0,0 +1,185 @@
+"""Stripe⇔DB 照合の共通処理
+
+全件照合 (週次) と Event API による差分照合 (毎時) の両方から使う。
+照合中に1件ずつ DB を引かないよう、Stripe ID → DB の対応は ReconcileMaps で一括ロードする。
+"""
+from datetime import datetime
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from app.models.invoice_record import InvoiceRecord
+from app.models.subscription import Subscription
+from app.models.user import User
+from app.models.promotion_code import PromotionCode
+from app.core.logging import get_logger
+
+logger = get_logger(__name__)
+
+ACTIVE_STATUSES = ("trialing", "active", "past_due")
+
+
+class ReconcileMaps:
+    """照合用の事前ロード: 購読・顧客・クーポン"""
+
+    def __init__(self, db: Session):
+        # stripe_subscription_id → (id, status, cancel_at_period_end)
+        self.subscriptions = {
+            row.stripe_subscription_id: row
+            for row in db.query(
+                Subscription.stripe_subscription_id,
+                Subscription.id,
+                Subscription.status,
+                Subscription.cancel_at_period_end,
+            ).filter(Subscription.stripe_subscription_id != None)
+        }
+        # stripe_customer_id → user_id
+        self.users = dict(
+            db.query(User.stripe_customer_id, User.id).filter(User.stripe_customer_id != None).all()
+        )
+        # stripe_coupon_id → promotion_code_id (同じクーポンが複数あれば最初の1件)
+        self.promos = {}
+        for coupon_id, promo_id in db.query(
+            PromotionCode.stripe_coupon_id, PromotionCode.id,
+        ).filter(PromotionCode.stripe_coupon_id != None).order_by(PromotionCode.id):
+            self.promos.setdefault(coupon_id, promo_id)
+
+
+def subscription_inconsistencies(stripe_sub, db_sub) -> list[dict]:
+    """Stripe の購読1件と DB 行 (ReconcileMaps.subscriptions の値、なければ None) を比較"""
+    stripe_id = stripe_sub["id"]
+    stripe_status = stripe_sub.get("status")
+    result = []
+
+    if stripe_status in ACTIVE_STATUSES:
+        if db_sub is None:
+            # Stripeでアクティブな購読がDBにない
+            result.append({
+                "type": "MISSING_IN_DB",
+                "stripe_subscription_id": stripe_id,
+                "stripe_status": stripe_status,
+                "customer_id": stripe_sub.get("customer"),
+                "message": "Stripeにアクティブな購読があるがDBに存在しない",
+            })
+            return result
+        if db_sub.status != stripe_status:
+            result.append({
+                "type": "STATUS_MISMATCH",
+                "stripe_subscription_id": stripe_id,
+                "stripe_status": stripe_status,
+                "db_status": db_sub.status,
+                "subscription_id": db_sub.id,
+                "message": f"ステータス不一致: Stripe={stripe_status}, DB={db_sub.status}",
+            })
+        stripe_cancel = bool(stripe_sub.get("cancel_at_period_end"))
+        if db_sub.status in ACTIVE_STATUSES and bool(db_sub.cancel_at_period_end) != stripe_cancel:
+            result.append({
+                "type": "CANCEL_FLAG_MISMATCH",
+                "stripe_subscription_id": stripe_id,
+                "stripe_cancel_at_period_end": stripe_cancel,
+                "db_cancel_at_period_end": db_sub.cancel_at_period_end,
+                "subscription_id": db_sub.id,
+                "message": f"キャンセル予約フラグ不一致: Stripe={stripe_cancel}, DB={db_sub.cancel_at_period_end}",
+            })
+
+    elif stripe_status == "canceled" and db_sub is not None and db_sub.status in ACTIVE_STATUSES:
+        # Stripeでキャンセル済みなのにDBでアクティブ
+        result.append({
+            "type": "CANCELED_BUT_ACTIVE_IN_DB",
+            "stripe_subscription_id": stripe_id,
+            "stripe_status": stripe_status,
+            "db_status": db_sub.status,
+            "subscription_id": db_sub.id,
+            "message": "Stripeでキャンセル済みだがDBでアクティブ",
+        })
+
+    return result
+
+
+def _invoice_record(inv, maps: ReconcileMaps) -> InvoiceRecord:
+    """Stripe Invoice → InvoiceRecord (DB参照は事前ロード済みの対応表のみ)"""
+    stripe_subscription_id = inv.get("subscription")
+    sub = maps.subscriptions.get(stripe_subscription_id) if stripe_subscription_id else None
+
+    # 割引情報
+    discount = inv.get("discount") or {}
+    coupon = discount.get("coupon") if discount else None
+    coupon_id = coupon.get("id") if coupon else None
+
+    discount_amount = sum(d.get("amount", 0) for d in (inv.get("total_discount_amounts") or []))
+
+    # 期間
+    period_start = None
+    period_end = None
+    lines = (inv.get("lines") or {}).get("data") or []
+    if lines and lines[0].get("period"):
+        period = lines[0]["period"]
+        period_start = datetime.fromtimestamp(period["start"]) if period.get("start") else None
+        period_end = datetime.fromtimestamp(period["end"]) if period.get("end") else None
+
+    return InvoiceRecord(
+        stripe_invoice_id=inv["id"],
+        stripe_subscription_id=stripe_subscription_id,
+        subscription_id=sub.id if sub else None,
+        user_id=maps.users.get(inv.get("customer")),
+        amount_paid=inv.get("amount_paid") or 0,
+        subtotal=inv.get("subtotal") or 0,
+        discount_amount=discount_amount,
+        promotion_code_id=maps.promos.get(coupon_id) if coupon_id else None,
+        coupon_id=coupon_id,
+        period_start=period_start,
+        period_end=period_end,
+        status="paid",
+    )
+
+
+def sync_invoices(db: Session, invoices: list, maps: ReconcileMaps) -> tuple[int, int]:
+    """
+    支払い済み Invoice のうち未記録のものを invoice_records に追加。
+    既存チェックは1回の IN クエリ。戻り値: (追加件数, スキップ件数)
+    """
+    if not invoices:
+        return 0, 0
+    ids = [inv["id"] for inv in invoices]
+    existing = {
+        row.stripe_invoice_id for row in db.query(InvoiceRecord.stripe_invoice_id).filter(
+            InvoiceRecord.stripe_invoice_id.in_(ids),
+        )
+    }
+    records = []
+    for inv in invoices:
+        if inv["id"] in existing:
+            continue
+        existing.add(inv["id"])
+        try:
+            records.append(_invoice_record(inv, maps))
+        except Exception as e:
+            logger.warning(f"Invoice個別同期エラー: invoice={inv['id']}, error={e}")
+    if not records:
+        return 0, len(invoices)
+
+    try:
+        db.add_all(records)
+        db.commit()
+        return len(records), len(invoices) - len(records)
+    except IntegrityError:
+        # Webhook と同時に記録された等: 1件ずつ入れ直す
+        db.rollback()
+
+    synced = 0
+    for record in records:
+        try:
+            db.add(record)
+            db.commit()
+            synced += 1
+        except IntegrityError:
+            db.rollback()
+    return synced, len(invoices) - synced
+
+
+def latest_by_id(objects: list) -> dict:
+    """古い順に並んだイベントの object から、ID ごとの最新スナップショットを取る"""
+    latest = {}
+    for obj in objects:
+        latest[obj["id"]] = obj
+    return latest
+
@@ -347,6 +347,12 @@ def remove_subscription_coupon(subscription_id: str) -> bool:
         return False
 
 
+def retrieve_subscription_with_discount(subscription_id: str):
+    """割引 (クーポン) を展開して Stripe Subscription を取得 (失敗時は例外)"""
+    _init_stripe()
+    return stripe.Subscription.retrieve(subscription_id, expand=["discount.coupon"])
+
+
 def get_subscription_discount_info(subscription_id: str) -> dict:
     """Stripeのsubscriptionから割引情報を取得
     
@@ -0,0 +1,518 @@
+"""Stripe Webhook イベント処理
+
+受信箱 (stripe_event_inbox) から取り出したイベントを webhook_worker が処理する。
+"""
+from sqlalchemy.orm import Session
+from datetime import datetime
+from zoneinfo import ZoneInfo
+
+from app.services import stripe_service, subscription_service, subscription_mirror
+from app.services.stats_service import invalidate_subscription_snapshot
+from app.services.mail_service import (
+    send_subscription_welcome_email,
+    send_plan_change_email,
+    send_renewal_complete_email,
+)
+from app.models.user import User
+from app.models.plan import Plan
+from app.models.subscription import Subscription
+from app.models.processed_stripe_event import ProcessedStripeEvent
+from app.models.promotion_code import PromotionCode
+from app.core.logging import get_logger
+
+logger = get_logger(__name__)
+JST = ZoneInfo("Asia/Tokyo")
+
+
+def handle_stripe_event(db: Session, event: dict) -> bool:
+    """
+    イベント種別ごとのハンドラを実行する。
+    戻り値: 処理した場合 True、処理済み (重複) や対象外イベントは False。
+    失敗時は例外をそのまま送出する (受信箱側でリトライ)。
+    """
+    event_id = event["id"]
+    event_type = event["type"]
+    data = event["data"]["object"]
+    previous_attributes = event["data"].get("previous_attributes", {})
+
+    # 冪等性チェック: 同一イベントの重複処理を防止
+    if _is_event_processed(db, event_id):
+        logger.info(f"Stripe webhook重複スキップ: {event_id} ({event_type})")
+        return False
+
+    if event_type == "checkout.session.completed":
+        _handle_checkout_completed(db, data)
+    elif event_type == "customer.subscription.created":
+        _handle_subscription_created(db, data)
+    elif event_type == "customer.subscription.updated":
+        _handle_subscription_updated(db, data, event_id, previous_attributes)
+    elif event_type == "customer.subscription.deleted":
+        _handle_subscription_deleted(db, data)
+    elif event_type == "invoice.paid":
+        _handle_invoice_paid(db, data)
+    elif event_type == "invoice.payment_failed":
+        _handle_invoice_payment_failed(db, data)
+    else:
+        logger.info(f"未処理のStripeイベント: {event_type}")
+        return False
+
+    # 割引情報のミラー (マイページ表示用)
+    if event_type in ("customer.subscription.created", "customer.subscription.updated"):
+        subscription_mirror.mirror_from_event(db, data, event.get("created"))
+
+    # 処理済みとして記録
+    _record_processed_event(db, event_id, event_type)
+    invalidate_subscription_snapshot()
+    return True
+
+
+# =========================================================
+# 冪等性ヘルパー
+# =========================================================
+
+def _is_event_processed(db: Session, event_id: str) -> bool:
+    return db.query(ProcessedStripeEvent).filter(
+        ProcessedStripeEvent.event_id == event_id
+    ).first() is not None
+
+
+def _record_processed_event(db: Session, event_id: str, event_type: str):
+    db.add(ProcessedStripeEvent(event_id=event_id, event_type=event_type))
+    db.commit()
+
+
+# =========================================================
+# イベントハンドラ
+# =========================================================
+
+def _handle_checkout_completed(db: Session, data: dict):
+    """checkout.session.completed: Checkoutフローからの購読開始"""
+    metadata = data.get("metadata", {})
+    user_id = int(metadata.get("user_id", 0))
+    plan_id = int(metadata.get("plan_id", 0))
+    member_no = metadata.get("member_no", "")
+    stripe_subscription_id = data.get("subscription")
+    stripe_customer_id = data.get("customer")
+
+    if not user_id or not plan_id:
+        logger.warning(f"checkout.session.completed: metadata不足")
+        return
+
+    if not stripe_subscription_id:
+        logger.warning(f"checkout.session.completed: subscription_id なし (無料プラン?)")
+        return
+
+    user = db.query(User).filter(User.id == user_id).first()
+    if user:
+        # Stripe Customer ID更新
+        if stripe_customer_id and not user.stripe_customer_id:
+            user.stripe_customer_id = stripe_customer_id
+        # トライアル使用済みに (有料プランでトライアルが有効な場合のみ、無料プランは消費しない)
+        plan = db.query(Plan).filter(Plan.id == plan_id).first()
+        if plan and plan.trial_enabled and plan.price > 0:
+            user.trial_used = True
+            logger.info(f"トライアル使用フラグ設定: user_id={user.id}, plan_id={plan_id}")
+        db.commit()
+
+    # 購読レコード作成 (重複チェック)
+    existing = db.query(Subscription).filter(
+        Subscription.stripe_subscription_id == stripe_subscription_id
+    ).first()
+    if existing:
+        # 既存レコードがincomplete等、またはcurrent_period_endがNULLの場合は更新
+        needs_update = (
+            existing.status in ("incomplete", "incomplete_expired") or
+            existing.current_period_end is None
+        )
+        if needs_update:
+            try:
+                stripe_sub = stripe_service.retrieve_subscription(stripe_subscription_id)
+                if stripe_sub:
+                    existing.status = stripe_sub.get("status", "active")
+                    if stripe_sub.get("trial_end"):
+                        existing.trial_end = datetime.fromtimestamp(stripe_sub["trial_end"])
+                    if stripe_sub.get("current_period_start"):
+                        existing.current_period_start = datetime.fromtimestamp(stripe_sub["current_period_start"])
+                    if stripe_sub.get("current_period_end"):
+                        existing.current_period_end = datetime.fromtimestamp(stripe_sub["current_period_end"])
+                    db.commit()
+                    logger.info(f"Checkout完了: 既存購読を更新 subscription_id={existing.id}, status={existing.status}, period_end={existing.current_period_end}")
+            except Exception as e:
+                logger.warning(f"Checkout完了: 既存購読の更新失敗: {e}")
+        else:
+            logger.info(f"Checkout完了: 購読は既に存在 user_id={user_id}, subscription_id={existing.id}")
+        return
+
+    # Stripe Subscriptionから正確なステータスと期間情報を取得
+    status = "active"
+    trial_end = None
+    current_period_start = None
+    current_period_end = None
+    try:
+        stripe_sub = stripe_service.retrieve_subscription(stripe_subscription_id)
+        if stripe_sub:
+            status = stripe_sub.get("status", "active")
+            if stripe_sub.get("trial_end"):
+                trial_end = datetime.fromtimestamp(stripe_sub["trial_end"])
+            if stripe_sub.get("current_period_start"):
+                current_period_start = datetime.fromtimestamp(stripe_sub["current_period_start"])
+            if stripe_sub.get("current_period_end"):
+                current_period_end = datetime.fromtimestamp(stripe_sub["current_period_end"])
+            logger.info(f"Stripe Subscription取得: status={status}, trial_end={trial_end}")
+    except Exception as e:
+        logger.warning(f"Stripe Subscription取得失敗: {e}")
+
+    # ディスカウントからプロモーションコードを取得
+    promotion_code_id = None
+    try:
+        stripe_sub_obj = stripe_service.retrieve_subscription(stripe_subscription_id)
+        if stripe_sub_obj and stripe_sub_obj.get("discount"):
+            discount = stripe_sub_obj["discount"]
+            coupon = discount.get("coupon", {})
+            stripe_coupon_id = coupon.get("id") if coupon else None
+            if stripe_coupon_id:
+                promo = db.query(PromotionCode).filter(
+                    PromotionCode.stripe_coupon_id == stripe_coupon_id
+                ).first()
+                if promo:
+                    promotion_code_id = promo.id
+    except Exception as e:
+        logger.warning(f"プロモーションコード取得失敗: {e}")
+
+    subscription_service.create_subscription_record(
+        db=db,
+        user_id=user_id,
+        plan_id=plan_id,
+        member_no=member_no,
+        stripe_subscription_id=stripe_subscription_id,
+        status=status,
+        trial_end=trial_end,
+        current_period_start=current_period_start,
+        current_period_end=current_period_end,
+        promotion_code_id=promotion_code_id,
+    )
+
+    logger.info(f"Checkout完了: user_id={user_id}, plan_id={plan_id}, status={status}, promo_id={promotion_code_id}")
+
+    # プロモーションコード使用数を更新
+    try:
+        # Checkout Sessionのdiscounts配列からpromotion_codeを取得
+        discounts = data.get("discounts", []) or []
+        # または単一のdiscount
+        if not discounts and data.get("discount"):
+            discount = data.get("discount", {})
+            if discount.get("promotion_code"):
+                discounts = [{"promotion_code": discount["promotion_code"]}]
+        
+        for discount_item in discounts:
+            promo_code_id = discount_item.get("promotion_code")
+            if promo_code_id:
+                promo = db.query(PromotionCode).filter(
+                    PromotionCode.stripe_promotion_code_id == promo_code_id
+                ).first()
+                if promo:
+                    promo.times_redeemed = (promo.times_redeemed or 0) + 1
+                    db.commit()
+                    logger.info(f"プロモーションコード使用: code={promo.code}, times_redeemed={promo.times_redeemed}")
+    except Exception as e:
+        logger.warning(f"プロモーションコード使用数更新失敗: {e}")
+    
+    # 加入完了メール送信
+    if user and plan:
+        is_trial = status == "trialing"
+        next_date = trial_end if is_trial else current_period_end
+        next_date_str = next_date.astimezone(JST).strftime("%Y年%m月%d日") if next_date else "-"
+        trial_end_str = trial_end.astimezone(JST).strftime("%Y年%m月%d日") if trial_end else None
+        
+        send_subscription_welcome_email(
+            to_email=user.email,
+            name=f"{user.name_last} {user.name_first}",
+            plan_name=plan.name,
+            plan_price=plan.price,
+            next_billing_date=next_date_str,
+            is_trial=is_trial,
+            trial_end_date=trial_end_str,
+        )
+
+
+def _handle_subscription_created(db: Session, data: dict):
+    """customer.subscription.created: Billing Portal等からの新規サブスクリプション"""
+    stripe_sub_id = data.get("id")
+    stripe_customer_id = data.get("customer")
+    status = data.get("status", "active")
+
+    # 既存チェック (checkout.session.completed で作成済みの場合)
+    existing = db.query(Subscription).filter(
+        Subscription.stripe_subscription_id == stripe_sub_id
+    ).first()
+    if existing:
+        logger.info(f"subscription.created: 既存レコード stripe_sub_id={stripe_sub_id}")
+        return
+
+    # Customer ID → ユーザー逆引き
+    user = db.query(User).filter(User.stripe_customer_id == stripe_customer_id).first()
+    if not user:
+        logger.warning(f"subscription.created: ユーザー不明 customer={stripe_customer_id}")
+        return
+
+    # Price ID → プラン逆引き
+    items = data.get("items", {}).get("data", [])
+    if not items:
+        logger.warning(f"subscription.created: items なし stripe_sub_id={stripe_sub_id}")
+        return
+
+    price_id = items[0].get("price", {}).get("id")
+    plan = db.query(Plan).filter(Plan.stripe_price_id == price_id).first()
+    if not plan:
+        logger.warning(f"subscription.created: プラン不明 price_id={price_id}")
+        return
+
+    # 期間情報取得: トップレベル → items.data[0] の順でフォールバック
+    # (Stripe API 2025-12-15.clover 以降、current_period_* は items 内に移動)
+    trial_end = None
+    current_period_start = None
+    current_period_end = None
+    if data.get("trial_end"):
+        trial_end = datetime.fromtimestamp(data["trial_end"])
+    
+    # トップレベルから取得
+    if data.get("current_period_start"):
+        current_period_start = datetime.fromtimestamp(data["current_period_start"])
+    if data.get("current_period_end"):
+        current_period_end = datetime.fromtimestamp(data["current_period_end"])
+    
+    # トップレベルにない場合、items.data[0] から取得
+    if (current_period_start is None or current_period_end is None) and items:
+        item = items[0]
+        if current_period_start is None and item.get("current_period_start"):
+            current_period_start = datetime.fromtimestamp(item["current_period_start"])
+        if current_period_end is None and item.get("current_period_end"):
+            current_period_end = datetime.fromtimestamp(item["current_period_end"])
+
+    # ディスカウントからプロモーションコードを取得
+    promotion_code_id = None
+    discount = data.get("discount")
+    if discount:
+        coupon = discount.get("coupon", {})
+        stripe_coupon_id = coupon.get("id") if coupon else None
+        if stripe_coupon_id:
+            promo = db.query(PromotionCode).filter(
+                PromotionCode.stripe_coupon_id == stripe_coupon_id
+            ).first()
+            if promo:
+                promotion_code_id = promo.id
+
+    subscription_service.create_subscription_record(
+        db=db,
+        user_id=user.id,
+        plan_id=plan.id,
+        member_no=user.member_no,
+        stripe_subscription_id=stripe_sub_id,
+        status=status,
+        trial_end=trial_end,
+        current_period_start=current_period_start,
+        current_period_end=current_period_end,
+        promotion_code_id=promotion_code_id,
+    )
+
+    logger.info(f"subscription.created: レコード作成 user_id={user.id}, plan_id={plan.id}, status={status}, promo_id={promotion_code_id}")
+    
+    # 加入完了メール送信
+    is_trial = status == "trialing"
+    next_date = trial_end if is_trial else current_period_end
+    next_date_str = next_date.astimezone(JST).strftime("%Y年%m月%d日") if next_date else "-"
+    trial_end_str = trial_end.astimezone(JST).strftime("%Y年%m月%d日") if trial_end else None
+    
+    send_subscription_welcome_email(
+        to_email=user.email,
+        name=f"{user.name_last} {user.name_first}",
+        plan_name=plan.name,
+        plan_price=plan.price,
+        next_billing_date=next_date_str,
+        is_trial=is_trial,
+        trial_end_date=trial_end_str,
+    )
+
+
+def _handle_subscription_updated(db: Session, data: dict, event_id: str, previous_attributes: dict = None):
+    """customer.subscription.updated: ステータス変更 + プラン変更検知"""
+    previous_attributes = previous_attributes or {}
+    stripe_sub_id = data.get("id")
+    status = data.get("status", "active")
+    cancel_at_period_end = data.get("cancel_at_period_end", False)
+
+    # 期間情報: トップレベル → items.data[0] の順でフォールバック
+    # (Stripe API 2025-12-15.clover 以降、current_period_* は items 内に移動)
+    period_start = data.get("current_period_start")
+    period_end = data.get("current_period_end")
+    trial_end = data.get("trial_end")
+
+    # トップレベルにない場合、items.data[0] から取得
+    items = data.get("items", {}).get("data", [])
+    if items and (period_start is None or period_end is None):
+        item = items[0]
+        if period_start is None:
+            period_start = item.get("current_period_start")
+        if period_end is None:
+            period_end = item.get("current_period_end")
+
+    logger.info(f"subscription.updated: stripe_sub_id={stripe_sub_id}, status={status}, period_end={period_end}")
+
+    # 1. 基本情報更新 (ステータス・期間)
+    subscription_service.update_subscription_from_stripe(
+        db=db,
+        stripe_subscription_id=stripe_sub_id,
+        status=status,
+        cancel_at_period_end=cancel_at_period_end,
+        current_period_start=datetime.fromtimestamp(period_start) if period_start else None,
+        current_period_end=datetime.fromtimestamp(period_end) if period_end else None,
+        trial_end=datetime.fromtimestamp(trial_end) if trial_end else None,
+    )
+
+    # 2. プラン変更検知 (items から現在のprice_idを取得)
+    items = data.get("items", {}).get("data", [])
+    if items:
+        new_price_id = items[0].get("price", {}).get("id")
+        if new_price_id:
+            subscription_service.detect_and_handle_plan_change(
+                db=db,
+                stripe_subscription_id=stripe_sub_id,
+                new_stripe_price_id=new_price_id,
+                current_period_end=datetime.fromtimestamp(period_end) if period_end else None,
+                stripe_event_id=event_id,
+            )
+
+    # 3. プロモーションコード使用数を更新（新規適用時のみ）
+    # previous_attributes に "discount" が含まれている = 今回 discount が変更された
+    try:
+        if "discount" in previous_attributes:
+            discount = data.get("discount")
+            if discount and discount.get("promotion_code"):
+                promo_code_id = discount["promotion_code"]
+                promo = db.query(PromotionCode).filter(
+                    PromotionCode.stripe_promotion_code_id == promo_code_id
+                ).first()
+                if promo:
+                    promo.times_redeemed = (promo.times_redeemed or 0) + 1
+                    db.commit()
+                    logger.info(f"プロモーションコード使用（プラン変更）: code={promo.code}, times_redeemed={promo.times_redeemed}")
+    except Exception as e:
+        logger.warning(f"プロモーションコード使用数更新失敗（subscription.updated）: {e}")
+
+
+def _handle_subscription_deleted(db: Session, data: dict):
+    """customer.subscription.deleted"""
+    stripe_sub_id = data.get("id")
+    subscription_service.handle_subscription_deleted(db, stripe_sub_id)
+
+
+def _handle_invoice_paid(db: Session, data: dict):
+    """invoice.paid: 請求成功 → past_due から active への復帰 + 初回課金時にtrial_used設定 + 更新完了メール + Invoice記録"""
+    from app.models.invoice_record import InvoiceRecord
+    from app.models.promotion_code import PromotionCode
+    
+    stripe_subscription_id = data.get("subscription")
+    if stripe_subscription_id:
+        subscription_service.handle_invoice_paid(db, stripe_subscription_id)
+
+    # 基本情報取得
+    stripe_invoice_id = data.get("id")
+    amount_paid = data.get("amount_paid", 0)
+    customer_id = data.get("customer")
+    billing_reason = data.get("billing_reason", "")
+    
+    # ユーザーと購読を取得（1回だけ）
+    user = db.query(User).filter(User.stripe_customer_id == customer_id).first() if customer_id else None
+    sub = db.query(Subscription).filter(
+        Subscription.stripe_subscription_id == stripe_subscription_id
+    ).first() if stripe_subscription_id else None
+
+    # --- Invoice記録を保存（try-exceptで囲む）---
+    try:
+        existing = db.query(InvoiceRecord).filter(
+            InvoiceRecord.stripe_invoice_id == stripe_invoice_id
+        ).first()
+        if not existing and stripe_invoice_id:
+            # 割引情報を取得
+            discount = data.get("discount") or {}
+            coupon = discount.get("coupon") or {}
+            coupon_id = coupon.get("id")
+            subtotal = data.get("subtotal", 0)
+            discount_amounts = data.get("total_discount_amounts") or []
+            discount_amount = discount_amounts[0].get("amount", 0) if discount_amounts else 0
+            
+            # プロモコードをDBから検索
+            promo = None
+            if coupon_id:
+                promo = db.query(PromotionCode).filter(
+                    PromotionCode.stripe_coupon_id == coupon_id
+                ).first()
+            
+            # 期間
+            lines = data.get("lines", {}).get("data", [])
+            period_start = None
+            period_end = None
+            if lines:
+                period = lines[0].get("period", {})
+                if period.get("start"):
+                    period_start = datetime.fromtimestamp(period["start"])
+                if period.get("end"):
+                    period_end = datetime.fromtimestamp(period["end"])
+            
+            record = InvoiceRecord(
+                stripe_invoice_id=stripe_invoice_id,
+                stripe_subscription_id=stripe_subscription_id,
+                subscription_id=sub.id if sub else None,
+                user_id=user.id if user else None,
+                amount_paid=amount_paid,
+                subtotal=subtotal,
+                discount_amount=discount_amount,
+                promotion_code_id=promo.id if promo else None,
+                coupon_id=coupon_id,
+                period_start=period_start,
+                period_end=period_end,
+                status="paid",
+            )
+            db.add(record)
+            db.commit()  # Invoice記録を確実にcommit
+            logger.info(f"Invoice記録保存: invoice={stripe_invoice_id}, amount={amount_paid}")
+    except Exception as e:
+        logger.warning(f"Invoice記録保存エラー（処理は継続）: invoice={stripe_invoice_id}, error={e}")
+        db.rollback()
+
+    # --- 有料課金が発生した場合、ユーザーのtrial_usedをTrueに設定 ---
+    subscription_id = stripe_subscription_id
+    
+    if amount_paid > 0 and user and not user.trial_used:
+        user.trial_used = True
+        db.commit()
+        logger.info(f"初回課金完了: user_id={user.id}, trial_used=True に設定")
+        
+        # 更新完了メール送信（初回以外の請求時）
+        # billing_reason: subscription_cycle（定期更新）, subscription_update（変更時の日割り）
+        if user and subscription_id and billing_reason == "subscription_cycle":
+            sub = db.query(Subscription).filter(
+                Subscription.stripe_subscription_id == subscription_id
+            ).first()
+            if sub:
+                plan = db.query(Plan).filter(Plan.id == sub.plan_id).first()
+                if plan:
+                    next_date = sub.current_period_end
+                    next_date_str = next_date.astimezone(JST).strftime("%Y年%m月%d日") if next_date else "-"
+                    send_renewal_complete_email(
+                        to_email=user.email,
+                        name=f"{user.name_last} {user.name_first}",
+                        plan_name=plan.name,
+                        amount=amount_paid,
+                        next_billing_date=next_date_str,
+                    )
+
+    logger.info(f"請求成功: subscription={subscription_id}, amount_paid={amount_paid}")
+
+
+def _handle_invoice_payment_failed(db: Session, data: dict):
+    """invoice.payment_failed: 決済失敗 → past_due + 配信停止"""
+    subscription_id = data.get("subscription")
+    if subscription_id:
+        subscription_service.handle_payment_failed(db, subscription_id)
+    logger.warning(f"決済失敗: subscription={subscription_id}")
@@ -0,0 +1,107 @@
+"""Stripe 購読の割引情報ミラー
+
+マイページの購読一覧は Stripe を呼ばず、subscriptions の discount_* 列から表示する。
+ミラーの更新元:
+- Webhook (customer.subscription.created/updated): イベント発生時点の内容
+- Stripe照合 (毎時の差分・週次の全件): 照合時点の内容
+- 利用者の明示的な更新 (subscription_service.refresh_subscription_from_stripe): Stripe から直接取得
+stripe_synced_at は「どの時点の Stripe の内容か」を表し、それより古い内容では上書きしない。
+ステータス・解約予約・期間終了は従来どおり Webhook ハンドラが更新する列をそのまま使う。
+"""
+from datetime import datetime, timedelta
+from zoneinfo import ZoneInfo
+from sqlalchemy import bindparam, or_, update
+from sqlalchemy.orm import Session
+
+from app.models.subscription import Subscription
+
+JST = ZoneInfo("Asia/Tokyo")
+
+# 全件照合 (週次) で必ず更新されるため、これより古いミラーは取りこぼしとみなす
+MIRROR_MAX_AGE = timedelta(days=8)
+# 明示的な更新でも、この間隔以内に同期済みなら Stripe を呼ばない
+REFRESH_MIN_INTERVAL = timedelta(seconds=60)
+
+_table = Subscription.__table__
+_MIRROR_UPDATE = update(_table).where(
+    _table.c.id == bindparam("b_id"),
+    or_(_table.c.stripe_synced_at == None, _table.c.stripe_synced_at < bindparam("b_as_of")),
+).values(
+    discount_coupon_id=bindparam("b_discount_coupon_id"),
+    discount_name=bindparam("b_discount_name"),
+    discount_percent=bindparam("b_discount_percent"),
+    discount_amount=bindparam("b_discount_amount"),
+    stripe_synced_at=bindparam("b_as_of"),
+)
+
+
+def jst_naive(timestamp: int | None = None) -> datetime:
+    """UNIX秒 (省略時は現在) → naive JST"""
+    dt = datetime.fromtimestamp(timestamp, JST) if timestamp else datetime.now(JST)
+    return dt.replace(tzinfo=None)
+
+
+def discount_fields(stripe_sub) -> dict:
+    """Stripe 購読 (Webhook の data.object / API の Subscription) から割引情報を取り出す"""
+    discount = stripe_sub.get("discount")
+    coupon = (discount.get("coupon") if discount else None) or {}
+    if isinstance(coupon, str):
+        coupon = {"id": coupon}  # 未展開
+    return {
+        "discount_coupon_id": coupon.get("id"),
+        "discount_name": coupon.get("name") or coupon.get("id"),
+        "discount_percent": coupon.get("percent_off"),  # 例: 10.0 (10%)
+        "discount_amount": coupon.get("amount_off"),  # 通貨の最小単位 (円なら円)
+    }
+
+
+def mirror_discounts(db: Session, snapshots: list[tuple[int, object]], as_of: datetime) -> int:
+    """
+    (subscriptions.id, Stripe 購読) の組をまとめて反映する (1回の executemany、commit は呼び出し側)。
+    as_of 以降の内容を既に持つ行はそのまま。
+    """
+    rows = []
+    for sub_id, stripe_sub in snapshots:
+        row = {f"b_{key}": value for key, value in discount_fields(stripe_sub).items()}
+        row.update(b_id=sub_id, b_as_of=as_of)
+        rows.append(row)
+    if rows:
+        db.execute(_MIRROR_UPDATE, rows)
+    return len(rows)
+
+
+def mirror_from_event(db: Session, stripe_sub: dict, event_created: int | None):
+    """Webhook の customer.subscription.* を反映"""
+    sub_id = db.query(Subscription.id).filter(
+        Subscription.stripe_subscription_id == stripe_sub.get("id")
+    ).scalar()
+    if sub_id:
+        mirror_discounts(db, [(sub_id, stripe_sub)], jst_naive(event_created))
+
+
+def clear_discount(db: Session, sub: Subscription):
+    """クーポンを外した直後: 後から届く古いイベントで戻らないよう現在時刻で空にする"""
+    mirror_discounts(db, [(sub.id, {})], jst_naive())
+
+
+def needs_refresh(sub: Subscription) -> bool:
+    """明示的な更新で Stripe を呼ぶか (直近に同期済みなら呼ばない)"""
+    return bool(sub.stripe_subscription_id) and (
+        sub.stripe_synced_at is None or sub.stripe_synced_at < jst_naive() - REFRESH_MIN_INTERVAL
+    )
+
+
+def is_stale(sub: Subscription) -> bool:
+    """ミラーが一度も同期されていない、または MIRROR_MAX_AGE より古い"""
+    if not sub.stripe_subscription_id:
+        return False
+    return sub.stripe_synced_at is None or sub.stripe_synced_at < jst_naive() - MIRROR_MAX_AGE
+
+
+def actual_price(plan_price: int, sub: Subscription) -> int:
+    """ミラーの割引情報から実際の請求額を計算"""
+    if sub.discount_percent:
+        return int(plan_price * (100 - sub.discount_percent) / 100)
+    if sub.discount_amount:
+        return max(0, plan_price - sub.discount_amount)
+    return plan_price
@@ -10,7 +10,7 @@ from app.models.plan import Plan
 from app.models.user import User
 from app.models.service_setting import ServiceSetting
 from app.models.promotion_code import PromotionCode
-from app.services import stripe_service
+from app.services import stripe_service, subscription_mirror
 from app.services.mail_service import (
     send_subscription_cancel_email,
     send_payment_failed_email,
@@ -126,6 +126,32 @@ def update_subscription_from_stripe(
     db.commit()
 
 
+def refresh_subscription_from_stripe(db: Session, sub: Subscription):
+    """
+    利用者の明示的な更新: Stripe から直接取得して割引ミラー・解約予約・期間終了を反映。
+    ステータスは Webhook (と照合の通知) に任せて変更しない。失敗時は例外を送出。
+    """
+    stripe_sub = stripe_service.retrieve_subscription_with_discount(sub.stripe_subscription_id)
+    as_of = subscription_mirror.jst_naive()
+
+    # 期間終了: トップレベル → items.data[0] の順でフォールバック (Webhook ハンドラと同じ)
+    period_end = stripe_sub.get("current_period_end")
+    items = (stripe_sub.get("items") or {}).get("data") or []
+    if period_end is None and items:
+        period_end = items[0].get("current_period_end")
+
+    update_subscription_from_stripe(
+        db=db,
+        stripe_subscription_id=sub.stripe_subscription_id,
+        status=sub.status,
+        cancel_at_period_end=bool(stripe_sub.get("cancel_at_period_end")),
+        current_period_end=datetime.fromtimestamp(period_end) if period_end else None,
+    )
+    subscription_mirror.mirror_discounts(db, [(sub.id, stripe_sub)], as_of)
+    db.commit()
+    db.refresh(sub)
+
+
 # =========================================================
 # プラン変更検知・処理
 # =========================================================
@@ -260,6 +286,8 @@ def _apply_plan_change_immediately(
     # 新プランがクーポン対象外ならクーポンを削除
     if sub.stripe_subscription_id and _should_remove_coupon(db, sub.stripe_subscription_id, new_plan.id):
         if stripe_service.remove_subscription_coupon(sub.stripe_subscription_id):
+            subscription_mirror.clear_discount(db, sub)
+            db.commit()
             logger.info(f"プラン変更に伴いクーポン削除: subscription_id={sub.id}")
         else:
             logger.warning(f"クーポン削除失敗: subscription_id={sub.id}")
@@ -399,6 +427,7 @@ def apply_scheduled_plan_changes(db: Session, now: datetime):
         # ダウングレード適用時、新プランがクーポン対象外ならクーポンを削除
         if sub.stripe_subscription_id and _should_remove_coupon(db, sub.stripe_subscription_id, new_plan_id):
             if stripe_service.remove_subscription_coupon(sub.stripe_subscription_id):
+                subscription_mirror.clear_discount(db, sub)
                 logger.info(f"ダウングレード適用に伴いクーポン削除: subscription_id={sub.id}")
             else:
                 logger.warning(f"クーポン削除失敗: subscription_id={sub.id}")
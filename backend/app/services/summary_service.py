@@ -25,8 +25,8 @@ def get_recent_summaries(db: Session, plan_id: int, user_id: int, count: int) ->
     return [s.summary_text for s in reversed(summaries)]
 
 
-def inject_summaries_into_prompt(prompt: str, summaries: list[str]) -> str:
-    """あらすじをプロンプトに注入"""
+def inject_summaries_into_prompt(prompt: str, summaries: list[str], append: bool = False) -> str:
+    """あらすじをプロンプトに注入 (append=True なら末尾。プロンプトキャッシュ最適化用)"""
     if not summaries:
         return prompt
 
@@ -35,6 +35,8 @@ def inject_summaries_into_prompt(prompt: str, summaries: list[str]) -> str:
         summary_block += f"{i}. {s}\n"
     summary_block += "\n上記のあらすじの続きとして、新しい内容を生成してください。\n"
 
+    if append:
+        return prompt + "\n" + summary_block
     return summary_block + "\n" + prompt
 
 
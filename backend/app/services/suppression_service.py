@@ -0,0 +1,119 @@
+"""配信停止アドレス (bounce/complaint) の抑止リスト
+
+Resend Webhook は受信時に Redis の抑止セットへ即追加し、DB 反映用のキューに積むだけにする。
+users.deliverable=false への反映は webhook_worker がまとめて1回の UPDATE で行う。
+配信処理は送信前に抑止セットを見るため、Webhook 受信から DB 反映・次の対象ユーザー取得までの
+間でもバウンスしたアドレスには送らない。
+
+抑止セットは DB 反映までの隙間を埋めるためのもので、正は users.deliverable。
+そのため各アドレスに期限を持たせ (Sorted Set のスコア)、ユーザー削除・新規登録・
+管理画面での配信再開ではその場で取り除く (unsuppress)。
+"""
+import json
+import time
+from sqlalchemy.orm import Session
+
+from app.core.redis import get_sync_redis
+from app.models.user import User
+from app.core.logging import get_logger
+
+logger = get_logger(__name__)
+
+SUPPRESSION_KEY = "mail:suppressed_until"  # Sorted Set: アドレス → 抑止期限 (unix秒)
+SUPPRESSION_TTL = 3 * 24 * 60 * 60  # 3日 (webhook_worker 停止中も DB 反映まで抑止が続くよう余裕を持たせる)
+LEGACY_SUPPRESSION_KEY = "mail:suppressed"  # 期限なしの旧 Set
+BOUNCE_QUEUE_KEY = "resend:bounce_queue"
+APPLY_BATCH = 500
+
+
+def normalize_email(email: str) -> str:
+    return (email or "").strip().lower()
+
+
+async def enqueue_bounces(r, emails: list[str], event_type: str):
+    """抑止セットへ追加し、DB反映キューに積む (Webhook受信時、非同期Redis)"""
+    emails = [e for e in (normalize_email(e) for e in emails) if e]
+    if not emails:
+        return
+    expires_at = time.time() + SUPPRESSION_TTL
+    pipe = r.pipeline()
+    pipe.zadd(SUPPRESSION_KEY, {e: expires_at for e in emails})
+    pipe.rpush(BOUNCE_QUEUE_KEY, *(json.dumps({"email": e, "type": event_type}) for e in emails))
+    await pipe.execute()
+    logger.warning(f"配信停止キュー追加: {len(emails)}件, event={event_type}")
+
+
+def is_suppressed(email: str) -> bool:
+    """抑止セットに含まれるか (Redis障害時は送信を止めない)"""
+    try:
+        expires_at = get_sync_redis().zscore(SUPPRESSION_KEY, normalize_email(email))
+        return expires_at is not None and expires_at > time.time()
+    except Exception as e:
+        logger.warning(f"抑止リスト確認失敗: {e}")
+        return False
+
+
+def filter_suppressed(users: list[User]) -> list[User]:
+    """抑止セットに含まれるユーザーを除外 (1回の ZMSCORE で判定)"""
+    if not users:
+        return users
+    try:
+        scores = get_sync_redis().zmscore(SUPPRESSION_KEY, [normalize_email(u.email) for u in users])
+    except Exception as e:
+        logger.warning(f"抑止リスト確認失敗: {e}")
+        return users
+    now = time.time()
+    kept = [u for u, expires_at in zip(users, scores) if expires_at is None or expires_at <= now]
+    if len(kept) != len(users):
+        logger.info(f"抑止リストにより除外: {len(users) - len(kept)}件")
+    return kept
+
+
+def unsuppress(emails: list[str]):
+    """抑止セットから取り除く (ユーザー削除・新規登録・配信再開時)。Redis障害時は期限切れを待つ"""
+    emails = [e for e in (normalize_email(e) for e in emails) if e]
+    if not emails:
+        return
+    try:
+        removed = get_sync_redis().zrem(SUPPRESSION_KEY, *emails)
+    except Exception as e:
+        logger.warning(f"抑止リスト解除失敗: {e}")
+        return
+    if removed:
+        logger.info(f"抑止リスト解除: {removed}件")
+
+
+def prune_expired():
+    """期限切れのアドレスと旧形式の Set を削除"""
+    r = get_sync_redis()
+    pipe = r.pipeline()
+    pipe.zremrangebyscore(SUPPRESSION_KEY, "-inf", time.time())
+    pipe.delete(LEGACY_SUPPRESSION_KEY)
+    pipe.execute()
+
+
+def apply_pending_bounces(db: Session, limit: int = APPLY_BATCH) -> int:
+    """キューに溜まった bounce/complaint を users.deliverable=false に一括反映 (取り出した件数を返す)"""
+    r = get_sync_redis()
+    pipe = r.pipeline()
+    pipe.lrange(BOUNCE_QUEUE_KEY, 0, limit - 1)
+    pipe.ltrim(BOUNCE_QUEUE_KEY, limit, -1)
+    raw, _ = pipe.execute()
+    if not raw:
+        return 0
+
+    emails = sorted({json.loads(item)["email"] for item in raw})
+    try:
+        updated = db.query(User).filter(
+            User.email.in_(emails),
+            User.deliverable == True,
+        ).update({"deliverable": False}, synchronize_session=False)
+        db.commit()
+    except Exception:
+        db.rollback()
+        # 反映できなかった分はキューに戻して次回に回す
+        r.lpush(BOUNCE_QUEUE_KEY, *reversed(raw))
+        raise
+
+    logger.warning(f"配信停止反映: {updated}件 (受信{len(raw)}件, 宛先{len(emails)}件)")
+    return len(raw)
@@ -0,0 +1,127 @@
+"""system_logs のパーティション管理と保持期間パージ
+
+system_logs は created_at (UTC) の月単位 RANGE パーティション (pYYYYMM + pmax)。
+- 先の月のパーティションは pmax を分割して事前に作る
+- 保持期間を過ぎた月はパーティションごと DROP (行削除なしで一瞬で終わる)
+- パーティション境界にかからない残りや、未パーティション環境では
+  小分けの DELETE でワーカーの書き込みを長時間ブロックしない
+"""
+import time
+from datetime import date, datetime, timedelta
+from typing import Optional
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+from app.models.system_log import SystemLog
+from app.core.logging import get_logger
+
+logger = get_logger(__name__)
+
+MAX_PARTITION = "pmax"
+FUTURE_MONTHS = 2  # 今月 + 先2ヶ月分のパーティションを用意
+DELETE_CHUNK = 5000
+DELETE_PAUSE = 0.1  # チャンク間の待機秒 (他の書き込みに譲る)
+
+
+def partition_name(month_start: date) -> str:
+    return f"p{month_start.strftime('%Y%m')}"
+
+
+def next_month(d: date) -> date:
+    return (d.replace(day=1) + timedelta(days=32)).replace(day=1)
+
+
+def list_partitions(db: Session) -> list[dict]:
+    """パーティション一覧 (未パーティションなら空)。upper は境界日 (これ未満の行を持つ)"""
+    rows = db.execute(text("""
+        SELECT PARTITION_NAME, PARTITION_DESCRIPTION, TABLE_ROWS
+        FROM information_schema.PARTITIONS
+        WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = 'system_logs'
+          AND PARTITION_NAME IS NOT NULL
+        ORDER BY PARTITION_ORDINAL_POSITION
+    """)).all()
+    result = []
+    for name, description, table_rows in rows:
+        upper = None
+        if description and description != "MAXVALUE":
+            upper = date.fromordinal(int(description) - 365)  # TO_DAYS → date
+        result.append({"name": name, "upper": upper, "rows": table_rows or 0})
+    return result
+
+
+def ensure_future_partitions(db: Session, today: Optional[date] = None) -> list[str]:
+    """今月〜FUTURE_MONTHS 先までの月パーティションを pmax から切り出して作成"""
+    partitions = list_partitions(db)
+    if not partitions:
+        return []
+
+    this_month = (today or date.today()).replace(day=1)
+    last = this_month
+    for _ in range(FUTURE_MONTHS):
+        last = next_month(last)
+
+    created = []
+    # 既存の最終境界の月 (= まだパーティションがない最初の月) から作る
+    bounds = [p["upper"] for p in partitions if p["upper"]]
+    start = max(bounds) if bounds else this_month
+    while start <= last:
+        upper = next_month(start)
+        name = partition_name(start)
+        db.execute(text(
+            f"ALTER TABLE system_logs REORGANIZE PARTITION {MAX_PARTITION} INTO ("
+            f"PARTITION {name} VALUES LESS THAN (TO_DAYS('{upper.isoformat()}')), "
+            f"PARTITION {MAX_PARTITION} VALUES LESS THAN MAXVALUE)"
+        ))
+        created.append(name)
+        start = upper
+    if created:
+        logger.info(f"system_logs パーティション作成: {created}")
+    return created
+
+
+def purge_logs_before(db: Session, before: datetime) -> dict:
+    """
+    before (UTC naive) より古いログを削除。
+    丸ごと範囲内の月パーティションは DROP、残りは小分け DELETE。
+    """
+    dropped = []
+    for p in list_partitions(db):
+        if p["upper"] and datetime.combine(p["upper"], datetime.min.time()) <= before:
+            db.execute(text(f"ALTER TABLE system_logs DROP PARTITION {p['name']}"))
+            dropped.append(p["name"])
+    if dropped:
+        logger.info(f"system_logs パーティション削除: {dropped}")
+
+    deleted = delete_in_chunks(db, before)
+    return {"dropped_partitions": dropped, "deleted_rows": deleted}
+
+
+def delete_in_chunks(db: Session, before: datetime) -> int:
+    """created_at < before の行を DELETE_CHUNK 件ずつ削除 (1回のロックを短くする)"""
+    total = 0
+    while True:
+        ids = [
+            row.id for row in db.query(SystemLog.id).filter(
+                SystemLog.created_at < before,
+            ).order_by(SystemLog.created_at).limit(DELETE_CHUNK).all()
+        ]
+        if not ids:
+            break
+        total += db.query(SystemLog).filter(
+            SystemLog.created_at < before,
+            SystemLog.id.in_(ids),
+        ).delete(synchronize_session=False)
+        db.commit()
+        if len(ids) < DELETE_CHUNK:
+            break
+        time.sleep(DELETE_PAUSE)
+    return total
+
+
+def estimated_row_count(db: Session) -> int:
+    """テーブル全体の概算行数 (統計情報から。COUNT(*) の全走査をしない)"""
+    rows = db.execute(text("""
+        SELECT TABLE_ROWS FROM information_schema.TABLES
+        WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = 'system_logs'
+    """)).scalar()
+    return int(rows or 0)
@@ -0,0 +1,192 @@
+"""SystemLog の非同期バッチ書き込み
+
+配信ループから1件ずつ INSERT + commit すると、system_logs の多数のインデックス更新で
+送信処理が遅くなるため、ログはメモリ上のキューに積むだけにして
+バックグラウンドスレッドが複数行 INSERT でまとめて書き込む。
+
+- バックプレッシャー: キューは上限付き。満杯なら短時間だけ待ち、それでも空かなければ
+  破棄して件数を数える (次回フラッシュ時に破棄件数を WARNING として記録)。配信は止めない。
+- 終了時: shutdown() (および atexit) でキューに残ったログを書き切る。
+"""
+import atexit
+import queue
+import threading
+from datetime import datetime
+from typing import Optional
+from zoneinfo import ZoneInfo
+from sqlalchemy import insert
+
+from app.core.database import SessionLocal
+from app.core.logging import get_logger
+from app.models.system_log import SystemLog
+
+logger = get_logger(__name__)
+UTC = ZoneInfo("UTC")
+
+QUEUE_MAX = 10000
+BATCH_SIZE = 500
+FLUSH_INTERVAL = 1.0  # 秒
+PUT_TIMEOUT = 0.05  # 満杯時に待つ最大秒数
+SHUTDOWN_TIMEOUT = 10.0
+
+_queue: "queue.Queue[Optional[dict]]" = queue.Queue(maxsize=QUEUE_MAX)
+_lock = threading.Lock()
+_thread: Optional[threading.Thread] = None
+_dropped = 0
+
+
+def log_event(
+    level: str,
+    event_type: str,
+    message: str = "",
+    plan_id: int = None,
+    user_id: int = None,
+    member_no: str = None,
+    delivery_id: int = None,
+    details: dict = None,
+):
+    """SystemLog をキューに積む (DB書き込みはバックグラウンド)"""
+    global _dropped
+    record = {
+        "level": level,
+        "event_type": event_type,
+        "plan_id": plan_id,
+        "user_id": user_id,
+        "member_no_snapshot": member_no,
+        "delivery_id": delivery_id,
+        "message": message or "",
+        "details": details,
+        # 書き込みが遅れても発生時刻で記録する (created_at は UTC 保存)
+        "created_at": datetime.now(UTC).replace(tzinfo=None),
+    }
+    _ensure_started()
+    try:
+        _queue.put(record, timeout=PUT_TIMEOUT)
+    except queue.Full:
+        with _lock:
+            _dropped += 1
+        logger.warning(f"SystemLogキュー満杯のため破棄: {event_type} {message}")
+
+
+def flush(timeout: float = SHUTDOWN_TIMEOUT):
+    """キューに積まれた分の書き込み完了を待つ"""
+    if _thread is None or not _thread.is_alive():
+        _drain_all()
+        return
+    done = threading.Event()
+    try:
+        _queue.put(done, timeout=timeout)
+    except queue.Full:
+        return
+    done.wait(timeout)
+
+
+def shutdown(timeout: float = SHUTDOWN_TIMEOUT):
+    """残りのログを書き切ってフラッシャーを停止"""
+    global _thread
+    with _lock:
+        thread = _thread
+        _thread = None
+    if thread is None:
+        return
+    try:
+        _queue.put(None, timeout=timeout)
+    except queue.Full:
+        pass
+    thread.join(timeout)
+    # 停止が間に合わなかった分も同期で書き込む
+    _drain_all()
+
+
+def _ensure_started():
+    global _thread
+    if _thread is not None:
+        return
+    with _lock:
+        if _thread is None:
+            _thread = threading.Thread(target=_run, name="system-log-sink", daemon=True)
+            _thread.start()
+
+
+def _run():
+    while True:
+        batch, waiters, stop = _collect_batch()
+        if batch:
+            _write(batch)
+        for waiter in waiters:
+            waiter.set()
+        if stop:
+            return
+
+
+def _collect_batch() -> tuple[list[dict], list[threading.Event], bool]:
+    """最大 BATCH_SIZE 件 / FLUSH_INTERVAL 秒分をまとめて取り出す"""
+    batch, waiters = [], []
+    try:
+        item = _queue.get(timeout=FLUSH_INTERVAL)
+    except queue.Empty:
+        return batch, waiters, False
+    while True:
+        if item is None:
+            return batch, waiters, True
+        if isinstance(item, threading.Event):
+            waiters.append(item)
+        else:
+            batch.append(item)
+        if len(batch) >= BATCH_SIZE:
+            return batch, waiters, False
+        try:
+            item = _queue.get_nowait()
+        except queue.Empty:
+            return batch, waiters, False
+
+
+def _drain_all():
+    batch = []
+    while True:
+        try:
+            item = _queue.get_nowait()
+        except queue.Empty:
+            break
+        if isinstance(item, dict):
+            batch.append(item)
+        elif isinstance(item, threading.Event):
+            item.set()
+    for i in range(0, len(batch), BATCH_SIZE):
+        _write(batch[i:i + BATCH_SIZE])
+    if not batch and _dropped:
+        _write([])
+
+
+def _write(batch: list[dict]):
+    """複数行 INSERT で書き込む (失敗しても呼び出し側には伝播させない)"""
+    global _dropped
+    with _lock:
+        dropped, _dropped = _dropped, 0
+    if dropped:
+        batch = batch + [{
+            "level": "WARNING",
+            "event_type": "system_log_dropped",
+            "plan_id": None,
+            "user_id": None,
+            "member_no_snapshot": None,
+            "delivery_id": None,
+            "message": f"SystemLogキュー満杯のため {dropped} 件を破棄しました",
+            "details": None,
+            "created_at": datetime.now(UTC).replace(tzinfo=None),
+        }]
+    if not batch:
+        return
+
+    db = SessionLocal()
+    try:
+        db.execute(insert(SystemLog), batch)
+        db.commit()
+    except Exception as e:
+        db.rollback()
+        logger.error(f"SystemLog書き込み失敗: {len(batch)}件 - {e}")
+    finally:
+        db.close()
+
+
+atexit.register(shutdown)
@@ -0,0 +1,72 @@
+"""Webhook Worker エントリポイント: python -m app.webhook_worker で起動
+
+Stripe Webhook の受信箱 (stripe_event_inbox) と、
+Resend の bounce/complaint 反映キュー (users.deliverable=false への一括反映) を処理する。
+"""
+import time
+import signal
+from app.core.config import settings
+from app.core.database import SessionLocal
+from app.core.logging import setup_logging, get_logger
+from app.webhook_worker.dispatcher import InboxDispatcher
+from app.services import system_log_sink
+from app.services.suppression_service import apply_pending_bounces, prune_expired, APPLY_BATCH
+
+setup_logging()
+logger = get_logger("webhook_worker")
+
+POLL_INTERVAL = 1.0  # 処理待ちがないときの待機秒数
+BUSY_POLL_INTERVAL = 0.2
+BOUNCE_APPLY_INTERVAL = 5.0  # bounce/complaint を DB に反映する間隔 (秒)
+
+running = True
+
+
+def signal_handler(sig, frame):
+    global running
+    logger.info("Webhook Worker停止シグナル受信")
+    running = False
+
+
+signal.signal(signal.SIGTERM, signal_handler)
+signal.signal(signal.SIGINT, signal_handler)
+
+
+def _apply_bounces():
+    """溜まった bounce/complaint をまとめて users に反映し、期限切れの抑止を掃除する"""
+    db = SessionLocal()
+    try:
+        prune_expired()
+        # 1バッチ分取り出せた間は続けて反映する
+        while apply_pending_bounces(db) >= APPLY_BATCH:
+            pass
+    except Exception as e:
+        logger.error(f"配信停止反映エラー: {e}")
+    finally:
+        db.close()
+
+
+def main():
+    logger.info(f"Webhook Worker起動: workers={settings.STRIPE_INBOX_WORKERS}")
+    dispatcher = InboxDispatcher(settings.STRIPE_INBOX_WORKERS)
+    next_bounce_apply = 0.0
+    while running:
+        try:
+            if time.monotonic() >= next_bounce_apply:
+                _apply_bounces()
+                next_bounce_apply = time.monotonic() + BOUNCE_APPLY_INTERVAL
+            submitted = dispatcher.poll()
+            time.sleep(BUSY_POLL_INTERVAL if submitted or dispatcher.busy else POLL_INTERVAL)
+        except Exception as e:
+            logger.error(f"Webhook Workerループエラー: {e}")
+            time.sleep(5)
+
+    dispatcher.shutdown()
+    _apply_bounces()
+    # キューに残った SystemLog を書き切る
+    system_log_sink.shutdown()
+    logger.info("Webhook Worker終了")
+
+
+if __name__ == "__main__":
+    main()
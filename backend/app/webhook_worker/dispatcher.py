@@ -0,0 +1,88 @@
+"""Stripe 受信箱のディスパッチャ
+
+処理待ちの顧客キーをスレッドプールに割り当てる。
+同じ顧客は同時に1スレッドだけ (Redis ロックでプロセス間も排他)、別の顧客は並列に処理する。
+"""
+import uuid
+from concurrent.futures import Future, ThreadPoolExecutor
+
+from app.core.database import SessionLocal
+from app.core.redis import get_sync_redis
+from app.services.stripe_inbox_service import (
+    due_customer_keys, process_customer_events, STALE_LOCK_SECONDS,
+)
+from app.core.logging import get_logger
+
+logger = get_logger(__name__)
+
+LOCK_PREFIX = "stripe_inbox:lock:"
+
+# 自分が取ったロックだけを消す
+_RELEASE_SCRIPT = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    return redis.call('DEL', KEYS[1])
+end
+return 0
+"""
+
+
+class InboxDispatcher:
+    def __init__(self, workers: int):
+        self.workers = workers
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="stripe-inbox")
+        self.in_flight: dict[str, Future] = {}
+        self._release = get_sync_redis().register_script(_RELEASE_SCRIPT)
+
+    def poll(self) -> int:
+        """空きスレッド分の顧客を割り当て、割り当てた数を返す"""
+        self._reap()
+        free = self.workers - len(self.in_flight)
+        if free <= 0:
+            return 0
+
+        db = SessionLocal()
+        try:
+            keys = due_customer_keys(db, limit=free + len(self.in_flight))
+        finally:
+            db.close()
+
+        r = get_sync_redis()
+        submitted = 0
+        for key in keys:
+            if submitted >= free:
+                break
+            if key in self.in_flight:
+                continue
+            token = uuid.uuid4().hex
+            if not r.set(LOCK_PREFIX + key, token, nx=True, ex=STALE_LOCK_SECONDS):
+                continue  # 他プロセスが処理中
+            self.in_flight[key] = self.executor.submit(self._run_customer, key, token)
+            submitted += 1
+        return submitted
+
+    @property
+    def busy(self) -> bool:
+        return bool(self.in_flight)
+
+    def shutdown(self):
+        """処理中の顧客を書き切ってから停止"""
+        self.executor.shutdown(wait=True)
+        self._reap()
+
+    def _reap(self):
+        for key, future in list(self.in_flight.items()):
+            if future.done():
+                del self.in_flight[key]
+                if future.exception():
+                    logger.error(f"Stripe受信箱処理エラー: customer={key} - {future.exception()}")
+
+    def _run_customer(self, key: str, token: str) -> int:
+        db = SessionLocal()
+        try:
+            return process_customer_events(db, key)
+        finally:
+            db.close()
+            try:
+                self._release(keys=[LOCK_PREFIX + key], args=[token])
+            except Exception as e:
+                logger.warning(f"Stripe受信箱ロック解放失敗: customer={key} - {e}")
@@ -2,14 +2,18 @@
 import time
 import signal
 import sys
+import threading
 from app.core.logging import setup_logging, get_logger
 from app.worker.task_processor import process_pending_tasks
 from app.worker.throttle_manager import check_emergency_stop
+from app.worker import retry_worker
+from app.services import system_log_sink
 
 setup_logging()
 logger = get_logger("worker")
 
 running = True
+retry_stop = threading.Event()
 
 
 def signal_handler(sig, frame):
@@ -24,6 +28,7 @@ signal.signal(signal.SIGINT, signal_handler)
 
 def main():
     logger.info("Worker起動")
+    retry_thread = retry_worker.start(retry_stop)
     while running:
         try:
             if check_emergency_stop():
@@ -39,6 +44,12 @@ def main():
             logger.error(f"Workerループエラー: {e}")
             time.sleep(10)
 
+    # 再送中の分を送り終えるまで待つ
+    retry_stop.set()
+    retry_thread.join()
+
+    # キューに残った SystemLog を書き切る
+    system_log_sink.shutdown()
     logger.info("Worker終了")
 
 
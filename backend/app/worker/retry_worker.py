@@ -0,0 +1,64 @@
+"""配信の再送スレッド
+
+再送キュー (services/retry_queue) から期限の来た1通を取り出し、DELIVERY_RETRY_WORKERS 本の
+スレッドで並列に送る。配信ループ (task_processor) とは独立に動くので、失敗した受信者の
+バックオフ待ちで配信全体が止まることはない。
+"""
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from app.core.config import settings
+from app.core.database import SessionLocal
+from app.services import retry_queue
+from app.services.delivery_service import process_retry_unit
+from app.worker.throttle_manager import check_emergency_stop
+from app.core.logging import get_logger
+
+logger = get_logger(__name__)
+
+POLL_SECONDS = 1.0
+EMERGENCY_STOP_WAIT = 10.0
+
+
+def start(stop: threading.Event) -> threading.Thread:
+    """再送スレッドを起動する。stop をセットすると処理中の分を送り終えてから止まる"""
+    thread = threading.Thread(target=_run, args=(stop,), name="delivery-retry", daemon=True)
+    thread.start()
+    return thread
+
+
+def _run(stop: threading.Event):
+    workers = max(1, settings.DELIVERY_RETRY_WORKERS)
+    logger.info(f"再送スレッド起動: workers={workers}")
+    active = set()
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="delivery-retry") as pool:
+        while not stop.is_set():
+            active = {f for f in active if not f.done()}
+            try:
+                if check_emergency_stop():
+                    stop.wait(EMERGENCY_STOP_WAIT)
+                    continue
+                # 空いているスレッドの分だけ取り出す (取り出したものはリース付きで処理中になる)
+                claimed = retry_queue.claim_due(workers - len(active)) if len(active) < workers else []
+            except Exception as e:
+                logger.error(f"再送キュー取得エラー: {e}")
+                stop.wait(EMERGENCY_STOP_WAIT)
+                continue
+
+            for member, unit in claimed:
+                active.add(pool.submit(_process, member, unit))
+            if not claimed:
+                stop.wait(POLL_SECONDS)
+    logger.info("再送スレッド終了")
+
+
+def _process(member: str, unit: dict):
+    db = SessionLocal()
+    try:
+        process_retry_unit(db, member, unit)
+    except Exception as e:
+        # キューには処理中のまま残り、リース切れで再び取り出される
+        db.rollback()
+        logger.error(f"再送処理エラー: delivery_id={unit.get('delivery_id')}, user_id={unit.get('user_id')} - {e}")
+    finally:
+        db.close()
@@ -2,25 +2,32 @@
 import time
 from datetime import datetime
 from zoneinfo import ZoneInfo
-from sqlalchemy import and_
+from sqlalchemy import and_, or_
 
 from app.core.database import SessionLocal
 from app.models.plan import Plan
 from app.models.progress_plan import ProgressPlan
-from app.services.delivery_service import execute_plan_delivery
+from app.services.delivery_service import execute_plan_delivery, execute_manual_delivery
+from app.services.pregeneration_service import PregenerationPreempted, pregenerate_plan_content
+from app.services.openai_batch_service import has_batch_jobs, submit_plan_batch
 from app.services.report_service import send_error_alert
+from app.services.circuit_breaker import CircuitOpenError, openai_breaker
+from app.services.mail_transport import sending_paused
 from app.worker.throttle_manager import check_emergency_stop, get_throttle_sleep
 from app.core.logging import get_logger
 
 logger = get_logger(__name__)
 JST = ZoneInfo("Asia/Tokyo")
 
+PARKED = 5  # プロバイダのブレーカー OPEN で一時停止中
+
 
 def process_pending_tasks():
     """
     未実行タスクを処理する。
 
-    優先順位: 3(エラーリトライ、retry_count < max_retries) → 0(通常)
+    優先順位: 3(エラーリトライ、retry_count < max_retries) → 5(一時停止からの再開) → 0(通常)
+    → 事前生成 (配信タスクがすべて片付いてから)
     """
     if check_emergency_stop():
         logger.info("緊急停止中: タスク処理スキップ")
@@ -41,6 +48,9 @@ def process_pending_tasks():
             db.commit()
             return True
 
+        # 一時停止・中断 (cursor あり) からの再開は同じ Delivery に続きを送る
+        resume_delivery_id = progress.delivery_id if progress.status == PARKED or progress.cursor else None
+
         # ロック取得: 実行中に更新
         now = datetime.now(JST)
         progress.status = 1
@@ -52,15 +62,56 @@ def process_pending_tasks():
         logger.info(f"タスク実行開始: progress_id={progress.id}, plan_id={plan.id}, retry={progress.retry_count}")
 
         try:
+            if progress.send_type == "pregenerate":
+                # 事前生成: GPT結果をステージングするのみ (送信は定時タスクで実行)
+                pregenerate_plan_content(db, plan, progress.date, progress_id=progress.id)
+                now = datetime.now(JST)
+                progress.status = 2
+                progress.heartbeat_at = now
+                progress.updated_at = now
+                db.commit()
+                logger.info(f"事前生成完了: progress_id={progress.id}")
+                return True
+
+            if progress.send_type == "scheduled" and plan.openai_batch_enabled \
+                    and not has_batch_jobs(db, plan.id, progress.date):
+                # Batch APIモード: 生成をBatchジョブに投入し、完了後に送信する
+                try:
+                    submitted = submit_plan_batch(db, plan, progress)
+                except Exception as e:
+                    db.rollback()
+                    submitted = 0
+                    logger.warning(f"Batch投入失敗、通常生成で送信: plan_id={plan.id} - {e}")
+                if submitted:
+                    now = datetime.now(JST)
+                    progress.status = 4  # バッチ待ち
+                    progress.heartbeat_at = now
+                    progress.updated_at = now
+                    db.commit()
+                    logger.info(f"Batch完了待ち: progress_id={progress.id}, requests={submitted}")
+                    return True
+
             throttle = get_throttle_sleep()
-            delivery = execute_plan_delivery(
-                db=db,
-                plan=plan,
-                send_type=progress.send_type,
-                throttle_seconds=throttle,
-                progress_id=progress.id,
-                cursor=progress.cursor,  # 途中再開用
-            )
+            if progress.send_type == "manual":
+                # 手動一斉送信: 件名・本文は登録時の Delivery に保存済み
+                delivery = execute_manual_delivery(
+                    db=db,
+                    delivery_id=progress.delivery_id,
+                    throttle_seconds=throttle,
+                    progress_id=progress.id,
+                    cursor=progress.cursor,
+                )
+            else:
+                delivery = execute_plan_delivery(
+                    db=db,
+                    plan=plan,
+                    send_type=progress.send_type,
+                    throttle_seconds=throttle,
+                    progress_id=progress.id,
+                    cursor=progress.cursor,  # 途中再開用
+                    resume_delivery_id=resume_delivery_id,
+                    target_date=progress.date,
+                )
 
             if delivery:
                 progress.delivery_id = delivery.id
@@ -76,6 +127,31 @@ def process_pending_tasks():
             db.commit()
             logger.info(f"タスク実行完了: progress_id={progress.id}")
 
+        except PregenerationPreempted:
+            # 配信タスクに譲る: 未実行に戻し、配信が片付いたら続きから生成する
+            db.rollback()
+            progress = db.query(ProgressPlan).filter(ProgressPlan.id == progress.id).first()
+            if progress:
+                now = datetime.now(JST)
+                progress.status = 0
+                progress.heartbeat_at = now
+                progress.updated_at = now
+                db.commit()
+                logger.info(f"事前生成をキューに戻す: progress_id={progress.id}")
+
+        except CircuitOpenError as e:
+            # 失敗ではないのでリトライ回数を消費しない。cursor・delivery_id は残して再開に使う
+            db.rollback()
+            progress = db.query(ProgressPlan).filter(ProgressPlan.id == progress.id).first()
+            if progress:
+                now = datetime.now(JST)
+                progress.status = PARKED
+                progress.last_error = str(e)[:1000]
+                progress.heartbeat_at = now
+                progress.updated_at = now
+                db.commit()
+                logger.warning(f"タスク一時停止: progress_id={progress.id}, cursor={progress.cursor} - {e}")
+
         except Exception as e:
             error_msg = str(e)
             logger.error(f"タスク実行エラー: progress_id={progress.id} - {error_msg}")
@@ -158,23 +234,55 @@ def _get_next_task(db) -> ProgressPlan:
 
     優先順位:
     1. status=3 (エラー) かつ retry_count < max_retries → リトライ対象
-    2. status=0 (未実行) → 通常実行
+    2. status=5 (一時停止) で、必要なプロバイダのブレーカーが OPEN でなくなったもの
+       → 再開 (HALF_OPEN なら最初の呼び出しが試行になり、失敗すれば再び一時停止する)
+    3. status=0 (未実行) → 通常実行
+    4. 事前生成 (status=0、または status=3 でリトライ可能) → 配信タスクがないときだけ実行
+    手動一斉送信は日次リセットで中断されても翌日以降に再開できるよう、日付で絞らない。
+    事前生成は配信を遅らせないよう最後に回し、実行中も配信タスクが来れば中断してキューに戻る。
     """
     today = datetime.now(JST).date()
 
     # 1. エラー状態でリトライ可能なもの（排他ロック付き）
     task = db.query(ProgressPlan).filter(
         ProgressPlan.status == 3,
-        ProgressPlan.date == today,
+        ProgressPlan.send_type != "pregenerate",
+        or_(ProgressPlan.date == today, ProgressPlan.send_type == "manual"),
         ProgressPlan.retry_count < ProgressPlan.max_retries,
     ).with_for_update(skip_locked=True).first()
     if task:
         logger.info(f"リトライ対象タスク検出: progress_id={task.id}, retry={task.retry_count}/{task.max_retries}")
         return task
 
-    # 2. 未実行（排他ロック付き）
+    # 2. 一時停止中で再開できるもの（排他ロック付き）。手動一斉送信は OpenAI を使わない
+    if not sending_paused():
+        query = db.query(ProgressPlan).filter(
+            ProgressPlan.status == PARKED,
+            or_(ProgressPlan.date == today, ProgressPlan.send_type == "manual"),
+        )
+        if openai_breaker.is_open():
+            query = query.filter(ProgressPlan.send_type == "manual")
+        task = query.order_by(ProgressPlan.id).with_for_update(skip_locked=True).first()
+        if task:
+            logger.info(f"一時停止タスク再開: progress_id={task.id}, cursor={task.cursor}")
+            return task
+
+    # 3. 未実行（排他ロック付き）
     task = db.query(ProgressPlan).filter(
         ProgressPlan.status == 0,
+        ProgressPlan.send_type != "pregenerate",
+        or_(ProgressPlan.date == today, ProgressPlan.send_type == "manual"),
+    ).order_by(ProgressPlan.id).with_for_update(skip_locked=True).first()
+    if task:
+        return task
+
+    # 4. 事前生成（排他ロック付き）
+    task = db.query(ProgressPlan).filter(
+        ProgressPlan.send_type == "pregenerate",
         ProgressPlan.date == today,
-    ).with_for_update(skip_locked=True).first()
+        or_(
+            ProgressPlan.status == 0,
+            and_(ProgressPlan.status == 3, ProgressPlan.retry_count < ProgressPlan.max_retries),
+        ),
+    ).order_by(ProgressPlan.id).with_for_update(skip_locked=True).first()
     return task
@@ -27,35 +27,44 @@ const DeliveriesPage = {
         this.load();
     },
 
-    async load() {
+    async load(afterId = null) {
         try {
-            const params = new URLSearchParams({page: 1, per_page: 50});
+            const params = new URLSearchParams({limit: 50});
+            if (afterId) params.set('after_id', afterId);
             if (this.currentFilter) params.set('send_type', this.currentFilter);
             const dateVal = document.getElementById('del-date')?.value;
             if (dateVal) params.set('date', dateVal);
             const data = await API.get(`/api/admin/deliveries?${params}`);
             const el = document.getElementById('deliveries-list');
-            if (!data.deliveries || data.deliveries.length === 0) {
-                el.innerHTML = '<p>配信履歴がありません</p>';
-                return;
+            if (!afterId) {
+                if (!data.deliveries || data.deliveries.length === 0) {
+                    el.innerHTML = '<p>配信履歴がありません</p>';
+                    return;
+                }
+                el.innerHTML = `
+                    <p>全${data.total}件</p>
+                    <div class="table-container"><table>
+                        <thead><tr><th>日時</th><th>プラン</th><th>タイプ</th><th>送信数</th><th>成功</th><th>失敗</th><th>状態</th><th>操作</th></tr></thead>
+                        <tbody id="deliveries-tbody"></tbody>
+                    </table></div>
+                    <div id="deliveries-more" style="margin-top:12px;"></div>
+                `;
             }
-            el.innerHTML = `
-                <div class="table-container"><table>
-                    <thead><tr><th>日時</th><th>プラン</th><th>タイプ</th><th>送信数</th><th>成功</th><th>失敗</th><th>状態</th><th>操作</th></tr></thead>
-                    <tbody>${data.deliveries.map(d => `
-                        <tr>
-                            <td>${d.created_at ? new Date(d.created_at).toLocaleString('ja-JP') : '-'}</td>
-                            <td>${d.plan_name || '-'}</td>
-                            <td>${d.send_type}</td>
-                            <td>${d.total_count}</td>
-                            <td>${d.success_count}</td>
-                            <td>${d.fail_count}</td>
-                            <td><span class="badge badge-${d.status==='success'?'active':d.status==='failed'?'danger':'warning'}">${d.status}</span></td>
-                            <td><button class="btn btn-sm btn-danger" onclick="DeliveriesPage.del(${d.id})">削除</button></td>
-                        </tr>
-                    `).join('')}</tbody>
-                </table></div>
-            `;
+            document.getElementById('deliveries-tbody').insertAdjacentHTML('beforeend', data.deliveries.map(d => `
+                <tr>
+                    <td>${d.created_at ? new Date(d.created_at).toLocaleString('ja-JP') : '-'}</td>
+                    <td>${d.plan_name || '-'}</td>
+                    <td>${d.send_type}</td>
+                    <td>${d.total_count}</td>
+                    <td>${d.success_count}</td>
+                    <td>${d.fail_count}</td>
+                    <td><span class="badge badge-${d.status==='success'?'active':d.status==='failed'?'danger':'warning'}">${d.status}</span></td>
+                    <td><button class="btn btn-sm btn-danger" onclick="DeliveriesPage.del(${d.id})">削除</button></td>
+                </tr>
+            `).join(''));
+            document.getElementById('deliveries-more').innerHTML = data.next_after_id
+                ? `<button class="btn btn-sm" onclick="DeliveriesPage.load(${data.next_after_id})">もっと見る</button>`
+                : '';
         } catch (e) {
             document.getElementById('deliveries-list').innerHTML = `<p class="error-message">${e.message}</p>`;
         }
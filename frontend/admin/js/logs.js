@@ -24,9 +24,10 @@ const LogsPage = {
         await this.load();
     },
 
-    async load() {
+    async load(cursor = null) {
         try {
-            const params = new URLSearchParams({page: 1, per_page: 100});
+            const params = new URLSearchParams({per_page: 100});
+            if (cursor) params.set('cursor', cursor);
             const level = document.getElementById('log-level')?.value;
             const eventType = document.getElementById('log-event')?.value;
             const start = document.getElementById('log-start')?.value;
@@ -38,28 +39,35 @@ const LogsPage = {
 
             const data = await API.get(`/api/admin/logs?${params}`);
             const el = document.getElementById('logs-list');
-            if (data.logs.length === 0) {
-                el.innerHTML = '<p>ログがありません</p>';
-                return;
+            if (!cursor) {
+                if (data.logs.length === 0) {
+                    el.innerHTML = '<p>ログがありません</p>';
+                    return;
+                }
+                el.innerHTML = `
+                    <p style="margin-bottom:10px;color:#666;">${data.total_approximate ? '約' : ''}${data.total}件</p>
+                    <div class="table-container"><table>
+                        <thead><tr><th>日時</th><th>レベル</th><th>イベント</th><th>プランID</th><th>会員番号</th><th>メッセージ</th></tr></thead>
+                        <tbody id="logs-tbody"></tbody>
+                    </table></div>
+                    <div id="logs-more" style="margin-top:12px;"></div>
+                `;
             }
 
             const levelClass = {INFO:'',WARNING:'badge-warning',ERROR:'badge-danger',CRITICAL:'badge-danger'};
-            el.innerHTML = `
-                <p style="margin-bottom:10px;color:#666;">${data.total}件</p>
-                <div class="table-container"><table>
-                    <thead><tr><th>日時</th><th>レベル</th><th>イベント</th><th>プランID</th><th>会員番号</th><th>メッセージ</th></tr></thead>
-                    <tbody>${data.logs.map(l => `
-                        <tr>
-                            <td style="white-space:nowrap;">${l.created_at ? new Date(l.created_at).toLocaleString('ja-JP') : '-'}</td>
-                            <td><span class="badge ${levelClass[l.level]||''}">${l.level}</span></td>
-                            <td>${l.event_type}</td>
-                            <td>${l.plan_id || '-'}</td>
-                            <td>${l.member_no_snapshot || '-'}</td>
-                            <td style="max-width:300px;overflow:hidden;text-overflow:ellipsis;">${this.esc(l.message)}</td>
-                        </tr>
-                    `).join('')}</tbody>
-                </table></div>
-            `;
+            document.getElementById('logs-tbody').insertAdjacentHTML('beforeend', data.logs.map(l => `
+                <tr>
+                    <td style="white-space:nowrap;">${l.created_at ? new Date(l.created_at).toLocaleString('ja-JP') : '-'}</td>
+                    <td><span class="badge ${levelClass[l.level]||''}">${l.level}</span></td>
+                    <td>${l.event_type}</td>
+                    <td>${l.plan_id || '-'}</td>
+                    <td>${l.member_no_snapshot || '-'}</td>
+                    <td style="max-width:300px;overflow:hidden;text-overflow:ellipsis;">${this.esc(l.message)}</td>
+                </tr>
+            `).join(''));
+            document.getElementById('logs-more').innerHTML = data.next_cursor
+                ? `<button class="btn btn-sm" onclick="LogsPage.load('${data.next_cursor}')">もっと見る</button>`
+                : '';
         } catch (e) {
             document.getElementById('logs-list').innerHTML = `<p class="error-message">${e.message}</p>`;
         }
@@ -148,6 +148,13 @@ const PlansPage = {
                     <div class="form-group"><label>個別指示 (プロンプト)</label><textarea id="p-prompt" rows="6" placeholder="変数: {name} {var_name} {external_data}"></textarea></div>
                     <div class="form-group"><label><input type="checkbox" id="p-trial" checked>初月無料トライアルを有効にする</label></div>
                     <div class="form-group"><label><input type="checkbox" id="p-batch">まとめて送信 (batch_send)</label></div>
+                    <div class="form-group">
+                        <label>GPT事前生成 (配信時刻の何分前から生成するか)</label>
+                        <input id="p-pregen-lead" type="number" min="0" max="720" value="0">
+                        <small>0で無効。配信時刻には生成済みの内容を送信のみ行います</small>
+                    </div>
+                    <div class="form-group"><label><input type="checkbox" id="p-openai-batch">OpenAI Batch APIで生成 (当日中の配信で良い定時プラン向け・低コスト)</label></div>
+                    <div class="form-group"><label><input type="checkbox" id="p-prompt-cache-layout">プロンプトキャッシュ最適化 (外部データを共通メッセージに分離し、あらすじを末尾に配置)</label></div>
                     <div class="form-group"><label><input type="checkbox" id="p-active" checked>有効</label></div>
                     <div class="form-row" style="margin-top:16px;">
                         <div class="form-group">
@@ -196,6 +203,12 @@ const PlansPage = {
                         <input type="file" id="e-key-file" accept=".json" onchange="PlansPage.onFirebaseFileSelected()">
                         <span id="e-key-status" style="margin-left:8px;color:#666;"></span>
                     </div>
+                    <div class="form-group">
+                        <label>トークン予算 (0=無制限)</label>
+                        <input id="e-token-budget" type="number" min="0" max="200000" value="0">
+                    </div>
+                    <div class="form-group"><label>含めるフィールド (カンマ区切り・空=すべて)</label><input id="e-include-fields" type="text" placeholder="title, doc.price"></div>
+                    <div class="form-group"><label>除外するフィールド (カンマ区切り)</label><input id="e-exclude-fields" type="text" placeholder="internal_memo"></div>
                     <button type="button" class="btn btn-sm btn-secondary" onclick="PlansPage.testExternalData()">動作チェック</button>
                     <div id="external-test-result" style="margin-top:8px;"></div>
                 </div>
@@ -284,6 +297,9 @@ const PlansPage = {
             document.getElementById('p-prompt').value = plan.prompt || '';
             document.getElementById('p-trial').checked = plan.trial_enabled !== false;
             document.getElementById('p-batch').checked = plan.batch_send_enabled;
+            document.getElementById('p-pregen-lead').value = plan.pregenerate_lead_minutes || 0;
+            document.getElementById('p-openai-batch').checked = !!plan.openai_batch_enabled;
+            document.getElementById('p-prompt-cache-layout').checked = !!plan.prompt_cache_layout;
             document.getElementById('p-active').checked = plan.is_active;
 
             // 曜日チェックボックス復元
@@ -324,6 +340,9 @@ const PlansPage = {
             if (plan.external_data_setting) {
                 document.getElementById('e-path').value = plan.external_data_setting.external_data_path || '';
                 document.getElementById('e-key-status').textContent = plan.external_data_setting.has_firebase_key ? '設定済み' : '';
+                document.getElementById('e-token-budget').value = plan.external_data_setting.token_budget || 0;
+                document.getElementById('e-include-fields').value = (plan.external_data_setting.include_fields || []).join(', ');
+                document.getElementById('e-exclude-fields').value = (plan.external_data_setting.exclude_fields || []).join(', ');
             }
 
             // テスト結果クリア
@@ -351,6 +370,9 @@ const PlansPage = {
         document.getElementById('p-model').value = 'gpt-4o-mini';
         document.getElementById('p-trial').checked = true;
         document.getElementById('p-batch').checked = false;
+        document.getElementById('p-pregen-lead').value = 0;
+        document.getElementById('p-openai-batch').checked = false;
+        document.getElementById('p-prompt-cache-layout').checked = false;
         document.getElementById('p-active').checked = true;
         document.getElementById('s-enabled').checked = false;
         document.getElementById('s-length').value = '200';
@@ -358,6 +380,9 @@ const PlansPage = {
         document.getElementById('s-inject').value = '3';
         document.getElementById('e-key-file').value = '';
         document.getElementById('e-key-status').textContent = '';
+        document.getElementById('e-token-budget').value = '0';
+        document.getElementById('e-include-fields').value = '';
+        document.getElementById('e-exclude-fields').value = '';
         document.getElementById('external-test-result').innerHTML = '';
         document.getElementById('sheets-test-result').innerHTML = '';
         document.querySelectorAll('.weekday-cb').forEach(cb => cb.checked = false);
@@ -500,6 +525,9 @@ const PlansPage = {
             system_prompt: document.getElementById('p-system-prompt').value || null,
             prompt: document.getElementById('p-prompt').value,
             batch_send_enabled: document.getElementById('p-batch').checked,
+            pregenerate_lead_minutes: parseInt(document.getElementById('p-pregen-lead').value) || 0,
+            openai_batch_enabled: document.getElementById('p-openai-batch').checked,
+            prompt_cache_layout: document.getElementById('p-prompt-cache-layout').checked,
             trial_enabled: document.getElementById('p-trial').checked,
             bg_color: bgColor,
             text_color: textColor,
@@ -547,6 +575,7 @@ const PlansPage = {
                 await API.put(`/api/admin/plans/${planId}/external-data-setting`, {
                     external_data_path: ePath,
                     firebase_key_json: this.firebaseKeyJson || null,
+                    ...this.externalCompactionSettings(),
                 });
             }
 
@@ -557,6 +586,15 @@ const PlansPage = {
         }
     },
 
+    externalCompactionSettings() {
+        const fields = id => document.getElementById(id).value.split(',').map(f => f.trim()).filter(f => f);
+        return {
+            token_budget: parseInt(document.getElementById('e-token-budget').value) || null,
+            include_fields: fields('e-include-fields'),
+            exclude_fields: fields('e-exclude-fields'),
+        };
+    },
+
     async testExternalData() {
         const resultEl = document.getElementById('external-test-result');
         const path = document.getElementById('e-path').value;
@@ -566,7 +604,13 @@ const PlansPage = {
         }
         resultEl.innerHTML = '<span style="color:#888;">テスト中...</span>';
 
-        const body = { external_data_path: path };
+        const body = {
+            external_data_path: path,
+            ...this.externalCompactionSettings(),
+            model: document.getElementById('p-model').value,
+            system_prompt: document.getElementById('p-system-prompt').value,
+            prompt: document.getElementById('p-prompt').value,
+        };
         if (this.firebaseKeyJson) {
             body.firebase_key_json = this.firebaseKeyJson;
         } else if (this.editingId) {
@@ -582,16 +626,20 @@ const PlansPage = {
                 </div>`;
                 return;
             }
+            const t = res.tokens;
+            const sizeHtml = t ? `<div style="margin-top:6px;color:#333;">外部データ: ${t.external_data_raw.toLocaleString()} → <strong>${t.external_data.toLocaleString()}</strong> tokens / プロンプト合計 (1通あたり目安): <strong>${t.prompt_total.toLocaleString()}</strong> tokens</div>` : '';
             if (res.split) {
                 const keyList = res.keys.map(k => `<li>${this.esc(k)}</li>`).join('');
                 resultEl.innerHTML = `<div style="background:#f0fdf4;border:1px solid #bbf7d0;border-radius:8px;padding:12px;font-size:13px;">
                     <strong style="color:#16a34a;">接続OK</strong> — 分割処理対象: <strong>${res.keys.length}件</strong>
+                    ${sizeHtml}
                     <ul style="margin:8px 0 0 16px;color:#333;">${keyList}</ul>
                 </div>`;
             } else {
                 const preview = res.preview || '(データなし)';
                 resultEl.innerHTML = `<div style="background:#f0fdf4;border:1px solid #bbf7d0;border-radius:8px;padding:12px;font-size:13px;">
                     <strong style="color:#16a34a;">接続OK</strong>
+                    ${sizeHtml}
                     <pre style="margin:8px 0 0;background:#f8f8f8;padding:8px;border-radius:4px;font-size:12px;max-height:200px;overflow:auto;white-space:pre-wrap;">${this.esc(preview)}</pre>
                 </div>`;
             }
@@ -2,8 +2,8 @@
  * 進捗管理UI (ダッシュボード + スケジュール + 進捗テーブル + 配信履歴 + エラー)
  */
 const ProgressPage = {
-    STATUS_CLASS: { '-1': 'badge-waiting', 0: 'badge-inactive', 1: 'badge-warning', 2: 'badge-active', 3: 'badge-danger' },
-    STATUS_LABEL: { '-1': '待機中', 0: '未実行', 1: '実行中', 2: '完了', 3: 'エラー' },
+    STATUS_CLASS: { '-1': 'badge-waiting', 0: 'badge-inactive', 1: 'badge-warning', 2: 'badge-active', 3: 'badge-danger', 4: 'badge-waiting' },
+    STATUS_LABEL: { '-1': '待機中', 0: '未実行', 1: '実行中', 2: '完了', 3: 'エラー', 4: 'バッチ待ち', 5: '一時停止' },
     DELIVERY_STATUS_MAP: {
         running: ['badge-warning', '実行中'],
         success: ['badge-active', '成功'],
@@ -218,14 +218,30 @@ const ProgressPage = {
                             }
                         }
 
+                        // 事前生成 (リードタイム + ステージングヒット率)
+                        let pregenHtml = '';
+                        if (p.pregenerate) {
+                            const st = p.pregenerate.stats;
+                            const rate = st && st.hit_rate !== null ? `ヒット率 ${st.hit_rate}%` : (st ? `生成 ${st.staged}件` : '未生成');
+                            pregenHtml = `<br><span style="font-size:11px;color:#666;">事前生成 ${p.pregenerate.lead_minutes}分前 / ${rate}</span>`;
+                        }
+
+                        // GPT usage (プロンプトキャッシュ率 + 平均レイテンシ)
+                        let usageHtml = '';
+                        if (p.gpt_usage && p.gpt_usage.requests) {
+                            const u = p.gpt_usage;
+                            const cached = u.cached_ratio !== null ? `キャッシュ ${u.cached_ratio}%` : 'キャッシュ -';
+                            usageHtml = `<br><span style="font-size:11px;color:#666;">GPT ${u.requests}回 / ${cached} / 平均${u.avg_latency_ms}ms</span>`;
+                        }
+
                         return `
                             <tr>
                                 <td>${this.escName(p.plan_name)}</td>
-                                <td style="font-size:12px;">${this.esc(p.schedule_type || '-')}</td>
+                                <td style="font-size:12px;">${p.send_type === 'pregenerate' ? '事前生成' : this.esc(p.schedule_type || '-')}</td>
                                 <td><span class="badge ${this.STATUS_CLASS[p.status] || ''} ${p.status === 1 ? 'badge-pulse' : ''}">${this.STATUS_LABEL[p.status] || '不明'}</span></td>
                                 <td style="min-width:180px;">${progressHtml}</td>
-                                <td>${p.schedule_time || '-'}</td>
-                                <td>${durationHtml}</td>
+                                <td>${p.schedule_time || '-'}${pregenHtml}</td>
+                                <td>${durationHtml}${usageHtml}</td>
                                 <td style="font-size:12px;">${p.updated_at ? new Date(p.updated_at).toLocaleString('ja-JP') : '-'}</td>
                                 <td>
                                     ${p.id !== null ? `<div class="action-btns">
@@ -397,23 +413,16 @@ const ProgressPage = {
             `;
 
             if (data.items && data.items.length > 0) {
-                const itemStatusMap = { 0: ['badge-inactive', '待機'], 1: ['badge-warning', '実行中'], 2: ['badge-active', '成功'], 3: ['badge-danger', '失敗'] };
+                this.detailItemOptions = {
+                    statusMap: { 0: ['badge-inactive', '待機'], 1: ['badge-warning', '実行中'], 2: ['badge-active', '成功'], 3: ['badge-danger', '失敗'] },
+                    withError: false,
+                };
                 html += `
                     <div class="table-container"><table>
                         <thead><tr><th>会員番号</th><th>名前</th><th>メール</th><th>ステータス</th><th>送信日時</th></tr></thead>
-                        <tbody>${data.items.map(item => {
-                            const [iClass, iLabel] = itemStatusMap[item.status] || ['badge-inactive', '不明'];
-                            return `
-                                <tr>
-                                    <td>${this.esc(item.member_no)}</td>
-                                    <td>${this.esc(item.user_name)}</td>
-                                    <td>${this.esc(item.email)}</td>
-                                    <td><span class="badge ${iClass}">${iLabel}</span></td>
-                                    <td>${item.sent_at ? new Date(item.sent_at).toLocaleString('ja-JP') : '-'}</td>
-                                </tr>
-                            `;
-                        }).join('')}</tbody>
+                        <tbody id="detail-items-tbody">${this.renderDetailItemRows(data.items)}</tbody>
                     </table></div>
+                    ${this.renderDetailItemsMore(d.id, data.next_after_id)}
                 `;
             } else {
                 html += '<p style="color:#999;">送信先がありません</p>';
@@ -534,24 +543,16 @@ const ProgressPage = {
 
         // ユーザー別結果テーブル
         if (data.items && data.items.length > 0) {
-            const itemStatusMap = { 0: ['badge-inactive', '未実行'], 1: ['badge-warning', '実行中'], 2: ['badge-active', '完了'], 3: ['badge-danger', 'エラー'] };
+            this.detailItemOptions = {
+                statusMap: { 0: ['badge-inactive', '未実行'], 1: ['badge-warning', '実行中'], 2: ['badge-active', '完了'], 3: ['badge-danger', 'エラー'] },
+                withError: true,
+            };
             html += `
                 <div class="table-container"><table>
                     <thead><tr><th>会員番号</th><th>名前</th><th>メール</th><th>ステータス</th><th>送信日時</th><th>エラー</th></tr></thead>
-                    <tbody>${data.items.map(item => {
-                        const [iClass, iLabel] = itemStatusMap[item.status] || ['badge-inactive', '不明'];
-                        return `
-                            <tr>
-                                <td>${this.esc(item.member_no)}</td>
-                                <td>${this.esc(item.user_name)}</td>
-                                <td>${this.esc(item.email)}</td>
-                                <td><span class="badge ${iClass}">${iLabel}</span></td>
-                                <td>${item.sent_at ? new Date(item.sent_at).toLocaleString('ja-JP') : '-'}</td>
-                                <td style="max-width:200px;word-break:break-word;color:#dc3545;">${this.esc(item.error_message || '')}</td>
-                            </tr>
-                        `;
-                    }).join('')}</tbody>
+                    <tbody id="detail-items-tbody">${this.renderDetailItemRows(data.items)}</tbody>
                 </table></div>
+                ${this.renderDetailItemsMore(data.delivery && data.delivery.id, data.next_after_id)}
             `;
         } else {
             html += '<p style="color:#999;">配信アイテムがありません</p>';
@@ -560,6 +561,45 @@ const ProgressPage = {
         body.innerHTML = html;
     },
 
+    // --- 詳細モーダルの配信アイテム (id順のページング) ---
+    renderDetailItemRows(items) {
+        const { statusMap, withError } = this.detailItemOptions;
+        return items.map(item => {
+            const [iClass, iLabel] = statusMap[item.status] || ['badge-inactive', '不明'];
+            return `
+                <tr>
+                    <td>${this.esc(item.member_no)}</td>
+                    <td>${this.esc(item.user_name)}</td>
+                    <td>${this.esc(item.email)}</td>
+                    <td><span class="badge ${iClass}">${iLabel}</span></td>
+                    <td>${item.sent_at ? new Date(item.sent_at).toLocaleString('ja-JP') : '-'}</td>
+                    ${withError ? `<td style="max-width:200px;word-break:break-word;color:#dc3545;">${this.esc(item.error_message || '')}</td>` : ''}
+                </tr>
+            `;
+        }).join('');
+    },
+
+    renderDetailItemsMore(deliveryId, nextAfterId) {
+        const button = deliveryId && nextAfterId
+            ? `<button class="btn btn-sm" onclick="ProgressPage.loadMoreDetailItems(${deliveryId}, ${nextAfterId})">もっと見る</button>`
+            : '';
+        const exportLink = deliveryId
+            ? `<a class="btn btn-sm btn-secondary" href="/api/admin/exports/deliveries/${deliveryId}/items?format=csv">CSV出力</a>`
+            : '';
+        return `<div id="detail-items-more" style="margin-top:12px;">${button} ${exportLink}</div>`;
+    },
+
+    async loadMoreDetailItems(deliveryId, afterId) {
+        const more = document.getElementById('detail-items-more');
+        try {
+            const data = await API.get(`/api/admin/deliveries/${deliveryId}/items?after_id=${afterId}`);
+            document.getElementById('detail-items-tbody').insertAdjacentHTML('beforeend', this.renderDetailItemRows(data.items));
+            more.outerHTML = this.renderDetailItemsMore(deliveryId, data.next_after_id);
+        } catch (e) {
+            alert(e.message);
+        }
+    },
+
     closeDetail() {
         document.getElementById('progress-detail-modal').classList.remove('active');
     },
@@ -577,7 +617,7 @@ const ProgressPage = {
         if (!confirm('失敗したユーザーに再送しますか？（最大3回リトライします）')) return;
         try {
             const result = await API.post(`/api/admin/progress/${id}/retry-failed`);
-            alert(`再送完了: ${result.success}件成功 / ${result.failed}件失敗`);
+            alert(`${result.queued}件を再送キューに追加しました。結果は順次配信履歴に反映されます`);
             this.loadProgress();
             this.loadRecentDeliveries();
         } catch (e) {
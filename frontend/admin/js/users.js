@@ -9,7 +9,11 @@ const UsersPage = {
         container.innerHTML = `
             <div class="content-header flex-between">
                 <h1>ユーザー管理</h1>
-                <button class="btn" onclick="UsersPage.showInvite()">管理者招待</button>
+                <div>
+                    <a class="btn btn-secondary" href="/api/admin/exports/users?format=csv">ユーザーCSV</a>
+                    <a class="btn btn-secondary" href="/api/admin/exports/answers?format=csv">回答CSV</a>
+                    <button class="btn" onclick="UsersPage.showInvite()">管理者招待</button>
+                </div>
             </div>
             <div class="filters">
                 <input id="user-search" type="text" placeholder="検索 (メール/会員番号/名前)" style="flex:1;padding:8px;border:1px solid #000;" onkeydown="if(event.key==='Enter')UsersPage.search()">
@@ -81,6 +85,7 @@ const UsersPage = {
                             <td class="action-btns">
                                 <button class="btn btn-sm btn-secondary" onclick="UsersPage.showPlanModal(${u.id},'${this.esc(u.name_last)} ${this.esc(u.name_first)}',${JSON.stringify(u.plans.map(p=>p.plan_id)).replace(/"/g,'&quot;')})">プラン変更</button>
                                 <button class="btn btn-sm btn-secondary" onclick="UsersPage.toggleActive(${u.id})">${u.is_active ? '無効化' : '有効化'}</button>
+                                ${u.deliverable ? '' : `<button class="btn btn-sm btn-secondary" onclick="UsersPage.restoreDeliverable(${u.id})">配信再開</button>`}
                                 <button class="btn btn-sm btn-secondary" onclick="UsersPage.changeRole(${u.id},'${u.role==='admin'?'user':'admin'}')">${u.role==='admin'?'→user':'→admin'}</button>
                             </td>
                         </tr>`;
@@ -148,6 +153,11 @@ const UsersPage = {
         try { await API.put(`/api/admin/users/${id}/toggle-active`); this.load(this.currentPage); } catch(e) { alert(e.message); }
     },
 
+    async restoreDeliverable(id) {
+        if (!confirm('バウンス・配信停止で止まっている配信を再開しますか？')) return;
+        try { await API.put(`/api/admin/users/${id}/restore-deliverable`); this.load(this.currentPage); } catch(e) { alert(e.message); }
+    },
+
     async changeRole(id, role) {
         if (!confirm(`ロールを${role}に変更しますか？`)) return;
         try { await API.put(`/api/admin/users/${id}/role`, {role}); this.load(this.currentPage); } catch(e) { alert(e.message); }
@@ -122,10 +122,11 @@ async function loadGreeting() {
 
 // --- プランカード ---
 let _subs = [];
-async function loadPlanCards() {
+async function loadPlanCards(refresh = false) {
     const el = document.getElementById('plan-cards');
     try {
-        _subs = await API.get('/api/my-subscriptions');
+        // 割引情報は通常サーバー側の控えから表示し、refresh 時のみ Stripe から取り直す
+        _subs = await API.get('/api/my-subscriptions' + (refresh ? '?refresh=true' : ''));
         if (_subs.length === 0) {
             el.innerHTML = `
                 <div class="dash-card">
@@ -192,6 +193,10 @@ function renderPlanCard(s) {
                     <span style="color:#e53935;font-weight:bold;"> → ${fmtPrice(s.actual_price)}</span>
                     <div style="font-size:0.8em;color:#4caf50;">${s.discount_name}${s.discount_percent ? ` (${s.discount_percent}%OFF)` : ''}</div>
                 ` : fmtPrice(s.actual_price || s.plan_price)}</div>
+                ${s.discount_stale ? `
+                <div style="font-size:0.8em;margin-top:4px;">
+                    <a href="javascript:void(0)" onclick="loadPlanCards(true)" style="color:#0056b3;">最新の情報に更新</a>
+                </div>` : ''}
             </div>` : ''}
             ${s.trial_end ? `
             <div class="meta-item">
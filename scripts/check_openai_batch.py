@@ -0,0 +1,266 @@
+#!/usr/bin/env python3
+"""OpenAI Batch API モードの動作確認スクリプト
+
+/v1/files と /v1/batches を模したフェイクサーバーをプロセス内で起動し、
+OPENAI_BASE_URL をそこへ向けて openai_batch_service の各経路を実行する。
+
+    1. submit   : チャンク分割して投入し、ジョブが記録されること
+    2. rollback : 2件目のチャンク投入に失敗したとき、ジョブが記録されず投入済み分がキャンセルされること
+    3. parse    : 完了したジョブの結果を取り込み、不正な行は失敗件数に数えること
+    4. fail     : failed になったジョブのエラーが記録され、待機中の進捗が未実行に戻ること
+
+DB への書き込みはすべて外側のトランザクション内のセーブポイントで行い、最後にロールバックする。
+(ステージング統計・usage 集計の Redis キーは 2000-01-01 の日付で加算される)
+
+使用方法:
+    cd /opt/mail_service
+    docker compose exec worker python /app/scripts/check_openai_batch.py --plan-id 1
+
+    --plan-id には、ユーザーごとにプロンプトが異なり配信対象ユーザーが2人以上いるプランを指定する。
+"""
+import argparse
+import json
+import os
+import sys
+import threading
+import time
+from datetime import date
+from email.parser import BytesParser
+from email.policy import HTTP
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+sys.path.insert(0, "/app")
+
+TARGET_DATE = date(2000, 1, 1)
+
+
+class FakeBatchState:
+    """フェイクサーバーが保持するファイルとバッチ"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.files: dict[str, bytes] = {}
+        self.batches: dict[str, dict] = {}
+        self.seq = 0
+        self.fail_batch_create_after = None  # N件作成した後の batches.create を失敗させる
+        self.cancelled: list[str] = []
+
+    def next_id(self, prefix: str) -> str:
+        self.seq += 1
+        return f"{prefix}-fake{self.seq}"
+
+    def requests_of(self, batch_id: str) -> list[dict]:
+        raw = self.files[self.batches[batch_id]["input_file_id"]]
+        return [json.loads(line) for line in raw.decode("utf-8").splitlines() if line.strip()]
+
+    def complete(self, batch_id: str, broken: int = 0):
+        """入力の各リクエストに応答した出力ファイルを作り completed にする。先頭 broken 件は不正な応答にする"""
+        lines = []
+        for i, req in enumerate(self.requests_of(batch_id)):
+            if i < broken:
+                content = json.dumps({"subject": "件名のみ"}, ensure_ascii=False)
+            else:
+                content = json.dumps({"subject": f"件名{i}", "body": f"本文{i}"}, ensure_ascii=False)
+            lines.append(json.dumps({
+                "id": f"req-{i}",
+                "custom_id": req["custom_id"],
+                "response": {
+                    "status_code": 200,
+                    "body": {
+                        "choices": [{"index": 0, "message": {"role": "assistant", "content": content}}],
+                        "usage": {"prompt_tokens": 10, "completion_tokens": 5, "total_tokens": 15},
+                    },
+                },
+                "error": None,
+            }, ensure_ascii=False))
+        with self.lock:
+            output_id = self.next_id("file")
+            self.files[output_id] = "\n".join(lines).encode("utf-8")
+            self.batches[batch_id].update(status="completed", output_file_id=output_id)
+
+    def fail(self, batch_id: str, message: str):
+        with self.lock:
+            self.batches[batch_id].update(
+                status="failed",
+                errors={"object": "list", "data": [{"code": "invalid_request", "message": message}]},
+            )
+
+
+def make_handler(state: FakeBatchState):
+    class Handler(BaseHTTPRequestHandler):
+        def log_message(self, *args):
+            pass
+
+        def _send(self, status: int, body, content_type: str = "application/json"):
+            data = body if isinstance(body, bytes) else json.dumps(body).encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", content_type)
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def _body(self) -> bytes:
+            return self.rfile.read(int(self.headers.get("Content-Length") or 0))
+
+        def do_POST(self):
+            body = self._body()
+            parts = self.path.rstrip("/").split("/")
+            if self.path == "/v1/files":
+                header = f"Content-Type: {self.headers['Content-Type']}\r\n\r\n".encode("utf-8")
+                message = BytesParser(policy=HTTP).parsebytes(header + body)
+                upload = next(p for p in message.iter_parts() if p.get_param("name", header="content-disposition") == "file")
+                with state.lock:
+                    file_id = state.next_id("file")
+                    state.files[file_id] = upload.get_payload(decode=True)
+                return self._send(200, {
+                    "id": file_id, "object": "file", "bytes": len(state.files[file_id]),
+                    "created_at": int(time.time()), "filename": upload.get_filename(),
+                    "purpose": "batch", "status": "processed",
+                })
+            if self.path == "/v1/batches":
+                params = json.loads(body)
+                with state.lock:
+                    limit = state.fail_batch_create_after
+                    if limit is not None and len(state.batches) >= limit:
+                        return self._send(400, {"error": {"message": "fake: batch create rejected", "type": "invalid_request_error"}})
+                    batch_id = state.next_id("batch")
+                    state.batches[batch_id] = {
+                        "id": batch_id, "object": "batch", "endpoint": params["endpoint"],
+                        "input_file_id": params["input_file_id"], "completion_window": params["completion_window"],
+                        "status": "validating", "created_at": int(time.time()), "metadata": params.get("metadata"),
+                        "output_file_id": None, "errors": None,
+                    }
+                    return self._send(200, state.batches[batch_id])
+            if len(parts) == 5 and parts[2] == "batches" and parts[4] == "cancel":
+                with state.lock:
+                    batch = state.batches.get(parts[3])
+                    if not batch:
+                        return self._send(404, {"error": {"message": "not found"}})
+                    batch["status"] = "cancelled"
+                    state.cancelled.append(parts[3])
+                    return self._send(200, batch)
+            self._send(404, {"error": {"message": f"unknown path {self.path}"}})
+
+        def do_GET(self):
+            parts = self.path.rstrip("/").split("/")
+            if len(parts) == 4 and parts[2] == "batches" and parts[3] in state.batches:
+                return self._send(200, state.batches[parts[3]])
+            if len(parts) == 5 and parts[2] == "files" and parts[4] == "content" and parts[3] in state.files:
+                return self._send(200, state.files[parts[3]], "application/octet-stream")
+            self._send(404, {"error": {"message": f"unknown path {self.path}"}})
+
+    return Handler
+
+
+def start_fake_server(state: FakeBatchState) -> ThreadingHTTPServer:
+    server = ThreadingHTTPServer(("127.0.0.1", 0), make_handler(state))
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def check(label: str, condition: bool, detail: str = ""):
+    print(f"[{'OK' if condition else 'NG'}] {label}{' - ' + detail if detail else ''}")
+    if not condition:
+        raise SystemExit(1)
+
+
+def run(plan_id: int):
+    state = FakeBatchState()
+    server = start_fake_server(state)
+    # app の設定読み込み前に向け先を差し替える
+    os.environ["OPENAI_BASE_URL"] = f"http://127.0.0.1:{server.server_port}/v1"
+
+    from sqlalchemy.orm import Session
+    from app.core.database import engine
+    from app.models.plan import Plan
+    from app.models.progress_plan import ProgressPlan
+    from app.models.openai_batch_job import OpenAIBatchJob
+    from app.models.pregenerated_content import PregeneratedContent
+    from app.services import openai_batch_service as batch_service
+    from app.services.openai_service import get_openai_client
+
+    conn = engine.connect()
+    outer = conn.begin()
+    db = Session(bind=conn, join_transaction_mode="create_savepoint")
+    try:
+        plan = db.get(Plan, plan_id)
+        check("プラン取得", plan is not None, f"plan_id={plan_id}")
+        progress = ProgressPlan(plan_id=plan.id, date=TARGET_DATE, send_type="scheduled", status=0)
+        db.add(progress)
+        db.commit()
+
+        def jobs():
+            return db.query(OpenAIBatchJob).filter(
+                OpenAIBatchJob.plan_id == plan.id, OpenAIBatchJob.date == TARGET_DATE,
+            ).order_by(OpenAIBatchJob.id).all()
+
+        # 2. rollback: 記録が残らないことを確かめるため、成功経路より先に実行する
+        batch_service.BATCH_MAX_REQUESTS = 1
+        state.fail_batch_create_after = 1
+        try:
+            batch_service.submit_plan_batch(db, plan, progress, api_key="sk-fake")
+            raised = False
+        except Exception:
+            raised = True
+        check("rollback: 2件目の投入失敗で例外", raised)
+        check("rollback: ジョブは記録されない", not jobs())
+        check("rollback: 投入済みのバッチはキャンセル", state.cancelled == list(state.batches), f"cancelled={state.cancelled}")
+
+        # 1. submit
+        state.fail_batch_create_after = None
+        state.batches.clear()
+        state.cancelled.clear()
+        batch_service.BATCH_MAX_REQUESTS = 2
+        submitted = batch_service.submit_plan_batch(db, plan, progress, api_key="sk-fake")
+        recorded = jobs()
+        check("submit: リクエストを投入", submitted >= 2, f"requests={submitted}")
+        check("submit: チャンクごとにジョブを記録", len(recorded) == len(state.batches) == -(-submitted // 2),
+              f"jobs={len(recorded)}")
+        check("submit: 件数の合計が一致", sum(j.request_count for j in recorded) == submitted)
+        check("submit: 二重投入されない", batch_service.has_batch_jobs(db, plan.id, TARGET_DATE))
+        progress.status = 4
+        db.commit()
+
+        # 3. parse / 4. fail: 先頭ジョブは不正な応答1件を含めて完了、最後のジョブは失敗させる
+        client = get_openai_client("sk-fake")
+        first, last = recorded[0], recorded[-1]
+        state.complete(first.batch_id, broken=1)
+        if last is not first:
+            state.fail(last.batch_id, "fake: input file invalid")
+        for job in recorded[1:-1]:
+            state.complete(job.batch_id)
+
+        for job in recorded:
+            check(f"poll: {job.batch_id} が終了状態", batch_service.poll_batch_job(db, job, client))
+
+        check("parse: 成功件数", first.completed_count == first.request_count - 1,
+              f"completed={first.completed_count}, failed={first.failed_count}")
+        check("parse: 不正な応答は失敗件数", first.failed_count == 1)
+        staged = db.query(PregeneratedContent).filter(
+            PregeneratedContent.plan_id == plan.id, PregeneratedContent.date == TARGET_DATE,
+        ).count()
+        expected = sum(j.completed_count for j in recorded)
+        check("parse: pregenerated_contents に取り込み", staged == expected, f"staged={staged}")
+        if last is not first:
+            check("fail: status=failed", last.status == "failed")
+            check("fail: エラー内容を記録", "input file invalid" in (last.last_error or ""))
+
+        check("release: 待機中の進捗を未実行に戻す", batch_service.release_waiting_progress(db, plan.id, TARGET_DATE))
+        db.refresh(progress)
+        check("release: status=0", progress.status == 0)
+        print("\nすべての確認に成功しました")
+    finally:
+        db.close()
+        outer.rollback()
+        conn.close()
+        server.shutdown()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="OpenAI Batch API モードの動作確認")
+    parser.add_argument("--plan-id", type=int, required=True)
+    run(parser.parse_args().plan_id)
+
+
+if __name__ == "__main__":
+    main()
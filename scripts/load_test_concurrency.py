@@ -0,0 +1,105 @@
+#!/usr/bin/env python3
+"""API の同時実行負荷テスト
+
+同期DB・bcrypt・外部SDK呼び出しがイベントループを塞いでいないかを確認するため、
+軽いエンドポイント (/api/health) と DB を読むエンドポイントを同時に叩き、
+スループットとレイテンシ分布 (p50/p95/p99) を表示する。
+ループが塞がれていると /api/health の p99 が DB 系エンドポイントに引きずられて悪化する。
+
+使用方法:
+    cd /opt/mail_service
+    docker compose exec api python /app/scripts/load_test_concurrency.py \\
+        --base-url http://localhost:8000 --concurrency 50 --requests 2000 \\
+        --email admin@example.com --password '...'
+
+    --email/--password を指定すると管理者としてログインし、管理画面の一覧APIも対象にする。
+    ログインはレート制限があるため最初に1回だけ行い、セッションCookieを使い回す。
+"""
+import argparse
+import asyncio
+import statistics
+import time
+
+import httpx
+
+PUBLIC_PATHS = ["/api/health", "/api/plans"]
+ADMIN_PATHS = ["/api/admin/users?per_page=50", "/api/admin/logs?per_page=50"]
+
+
+def percentile(values: list[float], p: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, int(round(p / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+async def login(client: httpx.AsyncClient, email: str, password: str):
+    resp = await client.post("/api/auth/login", json={"email": email, "password": password})
+    resp.raise_for_status()
+    client.headers["X-CSRF-Token"] = resp.json().get("csrf_token", "")
+    print("ログイン成功")
+
+
+async def worker(client: httpx.AsyncClient, queue: asyncio.Queue, results: dict):
+    while True:
+        try:
+            path = queue.get_nowait()
+        except asyncio.QueueEmpty:
+            return
+        started = time.perf_counter()
+        try:
+            resp = await client.get(path)
+            ok = resp.status_code < 400
+        except httpx.HTTPError:
+            ok = False
+        elapsed = (time.perf_counter() - started) * 1000
+        stat = results.setdefault(path, {"latencies": [], "errors": 0})
+        stat["latencies"].append(elapsed)
+        if not ok:
+            stat["errors"] += 1
+
+
+async def run(args):
+    limits = httpx.Limits(max_connections=args.concurrency, max_keepalive_connections=args.concurrency)
+    async with httpx.AsyncClient(base_url=args.base_url, limits=limits, timeout=args.timeout) as client:
+        paths = list(PUBLIC_PATHS)
+        if args.email and args.password:
+            await login(client, args.email, args.password)
+            paths += ADMIN_PATHS
+
+        queue: asyncio.Queue = asyncio.Queue()
+        for i in range(args.requests):
+            queue.put_nowait(paths[i % len(paths)])
+
+        results: dict = {}
+        started = time.perf_counter()
+        await asyncio.gather(*(worker(client, queue, results) for _ in range(args.concurrency)))
+        elapsed = time.perf_counter() - started
+
+    total = sum(len(s["latencies"]) for s in results.values())
+    print(f"\n同時実行数: {args.concurrency}  リクエスト数: {total}  所要時間: {elapsed:.2f}秒")
+    print(f"スループット: {total / elapsed:.1f} req/s\n")
+    print(f"{'path':<32} {'count':>6} {'err':>5} {'mean':>8} {'p50':>8} {'p95':>8} {'p99':>8} (ms)")
+    for path, stat in results.items():
+        lat = stat["latencies"]
+        print(
+            f"{path:<32} {len(lat):>6} {stat['errors']:>5} "
+            f"{statistics.mean(lat):>8.1f} {percentile(lat, 50):>8.1f} "
+            f"{percentile(lat, 95):>8.1f} {percentile(lat, 99):>8.1f}"
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="API 同時実行負荷テスト")
+    parser.add_argument("--base-url", default="http://localhost:8000")
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--timeout", type=float, default=30.0)
+    parser.add_argument("--email", default="")
+    parser.add_argument("--password", default="")
+    asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()